@@ -29,6 +29,7 @@ import logging
 import os
 import sys
 import asyncio
+import time
 from datetime import datetime
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -41,7 +42,9 @@ from telegram.error import TimedOut, NetworkError
 # ========== INICIALIZAR SISTEMA ==========
 sys.path.append(os.path.dirname(__file__))
 
-from login import inicializar_sistema, AuthSystem, requiere_login, requiere_admin, VERSION
+from arranque import bootstrap, registrar_etapa, resumen_arranque
+from login import AuthSystem, requiere_login, requiere_admin, VERSION
+from almacen import store
 from menus_principal import menu_principal, menu_bienvenida
 
 # ========== VARIABLES DE ENTORNO ==========
@@ -65,22 +68,28 @@ GITHUB_OWNER = os.environ.get("GITHUB_OWNER")
 GITHUB_REPO = os.environ.get("GITHUB_REPO")
 USE_GITHUB_SYNC = os.getenv("USE_GITHUB_SYNC", "false").lower() == "true"
 
-# ✅ CREA TODOS LOS JSON Y VERIFICA TODO AL INICIAR
-inicializar_sistema()
+# Procesar updates en paralelo (las mutaciones van protegidas por bloqueos.py)
+CONCURRENT_UPDATES = os.getenv("CONCURRENT_UPDATES", "false").lower() == "true"
+
+# ✅ LOS JSON, LAS MIGRACIONES Y EL ÍNDICE DE ALIANZAS SE PREPARAN EN main()
+# (arranque.bootstrap): importar este módulo no toca red ni disco
 
 # ========== LOGGING ==========
 log_dir = 'log'
-os.makedirs(log_dir, exist_ok=True)
 log_file = os.path.join(log_dir, 'AstroIO.log')
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    handlers=[
-        logging.FileHandler(log_file, encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+def configurar_logging():
+    """📝 Log a consola y a log/AstroIO.log (se llama desde main)"""
+    os.makedirs(log_dir, exist_ok=True)
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO,
+        handlers=[
+            logging.FileHandler(log_file, encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
+
 logger = logging.getLogger(__name__)
 
 # ========== VERIFICAR CONFIGURACIÓN DE GITHUB ==========
@@ -99,10 +108,8 @@ def verificar_configuracion_github():
     except Exception as e:
         logger.warning(f"⚠️ No se pudo verificar GitHub: {e}")
 
-# Llamar a la función
-verificar_configuracion_github()
-
 # ========== IMPORTAR MÓDULOS ==========
+_INICIO_MODULOS = time.monotonic()
 from usuarios import start_handler, decision_handler, aceptar_usuario, rechazar_usuario
 from recursos import mostrar_recursos
 from callback_handlers import callback_handler
@@ -178,12 +185,12 @@ async def start_command_handler(update: Update, context: ContextTypes.DEFAULT_TY
     logger.info(f"📱 /start - {username_tag}")
     
     # ✅ Verificar si está registrado
-    if not AuthSystem.esta_registrado(user_id):
-        AuthSystem.registrar_usuario(user_id, username)
+    if not await store.ejecutar(AuthSystem.esta_registrado, user_id):
+        await store.ejecutar(AuthSystem.registrar_usuario, user_id, username)
         logger.info(f"📌 Usuario registrado: {username_tag}")
     
     # ✅ Si está autorizado, va al menú principal
-    if AuthSystem.esta_autorizado(user_id):
+    if await store.ejecutar(AuthSystem.esta_autorizado, user_id):
         # Mock Update para menu_principal
         class MockMessage:
             def __init__(self, chat_id):
@@ -231,7 +238,7 @@ async def admin_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """👑 Comando /admin"""
     user_id = update.effective_user.id
     
-    if not AuthSystem.es_admin(user_id):
+    if not await store.ejecutar(AuthSystem.es_admin, user_id):
         await update.message.reply_text(
             "❌ <b>ACCESO DENEGADO</b>\n\nNo tienes permisos de administrador.",
             parse_mode="HTML"
@@ -312,7 +319,7 @@ async def recibir_mensajes_handler(update: Update, context: ContextTypes.DEFAULT
     - Útil para ConversationHandlers
     """
     user_id = update.effective_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
     logger.debug(f"📨 Mensaje de {username_tag}: {update.message.text[:50]}...")
     
@@ -343,15 +350,32 @@ async def verificar_conexion(app):
             return False
     return False
 
+# ========== 💾 APAGADO ORDENADO ==========
+async def volcar_datos_al_apagar(app):
+    """💾 Vuelca las escrituras diferidas antes de que el proceso termine"""
+    from database import flush_all
+    if flush_all():
+        logger.info("💾 Datos pendientes volcados a disco")
+    else:
+        logger.error("❌ Algunos datos pendientes no se pudieron volcar")
+
 # ========== 🕐 TAREAS PROGRAMADAS ==========
 def main():
+    registrar_etapa("módulos del juego", time.monotonic() - _INICIO_MODULOS)
+    configurar_logging()
+    verificar_configuracion_github()
+
+    # ✅ ALMACENAMIENTO, JSON, TABLAS, MIGRACIONES E ÍNDICE DE ALIANZAS (una sola vez)
+    bootstrap()
+    inicio_app = time.monotonic()
     print("=" * 60)
     print(f"🚀 ASTROIO {VERSION} - SISTEMA MODULAR COMPLETO CON GUERRA")
     print("=" * 60)
     print(f"✅ Versión: {VERSION}")
     print("✅ Archivos JSON verificados")
     print("✅ Sistema de login activado")
-    print("✅ Datos en tiempo real - SIN CACHE")
+    print("✅ Datos en tiempo real - Caché validada por mtime")
+    print("✅ Updates concurrentes - Bloqueos por jugador" if CONCURRENT_UPDATES else "✅ Updates secuenciales")
     print("✅ Usuarios con @username")
     print("✅ Navegación sin spam")
     print("✅ Edificios - Colas en tiempo real")
@@ -366,7 +390,13 @@ def main():
     print("=" * 60)
     
     # Crear aplicación
-    app = Application.builder().token(TOKEN).build()
+    app = (
+        Application.builder()
+        .token(TOKEN)
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .post_shutdown(volcar_datos_al_apagar)
+        .build()
+    )
     
     # Configurar timeouts
     try:
@@ -464,6 +494,14 @@ def main():
             logger.info("✅ Tarea programada: Colas de investigación (cada 60s)")
         except Exception as e:
             logger.error(f"❌ Error en colas de investigación: {e}")
+        
+        # RETENCIÓN Y COMPACTACIÓN DE HISTORIALES
+        try:
+            from retencion import compactacion_programada, RETENCION_INTERVALO_HORAS
+            job_queue.run_repeating(compactacion_programada, interval=RETENCION_INTERVALO_HORAS * 3600, first=300)
+            logger.info(f"✅ Tarea programada: Compactación de historiales (cada {RETENCION_INTERVALO_HORAS:g}h)")
+        except Exception as e:
+            logger.error(f"❌ Error en compactación de historiales: {e}")
     else:
         logger.warning("⚠️ Job queue no disponible - Las colas no se procesarán automáticamente")
     
@@ -476,6 +514,9 @@ def main():
     print("⏱️  El bot comenzará a recibir mensajes inmediatamente")
     print("=" * 60 + "\n")
     
+    registrar_etapa("aplicación, handlers y tareas", time.monotonic() - inicio_app)
+    logger.info(resumen_arranque())
+    
     # Iniciar polling - esto es bloqueante
     app.run_polling()
 
@@ -29,7 +29,10 @@ from telegram.ext import (
 )
 
 from login import AuthSystem, requiere_login
-from database import load_json, save_json
+from database import load_json, save_json, existe_json, patch, ver_usuario, guardar_usuario, en_transaccion, TransaccionFallida
+from almacen import store
+from bloqueos import bloquear, clave_usuario, clave_alianza
+from indice_alianzas import alianza_de_usuario, alianza_verificada, asignar_alianza, quitar_alianza, disolver_en_indice
 from utils import abreviar_numero
 
 logger = logging.getLogger(__name__)
@@ -80,48 +83,38 @@ def inicializar_archivos_alianza():
         ALIANZA_SOLICITUDES_FILE
     ]
     for archivo in archivos:
-        if not os.path.exists(archivo):
+        if not existe_json(archivo):
             save_json(archivo, {})
 
-inicializar_archivos_alianza()
-
 # ================= FUNCIONES AUXILIARES =================
 
 def generar_id_alianza(etiqueta: str) -> str:
     return etiqueta.upper().replace(" ", "")[:10]
 
 def obtener_alianza_usuario(user_id: int) -> tuple:
-    user_id_str = str(user_id)
-    miembros_data = load_json(ALIANZA_MIEMBROS_FILE) or {}
-    for alianza_id, miembros in miembros_data.items():
-        if user_id_str in miembros:
-            datos = load_json(ALIANZA_DATOS_FILE) or {}
-            return alianza_id, datos.get(alianza_id, {})
-    return None, None
+    alianza_id = alianza_verificada(user_id)
+    if alianza_id is None:
+        return None, None
+    return alianza_id, ver_usuario(alianza_id, ALIANZA_DATOS_FILE)
 
 def es_fundador_alianza(user_id: int, alianza_id: str) -> bool:
-    datos = load_json(ALIANZA_DATOS_FILE) or {}
-    alianza = datos.get(alianza_id, {})
+    alianza = ver_usuario(alianza_id, ALIANZA_DATOS_FILE)
     return alianza.get("fundador") == user_id
 
 def es_admin_alianza(user_id: int, alianza_id: str) -> bool:
     if es_fundador_alianza(user_id, alianza_id):
         return True
-    miembros = load_json(ALIANZA_MIEMBROS_FILE) or {}
-    alianza_miembros = miembros.get(alianza_id, {})
+    alianza_miembros = ver_usuario(alianza_id, ALIANZA_MIEMBROS_FILE)
     miembro = alianza_miembros.get(str(user_id), {})
     return miembro.get("rango") == "admin"
 
 def puede_retirar(user_id: int, alianza_id: str) -> bool:
-    permisos = load_json(ALIANZA_PERMISOS_FILE) or {}
-    alianza_permisos = permisos.get(alianza_id, {})
+    alianza_permisos = ver_usuario(alianza_id, ALIANZA_PERMISOS_FILE)
     return user_id in alianza_permisos.get("retiro", [])
 
 def obtener_banco(alianza_id: str) -> dict:
-    banco_data = load_json(ALIANZA_BANCO_FILE) or {}
-    banco = banco_data.get(alianza_id, {"metal": 0, "cristal": 0, "deuterio": 0})
-    datos = load_json(ALIANZA_DATOS_FILE) or {}
-    alianza = datos.get(alianza_id, {})
+    banco = ver_usuario(alianza_id, ALIANZA_BANCO_FILE, {})
+    alianza = ver_usuario(alianza_id, ALIANZA_DATOS_FILE, {})
     nivel = alianza.get("banco_nivel", 1)
     return {
         "metal": banco.get("metal", 0),
@@ -147,6 +140,129 @@ def verificar_capacidad_banco(alianza_id: str, metal: int, cristal: int, deuteri
         return False, f"🧪 Deuterio excede capacidad ({abreviar_numero(capacidad)})"
     return True, ""
 
+# ================= MOVIMIENTOS DEL BANCO =================
+# Cargo al jugador y abono a la alianza se confirman juntos (en_transaccion),
+# comprobando saldo y capacidad dentro de la misma unidad.
+
+def _donar_al_banco(alianza_id: str, user_id: int, metal: int, cristal: int, deuterio: int) -> tuple:
+    donacion = [(recurso, cantidad) for recurso, cantidad in
+                (("metal", metal), ("cristal", cristal), ("deuterio", deuterio)) if cantidad > 0]
+    recursos = ver_usuario(user_id, RECURSOS_FILE, {})
+    for recurso, cantidad in donacion:
+        if recursos.get(recurso, 0) < cantidad:
+            return False, f"❌ No tienes suficiente {recurso}"
+    ok, msg = verificar_capacidad_banco(alianza_id, metal, cristal, deuterio)
+    if not ok:
+        return False, msg
+    patch(RECURSOS_FILE, user_id, [("incr", recurso, -cantidad) for recurso, cantidad in donacion])
+    patch(ALIANZA_BANCO_FILE, alianza_id, [("incr", recurso, cantidad) for recurso, cantidad in donacion])
+    return True, ""
+
+def donar_al_banco(alianza_id: str, user_id: int, metal: int, cristal: int, deuterio: int) -> tuple:
+    """🏦 Pasa la donación del jugador al banco. Retorna (ok, motivo)"""
+    try:
+        return en_transaccion(_donar_al_banco, alianza_id, user_id, metal, cristal, deuterio)
+    except TransaccionFallida as e:
+        logger.error(f"❌ No se pudo guardar la donación de {user_id} a {alianza_id}: {e}")
+        return False, "❌ No se pudo guardar la donación, inténtalo de nuevo"
+
+def _mejorar_banco(alianza_id: str, user_id: int, costo: int, nuevo_nivel: int) -> tuple:
+    if ver_usuario(alianza_id, ALIANZA_DATOS_FILE, {}).get("banco_nivel", 1) >= nuevo_nivel:
+        return False, f"❌ El banco ya es nivel {nuevo_nivel}"
+    if ver_usuario(user_id, RECURSOS_FILE, {}).get("nxt20", 0) < costo:
+        return False, "❌ No tienes suficiente NXT-20"
+    patch(RECURSOS_FILE, user_id, [("incr", "nxt20", -costo)])
+    patch(ALIANZA_DATOS_FILE, alianza_id, [("set", "banco_nivel", nuevo_nivel)])
+    return True, ""
+
+def mejorar_banco(alianza_id: str, user_id: int, costo: int, nuevo_nivel: int) -> tuple:
+    """⬆️ Cobra la mejora al jugador y sube el nivel del banco. Retorna (ok, motivo)"""
+    try:
+        return en_transaccion(_mejorar_banco, alianza_id, user_id, costo, nuevo_nivel)
+    except TransaccionFallida as e:
+        logger.error(f"❌ No se pudo guardar la mejora del banco de {alianza_id}: {e}")
+        return False, "❌ No se pudo guardar la mejora, inténtalo de nuevo"
+
+# ================= MIEMBROS Y SOLICITUDES =================
+# Escriben solo la entrada de la alianza (patch / guardar_usuario), nunca el
+# documento entero. Los handlers las llaman con bloquear(clave_alianza(...)).
+# Altas, bajas y disolución cambian miembros e índice en la misma transacción
+# (lanzan TransaccionFallida si no se pudo confirmar).
+
+def _agregar_miembro(alianza_id: str, user_id: int, username: str, rango: str, fecha: str) -> None:
+    miembro = {"user_id": user_id, "username": username, "rango": rango, "fecha_ingreso": fecha}
+    patch(ALIANZA_MIEMBROS_FILE, alianza_id, [("set", str(user_id), miembro)])
+    asignar_alianza(user_id, alianza_id)
+
+def agregar_miembro(alianza_id: str, user_id: int, username: str, rango: str, fecha: str) -> None:
+    """➕ Alta del miembro en la alianza y en el índice"""
+    en_transaccion(_agregar_miembro, alianza_id, user_id, username, rango, fecha)
+
+def _quitar_miembro(alianza_id: str, user_id: int) -> bool:
+    es_miembro = str(user_id) in (ver_usuario(alianza_id, ALIANZA_MIEMBROS_FILE) or {})
+    if es_miembro:
+        patch(ALIANZA_MIEMBROS_FILE, alianza_id, [("del", str(user_id))])
+        quitar_alianza(user_id, alianza_id)
+    if user_id in (ver_usuario(alianza_id, ALIANZA_PERMISOS_FILE) or {}).get("retiro", []):
+        patch(ALIANZA_PERMISOS_FILE, alianza_id, [("remove", "retiro", user_id)])
+    return es_miembro
+
+def quitar_miembro(alianza_id: str, user_id: int) -> bool:
+    """➖ Baja del miembro y de su permiso de retiro. False si no era miembro"""
+    return en_transaccion(_quitar_miembro, alianza_id, user_id)
+
+def _crear_alianza(alianza: dict, username: str) -> bool:
+    alianza_id = alianza["id"]
+    if ver_usuario(alianza_id, ALIANZA_DATOS_FILE):
+        return False
+    guardar_usuario(alianza_id, ALIANZA_DATOS_FILE, alianza)
+    _agregar_miembro(alianza_id, alianza["fundador"], username, "fundador", alianza["fecha_creacion"])
+    guardar_usuario(alianza_id, ALIANZA_BANCO_FILE, {"metal": 0, "cristal": 0, "deuterio": 0})
+    guardar_usuario(alianza_id, ALIANZA_PERMISOS_FILE, {"retiro": [alianza["fundador"]]})
+    return True
+
+def crear_alianza(alianza: dict, username: str) -> bool:
+    """🏗️ Alta de la alianza con su fundador. False si el ID ya está en uso"""
+    return en_transaccion(_crear_alianza, alianza, username)
+
+def _borrar_alianza(alianza_id: str) -> None:
+    disolver_en_indice(alianza_id)
+    for archivo in [ALIANZA_DATOS_FILE, ALIANZA_MIEMBROS_FILE, ALIANZA_BANCO_FILE,
+                    ALIANZA_PERMISOS_FILE, ALIANZA_MENSAJES_FILE, ALIANZA_SOLICITUDES_FILE]:
+        data = load_json(archivo) or {}
+        if alianza_id in data:
+            del data[alianza_id]
+            save_json(archivo, data)
+
+def borrar_alianza(alianza_id: str) -> None:
+    """💥 Elimina la alianza de todos sus archivos de una vez"""
+    en_transaccion(_borrar_alianza, alianza_id)
+
+def _aceptar_solicitud(alianza_id: str, user_id: int, username: str, fecha: str) -> bool:
+    otra = alianza_de_usuario(user_id)
+    if otra is None or otra == alianza_id:
+        _agregar_miembro(alianza_id, user_id, username, "miembro", fecha)
+    quitar_solicitud(alianza_id, user_id)
+    return otra is None or otra == alianza_id
+
+def aceptar_solicitud_miembro(alianza_id: str, user_id: int, username: str, fecha: str) -> bool:
+    """✅ Alta del solicitante y fin de su solicitud. False si ya está en otra alianza"""
+    return en_transaccion(_aceptar_solicitud, alianza_id, user_id, username, fecha)
+
+def agregar_solicitud(alianza_id: str, user_id: int, username: str) -> bool:
+    """📨 Añade la solicitud. False si ya tenía una pendiente"""
+    solicitudes = ver_usuario(alianza_id, ALIANZA_SOLICITUDES_FILE) or []
+    if any(s["user_id"] == user_id for s in solicitudes):
+        return False
+    nueva = {"user_id": user_id, "username": username, "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+    return guardar_usuario(alianza_id, ALIANZA_SOLICITUDES_FILE, list(solicitudes) + [nueva])
+
+def quitar_solicitud(alianza_id: str, user_id: int) -> bool:
+    solicitudes = ver_usuario(alianza_id, ALIANZA_SOLICITUDES_FILE)
+    if not solicitudes:
+        return True
+    return guardar_usuario(alianza_id, ALIANZA_SOLICITUDES_FILE, [s for s in solicitudes if s["user_id"] != user_id])
+
 # ================= MENÚ PRINCIPAL DE ALIANZA =================
 
 @requiere_login
@@ -157,7 +273,7 @@ async def menu_alianza_principal(update: Update, context: ContextTypes.DEFAULT_T
         return
     await query.answer()
     user_id = query.from_user.id
-    alianza_id, alianza_datos = obtener_alianza_usuario(user_id)
+    alianza_id, alianza_datos = await store.ejecutar(obtener_alianza_usuario, user_id)
     if alianza_id:
         await menu_alianza_interno(update, context, alianza_id, alianza_datos)
     else:
@@ -166,7 +282,7 @@ async def menu_alianza_principal(update: Update, context: ContextTypes.DEFAULT_T
 async def menu_sin_alianza(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     mensaje = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
         f"🌍 <b>SISTEMA DE ALIANZAS</b> - {username_tag}\n"
@@ -190,10 +306,10 @@ async def menu_alianza_interno(update: Update, context: ContextTypes.DEFAULT_TYP
     """🌍 Menú interno de alianza (cuando ya perteneces a una)"""
     query = update.callback_query
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
     # Obtener datos del banco
-    banco_info = obtener_banco(alianza_id)
+    banco_info = await store.ejecutar(obtener_banco, alianza_id)
     metal = banco_info["metal"]
     cristal = banco_info["cristal"]
     deuterio = banco_info["deuterio"]
@@ -201,13 +317,12 @@ async def menu_alianza_interno(update: Update, context: ContextTypes.DEFAULT_TYP
     capacidad = calcular_capacidad_banco(nivel_banco)
     
     # Obtener miembros
-    miembros = load_json(ALIANZA_MIEMBROS_FILE) or {}
-    alianza_miembros = miembros.get(alianza_id, {})
+    alianza_miembros = await store.ver_usuario(alianza_id, ALIANZA_MIEMBROS_FILE)
     total_miembros = len(alianza_miembros)
     
     # Verificar rangos
-    es_fundador = es_fundador_alianza(user_id, alianza_id)
-    es_admin = es_admin_alianza(user_id, alianza_id)
+    es_fundador = await store.ejecutar(es_fundador_alianza, user_id, alianza_id)
+    es_admin = await store.ejecutar(es_admin_alianza, user_id, alianza_id)
     
     # Descripción
     descripcion = alianza_datos.get("descripcion", "Sin descripción.")
@@ -279,8 +394,8 @@ async def iniciar_creacion_alianza(update: Update, context: ContextTypes.DEFAULT
     query = update.callback_query
     await query.answer()
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
-    alianza_id, _ = obtener_alianza_usuario(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
+    alianza_id, _ = await store.ejecutar(obtener_alianza_usuario, user_id)
     if alianza_id:
         await query.edit_message_text(
             f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -317,7 +432,7 @@ async def iniciar_creacion_alianza(update: Update, context: ContextTypes.DEFAULT
 
 async def recibir_nombre_alianza(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     nombre = update.message.text.strip()
     if len(nombre) < 3 or len(nombre) > 30:
         await update.message.reply_text(
@@ -329,7 +444,7 @@ async def recibir_nombre_alianza(update: Update, context: ContextTypes.DEFAULT_T
             parse_mode="HTML"
         )
         return NOMBRE_ALIANZA
-    datos = load_json(ALIANZA_DATOS_FILE) or {}
+    datos = await store.get(ALIANZA_DATOS_FILE) or {}
     nombre_existe = False
     for alianza in datos.values():
         if alianza.get("nombre", "").lower() == nombre.lower():
@@ -364,7 +479,7 @@ async def recibir_nombre_alianza(update: Update, context: ContextTypes.DEFAULT_T
 
 async def recibir_etiqueta_alianza(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     etiqueta = update.message.text.strip().upper()
     if len(etiqueta) < 2 or len(etiqueta) > 5:
         await update.message.reply_text(
@@ -386,7 +501,7 @@ async def recibir_etiqueta_alianza(update: Update, context: ContextTypes.DEFAULT
             parse_mode="HTML"
         )
         return ETIQUETA_ALIANZA
-    datos = load_json(ALIANZA_DATOS_FILE) or {}
+    datos = await store.get(ALIANZA_DATOS_FILE) or {}
     if etiqueta in datos:
         await update.message.reply_text(
             f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -400,7 +515,7 @@ async def recibir_etiqueta_alianza(update: Update, context: ContextTypes.DEFAULT
     nombre = context.user_data.get('alianza_nombre', 'Alianza sin nombre')
     alianza_id = etiqueta
     ahora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    datos[alianza_id] = {
+    alianza = {
         "id": alianza_id,
         "nombre": nombre,
         "etiqueta": etiqueta,
@@ -410,23 +525,24 @@ async def recibir_etiqueta_alianza(update: Update, context: ContextTypes.DEFAULT
         "descripcion": "",
         "banco_nivel": 1
     }
-    save_json(ALIANZA_DATOS_FILE, datos)
-    miembros = load_json(ALIANZA_MIEMBROS_FILE) or {}
-    if alianza_id not in miembros:
-        miembros[alianza_id] = {}
-    miembros[alianza_id][str(user_id)] = {
-        "user_id": user_id,
-        "username": username_tag,
-        "rango": "fundador",
-        "fecha_ingreso": ahora
-    }
-    save_json(ALIANZA_MIEMBROS_FILE, miembros)
-    banco = load_json(ALIANZA_BANCO_FILE) or {}
-    banco[alianza_id] = {"metal": 0, "cristal": 0, "deuterio": 0}
-    save_json(ALIANZA_BANCO_FILE, banco)
-    permisos = load_json(ALIANZA_PERMISOS_FILE) or {}
-    permisos[alianza_id] = {"retiro": [user_id]}
-    save_json(ALIANZA_PERMISOS_FILE, permisos)
+    try:
+        async with bloquear(clave_alianza(alianza_id)):
+            creada = await store.ejecutar(crear_alianza, alianza, username_tag)
+    except TransaccionFallida as e:
+        logger.error(f"❌ No se pudo crear la alianza {alianza_id}: {e}")
+        await update.message.reply_text("❌ No se pudo crear la alianza, inténtalo de nuevo:")
+        return ETIQUETA_ALIANZA
+    if not creada:
+        # Otro jugador registró la misma etiqueta mientras tanto
+        await update.message.reply_text(
+            f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
+            f"❌ <b>ETIQUETA NO DISPONIBLE</b>\n"
+            f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n\n"
+            f"La etiqueta '{etiqueta}' ya está en uso.\n\n"
+            f"<i>Escribe otra etiqueta o envía /cancelar:</i>",
+            parse_mode="HTML"
+        )
+        return ETIQUETA_ALIANZA
     del context.user_data['alianza_nombre']
     mensaje = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -452,8 +568,8 @@ async def iniciar_busqueda_alianza(update: Update, context: ContextTypes.DEFAULT
     query = update.callback_query
     await query.answer()
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
-    alianza_id, _ = obtener_alianza_usuario(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
+    alianza_id, _ = await store.ejecutar(obtener_alianza_usuario, user_id)
     if alianza_id:
         await query.edit_message_text(
             f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -483,9 +599,9 @@ async def iniciar_busqueda_alianza(update: Update, context: ContextTypes.DEFAULT
 
 async def recibir_busqueda_alianza(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     busqueda = update.message.text.strip()
-    datos = load_json(ALIANZA_DATOS_FILE) or {}
+    datos = await store.get(ALIANZA_DATOS_FILE) or {}
     alianza_encontrada = None
     alianza_id = None
     if busqueda.upper() in datos:
@@ -507,8 +623,7 @@ async def recibir_busqueda_alianza(update: Update, context: ContextTypes.DEFAULT
             parse_mode="HTML"
         )
         return BUSCAR_NOMBRE
-    miembros = load_json(ALIANZA_MIEMBROS_FILE) or {}
-    total_miembros = len(miembros.get(alianza_id, {}))
+    total_miembros = len(await store.ver_usuario(alianza_id, ALIANZA_MIEMBROS_FILE))
     mensaje = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
         f"🔍 <b>ALIANZA ENCONTRADA</b>\n"
@@ -534,9 +649,9 @@ async def enviar_solicitud_alianza(update: Update, context: ContextTypes.DEFAULT
     query = update.callback_query
     await query.answer()
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     alianza_id = query.data.replace("alianza_solicitar_", "")
-    alianza_actual, _ = obtener_alianza_usuario(user_id)
+    alianza_actual, _ = await store.ejecutar(obtener_alianza_usuario, user_id)
     if alianza_actual:
         await query.edit_message_text(
             f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -550,8 +665,7 @@ async def enviar_solicitud_alianza(update: Update, context: ContextTypes.DEFAULT
             ]])
         )
         return
-    datos = load_json(ALIANZA_DATOS_FILE) or {}
-    alianza = datos.get(alianza_id, {})
+    alianza = await store.ver_usuario(alianza_id, ALIANZA_DATOS_FILE)
     if not alianza:
         await query.edit_message_text(
             f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -566,36 +680,26 @@ async def enviar_solicitud_alianza(update: Update, context: ContextTypes.DEFAULT
         )
         return
 
-    # Guardar solicitud en archivo
-    solicitudes_data = load_json(ALIANZA_SOLICITUDES_FILE) or {}
-    if alianza_id not in solicitudes_data:
-        solicitudes_data[alianza_id] = []
-    # Evitar duplicados
-    for s in solicitudes_data[alianza_id]:
-        if s["user_id"] == user_id:
-            await query.edit_message_text(
-                f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
-                f"❌ <b>YA ENVIASTE SOLICITUD</b>\n"
-                f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n\n"
-                f"Ya tienes una solicitud pendiente para esta alianza.",
-                parse_mode="HTML",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("◀️ VOLVER", callback_data="menu_alianza")
-                ]])
-            )
-            return
-    solicitudes_data[alianza_id].append({
-        "user_id": user_id,
-        "username": username_tag,
-        "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    })
-    save_json(ALIANZA_SOLICITUDES_FILE, solicitudes_data)
+    # Guardar solicitud en archivo (evitando duplicados)
+    async with bloquear(clave_alianza(alianza_id)):
+        enviada = await store.ejecutar(agregar_solicitud, alianza_id, user_id, username_tag)
+    if not enviada:
+        await query.edit_message_text(
+            f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
+            f"❌ <b>YA ENVIASTE SOLICITUD</b>\n"
+            f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n\n"
+            f"Ya tienes una solicitud pendiente para esta alianza.",
+            parse_mode="HTML",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("◀️ VOLVER", callback_data="menu_alianza")
+            ]])
+        )
+        return
 
     # Notificar a los administradores (opcional, pero se puede hacer)
-    miembros = load_json(ALIANZA_MIEMBROS_FILE) or {}
-    miembros_alianza = miembros.get(alianza_id, {})
+    miembros_alianza = await store.ver_usuario(alianza_id, ALIANZA_MIEMBROS_FILE)
     for uid_str in miembros_alianza.keys():
-        if es_admin_alianza(int(uid_str), alianza_id):
+        if await store.ejecutar(es_admin_alianza, int(uid_str), alianza_id):
             try:
                 await context.bot.send_message(
                     chat_id=int(uid_str),
@@ -627,7 +731,7 @@ async def iniciar_donacion(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     user_id = query.from_user.id
     alianza_id = query.data.replace("alianza_donar_", "")
-    alianza_actual, _ = obtener_alianza_usuario(user_id)
+    alianza_actual, _ = await store.ejecutar(obtener_alianza_usuario, user_id)
     if alianza_actual != alianza_id:
         await query.answer("❌ No perteneces a esta alianza", show_alert=True)
         return
@@ -635,8 +739,7 @@ async def iniciar_donacion(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['donacion_metal'] = 0
     context.user_data['donacion_cristal'] = 0
     context.user_data['donacion_deuterio'] = 0
-    recursos_data = load_json(RECURSOS_FILE) or {}
-    recursos = recursos_data.get(str(user_id), {"metal": 0, "cristal": 0, "deuterio": 0})
+    recursos = await store.ver_usuario(user_id, RECURSOS_FILE, {"metal": 0, "cristal": 0, "deuterio": 0})
     mensaje = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
         f"💰 <b>DONAR METAL</b>\n"
@@ -683,8 +786,7 @@ async def recibir_donacion_metal(update: Update, context: ContextTypes.DEFAULT_T
         )
         return DONACION_METAL
     if cantidad > 0:
-        recursos_data = load_json(RECURSOS_FILE) or {}
-        recursos = recursos_data.get(str(user_id), {})
+        recursos = await store.ver_usuario(user_id, RECURSOS_FILE)
         if recursos.get('metal', 0) < cantidad:
             await update.message.reply_text(
                 f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -697,8 +799,7 @@ async def recibir_donacion_metal(update: Update, context: ContextTypes.DEFAULT_T
             )
             return DONACION_METAL
     context.user_data['donacion_metal'] = cantidad
-    recursos_data = load_json(RECURSOS_FILE) or {}
-    recursos = recursos_data.get(str(user_id), {})
+    recursos = await store.ver_usuario(user_id, RECURSOS_FILE)
     mensaje = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
         f"💰 <b>DONAR CRISTAL</b>\n"
@@ -739,8 +840,7 @@ async def recibir_donacion_cristal(update: Update, context: ContextTypes.DEFAULT
         )
         return DONACION_CRISTAL
     if cantidad > 0:
-        recursos_data = load_json(RECURSOS_FILE) or {}
-        recursos = recursos_data.get(str(user_id), {})
+        recursos = await store.ver_usuario(user_id, RECURSOS_FILE)
         if recursos.get('cristal', 0) < cantidad:
             await update.message.reply_text(
                 f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -753,8 +853,7 @@ async def recibir_donacion_cristal(update: Update, context: ContextTypes.DEFAULT
             )
             return DONACION_CRISTAL
     context.user_data['donacion_cristal'] = cantidad
-    recursos_data = load_json(RECURSOS_FILE) or {}
-    recursos = recursos_data.get(str(user_id), {})
+    recursos = await store.ver_usuario(user_id, RECURSOS_FILE)
     mensaje = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
         f"💰 <b>DONAR DEUTERIO</b>\n"
@@ -768,7 +867,7 @@ async def recibir_donacion_cristal(update: Update, context: ContextTypes.DEFAULT
 
 async def recibir_donacion_deuterio(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     alianza_id = context.user_data.get('donacion_alianza')
     if not alianza_id:
         await update.message.reply_text("❌ Sesión de donación expirada")
@@ -796,8 +895,7 @@ async def recibir_donacion_deuterio(update: Update, context: ContextTypes.DEFAUL
         )
         return DONACION_DEUTERIO
     if cantidad > 0:
-        recursos_data = load_json(RECURSOS_FILE) or {}
-        recursos = recursos_data.get(str(user_id), {})
+        recursos = await store.ver_usuario(user_id, RECURSOS_FILE)
         if recursos.get('deuterio', 0) < cantidad:
             await update.message.reply_text(
                 f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -826,7 +924,7 @@ async def recibir_donacion_deuterio(update: Update, context: ContextTypes.DEFAUL
         for key in ['donacion_alianza', 'donacion_metal', 'donacion_cristal']:
             context.user_data.pop(key, None)
         return ConversationHandler.END
-    ok, msg = verificar_capacidad_banco(alianza_id, metal, cristal, deuterio)
+    ok, msg = await store.ejecutar(verificar_capacidad_banco, alianza_id, metal, cristal, deuterio)
     if not ok:
         await update.message.reply_text(
             f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -868,8 +966,10 @@ async def confirmar_donacion(update: Update, context: ContextTypes.DEFAULT_TYPE)
     cristal = int(partes[5])
     deuterio = int(partes[6])
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
-    ok, msg = verificar_capacidad_banco(alianza_id, metal, cristal, deuterio)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
+    # Usuario y banco bloqueados: dos donaciones a la vez no pueden pasarse de la capacidad
+    async with bloquear(clave_usuario(user_id), clave_alianza(alianza_id)):
+        ok, msg = await store.ejecutar(donar_al_banco, alianza_id, user_id, metal, cristal, deuterio)
     if not ok:
         await query.edit_message_text(
             f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -883,21 +983,6 @@ async def confirmar_donacion(update: Update, context: ContextTypes.DEFAULT_TYPE)
             ]])
         )
         return
-    recursos_data = load_json(RECURSOS_FILE) or {}
-    recursos = recursos_data.get(str(user_id), {})
-    if metal > 0:
-        recursos['metal'] = recursos.get('metal', 0) - metal
-    if cristal > 0:
-        recursos['cristal'] = recursos.get('cristal', 0) - cristal
-    if deuterio > 0:
-        recursos['deuterio'] = recursos.get('deuterio', 0) - deuterio
-    recursos_data[str(user_id)] = recursos
-    save_json(RECURSOS_FILE, recursos_data)
-    banco_info = obtener_banco(alianza_id)
-    nuevo_metal = banco_info["metal"] + metal
-    nuevo_cristal = banco_info["cristal"] + cristal
-    nuevo_deuterio = banco_info["deuterio"] + deuterio
-    guardar_banco(alianza_id, nuevo_metal, nuevo_cristal, nuevo_deuterio)
     mensaje = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
         f"✅ <b>DONACIÓN COMPLETADA</b>\n"
@@ -928,10 +1013,10 @@ async def iniciar_mejora_banco(update: Update, context: ContextTypes.DEFAULT_TYP
     await query.answer()
     user_id = query.from_user.id
     alianza_id = query.data.replace("alianza_mejorar_banco_", "")
-    if not es_admin_alianza(user_id, alianza_id):
+    if not await store.ejecutar(es_admin_alianza, user_id, alianza_id):
         await query.answer("❌ No tienes permisos", show_alert=True)
         return
-    banco_info = obtener_banco(alianza_id)
+    banco_info = await store.ejecutar(obtener_banco, alianza_id)
     nivel_actual = banco_info["nivel"]
     if nivel_actual >= BANCO_NIVEL_MAX:
         await query.edit_message_text(
@@ -947,8 +1032,7 @@ async def iniciar_mejora_banco(update: Update, context: ContextTypes.DEFAULT_TYP
         return
     costo = calcular_costo_mejora_banco(nivel_actual)
     nueva_capacidad = calcular_capacidad_banco(nivel_actual + 1)
-    recursos = load_json(RECURSOS_FILE) or {}
-    user_recursos = recursos.get(str(user_id), {})
+    user_recursos = await store.ver_usuario(user_id, RECURSOS_FILE)
     nxt20_disponible = user_recursos.get("nxt20", 0)
     if nxt20_disponible < costo:
         await query.edit_message_text(
@@ -995,25 +1079,16 @@ async def confirmar_mejora_banco(update: Update, context: ContextTypes.DEFAULT_T
     if not alianza_id:
         await query.edit_message_text("❌ Sesión expirada")
         return ConversationHandler.END
-    recursos = load_json(RECURSOS_FILE) or {}
-    user_recursos = recursos.get(str(user_id), {})
-    nxt20_actual = user_recursos.get("nxt20", 0)
-    if nxt20_actual < costo:
+    async with bloquear(clave_usuario(user_id), clave_alianza(alianza_id)):
+        ok, msg = await store.ejecutar(mejorar_banco, alianza_id, user_id, costo, nuevo_nivel)
+    if not ok:
         await query.edit_message_text(
-            f"❌ No tienes suficiente NXT-20",
+            msg,
             reply_markup=InlineKeyboardMarkup([[
                 InlineKeyboardButton("◀️ VOLVER", callback_data="menu_alianza")
             ]])
         )
         return ConversationHandler.END
-    user_recursos["nxt20"] = nxt20_actual - costo
-    recursos[str(user_id)] = user_recursos
-    save_json(RECURSOS_FILE, recursos)
-    datos = load_json(ALIANZA_DATOS_FILE) or {}
-    if alianza_id not in datos:
-        datos[alianza_id] = {}
-    datos[alianza_id]["banco_nivel"] = nuevo_nivel
-    save_json(ALIANZA_DATOS_FILE, datos)
     await query.edit_message_text(
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
         f"✅ <b>BANCO MEJORADO</b>\n"
@@ -1028,7 +1103,7 @@ async def confirmar_mejora_banco(update: Update, context: ContextTypes.DEFAULT_T
     )
     for key in ['mejora_banco_alianza', 'mejora_banco_costo', 'mejora_banco_nuevo_nivel']:
         context.user_data.pop(key, None)
-    logger.info(f"🏦 {AuthSystem.obtener_username(user_id)} mejoró banco de {alianza_id} a nivel {nuevo_nivel}")
+    logger.info(f"🏦 {await store.ejecutar(AuthSystem.obtener_username, user_id)} mejoró banco de {alianza_id} a nivel {nuevo_nivel}")
     return ConversationHandler.END
 
 # ================= CHAT DE ALIANZA =================
@@ -1038,12 +1113,11 @@ async def ver_chat_alianza(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     user_id = query.from_user.id
-    alianza_id, alianza_datos = obtener_alianza_usuario(user_id)
+    alianza_id, alianza_datos = await store.ejecutar(obtener_alianza_usuario, user_id)
     if not alianza_id:
         await query.answer("❌ No perteneces a ninguna alianza", show_alert=True)
         return
-    mensajes_data = load_json(ALIANZA_MENSAJES_FILE) or {}
-    mensajes = mensajes_data.get(alianza_id, [])
+    mensajes = await store.ver_usuario(alianza_id, ALIANZA_MENSAJES_FILE, [])
     mensajes = sorted(mensajes, key=lambda x: x["fecha"], reverse=True)[:20]  # Últimos 20
     texto = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -1069,7 +1143,7 @@ async def iniciar_escribir_chat(update: Update, context: ContextTypes.DEFAULT_TY
     query = update.callback_query
     await query.answer()
     user_id = query.from_user.id
-    alianza_id, alianza_datos = obtener_alianza_usuario(user_id)
+    alianza_id, alianza_datos = await store.ejecutar(obtener_alianza_usuario, user_id)
     if not alianza_id:
         await query.answer("❌ No perteneces a ninguna alianza", show_alert=True)
         return
@@ -1096,20 +1170,17 @@ async def recibir_mensaje_chat(update: Update, context: ContextTypes.DEFAULT_TYP
     if not texto:
         await update.message.reply_text("❌ El mensaje no puede estar vacío.")
         return MENSAJE_TEXTO
-    username = AuthSystem.obtener_username(user_id)
-    mensajes_data = load_json(ALIANZA_MENSAJES_FILE) or {}
-    if alianza_id not in mensajes_data:
-        mensajes_data[alianza_id] = []
-    mensajes_data[alianza_id].append({
-        "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "user_id": user_id,
-        "username": username,
-        "texto": texto
-    })
-    # Mantener solo los últimos 20 mensajes
-    if len(mensajes_data[alianza_id]) > 20:
-        mensajes_data[alianza_id] = mensajes_data[alianza_id][-20:]
-    save_json(ALIANZA_MENSAJES_FILE, mensajes_data)
+    username = await store.ejecutar(AuthSystem.obtener_username, user_id)
+    async with bloquear(clave_alianza(alianza_id)):
+        mensajes = await store.usuario(alianza_id, ALIANZA_MENSAJES_FILE) or []
+        mensajes.append({
+            "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "user_id": user_id,
+            "username": username,
+            "texto": texto
+        })
+        # Mantener solo los últimos 20 mensajes
+        await store.guardar_usuario(alianza_id, ALIANZA_MENSAJES_FILE, mensajes[-20:])
     await update.message.reply_text(
         f"✅ Mensaje enviado al chat de la alianza.",
         reply_markup=InlineKeyboardMarkup([[
@@ -1126,14 +1197,12 @@ async def ver_miembros(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     user_id = query.from_user.id
     alianza_id = query.data.replace("alianza_miembros_", "")
-    alianza_actual, _ = obtener_alianza_usuario(user_id)
+    alianza_actual, _ = await store.ejecutar(obtener_alianza_usuario, user_id)
     if alianza_actual != alianza_id:
         await query.answer("❌ No perteneces a esta alianza", show_alert=True)
         return
-    datos = load_json(ALIANZA_DATOS_FILE) or {}
-    alianza = datos.get(alianza_id, {})
-    miembros = load_json(ALIANZA_MIEMBROS_FILE) or {}
-    alianza_miembros = miembros.get(alianza_id, {})
+    alianza = await store.ver_usuario(alianza_id, ALIANZA_DATOS_FILE)
+    alianza_miembros = await store.ver_usuario(alianza_id, ALIANZA_MIEMBROS_FILE)
     if not alianza_miembros:
         await query.edit_message_text(
             f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -1194,19 +1263,18 @@ async def salir_alianza(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     alianza_id = query.data.replace("alianza_salir_", "")
-    if es_fundador_alianza(user_id, alianza_id):
+    if await store.ejecutar(es_fundador_alianza, user_id, alianza_id):
         await query.answer("❌ Los fundadores no pueden salir, deben disolver la alianza", show_alert=True)
         return
-    miembros = load_json(ALIANZA_MIEMBROS_FILE) or {}
-    if alianza_id in miembros and str(user_id) in miembros[alianza_id]:
-        del miembros[alianza_id][str(user_id)]
-        save_json(ALIANZA_MIEMBROS_FILE, miembros)
-        permisos = load_json(ALIANZA_PERMISOS_FILE) or {}
-        if alianza_id in permisos and user_id in permisos[alianza_id].get("retiro", []):
-            permisos[alianza_id]["retiro"].remove(user_id)
-            save_json(ALIANZA_PERMISOS_FILE, permisos)
+    try:
+        async with bloquear(clave_alianza(alianza_id)):
+            salio = await store.ejecutar(quitar_miembro, alianza_id, user_id)
+    except TransaccionFallida as e:
+        logger.error(f"❌ No se pudo sacar a {user_id} de {alianza_id}: {e}")
+        salio = False
+    if salio:
         await query.edit_message_text(
             f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
             f"✅ <b>HAS SALIDO DE LA ALIANZA</b>\n"
@@ -1241,13 +1309,12 @@ async def panel_admin_alianza(update: Update, context: ContextTypes.DEFAULT_TYPE
     user_id = query.from_user.id
     alianza_id = query.data.replace("alianza_admin_", "")
     
-    if not es_admin_alianza(user_id, alianza_id):
+    if not await store.ejecutar(es_admin_alianza, user_id, alianza_id):
         await query.answer("❌ No tienes permisos de administrador", show_alert=True)
         return
     
-    datos = load_json(ALIANZA_DATOS_FILE) or {}
-    alianza = datos.get(alianza_id, {})
-    banco_info = obtener_banco(alianza_id)
+    alianza = await store.ver_usuario(alianza_id, ALIANZA_DATOS_FILE)
+    banco_info = await store.ejecutar(obtener_banco, alianza_id)
     nivel_banco = banco_info["nivel"]
     
     mensaje = (
@@ -1267,7 +1334,7 @@ async def panel_admin_alianza(update: Update, context: ContextTypes.DEFAULT_TYPE
     if nivel_banco < BANCO_NIVEL_MAX:
         keyboard.append([InlineKeyboardButton("🏦 MEJORAR BANCO", callback_data=f"alianza_mejorar_banco_{alianza_id}")])
     
-    if es_fundador_alianza(user_id, alianza_id):
+    if await store.ejecutar(es_fundador_alianza, user_id, alianza_id):
         keyboard.append([InlineKeyboardButton("⚠️ DISOLVER ALIANZA", callback_data=f"alianza_disolver_{alianza_id}")])
     
     keyboard.append([InlineKeyboardButton("◀️ VOLVER", callback_data="menu_alianza")])
@@ -1283,12 +1350,11 @@ async def ver_solicitudes(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = query.from_user.id
     alianza_id = query.data.replace("alianza_solicitudes_", "")
     
-    if not es_admin_alianza(user_id, alianza_id):
+    if not await store.ejecutar(es_admin_alianza, user_id, alianza_id):
         await query.answer("❌ No tienes permisos", show_alert=True)
         return
     
-    solicitudes_data = load_json(ALIANZA_SOLICITUDES_FILE) or {}
-    solicitudes = solicitudes_data.get(alianza_id, [])
+    solicitudes = await store.ver_usuario(alianza_id, ALIANZA_SOLICITUDES_FILE, [])
     
     if not solicitudes:
         await query.edit_message_text(
@@ -1330,35 +1396,33 @@ async def aceptar_solicitud(update: Update, context: ContextTypes.DEFAULT_TYPE):
     solicitante_id = int(partes[4])
     admin_id = query.from_user.id
     
-    if not es_admin_alianza(admin_id, alianza_id):
+    if not await store.ejecutar(es_admin_alianza, admin_id, alianza_id):
         await query.answer("❌ No tienes permisos", show_alert=True)
         return
     
     ahora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    username_sol = AuthSystem.obtener_username(solicitante_id)
-    
-    # Agregar a miembros
-    miembros = load_json(ALIANZA_MIEMBROS_FILE) or {}
-    if alianza_id not in miembros:
-        miembros[alianza_id] = {}
-    miembros[alianza_id][str(solicitante_id)] = {
-        "user_id": solicitante_id,
-        "username": username_sol,
-        "rango": "miembro",
-        "fecha_ingreso": ahora
-    }
-    save_json(ALIANZA_MIEMBROS_FILE, miembros)
+    username_sol = await store.ejecutar(AuthSystem.obtener_username, solicitante_id)
     
-    # Eliminar de solicitudes
-    solicitudes_data = load_json(ALIANZA_SOLICITUDES_FILE) or {}
-    if alianza_id in solicitudes_data:
-        solicitudes_data[alianza_id] = [s for s in solicitudes_data[alianza_id] if s["user_id"] != solicitante_id]
-        save_json(ALIANZA_SOLICITUDES_FILE, solicitudes_data)
+    # Agregar a miembros y eliminar de solicitudes
+    try:
+        async with bloquear(clave_usuario(solicitante_id), clave_alianza(alianza_id)):
+            aceptado = await store.ejecutar(aceptar_solicitud_miembro, alianza_id, solicitante_id, username_sol, ahora)
+    except TransaccionFallida as e:
+        logger.error(f"❌ No se pudo aceptar a {solicitante_id} en {alianza_id}: {e}")
+        await query.answer("❌ No se pudo guardar, inténtalo de nuevo", show_alert=True)
+        return
+    if not aceptado:
+        await query.edit_message_text(
+            f"❌ {username_sol} ya pertenece a otra alianza. Solicitud eliminada.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("◀️ VOLVER", callback_data=f"alianza_solicitudes_{alianza_id}")
+            ]])
+        )
+        return
     
     # Notificar al usuario
     try:
-        datos = load_json(ALIANZA_DATOS_FILE) or {}
-        alianza = datos.get(alianza_id, {})
+        alianza = await store.ver_usuario(alianza_id, ALIANZA_DATOS_FILE)
         nombre_alianza = alianza.get("nombre", alianza_id)
         await context.bot.send_message(
             chat_id=solicitante_id,
@@ -1388,22 +1452,19 @@ async def rechazar_solicitud(update: Update, context: ContextTypes.DEFAULT_TYPE)
     solicitante_id = int(partes[4])
     admin_id = query.from_user.id
     
-    if not es_admin_alianza(admin_id, alianza_id):
+    if not await store.ejecutar(es_admin_alianza, admin_id, alianza_id):
         await query.answer("❌ No tienes permisos", show_alert=True)
         return
     
-    username_sol = AuthSystem.obtener_username(solicitante_id)
+    username_sol = await store.ejecutar(AuthSystem.obtener_username, solicitante_id)
     
     # Eliminar de solicitudes
-    solicitudes_data = load_json(ALIANZA_SOLICITUDES_FILE) or {}
-    if alianza_id in solicitudes_data:
-        solicitudes_data[alianza_id] = [s for s in solicitudes_data[alianza_id] if s["user_id"] != solicitante_id]
-        save_json(ALIANZA_SOLICITUDES_FILE, solicitudes_data)
+    async with bloquear(clave_alianza(alianza_id)):
+        await store.ejecutar(quitar_solicitud, alianza_id, solicitante_id)
     
     # Notificar al usuario (opcional)
     try:
-        datos = load_json(ALIANZA_DATOS_FILE) or {}
-        alianza = datos.get(alianza_id, {})
+        alianza = await store.ver_usuario(alianza_id, ALIANZA_DATOS_FILE)
         nombre_alianza = alianza.get("nombre", alianza_id)
         await context.bot.send_message(
             chat_id=solicitante_id,
@@ -1432,14 +1493,12 @@ async def expulsar_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = query.from_user.id
     alianza_id = query.data.replace("alianza_expulsar_", "")
     
-    if not es_admin_alianza(user_id, alianza_id):
+    if not await store.ejecutar(es_admin_alianza, user_id, alianza_id):
         await query.answer("❌ No tienes permisos", show_alert=True)
         return
     
-    miembros = load_json(ALIANZA_MIEMBROS_FILE) or {}
-    alianza_miembros = miembros.get(alianza_id, {})
-    datos = load_json(ALIANZA_DATOS_FILE) or {}
-    fundador_id = datos.get(alianza_id, {}).get("fundador")
+    alianza_miembros = await store.ver_usuario(alianza_id, ALIANZA_MIEMBROS_FILE)
+    fundador_id = (await store.ver_usuario(alianza_id, ALIANZA_DATOS_FILE)).get("fundador")
     
     mensaje = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -1470,24 +1529,21 @@ async def confirmar_expulsion(update: Update, context: ContextTypes.DEFAULT_TYPE
     miembro_id = int(partes[4])
     admin_id = query.from_user.id
     
-    if not es_admin_alianza(admin_id, alianza_id):
+    if not await store.ejecutar(es_admin_alianza, admin_id, alianza_id):
         await query.answer("❌ No tienes permisos", show_alert=True)
         return
     
-    # Eliminar de miembros
-    miembros = load_json(ALIANZA_MIEMBROS_FILE) or {}
-    if alianza_id in miembros and str(miembro_id) in miembros[alianza_id]:
-        del miembros[alianza_id][str(miembro_id)]
-        save_json(ALIANZA_MIEMBROS_FILE, miembros)
-    
-    # Eliminar permisos de retiro
-    permisos = load_json(ALIANZA_PERMISOS_FILE) or {}
-    if alianza_id in permisos and miembro_id in permisos[alianza_id].get("retiro", []):
-        permisos[alianza_id]["retiro"].remove(miembro_id)
-        save_json(ALIANZA_PERMISOS_FILE, permisos)
+    # Eliminar de miembros y sus permisos de retiro
+    try:
+        async with bloquear(clave_alianza(alianza_id)):
+            await store.ejecutar(quitar_miembro, alianza_id, miembro_id)
+    except TransaccionFallida as e:
+        logger.error(f"❌ No se pudo expulsar a {miembro_id} de {alianza_id}: {e}")
+        await query.answer("❌ No se pudo guardar, inténtalo de nuevo", show_alert=True)
+        return
     
-    username = AuthSystem.obtener_username(miembro_id)
-    admin_username = AuthSystem.obtener_username(admin_id)
+    username = await store.ejecutar(AuthSystem.obtener_username, miembro_id)
+    admin_username = await store.ejecutar(AuthSystem.obtener_username, admin_id)
     
     await query.edit_message_text(
         f"✅ <b>MIEMBRO EXPULSADO</b>\n\n{username} ha sido expulsado de la alianza.",
@@ -1507,7 +1563,7 @@ async def editar_descripcion_inicio(update: Update, context: ContextTypes.DEFAUL
     user_id = query.from_user.id
     alianza_id = query.data.replace("alianza_editar_", "")
     
-    if not es_admin_alianza(user_id, alianza_id):
+    if not await store.ejecutar(es_admin_alianza, user_id, alianza_id):
         await query.answer("❌ No tienes permisos", show_alert=True)
         return
     
@@ -1541,14 +1597,14 @@ async def recibir_nueva_descripcion(update: Update, context: ContextTypes.DEFAUL
         await update.message.reply_text("❌ La descripción no puede exceder 200 caracteres. Intenta de nuevo.")
         return EDITAR_DESCRIPCION
     
-    datos = load_json(ALIANZA_DATOS_FILE) or {}
-    if alianza_id not in datos:
+    async with bloquear(clave_alianza(alianza_id)):
+        existe = bool(await store.ver_usuario(alianza_id, ALIANZA_DATOS_FILE))
+        if existe:
+            await store.patch(ALIANZA_DATOS_FILE, alianza_id, [("set", "descripcion", texto)])
+    if not existe:
         await update.message.reply_text("❌ Alianza no encontrada")
         return ConversationHandler.END
     
-    datos[alianza_id]["descripcion"] = texto
-    save_json(ALIANZA_DATOS_FILE, datos)
-    
     await update.message.reply_text(
         f"✅ Descripción actualizada.",
         reply_markup=InlineKeyboardMarkup([[
@@ -1567,7 +1623,7 @@ async def disolver_confirmar(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user_id = query.from_user.id
     alianza_id = query.data.replace("alianza_disolver_", "")
     
-    if not es_fundador_alianza(user_id, alianza_id):
+    if not await store.ejecutar(es_fundador_alianza, user_id, alianza_id):
         await query.answer("❌ Solo el fundador puede disolver la alianza", show_alert=True)
         return
     
@@ -1604,12 +1660,14 @@ async def disolver_ejecutar(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ConversationHandler.END
     
     # Eliminar todos los archivos relacionados
-    for archivo in [ALIANZA_DATOS_FILE, ALIANZA_MIEMBROS_FILE, ALIANZA_BANCO_FILE,
-                    ALIANZA_PERMISOS_FILE, ALIANZA_MENSAJES_FILE, ALIANZA_SOLICITUDES_FILE]:
-        data = load_json(archivo) or {}
-        if alianza_id in data:
-            del data[alianza_id]
-            save_json(archivo, data)
+    try:
+        async with bloquear(clave_alianza(alianza_id)):
+            await store.ejecutar(borrar_alianza, alianza_id)
+    except TransaccionFallida as e:
+        logger.error(f"❌ No se pudo disolver {alianza_id}: {e}")
+        await update.message.reply_text("❌ No se pudo disolver la alianza, inténtalo de nuevo.")
+        context.user_data.pop('disolver_alianza', None)
+        return ConversationHandler.END
     
     await update.message.reply_text(
         f"✅ La alianza ha sido disuelta.",
@@ -1618,7 +1676,7 @@ async def disolver_ejecutar(update: Update, context: ContextTypes.DEFAULT_TYPE):
         ]])
     )
     context.user_data.pop('disolver_alianza', None)
-    logger.info(f"💥 Alianza {alianza_id} disuelta por {AuthSystem.obtener_username(user_id)}")
+    logger.info(f"💥 Alianza {alianza_id} disuelta por {await store.ejecutar(AuthSystem.obtener_username, user_id)}")
     return ConversationHandler.END
 
 # ================= GESTIONAR PERMISOS =================
@@ -1630,19 +1688,16 @@ async def gestionar_permisos(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user_id = query.from_user.id
     alianza_id = query.data.replace("alianza_permisos_", "")
     
-    if not es_admin_alianza(user_id, alianza_id):
+    if not await store.ejecutar(es_admin_alianza, user_id, alianza_id):
         await query.answer("❌ No tienes permisos de administrador", show_alert=True)
         return
     
-    datos = load_json(ALIANZA_DATOS_FILE) or {}
-    alianza = datos.get(alianza_id, {})
+    alianza = await store.ver_usuario(alianza_id, ALIANZA_DATOS_FILE)
     fundador_id = alianza.get("fundador")
     
-    miembros = load_json(ALIANZA_MIEMBROS_FILE) or {}
-    alianza_miembros = miembros.get(alianza_id, {})
+    alianza_miembros = await store.ver_usuario(alianza_id, ALIANZA_MIEMBROS_FILE)
     
-    permisos = load_json(ALIANZA_PERMISOS_FILE) or {}
-    alianza_permisos = permisos.get(alianza_id, {"retiro": []})
+    alianza_permisos = await store.ver_usuario(alianza_id, ALIANZA_PERMISOS_FILE, {"retiro": []})
     retiro_permisos = alianza_permisos.get("retiro", [])
     
     mensaje = (
@@ -1698,25 +1753,21 @@ async def toggle_permiso(update: Update, context: ContextTypes.DEFAULT_TYPE):
     miembro_id = int(partes[4])
     admin_id = query.from_user.id
     
-    if not es_admin_alianza(admin_id, alianza_id):
+    if not await store.ejecutar(es_admin_alianza, admin_id, alianza_id):
         await query.answer("❌ No tienes permisos de administrador", show_alert=True)
         return
     
-    permisos = load_json(ALIANZA_PERMISOS_FILE) or {}
-    if alianza_id not in permisos:
-        permisos[alianza_id] = {"retiro": []}
-    
-    if miembro_id in permisos[alianza_id].get("retiro", []):
-        permisos[alianza_id]["retiro"].remove(miembro_id)
-        accion = "quitado"
-    else:
-        permisos[alianza_id]["retiro"].append(miembro_id)
-        accion = "otorgado"
-    
-    save_json(ALIANZA_PERMISOS_FILE, permisos)
+    async with bloquear(clave_alianza(alianza_id)):
+        permisos = await store.ver_usuario(alianza_id, ALIANZA_PERMISOS_FILE) or {}
+        if miembro_id in permisos.get("retiro", []):
+            await store.patch(ALIANZA_PERMISOS_FILE, alianza_id, [("remove", "retiro", miembro_id)])
+            accion = "quitado"
+        else:
+            await store.patch(ALIANZA_PERMISOS_FILE, alianza_id, [("add", "retiro", miembro_id)])
+            accion = "otorgado"
     
-    miembro_username = AuthSystem.obtener_username(miembro_id)
-    admin_username = AuthSystem.obtener_username(admin_id)
+    miembro_username = await store.ejecutar(AuthSystem.obtener_username, miembro_id)
+    admin_username = await store.ejecutar(AuthSystem.obtener_username, admin_id)
     
     await query.edit_message_text(
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -1737,7 +1788,7 @@ async def toggle_permiso(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def cancelar_conversacion(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     keys_to_clear = ['alianza_nombre', 'donacion_alianza', 'donacion_metal', 
                      'donacion_cristal', 'retiro_alianza', 'retiro_metal', 
                      'retiro_cristal', 'mejora_banco_alianza', 'mejora_banco_costo',
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#██████╗ ███████╗████████╗██████╗  █████╗ ██╗     ███████╗
+#██╔══██╗██╔════╝╚══██╔══╝██╔══██╗██╔══██╗██║     ██╔════╝
+#██████╔╝███████╗   ██║   ██████╔╝███████║██║     ███████╗
+#██╔══██╗╚════██║   ██║   ██╔══██╗██╔══██║██║     ╚════██║
+#██║  ██║███████║   ██║   ██║  ██║██║  ██║███████╗███████║
+#╚═╝  ╚═╝╚══════╝   ╚═╝   ╚═╝  ╚═╝╚═╝  ╚═╝╚══════╝╚══════╝
+
+#🚀 ASTRO.IO v2.4.5 🚀
+#🗄️ almacen.py - API ASÍNCRONA DE ALMACENAMIENTO
+#=======================================
+#✅ await store.get(...) / await store.put(...) desde los handlers
+#✅ La E/S de archivos y GitHub corre en un pool de hilos acotado
+#✅ Una llamada lenta a GitHub ya no congela al resto de jugadores
+#=======================================
+
+"""
+Uso en un handler:
+
+    from almacen import store
+
+    datos = await store.get(ALIANZA_DATOS_FILE, {})
+    await store.put(ALIANZA_DATOS_FILE, datos)
+    cola = await store.ejecutar(obtener_cola, user_id)   # cualquier función síncrona
+
+STORE_THREADS fija el tamaño del pool (por defecto 8). Las llamadas copian el
+contexto del handler, así que dentro de transaction() siguen viendo la
+transacción abierta.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import contextvars
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+import database
+from database import (
+    load_json, save_json, obtener_usuario, guardar_usuario, patch,
+    ver_json, ver_usuario, existe_json, flush_all
+)
+
+logger = logging.getLogger(__name__)
+
+# ================= CONFIGURACIÓN =================
+STORE_THREADS = max(1, int(os.getenv("STORE_THREADS", "8")))
+
+# ================= ALMACÉN ASÍNCRONO =================
+
+class AlmacenAsync:
+    """🗄️ Fachada async sobre database: cada llamada bloqueante va a un hilo del pool"""
+
+    def __init__(self, hilos: int = STORE_THREADS):
+        self.hilos = hilos
+        self._pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="astroio-store")
+        self._stats = {"llamadas": 0, "en_curso": 0, "espera_total": 0.0, "espera_max": 0.0, "errores": 0}
+
+    async def ejecutar(self, func: Callable, *args, **kwargs) -> Any:
+        """⚙️ Ejecuta una función síncrona en el pool sin bloquear el event loop"""
+        loop = asyncio.get_running_loop()
+        contexto = contextvars.copy_context()
+        encolada = time.perf_counter()
+
+        def tarea():
+            espera = time.perf_counter() - encolada
+            self._stats["espera_total"] += espera
+            self._stats["espera_max"] = max(self._stats["espera_max"], espera)
+            return contexto.run(partial(func, *args, **kwargs))
+
+        self._stats["llamadas"] += 1
+        self._stats["en_curso"] += 1
+        try:
+            return await loop.run_in_executor(self._pool, tarea)
+        except Exception:
+            self._stats["errores"] += 1
+            raise
+        finally:
+            self._stats["en_curso"] -= 1
+
+    # ================= DOCUMENTOS =================
+
+    async def get(self, filepath: str, default: Any = None) -> Any:
+        """📂 load_json"""
+        return await self.ejecutar(load_json, filepath, default)
+
+    async def put(self, filepath: str, data: Any) -> bool:
+        """💾 save_json"""
+        return await self.ejecutar(save_json, filepath, data)
+
+    async def ver(self, filepath: str, default: Any = None) -> Any:
+        """👁️ ver_json (solo lectura)"""
+        return await self.ejecutar(ver_json, filepath, default)
+
+    async def existe(self, filepath: str) -> bool:
+        return await self.ejecutar(existe_json, filepath)
+
+    # ================= ENTRADAS POR USUARIO =================
+
+    async def usuario(self, user_id: int, archivo: str, default: Any = None) -> Any:
+        """👤 obtener_usuario"""
+        return await self.ejecutar(obtener_usuario, user_id, archivo, default)
+
+    async def ver_usuario(self, user_id: int, archivo: str, default: Any = None) -> Any:
+        """👁️ ver_usuario (solo lectura)"""
+        return await self.ejecutar(ver_usuario, user_id, archivo, default)
+
+    async def guardar_usuario(self, user_id: int, archivo: str, datos_usuario: Any) -> bool:
+        return await self.ejecutar(guardar_usuario, user_id, archivo, datos_usuario)
+
+    async def patch(self, filepath: str, clave: Union[int, str], operaciones: List[Tuple]) -> bool:
+        """🩹 patch"""
+        return await self.ejecutar(patch, filepath, clave, operaciones)
+
+    async def flush(self) -> bool:
+        return await self.ejecutar(flush_all)
+
+    # ================= ESTADO =================
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        """📊 Llamadas, cola del pool y esperas hasta tener hilo libre"""
+        llamadas = self._stats["llamadas"]
+        return {
+            "hilos": self.hilos,
+            "llamadas": llamadas,
+            "en_curso": self._stats["en_curso"],
+            "errores": self._stats["errores"],
+            "espera_media_ms": round(self._stats["espera_total"] / llamadas * 1000, 2) if llamadas else 0.0,
+            "espera_max_ms": round(self._stats["espera_max"] * 1000, 2),
+            "backend": database.obtener_backend().nombre,
+        }
+
+    def cerrar(self) -> None:
+        self._pool.shutdown(wait=True)
+
+store = AlmacenAsync()
+
+def obtener_estadisticas_almacen() -> Dict[str, Any]:
+    return store.obtener_estadisticas()
+
+__all__ = [
+    'STORE_THREADS',
+    'AlmacenAsync',
+    'store',
+    'obtener_estadisticas_almacen',
+]
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#██████╗ ███████╗████████╗██████╗  █████╗ ██╗     ███████╗
+#██╔══██╗██╔════╝╚══██╔══╝██╔══██╗██╔══██╗██║     ██╔════╝
+#██████╔╝███████╗   ██║   ██████╔╝███████║██║     ███████╗
+#██╔══██╗╚════██║   ██║   ██╔══██╗██╔══██║██║     ╚════██║
+#██║  ██║███████║   ██║   ██║  ██║██║  ██║███████╗███████║
+#╚═╝  ╚═╝╚══════╝   ╚═╝   ╚═╝  ╚═╝╚═╝  ╚═╝╚══════╝╚══════╝
+
+#🚀 ASTRO.IO v2.4.5 🚀
+#⏱️ arranque.py - TIEMPOS DE ARRANQUE POR ETAPA
+#=======================================
+#✅ with etapa("github"): ... mide cada paso del arranque
+#✅ Resumen con el total para ver dónde se va el cold start
+#✅ bootstrap(): el único sitio donde el arranque toca red y disco
+#=======================================
+
+"""
+Sin dependencias del resto del bot al importarse: database.py lo importa al
+cargarse, así que el reloj empieza prácticamente con el proceso.
+
+    from arranque import bootstrap, etapa, resumen_arranque
+
+    bootstrap()                       # almacenamiento, JSON, tablas, migraciones
+    with etapa("handlers"):
+        ...
+    logger.info(resumen_arranque())
+
+Importar cualquier módulo del bot (un script, una prueba) no hace red ni
+escribe en disco; lo que antes ocurría al importar vive en bootstrap().
+"""
+
+import time
+import logging
+import importlib
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ================= REGISTRO =================
+_INICIO = time.monotonic()
+_etapas: List[Tuple[str, float]] = []
+_lock = threading.Lock()
+
+def registrar_etapa(nombre: str, segundos: float) -> None:
+    with _lock:
+        _etapas.append((nombre, segundos))
+    logger.info(f"⏱️ Arranque · {nombre}: {segundos * 1000:.0f} ms")
+
+@contextmanager
+def etapa(nombre: str):
+    """⏱️ Mide el bloque y lo anota como etapa del arranque (aunque falle)"""
+    inicio = time.monotonic()
+    try:
+        yield
+    finally:
+        registrar_etapa(nombre, time.monotonic() - inicio)
+
+def obtener_tiempos_arranque() -> Dict[str, Any]:
+    """📊 Etapas en orden y tiempo total desde que se importó este módulo"""
+    with _lock:
+        etapas = list(_etapas)
+    return {
+        "etapas": [{"nombre": nombre, "ms": round(segundos * 1000, 1)} for nombre, segundos in etapas],
+        "total_ms": round((time.monotonic() - _INICIO) * 1000, 1),
+    }
+
+def resumen_arranque() -> str:
+    """📝 Una línea por etapa y el total, listo para el log"""
+    tiempos = obtener_tiempos_arranque()
+    lineas = [f"⏱️ Arranque completo en {tiempos['total_ms'] / 1000:.2f}s"]
+    for i, e in enumerate(tiempos["etapas"]):
+        rama = "└" if i == len(tiempos["etapas"]) - 1 else "├"
+        lineas.append(f"   {rama} {e['nombre']}: {e['ms']:.0f} ms")
+    return "\n".join(lineas)
+
+# ================= BOOTSTRAP =================
+_bootstrap_lock = threading.Lock()
+_bootstrap_hecho = False
+
+# Sistemas opcionales: si el módulo no carga, AstroIO tampoco lo registra
+_INICIALIZADORES_OPCIONALES = (
+    ("alianza", "inicializar_archivos_alianza"),
+    ("guerra", "inicializar_puntos_guerra"),
+    ("mercado", "crear_tablas"),
+)
+
+def bootstrap() -> bool:
+    """
+    🚀 Arranque explícito e idempotente: almacenamiento (rama y SHAs de GitHub
+    cacheados en disco), JSON base, archivos de alianzas y guerra, tablas del
+    mercado, migraciones e índice de alianzas.
+    Retorna True solo la primera vez.
+    """
+    global _bootstrap_hecho
+    with _bootstrap_lock:
+        if _bootstrap_hecho:
+            return False
+        from database import iniciar_almacenamiento
+        from login import inicializar_sistema
+        from migraciones import migrar_esquema
+        from indice_alianzas import reconstruir_indice
+
+        iniciar_almacenamiento()
+        with etapa("verificar archivos"):
+            inicializar_sistema()
+        with etapa("alianzas, guerra y mercado"):
+            for modulo, funcion in _INICIALIZADORES_OPCIONALES:
+                try:
+                    inicializar = getattr(importlib.import_module(modulo), funcion)
+                except ImportError as e:
+                    logger.warning(f"⚠️ {modulo} no disponible, no se inicializa: {e}")
+                    continue
+                inicializar()
+        with etapa("migraciones de esquema"):
+            migrar_esquema()
+        with etapa("índice de alianzas"):
+            reconstruir_indice()
+        _bootstrap_hecho = True
+    return True
+
+__all__ = [
+    'bootstrap',
+    'etapa',
+    'registrar_etapa',
+    'obtener_tiempos_arranque',
+    'resumen_arranque',
+]
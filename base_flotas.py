@@ -25,9 +25,11 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 from login import AuthSystem, requiere_login
-from database import load_json, save_json
+from database import load_json, save_json, obtener_usuario, guardar_usuario, transaction, TransaccionFallida
+from almacen import store
 from utils import abreviar_numero
 from recursos import actualizar_recursos_tiempo, guardar_recursos_usuario
+from retencion import recortar_bajas, acumular_bajas, BAJAS_FLOTA_RESUMEN_FILE
 
 logger = logging.getLogger(__name__)
 
@@ -105,16 +107,11 @@ PROBABILIDADES = {
 
 def obtener_flota_base(user_id: int) -> dict:
     """🏠 Obtiene naves disponibles en base"""
-    user_id_str = str(user_id)
-    data = load_json(FLOTA_USUARIO_FILE) or {}
-    return data.get(user_id_str, {})
+    return obtener_usuario(user_id, FLOTA_USUARIO_FILE)
 
 def guardar_flota_base(user_id: int, flota: dict) -> bool:
     """💾 Guarda naves en base"""
-    user_id_str = str(user_id)
-    data = load_json(FLOTA_USUARIO_FILE) or {}
-    data[user_id_str] = flota
-    return save_json(FLOTA_USUARIO_FILE, data)
+    return guardar_usuario(user_id, FLOTA_USUARIO_FILE, flota)
 
 def obtener_misiones_activas(user_id: int = None) -> dict:
     """✈️ Obtiene misiones activas"""
@@ -157,9 +154,19 @@ def registrar_baja(user_id: int, mision_id: str, naves_perdidas: dict) -> bool:
         "total": sum(naves_perdidas.values())
     })
     
-    # Mantener solo últimas 50 bajas
-    if len(data[user_id_str]) > 50:
-        data[user_id_str] = data[user_id_str][-50:]
+    # Mantener solo las últimas bajas (ver retencion.py); las demás van al resumen
+    conservadas, descartadas = recortar_bajas(data[user_id_str])
+    if descartadas:
+        data[user_id_str] = conservadas
+        try:
+            with transaction():
+                resumen = load_json(BAJAS_FLOTA_RESUMEN_FILE) or {}
+                acumular_bajas(resumen, user_id_str, descartadas)
+                save_json(BAJAS_FLOTA_RESUMEN_FILE, resumen)
+                save_json(BAJAS_FLOTA_FILE, data)
+        except TransaccionFallida:
+            return False
+        return True
     
     return save_json(BAJAS_FLOTA_FILE, data)
 
@@ -430,93 +437,95 @@ def procesar_misiones_completadas() -> list:
         try:
             fin = datetime.strptime(mision["fin"], "%Y-%m-%d %H:%M:%S")
             
-            if ahora >= fin:
-                if mision["tipo"] == "ataque":
-                    # ⚔️ PROCESAR BATALLA
-                    resultado = calcular_batalla(mision)
-                    
-                    # 💀 REGISTRAR BAJAS DEL ATACANTE
-                    if resultado["bajas_atacante"]:
-                        registrar_baja(
-                            mision["atacante"],
-                            mision_id,
-                            resultado["bajas_atacante"]
-                        )
-                    
-                    # 💀 REGISTRAR BAJAS DEL DEFENSOR
-                    if resultado["bajas_defensor"]:
-                        registrar_baja(
-                            mision["defensor"],
-                            mision_id,
-                            resultado["bajas_defensor"]
-                        )
-                    
-                    # ✨ DEVOLVER NAVES SUPERVIVIENTES AL ATACANTE
-                    if resultado["supervivientes_atacante"]:
-                        flota_atacante = obtener_flota_base(mision["atacante"])
-                        for nave, cantidad in resultado["supervivientes_atacante"].items():
-                            if cantidad > 0:
-                                flota_atacante[nave] = flota_atacante.get(nave, 0) + cantidad
-                        guardar_flota_base(mision["atacante"], flota_atacante)
-                    
-                    # ✨ DEVOLVER NAVES SUPERVIVIENTES AL DEFENSOR
-                    if resultado["supervivientes_defensor"]:
-                        flota_defensor = obtener_flota_base(mision["defensor"])
-                        for nave, cantidad in resultado["supervivientes_defensor"].items():
-                            if cantidad > 0:
-                                flota_defensor[nave] = flota_defensor.get(nave, 0) + cantidad
-                        guardar_flota_base(mision["defensor"], flota_defensor)
-                    
-                    # 💰 TRANSFERIR BOTÍN AL ATACANTE
-                    if resultado["botin"] and resultado["resultado"].startswith("victoria_atacante"):
-                        from recursos import obtener_recursos_usuario, guardar_recursos_usuario
-                        recursos_atacante = obtener_recursos_usuario(mision["atacante"])
-                        recursos_defensor = obtener_recursos_usuario(mision["defensor"])
+            # Flotas, recursos, bajas y la misión de ambos jugadores se confirman juntos
+            with transaction():
+                if ahora >= fin:
+                    if mision["tipo"] == "ataque":
+                        # ⚔️ PROCESAR BATALLA
+                        resultado = calcular_batalla(mision)
                         
-                        for recurso, cantidad in resultado["botin"].items():
-                            if cantidad > 0:
-                                recursos_atacante[recurso] = recursos_atacante.get(recurso, 0) + cantidad
-                                recursos_defensor[recurso] = max(0, recursos_defensor.get(recurso, 0) - cantidad)
+                        # 💀 REGISTRAR BAJAS DEL ATACANTE
+                        if resultado["bajas_atacante"]:
+                            registrar_baja(
+                                mision["atacante"],
+                                mision_id,
+                                resultado["bajas_atacante"]
+                            )
                         
-                        guardar_recursos_usuario(mision["atacante"], recursos_atacante)
-                        guardar_recursos_usuario(mision["defensor"], recursos_defensor)
-                    
-                    # 🗑️ ELIMINAR MISIÓN
-                    eliminar_mision(mision_id)
-                    completadas.append((mision_id, mision, resultado))
-                
-                elif mision["tipo"] == "expedicion":
-                    # 🛰️ PROCESAR EXPEDICIÓN CON EVENTOS ALEATORIOS
-                    resultado = procesar_expedicion(mision)
-                    
-                    # ✨ DEVOLVER NAVES SUPERVIVIENTES
-                    if resultado["supervivientes"]:
-                        flota_atacante = obtener_flota_base(mision["atacante"])
-                        for nave, cantidad in resultado["supervivientes"].items():
-                            if cantidad > 0:
-                                flota_atacante[nave] = flota_atacante.get(nave, 0) + cantidad
-                        guardar_flota_base(mision["atacante"], flota_atacante)
-                    
-                    # 💀 REGISTRAR BAJAS
-                    if resultado["bajas"]:
-                        registrar_baja(
-                            mision["atacante"],
-                            mision_id,
-                            resultado["bajas"]
-                        )
-                    
-                    # 💰 AÑADIR RECURSOS ENCONTRADOS
-                    if resultado.get("recursos"):
-                        from recursos import obtener_recursos_usuario, guardar_recursos_usuario
-                        recursos = obtener_recursos_usuario(mision["atacante"])
-                        for recurso, cantidad in resultado["recursos"].items():
-                            recursos[recurso] = recursos.get(recurso, 0) + cantidad
-                        guardar_recursos_usuario(mision["atacante"], recursos)
+                        # 💀 REGISTRAR BAJAS DEL DEFENSOR
+                        if resultado["bajas_defensor"]:
+                            registrar_baja(
+                                mision["defensor"],
+                                mision_id,
+                                resultado["bajas_defensor"]
+                            )
+                        
+                        # ✨ DEVOLVER NAVES SUPERVIVIENTES AL ATACANTE
+                        if resultado["supervivientes_atacante"]:
+                            flota_atacante = obtener_flota_base(mision["atacante"])
+                            for nave, cantidad in resultado["supervivientes_atacante"].items():
+                                if cantidad > 0:
+                                    flota_atacante[nave] = flota_atacante.get(nave, 0) + cantidad
+                            guardar_flota_base(mision["atacante"], flota_atacante)
+                        
+                        # ✨ DEVOLVER NAVES SUPERVIVIENTES AL DEFENSOR
+                        if resultado["supervivientes_defensor"]:
+                            flota_defensor = obtener_flota_base(mision["defensor"])
+                            for nave, cantidad in resultado["supervivientes_defensor"].items():
+                                if cantidad > 0:
+                                    flota_defensor[nave] = flota_defensor.get(nave, 0) + cantidad
+                            guardar_flota_base(mision["defensor"], flota_defensor)
+                        
+                        # 💰 TRANSFERIR BOTÍN AL ATACANTE
+                        if resultado["botin"] and resultado["resultado"].startswith("victoria_atacante"):
+                            from recursos import obtener_recursos_usuario, guardar_recursos_usuario
+                            recursos_atacante = obtener_recursos_usuario(mision["atacante"])
+                            recursos_defensor = obtener_recursos_usuario(mision["defensor"])
+                            
+                            for recurso, cantidad in resultado["botin"].items():
+                                if cantidad > 0:
+                                    recursos_atacante[recurso] = recursos_atacante.get(recurso, 0) + cantidad
+                                    recursos_defensor[recurso] = max(0, recursos_defensor.get(recurso, 0) - cantidad)
+                            
+                            guardar_recursos_usuario(mision["atacante"], recursos_atacante)
+                            guardar_recursos_usuario(mision["defensor"], recursos_defensor)
+                        
+                        # 🗑️ ELIMINAR MISIÓN
+                        eliminar_mision(mision_id)
+                        completadas.append((mision_id, mision, resultado))
                     
-                    # 🗑️ ELIMINAR MISIÓN
-                    eliminar_mision(mision_id)
-                    completadas.append((mision_id, mision, resultado))
-        
+                    elif mision["tipo"] == "expedicion":
+                        # 🛰️ PROCESAR EXPEDICIÓN CON EVENTOS ALEATORIOS
+                        resultado = procesar_expedicion(mision)
+                        
+                        # ✨ DEVOLVER NAVES SUPERVIVIENTES
+                        if resultado["supervivientes"]:
+                            flota_atacante = obtener_flota_base(mision["atacante"])
+                            for nave, cantidad in resultado["supervivientes"].items():
+                                if cantidad > 0:
+                                    flota_atacante[nave] = flota_atacante.get(nave, 0) + cantidad
+                            guardar_flota_base(mision["atacante"], flota_atacante)
+                        
+                        # 💀 REGISTRAR BAJAS
+                        if resultado["bajas"]:
+                            registrar_baja(
+                                mision["atacante"],
+                                mision_id,
+                                resultado["bajas"]
+                            )
+                        
+                        # 💰 AÑADIR RECURSOS ENCONTRADOS
+                        if resultado.get("recursos"):
+                            from recursos import obtener_recursos_usuario, guardar_recursos_usuario
+                            recursos = obtener_recursos_usuario(mision["atacante"])
+                            for recurso, cantidad in resultado["recursos"].items():
+                                recursos[recurso] = recursos.get(recurso, 0) + cantidad
+                            guardar_recursos_usuario(mision["atacante"], recursos)
+                        
+                        # 🗑️ ELIMINAR MISIÓN
+                        eliminar_mision(mision_id)
+                        completadas.append((mision_id, mision, resultado))
+            
         except Exception as e:
             logger.error(f"❌ Error procesando misión {mision_id}: {e}")
     
@@ -681,7 +690,7 @@ async def reporte_misiones_activas(update: Update, context: ContextTypes.DEFAULT
     if not user_id:
         user_id = update.effective_user.id
     
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     misiones = obtener_misiones_activas(user_id)
     
     if not misiones:
@@ -757,10 +766,11 @@ async def reporte_misiones_activas(update: Update, context: ContextTypes.DEFAULT
 async def reporte_historial_bajas(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """💀 Muestra historial de naves perdidas"""
     user_id = update.effective_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
     data = load_json(BAJAS_FLOTA_FILE) or {}
     bajas_usuario = data.get(str(user_id), [])
+    archivadas = (load_json(BAJAS_FLOTA_RESUMEN_FILE) or {}).get(str(user_id), {})
     
     mensaje = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -768,10 +778,10 @@ async def reporte_historial_bajas(update: Update, context: ContextTypes.DEFAULT_
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n\n"
     )
     
-    if not bajas_usuario:
+    if not bajas_usuario and not archivadas:
         mensaje += "📭 No has perdido naves en combate.\n\n"
     else:
-        total_bajas = sum(b["total"] for b in bajas_usuario)
+        total_bajas = sum(b["total"] for b in bajas_usuario) + archivadas.get("total", 0)
         mensaje += f"📊 <b>TOTAL NAVES PERDIDAS:</b> {total_bajas}\n\n"
         
         for baja in bajas_usuario[-10:]:  # Últimas 10
@@ -810,7 +820,7 @@ async def menu_flota_principal(update: Update, context: ContextTypes.DEFAULT_TYP
     
     await query.answer()
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
     # Procesar misiones completadas
     procesar_misiones_completadas()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#██████╗ ███████╗████████╗██████╗  █████╗ ██╗     ███████╗
+#██╔══██╗██╔════╝╚══██╔══╝██╔══██╗██╔══██╗██║     ██╔════╝
+#██████╔╝███████╗   ██║   ██████╔╝███████║██║     ███████╗
+#██╔══██╗╚════██║   ██║   ██╔══██╗██╔══██║██║     ╚════██║
+#██║  ██║███████║   ██║   ██║  ██║██║  ██║███████╗███████║
+#╚═╝  ╚═╝╚══════╝   ╚═╝   ╚═╝  ╚═╝╚═╝  ╚═╝╚══════╝╚══════╝
+
+#🚀 ASTRO.IO v2.4.5 🚀
+#⏱️ benchmark_almacen.py - BENCHMARK DE ALMACENAMIENTO
+#=======================================
+#✅ Mundos sintéticos de 1k / 10k / 100k jugadores en un data/ temporal
+#✅ load_json / save_json y helpers calientes por backend y serializador
+#✅ Informe en JSON para comparar versiones (--comparar)
+#=======================================
+
+"""
+Uso:
+    python benchmark_almacen.py [--jugadores 1000,10000] [--backends json,sqlite,sharded,journal]
+                                [--serializadores json,orjson,msgpack] [--muestras 200]
+                                [--repeticiones 3] [--ledger] [--salida informe.json]
+                                [--comparar informe_anterior.json] [--umbral 1.2]
+
+Cada combinación corre en un proceso aparte, dentro de una copia del mundo
+sintético: database lee STORAGE_BACKEND/SERIALIZER al importarse y trabaja
+sobre ./data, así que no hay forma limpia de cambiarlos en caliente.
+GitHub queda desactivado; se mide solo el almacenamiento local.
+
+Con --comparar, sale con código 1 si algún tiempo empeora más que --umbral.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+from benchmark_serializadores import generar_mundo
+from serializadores import SERIALIZADORES
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKENDS = ("json", "sqlite", "sharded", "journal")
+# Por debajo de esto las diferencias son ruido y no cuentan como regresión
+MINIMO_COMPARABLE_MS = 1.0
+
+# ================= MUNDO EN DISCO =================
+
+def escribir_mundo(mundo: Dict[str, Any], data_dir: str) -> None:
+    """🌍 Vuelca el mundo sintético como data/*.json en el formato histórico"""
+    os.makedirs(data_dir, exist_ok=True)
+    serializador = SERIALIZADORES["json-indent"]
+    for nombre, documento in mundo.items():
+        with open(os.path.join(data_dir, nombre), "wb") as f:
+            f.write(serializador.codificar(documento))
+
+# ================= CASO (PROCESO HIJO) =================
+
+def _cronometrar(func: Callable, *args) -> float:
+    inicio = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - inicio
+
+def _resumen(tiempos: List[float]) -> Dict[str, float]:
+    """Media y p95 en microsegundos, total en ms"""
+    if not tiempos:
+        return {"llamadas": 0}
+    ordenados = sorted(tiempos)
+    return {
+        "llamadas": len(tiempos),
+        "total_ms": round(sum(tiempos) * 1000, 2),
+        "media_us": round(sum(tiempos) / len(tiempos) * 1e6, 1),
+        "p95_us": round(ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))] * 1e6, 1),
+    }
+
+def ejecutar_caso(directorio: str, repeticiones: int, muestras: int) -> Dict[str, Any]:
+    """⚙️ Mide un backend + serializador sobre la copia del mundo en `directorio`"""
+    os.chdir(directorio)
+    sys.path.insert(0, REPO_DIR)
+
+    inicio = time.perf_counter()
+    import database
+    arranque = time.perf_counter() - inicio
+
+    archivos = sorted(
+        os.path.join(database.DATA_DIR, nombre)
+        for nombre in os.listdir(database.DATA_DIR)
+        if nombre.endswith(".json")
+    )
+
+    # Reescribir todo en el formato y backend del caso (migraciones incluidas)
+    inicio = time.perf_counter()
+    for archivo in archivos:
+        database.save_json(archivo, database.load_json(archivo))
+    database.flush_all()
+    preparar = time.perf_counter() - inicio
+
+    resultado: Dict[str, Any] = {
+        "backend_real": database.obtener_backend().nombre,
+        "arranque_ms": round(arranque * 1000, 1),
+        "preparar_ms": round(preparar * 1000, 1),
+    }
+
+    # ========== load_json / save_json por documento completo ==========
+    frio = {archivo: float("inf") for archivo in archivos}
+    caliente = dict(frio)
+    guardar = dict(frio)
+    for repeticion in range(repeticiones):
+        for archivo in archivos:
+            database.invalidar_cache(archivo)
+            frio[archivo] = min(frio[archivo], _cronometrar(database.load_json, archivo))
+            caliente[archivo] = min(caliente[archivo], _cronometrar(database.load_json, archivo))
+
+            # Patrón habitual del juego: cargar, tocar una entrada y guardar
+            documento = database.load_json(archivo)
+            if isinstance(documento, dict) and documento:
+                clave = next(iter(documento))
+                if isinstance(documento[clave], dict):
+                    documento[clave]["_benchmark"] = repeticion
+            inicio = time.perf_counter()
+            database.save_json(archivo, documento)
+            database.flush_all()
+            guardar[archivo] = min(guardar[archivo], time.perf_counter() - inicio)
+
+    resultado["load_json_frio_ms"] = round(sum(frio.values()) * 1000, 2)
+    resultado["load_json_caliente_ms"] = round(sum(caliente.values()) * 1000, 2)
+    resultado["save_json_ms"] = round(sum(guardar.values()) * 1000, 2)
+    resultado["por_archivo"] = {
+        os.path.basename(archivo): {
+            "load_json_frio_ms": round(frio[archivo] * 1000, 2),
+            "save_json_ms": round(guardar[archivo] * 1000, 2),
+        }
+        for archivo in archivos
+    }
+
+    # ========== Entradas por jugador ==========
+    autorizados = database.load_json(os.path.join(database.DATA_DIR, "authorized_users.json"), [])
+    muestra = random.Random(7).sample(autorizados, min(muestras, len(autorizados)))
+    recursos_file = os.path.join(database.DATA_DIR, "recursos.json")
+
+    tiempos = []
+    for user_id in muestra:
+        recursos = dict(database.obtener_usuario(user_id, recursos_file))
+        recursos["metal"] = recursos.get("metal", 0) + 1
+        tiempos.append(_cronometrar(database.guardar_usuario, user_id, recursos_file, recursos))
+    resultado["guardar_usuario"] = _resumen(tiempos)
+    resultado["guardar_usuario"]["flush_ms"] = round(_cronometrar(database.flush_all) * 1000, 2)
+    resultado["patch"] = _resumen([
+        _cronometrar(database.patch, recursos_file, user_id, [("incr", "metal", 1)])
+        for user_id in muestra
+    ])
+    database.flush_all()
+
+    # ========== Helpers calientes del juego ==========
+    helpers: Dict[str, Any] = {}
+    try:
+        from login import AuthSystem
+        from recursos import actualizar_recursos_tiempo
+        from edificios import procesar_cola
+        from puntuacion import obtener_ranking
+    except Exception as e:
+        # Sin python-telegram-bot instalado los módulos del juego no importan
+        helpers["error"] = f"{type(e).__name__}: {e}"
+    else:
+        for etiqueta, func in (
+            ("AuthSystem.obtener_datos_completos", AuthSystem.obtener_datos_completos),
+            ("recursos.actualizar_recursos_tiempo", actualizar_recursos_tiempo),
+            ("edificios.procesar_cola", procesar_cola),
+        ):
+            helpers[etiqueta] = _resumen([_cronometrar(func, user_id) for user_id in muestra])
+            database.flush_all()
+        helpers["puntuacion.obtener_ranking"] = _resumen([_cronometrar(obtener_ranking)])
+    resultado["helpers"] = helpers
+
+    resultado["escritura"] = database.obtener_estadisticas_escritura()
+    resultado["fsync"] = database.obtener_estadisticas_fsync()
+    return resultado
+
+# ================= ORQUESTACIÓN =================
+
+def lanzar_caso(directorio: str, backend: str, serializador: str, args) -> Dict[str, Any]:
+    """🚀 Ejecuta un caso en un proceso limpio y devuelve su resultado"""
+    entorno = dict(os.environ)
+    entorno.update({
+        "STORAGE_BACKEND": backend,
+        "SERIALIZER": serializador,
+        "SERIALIZER_INTERNO": serializador,
+        "USE_RESOURCE_LEDGER": "true" if args.ledger else "false",
+        "USE_GITHUB_SYNC": "false",
+    })
+    entorno.pop("SQLITE_PATH", None)
+    entorno.pop("JOURNAL_PATH", None)
+    comando = [
+        sys.executable, os.path.abspath(__file__), "--caso", directorio,
+        "--repeticiones", str(args.repeticiones), "--muestras", str(args.muestras),
+    ]
+    proceso = subprocess.run(comando, env=entorno, capture_output=True, text=True)
+    if proceso.returncode != 0:
+        return {"error": proceso.stderr.strip().splitlines()[-1] if proceso.stderr.strip() else "sin salida"}
+    return json.loads(proceso.stdout.strip().splitlines()[-1])
+
+def _tiempos_planos(resultado: Dict[str, Any], prefijo: str = "") -> Dict[str, float]:
+    """Todas las métricas de tiempo de un caso como {ruta.metrica: valor}"""
+    planos = {}
+    for clave, valor in resultado.items():
+        ruta = f"{prefijo}{clave}"
+        if isinstance(valor, dict):
+            planos.update(_tiempos_planos(valor, ruta + "."))
+        elif isinstance(valor, (int, float)) and clave.endswith(("_ms", "_us")) and not clave.startswith("total"):
+            planos[ruta] = valor
+    return planos
+
+def comparar(anterior: Dict[str, Any], actual: Dict[str, Any], umbral: float) -> List[Dict[str, Any]]:
+    """🔍 Métricas que empeoran más que `umbral` (1.2 = un 20% más lentas)"""
+    clave = lambda r: (r.get("jugadores"), r.get("backend"), r.get("serializador"), r.get("ledger"))
+    previos = {clave(r): _tiempos_planos(r) for r in anterior.get("resultados", [])}
+    regresiones = []
+    for resultado in actual.get("resultados", []):
+        base = previos.get(clave(resultado))
+        if not base:
+            continue
+        for metrica, valor in _tiempos_planos(resultado).items():
+            antes = base.get(metrica)
+            antes_ms = antes / 1000 if antes and metrica.endswith("_us") else antes
+            if not antes_ms or antes_ms < MINIMO_COMPARABLE_MS:
+                continue
+            if valor / antes > umbral:
+                regresiones.append({
+                    "jugadores": resultado["jugadores"],
+                    "backend": resultado["backend"],
+                    "serializador": resultado["serializador"],
+                    "metrica": metrica,
+                    "antes": antes,
+                    "ahora": valor,
+                    "ratio": round(valor / antes, 2),
+                })
+    return regresiones
+
+def _lista(valor: str) -> List[str]:
+    return [v.strip() for v in valor.split(",") if v.strip()]
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de almacenamiento de AstroIO")
+    parser.add_argument("--jugadores", default="1000,10000", help="Tamaños de mundo, p. ej. 1000,10000,100000")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--serializadores", default=",".join(SERIALIZADORES))
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--muestras", type=int, default=200, help="Jugadores para los helpers por usuario")
+    parser.add_argument("--ledger", action="store_true", help="Activar USE_RESOURCE_LEDGER")
+    parser.add_argument("--salida", help="Guardar el informe en este archivo (por defecto, stdout)")
+    parser.add_argument("--comparar", help="Informe anterior contra el que buscar regresiones")
+    parser.add_argument("--umbral", type=float, default=1.2)
+    parser.add_argument("--caso", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.caso:
+        logging.basicConfig(level=logging.WARNING)
+        print(json.dumps(ejecutar_caso(args.caso, args.repeticiones, args.muestras)))
+        return 0
+
+    serializadores = [s for s in _lista(args.serializadores) if s in SERIALIZADORES]
+    informe = {
+        "version": "v2.4.5",
+        "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {
+            "repeticiones": args.repeticiones, "muestras": args.muestras, "ledger": args.ledger,
+        },
+        "resultados": [],
+    }
+
+    for jugadores in (int(j) for j in _lista(args.jugadores)):
+        plantilla = tempfile.mkdtemp(prefix=f"astroio-bench-{jugadores}-")
+        try:
+            inicio = time.perf_counter()
+            escribir_mundo(generar_mundo(jugadores), os.path.join(plantilla, "data"))
+            print(f"🌍 Mundo de {jugadores} jugadores en {time.perf_counter() - inicio:.1f} s", file=sys.stderr)
+
+            for backend in _lista(args.backends):
+                for serializador in serializadores:
+                    caso = f"{plantilla}-{backend}-{serializador}"
+                    shutil.copytree(plantilla, caso)
+                    try:
+                        inicio = time.perf_counter()
+                        resultado = lanzar_caso(caso, backend, serializador, args)
+                    finally:
+                        shutil.rmtree(caso, ignore_errors=True)
+                    print(f"   ⏱️ {backend:<8} {serializador:<12} {time.perf_counter() - inicio:6.1f} s"
+                          f"{'  ❌ ' + resultado['error'] if 'error' in resultado else ''}", file=sys.stderr)
+                    informe["resultados"].append({
+                        "jugadores": jugadores, "backend": backend, "serializador": serializador,
+                        "ledger": args.ledger, **resultado,
+                    })
+        finally:
+            shutil.rmtree(plantilla, ignore_errors=True)
+
+    codigo = 0
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            informe["regresiones"] = comparar(json.load(f), informe, args.umbral)
+        codigo = 1 if informe["regresiones"] else 0
+
+    salida = json.dumps(informe, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(salida + "\n")
+    else:
+        print(salida)
+    return codigo
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#██████╗ ███████╗████████╗██████╗  █████╗ ██╗     ███████╗
+#██╔══██╗██╔════╝╚══██╔══╝██╔══██╗██╔══██╗██║     ██╔════╝
+#██████╔╝███████╗   ██║   ██████╔╝███████║██║     ███████╗
+#██╔══██╗╚════██║   ██║   ██╔══██╗██╔══██║██║     ╚════██║
+#██║  ██║███████║   ██║   ██║  ██║██║  ██║███████╗███████║
+#╚═╝  ╚═╝╚══════╝   ╚═╝   ╚═╝  ╚═╝╚═╝  ╚═╝╚══════╝╚══════╝
+
+#🚀 ASTRO.IO v2.4.5 🚀
+#⏱️ benchmark_serializadores.py - COMPARATIVA DE FORMATOS
+#=======================================
+#✅ Mundo sintético con N jugadores (por defecto 10.000)
+#✅ Tiempo de codificar/decodificar y tamaño por serializador
+#=======================================
+
+"""
+Uso:
+    python benchmark_serializadores.py [--jugadores 10000] [--repeticiones 3] [--json]
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+from serializadores import SERIALIZADORES, decodificar
+
+NAVES = [
+    "cazador_ligero", "cazador_pesado", "crucero", "nave_batalla", "acorazado", "destructor",
+    "estrella_muerte", "nave_carga_pequena", "nave_carga_grande", "reciclador",
+    "sonda_espionaje", "satelite_solar",
+]
+DEFENSAS = [
+    "lanza_misiles", "laser_ligero", "laser_pesado", "canion_ionico", "canion_gauss",
+    "canion_plasma", "escudo_pequeno", "escudo_grande", "misil_interceptor", "misil_interplanetario",
+]
+EDIFICIOS = ["metal", "cristal", "deuterio", "energia", "laboratorio", "hangar", "terraformer"]
+INVESTIGACIONES = ["energia", "laser", "ionica", "hiperespacio", "plasma", "combustion", "impulso", "espionaje"]
+JUGADORES_POR_ALIANZA = 20
+
+# ================= MUNDO SINTÉTICO =================
+
+def generar_mundo(jugadores: int, semilla: int = 42) -> dict:
+    """🌍 Documentos con la misma forma que data/*.json para N jugadores"""
+    rnd = random.Random(semilla)
+    ahora = datetime(2024, 1, 1)
+    fecha = ahora.strftime("%Y-%m-%d %H:%M:%S")
+    mundo = {
+        "data.json": {}, "recursos.json": {}, "minas.json": {}, "edificios_usuario.json": {},
+        "flota_usuario.json": {}, "defensa_usuario.json": {}, "campos.json": {},
+        "colas_edificios.json": {}, "investigaciones_usuario.json": {}, "galaxia.json": {},
+        "alianza_datos.json": {}, "alianza_miembros.json": {}, "authorized_users.json": [],
+    }
+
+    for i in range(jugadores):
+        uid = str(1_000_000_000 + i)
+        mundo["data.json"][uid] = {
+            "id": int(uid), "user_id": int(uid), "username": f"@jugador{i}",
+            "username_raw": f"jugador{i}", "nombre": f"Comandante {i}",
+            "fecha_registro": fecha, "ultima_actualizacion": fecha,
+            "ultima_actualizacion_recursos": fecha, "autorizado": True, "version": "v2.4.5",
+        }
+        mundo["recursos.json"][uid] = {
+            "metal": rnd.randint(0, 5_000_000), "cristal": rnd.randint(0, 3_000_000),
+            "deuterio": rnd.randint(0, 1_000_000), "materia_oscura": rnd.randint(0, 500),
+            "nxt20": rnd.randint(0, 10_000), "energia": rnd.randint(-200, 2_000),
+        }
+        mundo["minas.json"][uid] = {r: rnd.randint(0, 30) for r in ("metal", "cristal", "deuterio")}
+        mundo["edificios_usuario.json"][uid] = {e: rnd.randint(0, 20) for e in EDIFICIOS}
+        mundo["flota_usuario.json"][uid] = {n: rnd.randint(0, 2_000) for n in NAVES}
+        mundo["defensa_usuario.json"][uid] = {d: rnd.randint(0, 1_000) for d in DEFENSAS}
+        mundo["campos.json"][uid] = {"total": 163, "usados": rnd.randint(0, 163), "adicionales": 0}
+        mundo["investigaciones_usuario.json"][uid] = {t: rnd.randint(0, 12) for t in INVESTIGACIONES}
+        coords = {"galaxia": rnd.randint(1, 9), "sistema": rnd.randint(1, 499), "planeta": rnd.randint(1, 15)}
+        coords["nombre"] = f"Planeta {coords['galaxia']}:{coords['sistema']}:{coords['planeta']}"
+        mundo["galaxia.json"][uid] = {
+            "user_id": int(uid), "username": f"@jugador{i}", "coordenadas": coords, "fecha_asignacion": fecha,
+        }
+        mundo["authorized_users.json"].append(int(uid))
+
+        # Uno de cada dos jugadores está en una alianza
+        if i % 2 == 0:
+            etiqueta = f"A{i // (2 * JUGADORES_POR_ALIANZA)}"
+            rango = "miembro"
+            if etiqueta not in mundo["alianza_datos.json"]:
+                rango = "fundador"
+                mundo["alianza_datos.json"][etiqueta] = {
+                    "id": etiqueta, "nombre": f"Alianza {etiqueta}", "etiqueta": etiqueta,
+                    "fundador": int(uid), "fundador_username": f"@jugador{i}",
+                    "fecha_creacion": fecha, "descripcion": "", "banco_nivel": 1,
+                }
+            mundo["alianza_miembros.json"].setdefault(etiqueta, {})[uid] = {
+                "user_id": int(uid), "username": f"@jugador{i}", "rango": rango, "fecha_ingreso": fecha,
+            }
+
+        cola = []
+        for _ in range(rnd.randint(0, 3)):
+            tiempo = rnd.randint(60, 86_400)
+            tipo = rnd.choice(EDIFICIOS)
+            nivel = rnd.randint(0, 20)
+            cola.append({
+                "tipo": tipo, "nivel_actual": nivel, "nivel_objetivo": nivel + 1,
+                "inicio": fecha, "fin": (ahora + timedelta(seconds=tiempo)).strftime("%Y-%m-%d %H:%M:%S"),
+                "tiempo_total": tiempo, "tiempo_restante": tiempo, "progreso": 0,
+                "costo": {"metal": rnd.randint(100, 100_000), "cristal": rnd.randint(50, 50_000)},
+            })
+        mundo["colas_edificios.json"][uid] = cola
+    return mundo
+
+# ================= MEDICIÓN =================
+
+def medir(serializador, mundo: dict, repeticiones: int) -> dict:
+    """Mejor tiempo de varias repeticiones (codificar + decodificar todo el mundo)"""
+    mejor_cod = mejor_dec = float("inf")
+    tamano = 0
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        codificados = [serializador.codificar(doc) for doc in mundo.values()]
+        mejor_cod = min(mejor_cod, time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        for contenido in codificados:
+            decodificar(contenido)
+        mejor_dec = min(mejor_dec, time.perf_counter() - inicio)
+        tamano = sum(len(c) for c in codificados)
+
+    return {
+        "serializador": serializador.nombre,
+        "codificar_ms": round(mejor_cod * 1000, 1),
+        "decodificar_ms": round(mejor_dec * 1000, 1),
+        "tamano_bytes": tamano,
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Comparativa de serializadores de AstroIO")
+    parser.add_argument("--jugadores", type=int, default=10_000)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    mundo = generar_mundo(args.jugadores)
+    resultados = [medir(s, mundo, args.repeticiones) for s in SERIALIZADORES.values()]
+    referencia = next(r for r in resultados if r["serializador"] == "json-indent")["tamano_bytes"]
+
+    if args.json:
+        print(json.dumps({"jugadores": args.jugadores, "resultados": resultados}, indent=2))
+        return 0
+
+    print(f"🌍 Mundo sintético: {args.jugadores} jugadores, {len(mundo)} archivos")
+    print(f"{'serializador':<14}{'codificar':>12}{'decodificar':>14}{'tamaño':>14}{'vs indent':>11}")
+    for r in resultados:
+        print(
+            f"{r['serializador']:<14}{r['codificar_ms']:>10} ms{r['decodificar_ms']:>12} ms"
+            f"{r['tamano_bytes'] / 1024 / 1024:>11.2f} MB{r['tamano_bytes'] / referencia:>10.0%}"
+        )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
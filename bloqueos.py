@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#██████╗ ███████╗████████╗██████╗  █████╗ ██╗     ███████╗
+#██╔══██╗██╔════╝╚══██╔══╝██╔══██╗██╔══██╗██║     ██╔════╝
+#██████╔╝███████╗   ██║   ██████╔╝███████║██║     ███████╗
+#██╔══██╗╚════██║   ██║   ██╔══██╗██╔══██║██║     ╚════██║
+#██║  ██║███████║   ██║   ██║  ██║██║  ██║███████╗███████║
+#╚═╝  ╚═╝╚══════╝   ╚═╝   ╚═╝  ╚═╝╚═╝  ╚═╝╚══════╝╚══════╝
+
+#🚀 ASTRO.IO v2.4.5 🚀
+#🔒 bloqueos.py - BLOQUEOS POR CLAVE (USUARIO / ALIANZA / OFERTA)
+#=======================================
+#✅ Un asyncio.Lock por clave, creado al vuelo y liberado al quedar libre
+#✅ Jugadores distintos nunca se bloquean entre sí
+#✅ Varias claves a la vez en orden fijo (sin interbloqueos)
+#✅ Métricas de espera y claves más disputadas
+#=======================================
+
+import time
+import asyncio
+import logging
+from functools import wraps
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+# ================= CLAVES =================
+
+def clave_usuario(user_id: int) -> str:
+    return f"usuario:{user_id}"
+
+def clave_alianza(alianza_id: str) -> str:
+    return f"alianza:{alianza_id}"
+
+def clave_oferta(tipo: str, oferta_id: int) -> str:
+    return f"oferta:{tipo}:{oferta_id}"
+
+# ================= REGISTRO =================
+
+class RegistroBloqueos:
+    """🔒 Bloqueos asyncio por clave con métricas de contención"""
+
+    def __init__(self):
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Corutinas que usan o esperan cada lock (para borrarlo al quedar libre)
+        self._usos: Dict[str, int] = {}
+        self._stats = {"adquisiciones": 0, "contendidas": 0, "espera_total": 0.0, "espera_max": 0.0}
+        self._contencion_por_clave: Dict[str, int] = {}
+
+    def _tomar(self, clave: str) -> asyncio.Lock:
+        lock = self._locks.get(clave)
+        if lock is None:
+            lock = self._locks[clave] = asyncio.Lock()
+        self._usos[clave] = self._usos.get(clave, 0) + 1
+        return lock
+
+    def _soltar(self, clave: str) -> None:
+        usos = self._usos.get(clave, 1) - 1
+        if usos <= 0:
+            self._usos.pop(clave, None)
+            self._locks.pop(clave, None)
+        else:
+            self._usos[clave] = usos
+
+    @asynccontextmanager
+    async def bloquear(self, *claves: str):
+        """
+        🔒 async with bloquear(clave_usuario(uid), clave_alianza(aid)): ...
+        Las claves se toman siempre en orden alfabético para evitar interbloqueos.
+        """
+        ordenadas = sorted(set(claves))
+        tomadas: List[str] = []
+        adquiridas: List[asyncio.Lock] = []
+        try:
+            for clave in ordenadas:
+                lock = self._tomar(clave)
+                tomadas.append(clave)
+                contendida = lock.locked()
+                inicio = time.perf_counter()
+                await lock.acquire()
+                adquiridas.append(lock)
+                espera = time.perf_counter() - inicio
+
+                self._stats["adquisiciones"] += 1
+                if contendida:
+                    self._stats["contendidas"] += 1
+                    self._stats["espera_total"] += espera
+                    self._stats["espera_max"] = max(self._stats["espera_max"], espera)
+                    self._contencion_por_clave[clave] = self._contencion_por_clave.get(clave, 0) + 1
+                    logger.debug(f"🔒 Espera de {espera * 1000:.1f} ms por {clave}")
+            yield
+        finally:
+            for lock in reversed(adquiridas):
+                lock.release()
+            for clave in tomadas:
+                self._soltar(clave)
+
+    def obtener_estadisticas(self, top: int = 10) -> Dict[str, Any]:
+        """📊 Adquisiciones, esperas y claves más disputadas"""
+        contendidas = self._stats["contendidas"]
+        mas_disputadas = sorted(self._contencion_por_clave.items(), key=lambda x: x[1], reverse=True)[:top]
+        return {
+            "adquisiciones": self._stats["adquisiciones"],
+            "contendidas": contendidas,
+            "espera_media_ms": round(self._stats["espera_total"] / contendidas * 1000, 2) if contendidas else 0.0,
+            "espera_max_ms": round(self._stats["espera_max"] * 1000, 2),
+            "locks_activos": len(self._locks),
+            "mas_disputadas": mas_disputadas,
+        }
+
+_registro = RegistroBloqueos()
+
+def bloquear(*claves: str):
+    """🔒 Bloqueo del registro global (ver RegistroBloqueos.bloquear)"""
+    return _registro.bloquear(*claves)
+
+def obtener_estadisticas_bloqueos(top: int = 10) -> Dict[str, Any]:
+    return _registro.obtener_estadisticas(top)
+
+# ================= DECORADORES =================
+
+def bloquea_usuario(func):
+    """
+    🔒 Ejecuta el handler con el bloqueo del usuario que lo dispara.
+    Dos toques seguidos del mismo jugador se procesan uno detrás de otro.
+    """
+    @wraps(func)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user = update.effective_user
+        if not user:
+            return await func(update, context)
+        async with bloquear(clave_usuario(user.id)):
+            return await func(update, context)
+    return wrapper
+
+__all__ = [
+    'RegistroBloqueos',
+    'bloquear',
+    'bloquea_usuario',
+    'clave_usuario',
+    'clave_alianza',
+    'clave_oferta',
+    'obtener_estadisticas_bloqueos',
+]
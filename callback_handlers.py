@@ -30,7 +30,8 @@ from usuarios import (
     regalar_recursos_menu, reinicio_fabrica_menu, confirmar_reinicio_fabrica,
     subir_nivel_construccion_menu, regalar_flota_menu, regalar_defensa_menu,
     mejorar_investigacion_menu, admin_callback_handler, limpiar_colas_handler,
-    admin_estadisticas_handler, lista_administradores_handler, remover_admin_menu,
+    admin_estadisticas_handler, admin_metricas_almacen_handler,
+    lista_administradores_handler, remover_admin_menu,
     backup_callback_handler, obtener_conversation_handlers_backup,
     toggle_mantenimiento_handler  # 👈 SOLO mantenimiento, NO decision_handler
 )
@@ -276,6 +277,8 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # ========== ADMIN - ESTADÍSTICAS ==========
     elif data == "admin_estadisticas":
         await admin_estadisticas_handler(update, context)
+    elif data.startswith("admin_metricas_almacen"):
+        await admin_metricas_almacen_handler(update, context)
     
     # ========== ADMIN - REINICIO FÁBRICA ==========
     elif data == "admin_reinicio_fabrica":
@@ -14,22 +14,50 @@
 #✅ Versión CORREGIDA - 20 Feb 2026
 #✅ Detección automática de rama GitHub
 #✅ Sistema de fallback 100% funcional
+#✅ Caché en memoria validada por mtime/tamaño
+#✅ Escritura diferida sin pérdidas (write-behind)
+#✅ Backends intercambiables: JSON, SQLite, fragmentos por usuario o diario (STORAGE_BACKEND)
+#✅ Transacciones multi-documento: with transaction()
+#✅ Formato de archivo configurable con detección automática (SERIALIZER)
+#✅ Escritura atómica (temporal + fsync + replace) con commit de grupo (FSYNC_MODE)
+#✅ Libro de recursos de ancho fijo en memoria mapeada (USE_RESOURCE_LEDGER)
+#✅ Vistas de solo lectura para lecturas y copia por jugador para escrituras
+#✅ Métricas de E/S por archivo: cargas, guardados, bytes, parseo y GitHub
+#✅ Subida a GitHub en segundo plano: el jugador nunca espera a la red
+#✅ Un solo commit por lote de archivos (API de datos de Git)
+#✅ Lecturas siempre locales: GitHub solo se reconcilia al arrancar o a petición
+#✅ Cortacircuitos con Retry-After: una caída de GitHub no frena al juego
+#✅ Importar no toca red ni disco: todo arranca en iniciar_almacenamiento()
 #=======================================
 
 import os
 import json
 import base64
+import hashlib
 import logging
 import requests
 import time
-from typing import Any, Dict, List, Optional, Union, Tuple
+import threading
+import atexit
+import copy
+from contextlib import contextmanager
+from requests.adapters import HTTPAdapter
+from contextvars import ContextVar
+from collections.abc import Mapping, Sequence
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Union, Tuple
 from datetime import datetime
 
+from serializadores import codificar, decodificar
+from database_metricas import metricas, nombre_logico
+from arranque import etapa
+from database_github import CircuitoGitHub, ColaSincronizacion, GITHUB_SYNC_DRAIN
+
 logger = logging.getLogger(__name__)
 
 # ================= CONSTANTES =================
 DATA_DIR = "data"
-os.makedirs(DATA_DIR, exist_ok=True)
 
 # ================= CONFIGURACIÓN DE GITHUB =================
 GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN")
@@ -37,6 +65,24 @@ GITHUB_OWNER = os.environ.get("GITHUB_OWNER")
 GITHUB_REPO = os.environ.get("GITHUB_REPO")
 GITHUB_API = "https://api.github.com"
 USE_GITHUB_SYNC = os.getenv("USE_GITHUB_SYNC", "false").lower() == "true"
+# Conexiones keep-alive reutilizables hacia api.github.com
+GITHUB_POOL_SIZE = max(1, int(os.getenv("GITHUB_POOL_SIZE", "8")))
+
+HEADERS = {"Accept": "application/vnd.github.v3+json"}
+if GITHUB_TOKEN:
+    HEADERS["Authorization"] = f"token {GITHUB_TOKEN}"
+
+def _crear_sesion_github() -> requests.Session:
+    """🔌 Sesión compartida: una sola negociación TCP+TLS por conexión del pool"""
+    sesion = requests.Session()
+    sesion.headers.update(HEADERS)
+    adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=GITHUB_POOL_SIZE)
+    sesion.mount("https://", adaptador)
+    return sesion
+
+_sesion_github = _crear_sesion_github()
+# Compartido por todas las peticiones a GitHub (ver database_github.CircuitoGitHub)
+_circuito_github = CircuitoGitHub()
 
 # ================= DETECCIÓN AUTOMÁTICA DE RAMA =================
 def detectar_rama_github() -> str:
@@ -44,105 +90,592 @@ def detectar_rama_github() -> str:
     if not all([GITHUB_TOKEN, GITHUB_OWNER, GITHUB_REPO]):
         return "main"
     
-    headers = {"Accept": "application/vnd.github.v3+json"}
-    if GITHUB_TOKEN:
-        headers["Authorization"] = f"token {GITHUB_TOKEN}"
-    
     # Intentar con main primero, luego master
     for branch in ["main", "master"]:
+        if not _circuito_github.permitir():
+            break
         try:
             url = f"{GITHUB_API}/repos/{GITHUB_OWNER}/{GITHUB_REPO}/branches/{branch}"
-            response = requests.get(url, headers=headers, timeout=5)
-            
-            if response.status_code == 200:
-                logger.info(f"✅ Rama GitHub detectada: '{branch}'")
-                return branch
-        except:
+            response = _sesion_github.get(url, timeout=5)
+        except Exception:
+            _circuito_github.registrar(None)
             continue
+        _circuito_github.registrar(response.status_code, response.headers)
+        if response.status_code == 200:
+            logger.info(f"✅ Rama GitHub detectada: '{branch}'")
+            return branch
     
     logger.warning("⚠️ No se pudo detectar rama GitHub, usando 'main'")
     return "main"
 
-# Detectar rama al iniciar
-GITHUB_BRANCH = detectar_rama_github()
-HEADERS = {"Accept": "application/vnd.github.v3+json"}
-if GITHUB_TOKEN:
-    HEADERS["Authorization"] = f"token {GITHUB_TOKEN}"
+# Se resuelve en iniciar_almacenamiento(): GITHUB_BRANCH del entorno, la rama
+# guardada en github_revisiones.json o, solo si no hay ninguna, detectar_rama_github()
+GITHUB_BRANCH = os.getenv("GITHUB_BRANCH", "")
 
-# Cache de SHAs para archivos en GitHub
-github_sha_cache = {}
-# Control de frecuencia para guardados
-last_save_time = {}
+# ================= REVISIONES SINCRONIZADAS =================
+# {filepath: sha del blob} de la última versión que local y GitHub compartieron,
+# más el estado de la rama que permite preguntar con If-None-Match:
+#   commit       -> última cabeza vista de la rama
+#   arbol        -> árbol de ese commit (los commits no cambian: no se vuelve a pedir)
+#   etag         -> ETag de la última lectura de la ref
+#   sincronizado -> commit cuyo árbol coincide con github_sha_cache
+# Todo se guarda en disco para que un reinicio no empiece de cero.
+REVISIONES_FILE = os.path.join(DATA_DIR, "github_revisiones.json")
+_revisiones_lock = threading.Lock()
+_CAMPOS_RAMA = ("commit", "arbol", "etag", "sincronizado")
 
-# ================= FUNCIONES AUXILIARES DE GITHUB =================
+def _leer_revisiones() -> Dict[str, Any]:
+    try:
+        with open(REVISIONES_FILE, "r", encoding="utf-8") as f:
+            guardado = json.load(f)
+        return guardado if isinstance(guardado, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def _cargar_revisiones(guardado: Dict[str, Any]) -> None:
+    """Deja en memoria lo guardado, si es de la rama activa"""
+    rama = dict.fromkeys(_CAMPOS_RAMA)
+    archivos = {}
+    if guardado.get("rama") == GITHUB_BRANCH:
+        rama.update({campo: guardado.get(campo) for campo in _CAMPOS_RAMA})
+        archivos = dict(guardado.get("archivos") or {})
+    with _revisiones_lock:
+        github_sha_cache.clear()
+        github_sha_cache.update(archivos)
+        estado_rama_github.update(rama)
+
+def _guardar_revisiones() -> None:
+    with _revisiones_lock:
+        contenido = json.dumps(
+            {"rama": GITHUB_BRANCH, **estado_rama_github, "archivos": github_sha_cache},
+            ensure_ascii=False
+        )
+    try:
+        escribir_atomico(REVISIONES_FILE, contenido)
+    except OSError as e:
+        logger.warning(f"⚠️ No se pudieron guardar las revisiones de GitHub: {e}")
+
+# Cache de SHAs para archivos en GitHub (persistente, ver arriba)
+github_sha_cache: Dict[str, str] = {}
+estado_rama_github: Dict[str, Optional[str]] = dict.fromkeys(_CAMPOS_RAMA)
+
+# ================= MÉTRICAS POR ARCHIVO =================
+# Ver database_metricas.py: contadores por hilo, sin locks en el camino caliente.
+
+@lru_cache(maxsize=4096)
+def _nombre_metrica(filepath: str) -> str:
+    return nombre_logico(filepath, DATA_DIR)
+
+def _metrica(filepath: str, campo: str, valor: float = 1) -> None:
+    metricas.sumar(_nombre_metrica(filepath), campo, valor)
+
+def obtener_metricas_archivos(orden: str = "guardados", top: Optional[int] = None) -> Dict[str, Any]:
+    """📈 Cargas, guardados, bytes, tiempos y GitHub por archivo (ver database_metricas)"""
+    return metricas.instantanea(orden=orden, top=top)
 
-def _get_file_from_github(path: str) -> Tuple[Optional[str], Optional[str]]:
+def reiniciar_metricas_archivos() -> None:
+    metricas.reiniciar()
+
+# ================= CACHÉ DE DOCUMENTOS EN MEMORIA =================
+# Guarda el objeto ya parseado de cada archivo y solo lo vuelve a leer si
+# cambia su firma en el backend (JSON: mtime + tamaño) o si save_json lo escribe.
+# El objeto en caché es COMPARTIDO y nunca sale tal cual: load_json y obtener_usuario
+# entregan copias propias, ver_json / ver_usuario vistas de solo lectura.
+USE_JSON_CACHE = os.getenv("USE_JSON_CACHE", "true").lower() == "true"
+
+_cache_documentos: Dict[str, Dict[str, Any]] = {}
+_cache_lock = threading.RLock()
+_cache_stats = {"hits": 0, "misses": 0, "invalidaciones": 0}
+
+def _clave_cache(filepath: str) -> str:
+    """Normaliza la ruta para que 'data/x.json' y './data/x.json' compartan entrada"""
+    return os.path.normpath(filepath)
+
+def _firma_archivo(filepath: str) -> Any:
+    """Firma del documento en el backend (JSON: mtime_ns + tamaño), o None si no existe"""
+    return _backend.firma(filepath)
+
+def _cache_obtener(filepath: str) -> Tuple[bool, Any]:
+    """Retorna (encontrado, datos) si la entrada sigue siendo válida"""
+    clave = _clave_cache(filepath)
+    with _cache_lock:
+        # Un documento pendiente de volcar SIEMPRE es más reciente que el disco
+        pendiente = _pendientes.get(clave)
+        if pendiente is not None:
+            _cache_stats["hits"] += 1
+            return True, pendiente["data"]
+        if not USE_JSON_CACHE:
+            return False, None
+        entrada = _cache_documentos.get(clave)
+        if entrada is not None and entrada["firma"] == _firma_archivo(filepath):
+            _cache_stats["hits"] += 1
+            return True, entrada["data"]
+        if entrada is not None:
+            # El archivo cambió fuera de save_json (edición manual, restauración...)
+            del _cache_documentos[clave]
+            _cache_stats["invalidaciones"] += 1
+            _tocar_version(filepath)
+        _cache_stats["misses"] += 1
+    return False, None
+
+def _cache_guardar(filepath: str, data: Any) -> None:
+    """Registra el documento con la firma actual del archivo local"""
+    if not USE_JSON_CACHE:
+        return
+    firma = _firma_archivo(filepath)
+    if firma is None:
+        return
+    with _cache_lock:
+        _cache_documentos[_clave_cache(filepath)] = {"data": data, "firma": firma}
+
+def _cache_actualizar_entrada(filepath: str, clave: str, valor: Any) -> None:
+    """Refleja en la caché una escritura por clave hecha directamente en el backend"""
+    with _cache_lock:
+        entrada = _cache_documentos.get(_clave_cache(filepath))
+        if entrada is None:
+            return
+        if isinstance(entrada["data"], dict):
+            entrada["data"][clave] = valor
+            entrada["firma"] = _firma_archivo(filepath)
+        else:
+            del _cache_documentos[_clave_cache(filepath)]
+
+def invalidar_cache(filepath: Optional[str] = None) -> None:
+    """🧹 Descarta un documento de la caché (o todos si no se indica ruta)"""
+    global _epoca_versiones
+    with _cache_lock:
+        if filepath is None:
+            _cache_stats["invalidaciones"] += len(_cache_documentos)
+            _cache_documentos.clear()
+            _epoca_versiones += 1
+            return
+        if _cache_documentos.pop(_clave_cache(filepath), None) is not None:
+            _cache_stats["invalidaciones"] += 1
+        # Quien invalida es porque el documento cambió por otra vía
+        _tocar_version(filepath)
+
+# ================= VERSIONES DE DOCUMENTO =================
+# Cada escritura que cambia lo que ven los lectores (save_json, guardar_usuario,
+# patch, una transacción confirmada, una invalidación) sube la versión del
+# documento. transaction() las compara al confirmar: si otro escritor cambió lo
+# que la transacción leyó y va a escribir, lanza ConflictoTransaccion en vez de
+# pisarlo. _escritura_lock hace atómico "comprobar y escribir" frente a los
+# demás escritores (los lectores no lo toman).
+_versiones: Dict[str, int] = {}
+_epoca_versiones = 0
+_escritura_lock = threading.RLock()
+
+def _version_documento(filepath: str) -> Tuple[int, int]:
+    with _cache_lock:
+        return _epoca_versiones, _versiones.get(_clave_cache(filepath), 0)
+
+def _tocar_version(filepath: str) -> None:
+    clave = _clave_cache(filepath)
+    with _cache_lock:
+        _versiones[clave] = _versiones.get(clave, 0) + 1
+
+# ================= ESCRITURA DIFERIDA (WRITE-BEHIND) =================
+# save_json marca el documento como sucio y un hilo en segundo plano lo vuelca
+# a disco cuando vence la ventana. Todas las modificaciones de un mismo archivo
+# dentro de la ventana se agrupan en UNA sola escritura y nunca se descartan.
+# WRITE_BEHIND_WINDOW=0 vuelve a la escritura síncrona.
+WRITE_BEHIND_WINDOW = float(os.getenv("WRITE_BEHIND_WINDOW", "1.0"))
+
+_pendientes: Dict[str, Dict[str, Any]] = {}
+_pendientes_cond = threading.Condition(_cache_lock)
+_flush_lock = threading.Lock()
+_flusher_thread: Optional[threading.Thread] = None
+_escritura_stats = {"solicitudes": 0, "escrituras": 0, "errores": 0}
+
+def marcar_sucio(filepath: str, data: Any) -> None:
+    """✏️ Registra la última versión de un documento para volcarla en la próxima ventana"""
+    clave = _clave_cache(filepath)
+    with _escritura_lock, _pendientes_cond:
+        _tocar_version(filepath)
+        entrada = _pendientes.get(clave)
+        if entrada is None:
+            _pendientes[clave] = {
+                "filepath": filepath,
+                "data": data,
+                "desde": time.monotonic(),
+                "version": 1
+            }
+        else:
+            entrada["data"] = data
+            entrada["version"] += 1
+            _metrica(filepath, "coalescidas")
+        _iniciar_flusher()
+        _pendientes_cond.notify()
+
+def _iniciar_flusher() -> None:
+    """Arranca el hilo de volcado la primera vez que hace falta"""
+    global _flusher_thread
+    if _flusher_thread is None or not _flusher_thread.is_alive():
+        _flusher_thread = threading.Thread(target=_bucle_flusher, name="astroio-flusher", daemon=True)
+        _flusher_thread.start()
+
+def _bucle_flusher() -> None:
+    """Espera a que venza la ventana del documento más antiguo y vuelca los vencidos"""
+    while True:
+        with _pendientes_cond:
+            while not _pendientes:
+                _pendientes_cond.wait()
+            vence = min(e["desde"] for e in _pendientes.values()) + WRITE_BEHIND_WINDOW
+            espera = vence - time.monotonic()
+            if espera > 0:
+                _pendientes_cond.wait(espera)
+                continue
+        try:
+            _volcar_pendientes(solo_vencidos=True)
+        except Exception as e:
+            logger.error(f"❌ Error en el volcado diferido: {e}")
+            time.sleep(WRITE_BEHIND_WINDOW)
+
+def _volcar_pendientes(solo_vencidos: bool) -> bool:
+    """Escribe los documentos pendientes. Retorna False si alguno falló"""
+    with _flush_lock:
+        ahora = time.monotonic()
+        with _pendientes_cond:
+            lote = [
+                (clave, e["filepath"], e["data"], e["version"])
+                for clave, e in _pendientes.items()
+                if not solo_vencidos or e["desde"] + WRITE_BEHIND_WINDOW <= ahora
+            ]
+        
+        # Todo el lote comparte un único commit de grupo (ver FSYNC_MODE)
+        resultados = []
+        try:
+            with _grupo_escrituras():
+                for clave, filepath, data, version in lote:
+                    resultados.append(_escribir_documento(filepath, data))
+        except OSError as e:
+            logger.error(f"❌ No se pudo confirmar el volcado en disco: {e}")
+            resultados = [False] * len(lote)
+        
+        todo_ok = True
+        for (clave, filepath, data, version), exito in zip(lote, resultados):
+            with _pendientes_cond:
+                entrada = _pendientes.get(clave)
+                if exito:
+                    # Si llegó otra versión mientras escribíamos, queda pendiente
+                    if entrada is not None and entrada["version"] == version:
+                        del _pendientes[clave]
+                        _cache_guardar(filepath, data)
+                else:
+                    todo_ok = False
+                    if entrada is not None:
+                        entrada["desde"] = time.monotonic()  # Reintentar en la próxima ventana
+        return todo_ok
+
+def flush_all() -> bool:
     """
-    Obtiene contenido y SHA de un archivo en GitHub.
-    Retorna (contenido, sha) o (None, None) si no existe o hay error.
+    💾 Vuelca YA todos los documentos pendientes.
+    Llamar al apagar el bot, antes de un backup y en pruebas.
     """
-    if not USE_GITHUB_SYNC or not all([GITHUB_OWNER, GITHUB_REPO, GITHUB_TOKEN]):
-        return None, None
+    if not _pendientes:
+        return True
+    return _volcar_pendientes(solo_vencidos=False)
 
-    url = f"{GITHUB_API}/repos/{GITHUB_OWNER}/{GITHUB_REPO}/contents/{path}?ref={GITHUB_BRANCH}"
-    
+def obtener_estadisticas_escritura() -> Dict[str, Any]:
+    """📊 Guardados solicitados vs escrituras reales en disco"""
+    with _pendientes_cond:
+        return {
+            "ventana": WRITE_BEHIND_WINDOW,
+            "solicitudes": _escritura_stats["solicitudes"],
+            "escrituras": _escritura_stats["escrituras"],
+            "errores": _escritura_stats["errores"],
+            "pendientes": len(_pendientes),
+        }
+
+atexit.register(flush_all)
+
+def obtener_estadisticas_cache() -> Dict[str, Any]:
+    """📊 Hits, misses y documentos en caché"""
+    with _cache_lock:
+        total = _cache_stats["hits"] + _cache_stats["misses"]
+        return {
+            "activada": USE_JSON_CACHE,
+            "hits": _cache_stats["hits"],
+            "misses": _cache_stats["misses"],
+            "invalidaciones": _cache_stats["invalidaciones"],
+            "ratio_hits": (_cache_stats["hits"] / total) if total else 0.0,
+            "documentos": len(_cache_documentos),
+        }
+
+# ================= FUNCIONES AUXILIARES DE GITHUB =================
+
+def _metrica_github(path: str, inicio: float, status: Optional[int]) -> None:
+    """⏱️ RTT de una petición; status None = timeout o error de red"""
+    nombre = _nombre_metrica(path)
+    metricas.sumar(nombre, "github_peticiones")
+    metricas.sumar(nombre, "github_s", time.perf_counter() - inicio)
+    if status in (403, 429):
+        metricas.sumar(nombre, "github_limitadas")
+    elif status is None or (status >= 400 and status != 404):
+        metricas.sumar(nombre, "github_errores")
+
+# ================= COMMIT POR LOTES (GIT DATA API) =================
+# Un lote de archivos = blobs (solo los binarios) -> árbol -> commit -> ref.
+# Cuesta las mismas 5 peticiones suba 1 archivo o 30 (3 si la rama no se movió
+# desde el último lote), y deja un commit por lote.
+GITHUB_METRICA = "github (api)"
+
+def _peticion_github(metodo: str, url: str, timeout: float = 15, **kwargs) -> Optional[requests.Response]:
+    """
+    Petición por la sesión compartida y a través del cortacircuitos.
+    None si el circuito está abierto (sin esperar nada) o hubo timeout/error de red.
+    """
+    if not _circuito_github.permitir():
+        return None
+    inicio = time.perf_counter()
     try:
-        r = requests.get(url, headers=HEADERS, timeout=10)
-        
-        if r.status_code == 200:
-            data = r.json()
-            content = base64.b64decode(data["content"]).decode("utf-8")
-            logger.info(f"☁️ Archivo encontrado en GitHub: {path}")
-            return content, data.get("sha")
-        elif r.status_code == 404:
-            logger.debug(f"ℹ️ Archivo no existe en GitHub: {path}")
-            return None, None
-        else:
-            logger.warning(f"⚠️ Error GitHub {r.status_code}: {r.text[:100]}")
-            return None, None
-    except requests.exceptions.Timeout:
-        logger.debug("⏱️ Timeout conectando con GitHub")
-        return None, None
+        r = _sesion_github.request(metodo, url, timeout=timeout, **kwargs)
     except Exception as e:
-        logger.debug(f"ℹ️ Error obteniendo archivo de GitHub: {e}")
-        return None, None
+        _metrica_github(GITHUB_METRICA, inicio, None)
+        _circuito_github.registrar(None)
+        logger.debug(f"ℹ️ Error en la petición a GitHub ({url}): {e}")
+        return None
+    _metrica_github(GITHUB_METRICA, inicio, r.status_code)
+    _circuito_github.registrar(r.status_code, r.headers)
+    return r
+
+def _git_api(metodo: str, endpoint: str, **kwargs) -> Optional[requests.Response]:
+    """Petición a /repos/{owner}/{repo}/git/..."""
+    url = f"{GITHUB_API}/repos/{GITHUB_OWNER}/{GITHUB_REPO}/git/{endpoint}"
+    return _peticion_github(metodo, url, **kwargs)
+
+def _cabeza_rama() -> Optional[str]:
+    """
+    Commit al que apunta la rama. Pregunta con If-None-Match: si la ref no
+    cambió, GitHub responde 304 sin cuerpo y sin gastar cuota.
+    """
+    cabeceras = {}
+    if estado_rama_github["etag"] and estado_rama_github["commit"]:
+        cabeceras["If-None-Match"] = estado_rama_github["etag"]
+    r = _git_api("GET", f"ref/heads/{GITHUB_BRANCH}", headers=cabeceras)
+    if r is None:
+        return None
+    if r.status_code == 304:
+        return estado_rama_github["commit"]
+    if r.status_code != 200:
+        return None
+    commit = r.json()["object"]["sha"]
+    with _revisiones_lock:
+        if commit != estado_rama_github["commit"]:
+            estado_rama_github.update(commit=commit, arbol=None)
+        estado_rama_github["etag"] = r.headers.get("ETag")
+    return commit
 
-def _put_file_to_github(path: str, content_str: str, sha: Optional[str] = None) -> Tuple[bool, Optional[str]]:
+def _arbol_de(commit: str) -> Optional[str]:
+    """Árbol de un commit; el de la cabeza conocida sale de la caché"""
+    if commit == estado_rama_github["commit"] and estado_rama_github["arbol"]:
+        return estado_rama_github["arbol"]
+    r = _git_api("GET", f"commits/{commit}")
+    if r is None or r.status_code != 200:
+        return None
+    arbol = r.json()["tree"]["sha"]
+    with _revisiones_lock:
+        if commit == estado_rama_github["commit"]:
+            estado_rama_github["arbol"] = arbol
+    return arbol
+
+def _sha_blob(contenido: bytes) -> str:
+    """SHA que Git asigna a un blob con este contenido (el mismo que da la API de contents)"""
+    return hashlib.sha1(b"blob %d\0" % len(contenido) + contenido).hexdigest()
+
+def _entrada_arbol(filepath: str, contenido: bytes) -> Optional[Dict[str, Any]]:
+    """Entrada del árbol: el texto va en línea, lo binario como blob aparte"""
+    entrada = {"path": _ruta_github(filepath), "mode": "100644", "type": "blob"}
+    try:
+        entrada["content"] = contenido.decode("utf-8")
+        return entrada
+    except UnicodeDecodeError:
+        pass
+    r = _git_api("POST", "blobs", json={
+        "content": base64.b64encode(contenido).decode("utf-8"),
+        "encoding": "base64"
+    })
+    if r is None or r.status_code != 201:
+        return None
+    entrada["sha"] = r.json()["sha"]
+    return entrada
+
+def _subir_lote_github(archivos: Dict[str, bytes]) -> bool:
     """
-    Guarda un archivo en GitHub.
-    Retorna (éxito, nuevo_sha)
+    ☁️ Sube todos los archivos en UN commit (lo llama el hilo de database_github).
+    Si otro proceso movió la rama entre medias, la ref no avanza y el lote
+    se reintenta entero sobre el commit nuevo.
     """
     if not USE_GITHUB_SYNC or not all([GITHUB_OWNER, GITHUB_REPO, GITHUB_TOKEN]):
-        return False, None
+        return False
+
+    # 1️⃣ Commit y árbol actuales de la rama
+    commit_padre = _cabeza_rama()
+    if commit_padre is None:
+        return False
+    arbol_base = _arbol_de(commit_padre)
+    if arbol_base is None:
+        return False
+
+    # 2️⃣ Árbol nuevo con los archivos del lote
+    entradas = []
+    for filepath, contenido in archivos.items():
+        entrada = _entrada_arbol(filepath, contenido)
+        if entrada is None:
+            return False
+        entradas.append(entrada)
+    r = _git_api("POST", "trees", json={"base_tree": arbol_base, "tree": entradas})
+    if r is None or r.status_code != 201:
+        return False
+    arbol = r.json()["sha"]
 
-    url = f"{GITHUB_API}/repos/{GITHUB_OWNER}/{GITHUB_REPO}/contents/{path}"
-    b64_content = base64.b64encode(content_str.encode("utf-8")).decode("utf-8")
+    # 3️⃣ Commit
+    nombres = sorted(_ruta_github(f) for f in archivos)
+    mensaje = (
+        f"Auto-backup: {len(nombres)} archivos - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+        + "\n".join(nombres)
+    )
+    r = _git_api("POST", "commits", json={"message": mensaje, "tree": arbol, "parents": [commit_padre]})
+    if r is None or r.status_code != 201:
+        return False
+    commit = r.json()["sha"]
 
-    payload = {
-        "message": f"Auto-backup: {path} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-        "content": b64_content,
-        "branch": GITHUB_BRANCH
-    }
-    if sha:
-        payload["sha"] = sha
+    # 4️⃣ Avanzar la rama (sin forzar: si alguien empujó antes, 422 y reintento)
+    r = _git_api("PATCH", f"refs/heads/{GITHUB_BRANCH}", json={"sha": commit, "force": False})
+    if r is None or r.status_code != 200:
+        if r is not None:
+            logger.warning(f"⚠️ GitHub no aceptó el commit del lote ({r.status_code}): {r.text[:100]}")
+            # La rama se movió: la próxima lectura de la ref debe ser completa
+            estado_rama_github["etag"] = None
+        return False
+
+    with _revisiones_lock:
+        for filepath, contenido in archivos.items():
+            github_sha_cache[os.path.normpath(filepath)] = _sha_blob(contenido)
+        # Si local y remoto coincidían en el padre, siguen coincidiendo en el commit nuevo
+        if estado_rama_github["sincronizado"] == commit_padre:
+            estado_rama_github["sincronizado"] = commit
+        # El ETag guardado es de la ref anterior: no vale para la nueva cabeza
+        estado_rama_github.update(commit=commit, arbol=arbol, etag=None)
+    _guardar_revisiones()
+    logger.info(f"☁️ Guardados en GitHub en un commit: {', '.join(nombres)}")
+    return True
 
+_cola_github = ColaSincronizacion(_subir_lote_github, circuito=_circuito_github)
+
+def sincronizar_github(timeout: float = GITHUB_SYNC_DRAIN) -> bool:
+    """⏩ Sube ya todo lo pendiente y espera (al apagar, antes de un backup...)"""
+    if not USE_GITHUB_SYNC:
+        return True
+    return _cola_github.vaciar(timeout)
+
+def obtener_estadisticas_github() -> Dict[str, Any]:
+    """📊 Cola de subida a GitHub: profundidad, reintentos, último error y circuito"""
+    stats = _cola_github.obtener_estadisticas()
+    stats["activado"] = USE_GITHUB_SYNC
+    stats["circuito"] = _circuito_github.obtener_estadisticas()
+    return stats
+
+# ================= ESCRITURA ATÓMICA =================
+# Cada archivo se escribe en un temporal del mismo directorio, se sincroniza y
+# se sustituye con os.replace: un corte a mitad deja el archivo anterior
+# intacto, nunca uno truncado.
+# FSYNC_MODE:
+#   grupo   -> (por defecto) dentro de un volcado los fsync se hacen juntos al
+#              final del tick y cada directorio se sincroniza una sola vez
+#   siempre -> fsync de archivo y directorio en cada escritura
+#   nunca   -> solo temporal + replace (sin fsync)
+FSYNC_MODE = os.getenv("FSYNC_MODE", "grupo").lower()
+
+_grupo_local = threading.local()
+_fsync_stats = {"archivos": 0, "directorios": 0, "grupos": 0}
+
+def _fsync_directorio(directorio: str) -> None:
+    """Persiste la entrada del directorio tras un os.replace (no existe en Windows)"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directorio, os.O_RDONLY | os.O_DIRECTORY)
     try:
-        r = requests.put(url, headers=HEADERS, json=payload, timeout=10)
-        
-        if r.status_code in (200, 201):
-            result = r.json()
-            new_sha = result.get("content", {}).get("sha")
-            logger.info(f"☁️ Guardado en GitHub: {path}")
-            return True, new_sha
-        else:
-            logger.warning(f"⚠️ Error guardando en GitHub ({r.status_code}): {r.text[:100]}")
-            return False, None
-    except requests.exceptions.Timeout:
-        logger.debug("⏱️ Timeout guardando en GitHub")
-        return False, None
-    except Exception as e:
-        logger.debug(f"ℹ️ Error guardando en GitHub: {e}")
-        return False, None
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    _fsync_stats["directorios"] += 1
+
+def _ruta_temporal(filepath: str) -> str:
+    return f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+def escribir_atomico(filepath: str, contenido: Union[str, bytes]) -> None:
+    """
+    💾 Escribe el archivo completo o nada (temporal + fsync + os.replace).
+    Dentro de _grupo_escrituras() el fsync y la sustitución se hacen al cerrar el grupo.
+    Lanza OSError si falla.
+    """
+    if isinstance(contenido, str):
+        contenido = contenido.encode("utf-8")
+    directorio = os.path.dirname(filepath) or "."
+    os.makedirs(directorio, exist_ok=True)
+    grupo = getattr(_grupo_local, "grupo", None)
+    temporal = _ruta_temporal(filepath)
+    try:
+        with open(temporal, "wb") as f:
+            f.write(contenido)
+            f.flush()
+            if grupo is not None:
+                # Otra escritura del mismo archivo en este grupo queda sustituida
+                grupo[filepath] = temporal
+                return
+            if FSYNC_MODE != "nunca":
+                os.fsync(f.fileno())
+                _fsync_stats["archivos"] += 1
+        os.replace(temporal, filepath)
+    except BaseException:
+        if grupo is None or grupo.get(filepath) != temporal:
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
+        raise
+    if FSYNC_MODE != "nunca":
+        _fsync_directorio(directorio)
+
+@contextmanager
+def _grupo_escrituras():
+    """
+    🧺 Commit de grupo: las escrituras atómicas del bloque (en este hilo) se
+    sincronizan y sustituyen todas juntas al salir, con un fsync por directorio.
+    Sin efecto si FSYNC_MODE no es 'grupo' o si ya hay un grupo abierto.
+    """
+    if FSYNC_MODE != "grupo" or getattr(_grupo_local, "grupo", None) is not None:
+        yield
+        return
+    grupo: Dict[str, str] = {}
+    _grupo_local.grupo = grupo
+    try:
+        yield
+    finally:
+        _grupo_local.grupo = None
+    if not grupo:
+        return
+    # 1️⃣ Datos en disco antes de hacerlos visibles
+    for temporal in grupo.values():
+        fd = os.open(temporal, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    # 2️⃣ Sustituir y 3️⃣ sincronizar cada directorio una sola vez
+    directorios = set()
+    for filepath, temporal in grupo.items():
+        os.replace(temporal, filepath)
+        directorios.add(os.path.dirname(filepath) or ".")
+    for directorio in directorios:
+        _fsync_directorio(directorio)
+    _fsync_stats["archivos"] += len(grupo)
+    _fsync_stats["grupos"] += 1
+
+def obtener_estadisticas_fsync() -> Dict[str, Any]:
+    """📊 fsync de archivos y directorios, y commits de grupo"""
+    return {"modo": FSYNC_MODE, **_fsync_stats}
 
 # ================= FUNCIONES AUXILIARES LOCALES =================
 
@@ -161,103 +694,950 @@ def _get_file_local(filepath: str) -> Tuple[Optional[str], None]:
 def _put_file_local(filepath: str, content_str: str) -> bool:
     """Guarda un archivo local"""
     try:
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(content_str)
+        escribir_atomico(filepath, content_str)
         logger.info(f"📁 Guardado en local: {filepath}")
         return True
     except Exception as e:
         logger.error(f"❌ Error guardando archivo local {filepath}: {e}")
         return False
 
-# ================= FUNCIONES PRINCIPALES CON FALLBACK =================
+# ================= BACKENDS DE ALMACENAMIENTO =================
+# Un backend sabe leer y escribir documentos completos y, si lo soporta,
+# entradas individuales (una clave de primer nivel, normalmente un user_id).
+# Interfaz (duck typing):
+#   nombre
+#   por_clave(filepath) -> True si lee/escribe entradas sin tocar el resto
+#   firma(filepath) -> valor comparable para validar la caché
+#   existe(filepath) -> bool
+#   leer(filepath) -> (encontrado, data)
+#   escribir(filepath, data) -> bool
+#   leer_entrada(filepath, clave) -> (encontrado, valor)
+#   escribir_entrada(filepath, clave, valor) -> bool
+#   iterar(filepath) -> (clave, valor) sin armar el documento (opcional)
+#   parchear_entrada(filepath, clave, operaciones) -> (exito, valor) en su sitio (opcional)
+#   escribir_lote(operaciones) -> bool, todas o ninguna (opcional, ver transaction())
+#   cerrar() -> se llama al salir, después de volcar lo pendiente (opcional)
+# Se elige con STORAGE_BACKEND (json | sqlite | sharded | journal).
+# USE_RESOURCE_LEDGER=true envuelve al elegido y lleva recursos.json a database_ledger.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json").lower()
 
-def load_json(filepath: str, default: Any = None) -> Any:
-    """
-    CARGA CON FALLBACK:
-    1️⃣ Intenta desde GitHub (si está activado)
-    2️⃣ Si falla, intenta desde local
-    3️⃣ Si todo falla, retorna valor por defecto
-    """
-    # Determinar ruta relativa para GitHub
+def _ruta_github(filepath: str) -> str:
+    """Ruta relativa del archivo dentro del repositorio de GitHub"""
     if filepath.startswith(DATA_DIR):
-        github_path = filepath[len(DATA_DIR)+1:]  # Quita 'data/'
-    else:
-        github_path = os.path.basename(filepath)
+        return filepath[len(DATA_DIR)+1:]  # Quita 'data/'
+    return os.path.basename(filepath)
+
+def _decodificar_medido(filepath: str, contenido: bytes) -> Any:
+    """decodificar() anotando bytes leídos y tiempo de parseo del archivo"""
+    inicio = time.perf_counter()
+    data = decodificar(contenido)
+    _metrica(filepath, "parseo_s", time.perf_counter() - inicio)
+    _metrica(filepath, "bytes_leidos", len(contenido))
+    return data
+
+class BackendJSON:
+    """💾 Un archivo JSON por documento, con respaldo opcional en GitHub"""
+    
+    nombre = "json"
+    
+    def por_clave(self, filepath: str) -> bool:
+        return False
+    
+    def firma(self, filepath: str) -> Optional[Tuple[int, int]]:
+        """Firma (mtime_ns, tamaño) del archivo local, o None si no existe"""
+        try:
+            st = os.stat(filepath)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+    
+    def existe(self, filepath: str) -> bool:
+        return os.path.exists(filepath)
+    
+    def leer(self, filepath: str) -> Tuple[bool, Any]:
+        """
+        LECTURA LOCAL: GitHub solo se consulta al reconciliar (arranque o a
+        petición), nunca en cada carga. Ver reconciliar_github().
+        """
+        try:
+            if os.path.exists(filepath):
+                with open(filepath, 'rb') as f:
+                    return True, _decodificar_medido(filepath, f.read())
+        except Exception as e:
+            # Con la escritura atómica esto ya no debería pasar: que se vea
+            logger.error(f"❌ Archivo local ilegible {filepath}: {e}")
+        return False, None
     
-    # ========== 1️⃣ INTENTAR DESDE GITHUB ==========
-    if USE_GITHUB_SYNC:
+    def escribir(self, filepath: str, data: Any) -> bool:
+        """
+        ESCRITURA LOCAL + SUBIDA EN SEGUNDO PLANO:
+        1️⃣ Guarda en local (atómico)
+        2️⃣ Encola la ruta para GitHub (si está activado); no espera a la red
+        3️⃣ Retorna True si LOCAL funcionó
+        """
+        # Preparar contenido en el formato configurado para este archivo
+        inicio = time.perf_counter()
         try:
-            content, sha = _get_file_from_github(github_path)
-            if content is not None:
-                data = json.loads(content)
-                # Guardar SHA en caché para futuras escrituras
-                if sha:
-                    github_sha_cache[filepath] = sha
-                return data
+            contenido = codificar(filepath, data)
+        except (RuntimeError, TypeError, ValueError) as e:
+            # RuntimeError: el documento se modificó mientras se serializaba; se reintenta
+            logger.warning(f"⚠️ No se pudo serializar {filepath}: {e}")
+            return False
+        _metrica(filepath, "serializacion_s", time.perf_counter() - inicio)
+        _metrica(filepath, "bytes_escritos", len(contenido))
+        
+        # ========== 1️⃣ GUARDAR EN LOCAL ==========
+        try:
+            escribir_atomico(filepath, contenido)
         except Exception as e:
-            logger.debug(f"ℹ️ Error cargando desde GitHub: {e}")
+            logger.error(f"❌ Error guardando en local: {e}")
+            return False
+        
+        # ========== 2️⃣ ENCOLAR PARA GITHUB ==========
+        if USE_GITHUB_SYNC:
+            _cola_github.encolar(filepath)
+        return True
+    
+    def leer_entrada(self, filepath: str, clave: str) -> Tuple[bool, Any]:
+        encontrado, data = self.leer(filepath)
+        if not encontrado or not isinstance(data, dict) or clave not in data:
+            return False, None
+        return True, data[clave]
     
-    # ========== 2️⃣ FALLBACK A LOCAL ==========
+    def escribir_entrada(self, filepath: str, clave: str, valor: Any) -> bool:
+        encontrado, data = self.leer(filepath)
+        if not encontrado:
+            data = {}
+        data[clave] = valor
+        return self.escribir(filepath, data)
+
+def _crear_backend(nombre: str):
+    """Instancia el backend configurado; si falla, vuelve a JSON"""
+    if nombre == "sqlite":
+        try:
+            from database_sqlite import BackendSQLite, SQLITE_PATH
+            backend = BackendSQLite(SQLITE_PATH, DATA_DIR)
+            if USE_GITHUB_SYNC:
+                logger.warning("⚠️ GitHub Sync solo respalda el backend JSON; con SQLite se ignora")
+            return backend
+        except Exception as e:
+            logger.error(f"❌ No se pudo iniciar el backend SQLite, usando JSON: {e}")
+    elif nombre == "sharded":
+        try:
+            from database_shards import BackendFragmentado
+            return BackendFragmentado(DATA_DIR, BackendJSON())
+        except Exception as e:
+            logger.error(f"❌ No se pudo iniciar el backend fragmentado, usando JSON: {e}")
+    elif nombre == "journal":
+        try:
+            from database_journal import BackendDiario
+            return BackendDiario(BackendJSON())
+        except Exception as e:
+            logger.error(f"❌ No se pudo iniciar el backend con diario, usando JSON: {e}")
+    elif nombre != "json":
+        logger.warning(f"⚠️ STORAGE_BACKEND desconocido '{nombre}', usando JSON")
+    return BackendJSON()
+
+def _envolver_libro(backend):
+    """📒 Con USE_RESOURCE_LEDGER, recursos.json pasa al libro mapeado en memoria"""
+    from database_ledger import USE_RESOURCE_LEDGER, BackendLibro
+    if not USE_RESOURCE_LEDGER:
+        return backend
     try:
-        if os.path.exists(filepath):
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data
+        return BackendLibro(backend, os.path.join(DATA_DIR, "recursos.json"))
     except Exception as e:
-        logger.debug(f"ℹ️ Error cargando desde local: {e}")
+        logger.error(f"❌ No se pudo abrir el libro de recursos, se sigue sin él: {e}")
+        return backend
+
+# ================= RECONCILIACIÓN CON GITHUB =================
+# Las lecturas son siempre locales. GitHub solo se mira al arrancar (o cuando
+# un admin lo pide): se lista el árbol de la rama en una petición (ninguna si la
+# ref responde 304) y, para cada archivo, gana el lado que cambió desde la
+# última revisión compartida. Si
+# cambiaron los dos, gana el más reciente (mtime local vs. fecha del último
+# commit que tocó el archivo).
+
+def _arbol_github() -> Optional[Tuple[str, Dict[str, str]]]:
+    """
+    (commit, {ruta en el repo: sha del blob}) de la rama, o None si GitHub no
+    responde. Si la rama sigue en el commit ya sincronizado (304 o mismo SHA),
+    el árbol es github_sha_cache y no se descarga.
+    """
+    commit = _cabeza_rama()
+    if commit is None:
+        return None
+    if commit == estado_rama_github["sincronizado"]:
+        with _revisiones_lock:
+            return commit, {_ruta_github(f): sha for f, sha in github_sha_cache.items()}
+    r = _git_api("GET", f"trees/{commit}", params={"recursive": "1"})
+    if r is None or r.status_code != 200:
+        return None
+    return commit, {e["path"]: e["sha"] for e in r.json().get("tree", []) if e.get("type") == "blob"}
+
+def _descargar_blob(sha: str) -> Optional[bytes]:
+    r = _git_api("GET", f"blobs/{sha}")
+    if r is None or r.status_code != 200:
+        return None
+    return base64.b64decode(r.json()["content"])
+
+def _fecha_remota(ruta: str) -> Optional[float]:
+    """Epoch del último commit que tocó la ruta en la rama"""
+    url = f"{GITHUB_API}/repos/{GITHUB_OWNER}/{GITHUB_REPO}/commits"
+    r = _peticion_github("GET", url, timeout=10, params={"path": ruta, "sha": GITHUB_BRANCH, "per_page": 1})
+    if r is None or r.status_code != 200:
+        return None
+    try:
+        fecha = r.json()[0]["commit"]["committer"]["date"]
+        return datetime.fromisoformat(fecha.replace("Z", "+00:00")).timestamp()
+    except (IndexError, KeyError, TypeError, ValueError) as e:
+        logger.debug(f"ℹ️ No se pudo obtener la fecha remota de {ruta}: {e}")
+        return None
+
+def _gana_remoto(filepath: str, ruta: str, sha_local: Optional[str], sha_remoto: str, base: Optional[str]) -> bool:
+    """¿Hay que traer la versión de GitHub?"""
+    if sha_local is None or base == sha_local:
+        return True        # No hay local, o local no cambió desde la última sincronización
+    if base == sha_remoto:
+        return False       # Solo cambió local
+    # Cambiaron los dos (o nunca se sincronizó): el más reciente
+    fecha = _fecha_remota(ruta)
+    if fecha is None:
+        return base is None
+    return fecha > os.path.getmtime(filepath)
+
+def reconciliar_github() -> Dict[str, Any]:
+    """
+    ☁️ Pone local y GitHub de acuerdo, archivo por archivo.
+    Trae lo que es más nuevo en GitHub y encola lo que es más nuevo en local.
+    Se llama al arrancar; también se puede pedir desde el panel de admin.
+    """
+    resultado = {"descargados": 0, "encolados": 0, "iguales": 0, "errores": 0, "disponible": False}
+    if not USE_GITHUB_SYNC or not all([GITHUB_OWNER, GITHUB_REPO, GITHUB_TOKEN]):
+        return resultado
+    flush_all()
+    remoto = _arbol_github()
+    if remoto is None:
+        logger.warning("⚠️ GitHub no respondió: se arranca con los datos locales")
+        return resultado
+    commit, arbol = remoto
+    resultado["disponible"] = True
+
+    # 1️⃣ Decidir archivo por archivo (solo hashes locales, sin red salvo conflictos)
+    vistos = set()
+    a_descargar: List[Tuple[str, str]] = []
+    for ruta, sha_remoto in arbol.items():
+        if not ruta.endswith(".json"):
+            continue
+        filepath = os.path.normpath(os.path.join(DATA_DIR, ruta))
+        vistos.add(filepath)
+        if _cola_github.pendiente(filepath):
+            continue   # Ya hay una subida en camino con lo último de local
+        try:
+            with open(filepath, "rb") as f:
+                sha_local = _sha_blob(f.read())
+        except FileNotFoundError:
+            sha_local = None
+        base = github_sha_cache.get(filepath)
+
+        if sha_local == sha_remoto:
+            resultado["iguales"] += 1
+        elif _gana_remoto(filepath, ruta, sha_local, sha_remoto, base):
+            a_descargar.append((filepath, sha_remoto))
+            continue
+        else:
+            _cola_github.encolar(filepath)
+            resultado["encolados"] += 1
+        # Lo que hay en la rama: la base contra la que se compara la próxima vez
+        with _revisiones_lock:
+            github_sha_cache[filepath] = sha_remoto
+
+    # 2️⃣ Descargas en paralelo: en frío es todo el directorio de datos
+    if a_descargar:
+        with ThreadPoolExecutor(max_workers=GITHUB_POOL_SIZE, thread_name_prefix="astroio-prefetch") as pool:
+            contenidos = list(pool.map(lambda d: _descargar_blob(d[1]), a_descargar))
+        for (filepath, sha_remoto), contenido in zip(a_descargar, contenidos):
+            if contenido is None:
+                resultado["errores"] += 1
+                continue
+            try:
+                escribir_atomico(filepath, contenido)
+            except OSError as e:
+                logger.error(f"❌ No se pudo escribir {filepath} desde GitHub: {e}")
+                resultado["errores"] += 1
+                continue
+            invalidar_cache(filepath)
+            resultado["descargados"] += 1
+            with _revisiones_lock:
+                github_sha_cache[filepath] = sha_remoto
+
+    # Archivos que ya se habían subido y faltan en la rama: volver a subirlos
+    for filepath in list(github_sha_cache):
+        if filepath not in vistos and os.path.exists(filepath):
+            _cola_github.encolar(filepath)
+            resultado["encolados"] += 1
+
+    if not resultado["errores"]:
+        estado_rama_github["sincronizado"] = commit
+    _guardar_revisiones()
+    logger.info(
+        f"☁️ Reconciliación con GitHub: {resultado['descargados']} descargados, "
+        f"{resultado['encolados']} por subir, {resultado['iguales']} iguales"
+    )
+    return resultado
+
+class _BackendSinIniciar:
+    """
+    Ocupa el lugar de _backend hasta iniciar_almacenamiento(). Quien lo use
+    antes (un script, una prueba) arranca el almacenamiento en ese momento.
+    """
+    def __getattr__(self, nombre: str):
+        iniciar_almacenamiento()
+        if _backend is self:
+            raise RuntimeError("backend de almacenamiento usado mientras se iniciaba")
+        return getattr(_backend, nombre)
+
+_backend = _BackendSinIniciar()
+
+def obtener_backend():
+    """💾 Backend de almacenamiento activo"""
+    iniciar_almacenamiento()
+    return _backend
+
+def _cerrar_backend() -> None:
+    """🛑 Al salir: volcar lo pendiente, dejar que el backend cierre y subir lo que falte a GitHub"""
+    if not _almacenamiento_listo:
+        return
+    flush_all()
+    if hasattr(_backend, "cerrar"):
+        try:
+            _backend.cerrar()
+        except Exception as e:
+            logger.error(f"❌ Error cerrando el backend {_backend.nombre}: {e}")
+    if not sincronizar_github():
+        logger.warning(f"⚠️ GitHub: {_cola_github.profundidad()} archivos sin subir al apagar")
+
+atexit.register(_cerrar_backend)
+
+# ================= FUNCIONES PRINCIPALES CON FALLBACK =================
+
+def load_json(filepath: str, default: Any = None) -> Any:
+    """
+    CARGA CON FALLBACK:
+    0️⃣ Toma el documento en caché si no cambió en el backend
+    1️⃣ Si no, lo lee del backend (JSON: siempre local)
+    2️⃣ Si todo falla, retorna valor por defecto
+    Retorna una copia propia (DocumentoCOW): modificarla no cambia lo que ven
+    los demás hasta guardarla con save_json.
+    """
+    return _leer_json(filepath, default, compartido=False)
+
+def _leer_json(filepath: str, default: Any, compartido: bool) -> Any:
+    """load_json; con compartido=True entrega el objeto de la caché (solo para vistas)"""
+    _metrica(filepath, "cargas")
+    tx = _transaccion_actual.get()
+    if tx is not None:
+        # La transacción ya trabaja sobre copias privadas
+        encontrado, data = tx.leer_documento(filepath)
+    else:
+        encontrado, data = _cargar_documento(filepath)
+        if encontrado and not compartido:
+            data = _copia_privada(data)
+    if encontrado:
+        return data
     
-    # ========== 3️⃣ VALOR POR DEFECTO ==========
+    # ========== VALOR POR DEFECTO ==========
     if default is not None:
         return default
     return {} if filepath.endswith('.json') else []
 
+def _cargar_documento(filepath: str) -> Tuple[bool, Any]:
+    """Caché y, si no está, backend. Retorna (encontrado, data compartida)"""
+    encontrado, data = _cache_obtener(filepath)
+    if encontrado:
+        return True, data
+    
+    _metrica(filepath, "lecturas")
+    encontrado, data = _backend.leer(filepath)
+    if encontrado:
+        _cache_guardar(filepath, data)
+    return encontrado, data
+
 def save_json(filepath: str, data: Any) -> bool:
     """
-    GUARDA CON FALLBACK:
-    1️⃣ Intenta en GitHub (si está activado)
-    2️⃣ SIEMPRE guarda en local como respaldo
-    3️⃣ Retorna True si al menos LOCAL funcionó
+    GUARDA CON ESCRITURA DIFERIDA:
+    1️⃣ Actualiza la versión en memoria (load_json la verá al instante)
+    2️⃣ El volcador la escribe en el backend (JSON: GitHub + SIEMPRE local)
+    3️⃣ Con WRITE_BEHIND_WINDOW=0 escribe en el momento y retorna si funcionó
+    Dentro de transaction() solo se anota; se escribe al confirmar.
     """
-    # Determinar ruta relativa para GitHub
-    if filepath.startswith(DATA_DIR):
-        github_path = filepath[len(DATA_DIR)+1:]  # Quita 'data/'
-    else:
-        github_path = os.path.basename(filepath)
+    _metrica(filepath, "guardados")
+    tx = _transaccion_actual.get()
+    if tx is not None:
+        tx.guardar_documento(filepath, data)
+        return True
+    if isinstance(data, DocumentoCOW):
+        # A la caché va un dict normal (las entradas no tocadas siguen compartidas)
+        data = dict(data)
+    
+    with _pendientes_cond:
+        _escritura_stats["solicitudes"] += 1
+    
+    if WRITE_BEHIND_WINDOW > 0:
+        marcar_sucio(filepath, data)
+        return True
+    
+    with _escritura_lock:
+        _tocar_version(filepath)
+        if _escribir_documento(filepath, data):
+            _cache_guardar(filepath, data)
+            return True
+        invalidar_cache(filepath)
+        return False
+
+def _escribir_documento(filepath: str, data: Any) -> bool:
+    """Escritura real en el backend, contando escrituras y errores"""
+    exito = _backend.escribir(filepath, data)
+    _metrica(filepath, "escrituras")
+    with _pendientes_cond:
+        _escritura_stats["escrituras" if exito else "errores"] += 1
+    return exito
+
+# ================= VISTAS DE SOLO LECTURA Y COPIA AL ESCRIBIR =================
+# Lectura: ver_json / ver_usuario envuelven el objeto compartido de la caché en
+# vistas que no se pueden modificar (sin copiarlo). Lo anidado se envuelve al
+# acceder, así que el coste es el mismo que leer el dict directamente.
+# ⚠️ Una vista no es un dict: para comprobar el tipo usar Mapping / Sequence.
+# Escritura: editar_usuario copia SOLO la entrada del jugador y la guarda al
+# salir; dentro de transaction() los documentos completos son DocumentoCOW.
+
+class VistaDict(Mapping):
+    """🔒 Diccionario de solo lectura sobre el objeto compartido"""
+    
+    __slots__ = ("_datos",)
+    
+    def __init__(self, datos: Dict[Any, Any]):
+        self._datos = datos
+    
+    def __getitem__(self, clave: Any) -> Any:
+        return solo_lectura(self._datos[clave])
+    
+    def __iter__(self):
+        return iter(self._datos)
+    
+    def __len__(self) -> int:
+        return len(self._datos)
+    
+    def __contains__(self, clave: Any) -> bool:
+        return clave in self._datos
+    
+    def __repr__(self) -> str:
+        return f"VistaDict({self._datos!r})"
+    
+    def copy(self) -> Dict[Any, Any]:
+        """Copia propia y modificable"""
+        return copy.deepcopy(self._datos)
+
+class VistaLista(Sequence):
+    """🔒 Lista de solo lectura sobre el objeto compartido"""
+    
+    __slots__ = ("_datos",)
+    
+    def __init__(self, datos: List[Any]):
+        self._datos = datos
+    
+    def __getitem__(self, indice: Any) -> Any:
+        return solo_lectura(self._datos[indice])
+    
+    def __len__(self) -> int:
+        return len(self._datos)
+    
+    def __contains__(self, valor: Any) -> bool:
+        return valor in self._datos
+    
+    def __eq__(self, otro: Any) -> bool:
+        if isinstance(otro, VistaLista):
+            otro = otro._datos
+        return isinstance(otro, (list, tuple)) and list(self._datos) == list(otro)
     
-    # Preparar contenido
-    content_str = json.dumps(data, indent=2, ensure_ascii=False)
+    def __repr__(self) -> str:
+        return f"VistaLista({self._datos!r})"
     
-    # Control de frecuencia para evitar sobrecarga
-    current_time = time.time()
-    if filepath in last_save_time:
-        if current_time - last_save_time[filepath] < 1:  # Mínimo 1 segundo
+    def copy(self) -> List[Any]:
+        return copy.deepcopy(self._datos)
+
+def solo_lectura(valor: Any) -> Any:
+    """🔒 Envuelve dicts y listas en vistas de solo lectura (el resto ya es inmutable)"""
+    if isinstance(valor, dict):
+        return VistaDict(valor)
+    if isinstance(valor, list):
+        return VistaLista(valor)
+    return valor
+
+def ver_json(filepath: str, default: Any = None) -> Any:
+    """👁️ load_json de solo lectura: el documento compartido sin copiarlo"""
+    return solo_lectura(_leer_json(filepath, default, compartido=True))
+
+def ver_usuario(user_id: int, archivo: str, default: Any = None) -> Any:
+    """👁️ obtener_usuario de solo lectura"""
+    if _transaccion_actual.get() is not None:
+        return solo_lectura(obtener_usuario(user_id, archivo, default))
+    return solo_lectura(_obtener_usuario_directo(user_id, archivo, {} if default is None else default))
+
+@contextmanager
+def editar_usuario(user_id: int, archivo: str, default: Any = None):
+    """
+    ✏️ with editar_usuario(uid, RECURSOS_FILE) as recursos: recursos["metal"] -= 500
+    Copia solo la entrada del jugador y la guarda al salir sin error.
+    """
+    valor = obtener_usuario(user_id, archivo, default)
+    yield valor
+    guardar_usuario(user_id, archivo, valor)
+
+class DocumentoCOW(dict):
+    """
+    📄 Copia de un documento que solo duplica las entradas que se tocan.
+    El primer nivel se copia (punteros); cada entrada se copia en profundidad
+    la primera vez que se accede a ella. Las que nadie toca siguen compartidas
+    con la caché y se serializan igual que el original.
+    """
+    
+    def __init__(self, original: Dict[Any, Any]):
+        super().__init__(original)
+        self._propias = set()
+    
+    def _propia(self, clave: Any) -> Any:
+        valor = dict.__getitem__(self, clave)
+        if clave not in self._propias:
+            self._propias.add(clave)
+            if isinstance(valor, (dict, list)):
+                valor = copy.deepcopy(valor)
+                dict.__setitem__(self, clave, valor)
+        return valor
+    
+    def __getitem__(self, clave: Any) -> Any:
+        return self._propia(clave)
+    
+    def get(self, clave: Any, default: Any = None) -> Any:
+        return self._propia(clave) if dict.__contains__(self, clave) else default
+    
+    def __setitem__(self, clave: Any, valor: Any) -> None:
+        self._propias.add(clave)
+        dict.__setitem__(self, clave, valor)
+    
+    def setdefault(self, clave: Any, default: Any = None) -> Any:
+        if not dict.__contains__(self, clave):
+            self[clave] = default
+        return self._propia(clave)
+    
+    def pop(self, clave: Any, *default: Any) -> Any:
+        if dict.__contains__(self, clave):
+            valor = self._propia(clave)
+            self._propias.discard(clave)
+            dict.__delitem__(self, clave)
+            return valor
+        return dict.pop(self, clave, *default)
+    
+    def popitem(self) -> Tuple[Any, Any]:
+        clave = next(reversed(dict.keys(self)))
+        return clave, self.pop(clave)
+    
+    def values(self):
+        return [self._propia(clave) for clave in list(dict.keys(self))]
+    
+    def items(self):
+        return [(clave, self._propia(clave)) for clave in list(dict.keys(self))]
+    
+    def copy(self) -> "DocumentoCOW":
+        return DocumentoCOW(self)
+    
+    def __reduce__(self):
+        # copy / deepcopy / pickle: otro DocumentoCOW sobre las mismas entradas
+        return DocumentoCOW, (dict(self),)
+
+# ================= TRANSACCIONES (UNIDAD DE TRABAJO) =================
+# with transaction():
+#     patch(RECURSOS_FILE, uid, [("incr", "metal", -500)])
+#     guardar_usuario(uid, COLAS_EDIFICIOS_FILE, cola)
+# Dentro del bloque las lecturas devuelven COPIAS privadas (de un documento por
+# jugador solo se copian las entradas que se tocan) y las escrituras se
+# acumulan. Al salir sin error se confirman todas juntas en una sola escritura
+# por lotes; si hay una excepción se descartan y el estado compartido no cambia.
+# Si la confirmación falla, el bloque lanza TransaccionFallida (un OSError).
+# Si otro escritor cambió algo que el bloque leyó y reescribe, no se confirma
+# nada y se lanza ConflictoTransaccion: en_transaccion() repite el bloque.
+# Backends sin escribir_lote: se guarda antes un registro de intención
+# (data/.transaccion_pendiente.json) que se reaplica al arrancar si el proceso
+# murió a mitad de la confirmación.
+RUTA_TRANSACCION_PENDIENTE = os.path.join(DATA_DIR, ".transaccion_pendiente.json")
+
+_transaccion_actual: ContextVar[Optional["Transaccion"]] = ContextVar("astroio_transaccion", default=None)
+_transaccion_stats = {"confirmadas": 0, "revertidas": 0, "errores": 0, "conflictos": 0}
+TRANSACCION_REINTENTOS = max(1, int(os.getenv("TRANSACCION_REINTENTOS", "5")))
+
+class TransaccionFallida(OSError):
+    """❌ El lote de la transacción no se pudo escribir: no se aplicó nada"""
+
+class ConflictoTransaccion(TransaccionFallida):
+    """🔀 Otro escritor cambió lo que la transacción leyó: no se aplicó nada"""
+
+_AUSENTE = object()
+
+def _copia_privada(data: Any) -> Any:
+    """Copia para la transacción: por entradas si es un documento por usuario"""
+    if isinstance(data, dict):
+        return DocumentoCOW(data)
+    return copy.deepcopy(data)
+
+class Transaccion:
+    """📦 Lecturas y escrituras acumuladas de un bloque transaction()"""
+    
+    def __init__(self):
+        # clave_cache -> {"filepath", "encontrado", "data", "escrito"}
+        self.documentos: Dict[str, Dict[str, Any]] = {}
+        # clave_cache -> {"filepath", "valores": {clave: valor}, "escritas": set()}
+        self.entradas: Dict[str, Dict[str, Any]] = {}
+        # Versión vista al leer: clave_cache -> versión del documento y
+        # (clave_cache, entrada) -> (versión, objeto compartido leído)
+        self.versiones: Dict[str, Tuple[int, int]] = {}
+        self.originales: Dict[Tuple[str, str], Tuple[Tuple[int, int], Any]] = {}
+        self.exito: Optional[bool] = None
+        self.conflicto: Optional[str] = None
+    
+    def leer_documento(self, filepath: str) -> Tuple[bool, Any]:
+        clave = _clave_cache(filepath)
+        doc = self.documentos.get(clave)
+        if doc is None:
+            # Si antes se leyeron entradas sueltas, cuenta la lectura más antigua
+            previas = [version for (c, _), (version, _) in self.originales.items() if c == clave]
+            self.versiones[clave] = min(previas) if previas else _version_documento(filepath)
+            encontrado, data = _cargar_documento(filepath)
+            doc = {
+                "filepath": filepath,
+                "encontrado": encontrado,
+                "data": _copia_privada(data) if encontrado else None,
+                "escrito": False,
+            }
+            # Las entradas ya escritas en esta transacción pasan al documento
+            entradas = self.entradas.pop(clave, None)
+            if entradas and entradas["escritas"]:
+                if not isinstance(doc["data"], dict):
+                    doc["data"] = {}
+                for c in entradas["escritas"]:
+                    doc["data"][c] = entradas["valores"][c]
+                doc["encontrado"] = doc["escrito"] = True
+            self.documentos[clave] = doc
+        return doc["encontrado"], doc["data"]
+    
+    def guardar_documento(self, filepath: str, data: Any) -> None:
+        clave = _clave_cache(filepath)
+        self.entradas.pop(clave, None)
+        self.documentos[clave] = {"filepath": filepath, "encontrado": True, "data": data, "escrito": True}
+    
+    def leer_entrada(self, filepath: str, clave_entrada: str) -> Tuple[bool, Any]:
+        clave = _clave_cache(filepath)
+        doc = self.documentos.get(clave)
+        if doc is not None:
+            if isinstance(doc["data"], dict) and clave_entrada in doc["data"]:
+                return True, doc["data"][clave_entrada]
+            return False, None
+        
+        entradas = self.entradas.setdefault(clave, {"filepath": filepath, "valores": {}, "escritas": set()})
+        if clave_entrada not in entradas["valores"]:
+            version = _version_documento(filepath)
+            valor = _obtener_usuario_directo(clave_entrada, filepath, _AUSENTE)
+            self.originales.setdefault((clave, clave_entrada), (version, valor))
+            if valor is _AUSENTE:
+                return False, None
+            entradas["valores"][clave_entrada] = copy.deepcopy(valor)
+        return True, entradas["valores"][clave_entrada]
+    
+    def guardar_entrada(self, filepath: str, clave_entrada: str, valor: Any) -> None:
+        clave = _clave_cache(filepath)
+        doc = self.documentos.get(clave)
+        if doc is not None:
+            if not isinstance(doc["data"], dict):
+                doc["data"] = {}
+            doc["data"][clave_entrada] = valor
+            doc["encontrado"] = doc["escrito"] = True
+            return
+        entradas = self.entradas.setdefault(clave, {"filepath": filepath, "valores": {}, "escritas": set()})
+        entradas["valores"][clave_entrada] = valor
+        entradas["escritas"].add(clave_entrada)
+    
+    def existe(self, filepath: str) -> Optional[bool]:
+        """True/False si la transacción lo sabe, None si hay que preguntar fuera"""
+        clave = _clave_cache(filepath)
+        doc = self.documentos.get(clave)
+        if doc is not None:
+            return doc["encontrado"]
+        entradas = self.entradas.get(clave)
+        if entradas and entradas["escritas"]:
             return True
-    last_save_time[filepath] = current_time
+        return None
+    
+    def buscar_conflicto(self) -> Optional[str]:
+        """Ruta de algo que se leyó, se va a escribir y otro cambió entretanto"""
+        for clave, doc in self.documentos.items():
+            leida = self.versiones.get(clave)
+            if doc["escrito"] and leida is not None and leida != _version_documento(doc["filepath"]):
+                return doc["filepath"]
+        for clave, entradas in self.entradas.items():
+            for c in entradas["escritas"]:
+                leida = self.originales.get((clave, c))
+                if leida is None or leida[0] == _version_documento(entradas["filepath"]):
+                    continue
+                # El documento cambió, pero quizá en otras entradas
+                original = leida[1]
+                actual = _obtener_usuario_directo(c, entradas["filepath"], _AUSENTE)
+                if actual is not original and actual != original:
+                    return entradas["filepath"]
+        return None
+    
+    def operaciones(self) -> List[Dict[str, Any]]:
+        """Escrituras acumuladas en el formato de escribir_lote"""
+        # dict() copia los punteros sin pasar por DocumentoCOW (no duplica nada)
+        ops = [
+            {"op": "doc", "f": doc["filepath"],
+             "v": dict(doc["data"]) if isinstance(doc["data"], DocumentoCOW) else doc["data"]}
+            for doc in self.documentos.values() if doc["escrito"]
+        ]
+        for entradas in self.entradas.values():
+            for c in sorted(entradas["escritas"]):
+                ops.append({"op": "entrada", "f": entradas["filepath"], "k": c, "v": entradas["valores"][c]})
+        return ops
+
+@contextmanager
+def transaction():
+    """
+    📦 Unidad de trabajo multi-documento: todo se confirma junto o nada.
+    Los bloques anidados se unen a la transacción exterior.
+    Lanza TransaccionFallida si al salir no se pudo confirmar y
+    ConflictoTransaccion si otro escritor se adelantó.
+    """
+    tx = _transaccion_actual.get()
+    if tx is not None:
+        yield tx
+        return
     
-    # ========== 1️⃣ INTENTAR EN GITHUB ==========
-    if USE_GITHUB_SYNC:
+    tx = Transaccion()
+    token = _transaccion_actual.set(tx)
+    try:
+        yield tx
+    except BaseException:
+        _transaccion_actual.reset(token)
+        tx.exito = False
+        with _pendientes_cond:
+            _transaccion_stats["revertidas"] += 1
+        raise
+    _transaccion_actual.reset(token)
+    tx.exito = _confirmar_transaccion(tx)
+    if tx.conflicto is not None:
+        raise ConflictoTransaccion(f"{tx.conflicto} cambió durante la transacción")
+    if not tx.exito:
+        raise TransaccionFallida("no se pudo confirmar la transacción")
+
+def en_transaccion(func: Callable, *args, intentos: int = TRANSACCION_REINTENTOS, **kwargs) -> Any:
+    """
+    🔁 Ejecuta func(*args, **kwargs) dentro de transaction() y la repite desde
+    cero si otro escritor se adelantó (ConflictoTransaccion). Dentro de otra
+    transacción se une a ella: el conflicto lo resuelve la exterior.
+    """
+    if _transaccion_actual.get() is not None:
+        return func(*args, **kwargs)
+    
+    for intento in range(1, intentos + 1):
         try:
-            # Obtener SHA de caché
-            sha = github_sha_cache.get(filepath)
-            
-            # Guardar en GitHub
-            success, new_sha = _put_file_to_github(github_path, content_str, sha)
-            
-            if success and new_sha:
-                github_sha_cache[filepath] = new_sha
-        except Exception as e:
-            logger.debug(f"ℹ️ Error guardando en GitHub: {e}")
+            with transaction():
+                return func(*args, **kwargs)
+        except ConflictoTransaccion as e:
+            if intento == intentos:
+                raise
+            logger.debug(f"🔀 {e}, reintento {intento}/{intentos - 1}")
+
+def _confirmar_transaccion(tx: Transaccion) -> bool:
+    """Comprueba conflictos y escribe las operaciones en un solo lote"""
+    ops = tx.operaciones()
+    if not ops:
+        return True
     
-    # ========== 2️⃣ SIEMPRE GUARDAR EN LOCAL ==========
+    with _escritura_lock, _flush_lock:
+        tx.conflicto = tx.buscar_conflicto()
+        if tx.conflicto is not None:
+            with _pendientes_cond:
+                _transaccion_stats["conflictos"] += 1
+            return False
+        
+        # Entradas sueltas sobre un backend sin escritura por clave (o con el
+        # documento pendiente de volcar) se convierten en el documento completo
+        lote = []
+        fusionados: Dict[str, Dict[str, Any]] = {}
+        for op in ops:
+            if op["op"] == "entrada":
+                clave = _clave_cache(op["f"])
+                with _pendientes_cond:
+                    pendiente = clave in _pendientes
+                if pendiente or not _backend.por_clave(op["f"]) or clave in fusionados:
+                    doc = fusionados.get(clave)
+                    if doc is None:
+                        encontrado, actual = _cargar_documento(op["f"])
+                        datos = dict(actual) if encontrado and isinstance(actual, dict) else {}
+                        doc = fusionados[clave] = {"op": "doc", "f": op["f"], "v": datos}
+                        lote.append(doc)
+                    doc["v"][op["k"]] = op["v"]
+                    continue
+            lote.append(op)
+        
+        exito = _escribir_lote(lote)
+        with _pendientes_cond:
+            _transaccion_stats["confirmadas" if exito else "errores"] += 1
+            _escritura_stats["solicitudes"] += 1
+            _escritura_stats["escrituras" if exito else "errores"] += 1
+            for op in lote:
+                # Lo confirmado sustituye a cualquier versión anterior pendiente
+                _pendientes.pop(_clave_cache(op["f"]), None)
+                _tocar_version(op["f"])
+        
+        for op in lote:
+            if not exito:
+                invalidar_cache(op["f"])
+            elif op["op"] == "doc":
+                _cache_guardar(op["f"], op["v"])
+            else:
+                _cache_actualizar_entrada(op["f"], op["k"], op["v"])
+    
+    if not exito:
+        logger.error(f"❌ No se pudo confirmar la transacción ({len(lote)} escrituras)")
+    return exito
+
+def _aplicar_operacion(op: Dict[str, Any]) -> bool:
+    if op["op"] == "doc":
+        return _backend.escribir(op["f"], op["v"])
+    return _backend.escribir_entrada(op["f"], op["k"], op["v"])
+
+def _escribir_lote(lote: List[Dict[str, Any]]) -> bool:
+    """
+    Todas las escrituras o ninguna. Con un backend que no lo soporta se deja
+    primero la intención en disco: desde ese momento la transacción cuenta como
+    confirmada y lo que falte se reaplica en la próxima confirmación o al arrancar.
+    """
+    if hasattr(_backend, "escribir_lote"):
+        return _backend.escribir_lote(lote)
+    
+    if not _recuperar_transaccion_pendiente():
+        return False
     try:
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(content_str)
+        contenido = json.dumps(lote, ensure_ascii=False, separators=(",", ":"))
+        escribir_atomico(RUTA_TRANSACCION_PENDIENTE, contenido)
+    except (OSError, RuntimeError, TypeError, ValueError) as e:
+        logger.error(f"❌ No se pudo registrar la transacción: {e}")
+        return False
+    
+    if all([_aplicar_operacion(op) for op in lote]):
+        os.remove(RUTA_TRANSACCION_PENDIENTE)
+    else:
+        logger.warning("⚠️ Transacción aplicada a medias, se completará en el próximo intento")
+    return True
+
+def _recuperar_transaccion_pendiente() -> bool:
+    """🔁 Reaplica una transacción que quedó a medias. False si sigue pendiente"""
+    if not os.path.exists(RUTA_TRANSACCION_PENDIENTE):
         return True
-    except Exception as e:
-        logger.error(f"❌ Error guardando en local: {e}")
+    try:
+        with open(RUTA_TRANSACCION_PENDIENTE, "r", encoding="utf-8") as f:
+            lote = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"❌ Registro de transacción ilegible, se descarta: {e}")
+        os.remove(RUTA_TRANSACCION_PENDIENTE)
+        return True
+    
+    if not all([_aplicar_operacion(op) for op in lote]):
+        return False
+    os.remove(RUTA_TRANSACCION_PENDIENTE)
+    for op in lote:
+        invalidar_cache(op["f"])
+    logger.info(f"🔁 Transacción pendiente reaplicada ({len(lote)} escrituras)")
+    return True
+
+def obtener_estadisticas_transacciones() -> Dict[str, int]:
+    """📊 Transacciones confirmadas, revertidas y fallidas"""
+    with _pendientes_cond:
+        return dict(_transaccion_stats)
+
+# ================= PRECARGA AL ARRANCAR =================
+# Parsea los documentos de data/ una vez al arrancar para que el primer menú de
+# cada jugador ya los encuentre en caché. Los fragmentos por jugador no se tocan.
+PRECARGA_ARRANQUE = os.getenv("PRECARGA_ARRANQUE", "true").lower() == "true"
+
+def precargar_documentos() -> int:
+    """🔥 Deja en caché los documentos de data/; retorna cuántos cargó"""
+    cargados = 0
+    for nombre in sorted(os.listdir(DATA_DIR)):
+        filepath = os.path.join(DATA_DIR, nombre)
+        if not nombre.endswith(".json") or filepath == REVISIONES_FILE or not os.path.isfile(filepath):
+            continue
+        try:
+            encontrado, _ = _cargar_documento(filepath)
+            cargados += encontrado
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo precargar {filepath}: {e}")
+    return cargados
+
+# ================= ARRANQUE DEL ALMACENAMIENTO =================
+# Importar database no hace red ni escribe en disco. Todo lo que antes pasaba al
+# importar ocurre aquí, una sola vez: lo llama arranque.bootstrap() o, si nadie
+# lo hizo, el primer acceso al backend.
+_almacenamiento_lock = threading.RLock()
+_almacenamiento_listo = False
+_iniciando = False
+
+def _resolver_rama(guardado: Dict[str, Any]) -> str:
+    """🌿 Entorno > rama guardada en disco > detección por red (solo la primera vez)"""
+    if GITHUB_BRANCH:
+        return GITHUB_BRANCH
+    if guardado.get("rama"):
+        return guardado["rama"]
+    if not USE_GITHUB_SYNC:
+        return "main"
+    with etapa("github: detectar rama"):
+        return detectar_rama_github()
+
+def iniciar_almacenamiento() -> bool:
+    """
+    💾 Deja listo el almacenamiento: rama y revisiones de GitHub desde disco,
+    reconciliación, backend, transacción pendiente y precarga.
+    Idempotente; retorna True solo la vez que de verdad arranca.
+    """
+    global GITHUB_BRANCH, _backend, _almacenamiento_listo, _iniciando
+    if _almacenamiento_listo:
         return False
+    with _almacenamiento_lock:
+        if _almacenamiento_listo or _iniciando:
+            return False
+        _iniciando = True
+        try:
+            os.makedirs(DATA_DIR, exist_ok=True)
+            guardado = _leer_revisiones()
+            GITHUB_BRANCH = _resolver_rama(guardado)
+            _cargar_revisiones(guardado)
+
+            # Antes de crear el backend: el diario y el libro leen estos archivos al abrirse
+            if USE_GITHUB_SYNC:
+                with etapa("github: reconciliar y descargar"):
+                    reconciliar_github()
+
+            with etapa("backend de almacenamiento"):
+                _backend = _envolver_libro(_crear_backend(STORAGE_BACKEND))
+            logger.info(f"💾 Backend de almacenamiento: {_backend.nombre}")
+            _almacenamiento_listo = True
+
+            with etapa("recuperar transacción pendiente"):
+                _recuperar_transaccion_pendiente()
+            if PRECARGA_ARRANQUE and USE_JSON_CACHE:
+                with etapa("precarga de documentos en caché"):
+                    precargar_documentos()
+        finally:
+            _iniciando = False
+    return True
 
 # ================= FUNCIONES DE UTILIDAD =================
 
@@ -265,31 +1645,200 @@ def get_file_path(filename: str) -> str:
     """Obtiene ruta completa en data/"""
     return os.path.join(DATA_DIR, filename)
 
-def obtener_usuario(user_id: int, archivo: str) -> dict:
-    """Obtiene datos de un usuario específico"""
+def existe_json(filepath: str) -> bool:
+    """📁 True si el documento existe en el backend o está pendiente de volcarse"""
+    tx = _transaccion_actual.get()
+    if tx is not None:
+        existe = tx.existe(filepath)
+        if existe is not None:
+            return existe
+    with _pendientes_cond:
+        if _clave_cache(filepath) in _pendientes:
+            return True
+    return _backend.existe(filepath)
+
+def iterar_documento(filepath: str):
+    """
+    🔁 Recorre un documento como pares (clave, valor) sin armarlo entero
+    cuando el backend lo permite (fragmentos por usuario).
+    Un documento que no es un diccionario se entrega como un único (None, data).
+    ⚠️ Fuera de una transacción los valores son los de la caché: solo lectura.
+    """
+    if _transaccion_actual.get() is not None:
+        encontrado, data = True, load_json(filepath)
+    else:
+        encontrado, data = _cache_obtener(filepath)
+    if not encontrado and hasattr(_backend, "iterar") and _backend.por_clave(filepath):
+        yield from _backend.iterar(filepath)
+        return
+    if not encontrado:
+        data = _leer_json(filepath, None, compartido=True)
+    if isinstance(data, dict):
+        # Copia de los pares para tolerar modificaciones durante el recorrido
+        yield from list(data.items())
+    else:
+        yield None, data
+
+def obtener_usuario(user_id: int, archivo: str, default: Any = None) -> Any:
+    """
+    Obtiene datos de un usuario específico.
+    Con un backend por clave (SQLite, fragmentos) lee solo la entrada del usuario.
+    """
+    if default is None:
+        default = {}
+    
+    tx = _transaccion_actual.get()
+    if tx is not None:
+        encontrado, valor = tx.leer_entrada(archivo, str(user_id))
+        return valor if encontrado else default
+    valor = _obtener_usuario_directo(user_id, archivo, default)
+    # Copia propia: la entrada de la caché la comparten todos los lectores
+    return valor if valor is default else copy.deepcopy(valor)
+
+def _obtener_usuario_directo(user_id: Union[int, str], archivo: str, default: Any) -> Any:
+    """Lectura de una entrada fuera de transacción (compartida, sin copiar)"""
     user_id_str = str(user_id)
-    data = load_json(archivo, {})
-    return data.get(user_id_str, {})
+    
+    if _backend.por_clave(archivo):
+        _metrica(archivo, "cargas")
+        encontrado, data = _cache_obtener(archivo)
+        if not encontrado:
+            _metrica(archivo, "lecturas")
+            encontrado, valor = _backend.leer_entrada(archivo, user_id_str)
+            return valor if encontrado else default
+    else:
+        # Sin pasar por la transacción: leer una entrada no mete el documento entero en ella
+        _metrica(archivo, "cargas")
+        encontrado, data = _cargar_documento(archivo)
+        if not encontrado:
+            return default
+    
+    if not isinstance(data, dict):
+        return default
+    return data.get(user_id_str, default)
 
-def guardar_usuario(user_id: int, archivo: str, datos_usuario: dict) -> bool:
-    """Guarda datos de un usuario específico"""
+def guardar_usuario(user_id: int, archivo: str, datos_usuario: Any) -> bool:
+    """
+    Guarda datos de un usuario específico.
+    Con un backend por clave (SQLite, fragmentos) escribe solo la entrada del usuario.
+    """
     user_id_str = str(user_id)
-    data = load_json(archivo, {})
-    data[user_id_str] = datos_usuario
-    return save_json(archivo, data)
+    
+    tx = _transaccion_actual.get()
+    if tx is not None:
+        tx.guardar_entrada(archivo, user_id_str, datos_usuario)
+        return True
+    
+    with _escritura_lock:
+        if _backend.por_clave(archivo):
+            with _pendientes_cond:
+                pendiente = _pendientes.get(_clave_cache(archivo))
+            if pendiente is None:
+                _metrica(archivo, "guardados")
+                _metrica(archivo, "escrituras")
+                _tocar_version(archivo)
+                if not _backend.escribir_entrada(archivo, user_id_str, datos_usuario):
+                    invalidar_cache(archivo)
+                    return False
+                _cache_actualizar_entrada(archivo, user_id_str, datos_usuario)
+                return True
+        
+        data = load_json(archivo, {})
+        data[user_id_str] = datos_usuario
+        return save_json(archivo, data)
+
+# ================= PARCHES POR CAMPO =================
+# patch(archivo, clave, [("incr", "metal", -500), ("set", "cola", [...])])
+# aplica operaciones sobre UNA entrada sin reescribir el documento:
+#   SQLite -> una sola fila | diario -> un registro | JSON -> caché + marca de sucio
+# Las rutas pueden ser "campo", "a.b.c" o una tupla ("a", "b", "c").
+#   incr   -> suma (crea el campo en 0)
+#   set    -> asigna el valor
+#   del    -> elimina el campo
+#   append -> añade a una lista
+#   add    -> añade a una lista si no estaba
+#   remove -> quita de una lista si estaba
+OPERACIONES_PATCH = ("incr", "set", "del", "append", "add", "remove")
+
+def aplicar_operaciones(valor: Any, operaciones: List[Tuple]) -> Dict[str, Any]:
+    """🩹 Aplica las operaciones sobre la entrada (in place) y la retorna"""
+    if not isinstance(valor, dict):
+        valor = {}
+    for operacion in operaciones:
+        op, ruta = operacion[0], operacion[1]
+        argumento = operacion[2] if len(operacion) > 2 else None
+        if op not in OPERACIONES_PATCH:
+            raise ValueError(f"Operación de patch desconocida: {op}")
+        
+        partes = ruta.split(".") if isinstance(ruta, str) else list(ruta)
+        contenedor = valor
+        for parte in partes[:-1]:
+            siguiente = contenedor.get(parte)
+            if not isinstance(siguiente, dict):
+                siguiente = contenedor[parte] = {}
+            contenedor = siguiente
+        campo = partes[-1]
+        
+        if op == "incr":
+            contenedor[campo] = contenedor.get(campo, 0) + argumento
+        elif op == "set":
+            contenedor[campo] = argumento
+        elif op == "del":
+            contenedor.pop(campo, None)
+        else:
+            lista = contenedor.get(campo)
+            if not isinstance(lista, list):
+                lista = contenedor[campo] = []
+            if op == "append" or (op == "add" and argumento not in lista):
+                lista.append(argumento)
+            elif op == "remove" and argumento in lista:
+                lista.remove(argumento)
+    return valor
+
+def patch(filepath: str, clave: Union[int, str], operaciones: List[Tuple]) -> bool:
+    """
+    🩹 Aplica operaciones de campo sobre una entrada (normalmente un user_id).
+    El backend las aplica en su sitio si sabe hacerlo (parchear_entrada).
+    """
+    clave = str(clave)
+    
+    tx = _transaccion_actual.get()
+    if tx is not None:
+        _, valor = tx.leer_entrada(filepath, clave)
+        tx.guardar_entrada(filepath, clave, aplicar_operaciones(valor, operaciones))
+        return True
+    
+    with _escritura_lock:
+        if _backend.por_clave(filepath):
+            with _pendientes_cond:
+                pendiente = _pendientes.get(_clave_cache(filepath))
+            if pendiente is None:
+                _metrica(filepath, "guardados")
+                _metrica(filepath, "escrituras")
+                _tocar_version(filepath)
+                if hasattr(_backend, "parchear_entrada"):
+                    exito, valor = _backend.parchear_entrada(filepath, clave, operaciones)
+                else:
+                    _, valor = _backend.leer_entrada(filepath, clave)
+                    valor = aplicar_operaciones(valor, operaciones)
+                    exito = _backend.escribir_entrada(filepath, clave, valor)
+                if not exito:
+                    invalidar_cache(filepath)
+                    return False
+                _cache_actualizar_entrada(filepath, clave, valor)
+                return True
+        
+        data = load_json(filepath, {})
+        data[clave] = aplicar_operaciones(data.get(clave), operaciones)
+        return save_json(filepath, data)
 
 def actualizar_campo_usuario(user_id: int, archivo: str, campo: str, valor: Any) -> bool:
     """Actualiza un campo específico de un usuario"""
-    datos = obtener_usuario(user_id, archivo)
-    datos[campo] = valor
-    return guardar_usuario(user_id, archivo, datos)
+    return patch(archivo, user_id, [("set", campo, valor)])
 
 def incrementar_campo_usuario(user_id: int, archivo: str, campo: str, cantidad: Union[int, float]) -> bool:
     """Incrementa un campo numérico de un usuario"""
-    datos = obtener_usuario(user_id, archivo)
-    valor_actual = datos.get(campo, 0)
-    datos[campo] = valor_actual + cantidad
-    return guardar_usuario(user_id, archivo, datos)
+    return patch(archivo, user_id, [("incr", campo, cantidad)])
 
 def obtener_recurso(user_id: int, recurso: str) -> Union[int, float]:
     """Obtiene un recurso específico"""
@@ -308,19 +1857,13 @@ def incrementar_recurso(user_id: int, recurso: str, cantidad: Union[int, float])
 
 def agregar_a_lista_usuario(user_id: int, archivo: str, lista: str, elemento: Any) -> bool:
     """Agrega elemento a lista del usuario"""
-    datos = obtener_usuario(user_id, archivo)
-    if lista not in datos:
-        datos[lista] = []
-    if elemento not in datos[lista]:
-        datos[lista].append(elemento)
-    return guardar_usuario(user_id, archivo, datos)
+    return patch(archivo, user_id, [("add", lista, elemento)])
 
 def eliminar_de_lista_usuario(user_id: int, archivo: str, lista: str, elemento: Any) -> bool:
     """Elimina elemento de lista del usuario"""
     datos = obtener_usuario(user_id, archivo)
     if lista in datos and elemento in datos[lista]:
-        datos[lista].remove(elemento)
-        return guardar_usuario(user_id, archivo, datos)
+        return patch(archivo, user_id, [("remove", lista, elemento)])
     return True
 
 # ================= EXPORTAR =================
@@ -329,9 +1872,40 @@ __all__ = [
     'load_json',
     'save_json',
     'get_file_path',
+    'existe_json',
+    'obtener_backend',
+    'iterar_documento',
+    'invalidar_cache',
+    'obtener_estadisticas_cache',
+    'marcar_sucio',
+    'flush_all',
+    'obtener_estadisticas_escritura',
+    'obtener_estadisticas_github',
+    'sincronizar_github',
+    'reconciliar_github',
+    'precargar_documentos',
+    'iniciar_almacenamiento',
+    'escribir_atomico',
+    'solo_lectura',
+    'ver_json',
+    'ver_usuario',
+    'editar_usuario',
+    'VistaDict',
+    'VistaLista',
+    'DocumentoCOW',
+    'obtener_estadisticas_fsync',
+    'obtener_metricas_archivos',
+    'reiniciar_metricas_archivos',
     'DATA_DIR',
     'obtener_usuario',
     'guardar_usuario',
+    'patch',
+    'aplicar_operaciones',
+    'transaction',
+    'en_transaccion',
+    'TransaccionFallida',
+    'ConflictoTransaccion',
+    'obtener_estadisticas_transacciones',
     'actualizar_campo_usuario',
     'incrementar_campo_usuario',
     'obtener_recurso',
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#██████╗ ███████╗████████╗██████╗  █████╗ ██╗     ███████╗
+#██╔══██╗██╔════╝╚══██╔══╝██╔══██╗██╔══██╗██║     ██╔════╝
+#██████╔╝███████╗   ██║   ██████╔╝███████║██║     ███████╗
+#██╔══██╗╚════██║   ██║   ██╔══██╗██╔══██║██║     ╚════██║
+#██║  ██║███████║   ██║   ██║  ██║██║  ██║███████╗███████║
+#╚═╝  ╚═╝╚══════╝   ╚═╝   ╚═╝  ╚═╝╚═╝  ╚═╝╚══════╝╚══════╝
+
+#🚀 ASTRO.IO v2.4.5 🚀
+#☁️ database_github.py - SINCRONIZACIÓN CON GITHUB EN SEGUNDO PLANO
+#=======================================
+#✅ save_json escribe en local y solo ENCOLA la ruta para GitHub
+#✅ Varios guardados del mismo archivo = una sola subida (la última versión)
+#✅ Todo lo acumulado viaja en UN commit (blobs → árbol → commit → ref)
+#✅ Reintentos con espera exponencial y profundidad de cola visible
+#✅ Cortacircuitos: si GitHub cae o nos limita, se deja de llamar un rato
+#=======================================
+
+"""
+El jugador ya no espera a GitHub: BackendJSON.escribir() deja el archivo en
+disco y llama a encolar(filepath). Un hilo sube los archivos cuya ventana
+(GITHUB_SYNC_WINDOW) ha vencido leyendo el contenido del disco en ese momento,
+así que siempre sube la última versión aunque se haya guardado diez veces.
+Con el primero que vence viajan todos los demás pendientes: el lote entero se
+confirma como un único commit, o no se confirma ninguno.
+
+Si una subida falla, cada archivo del lote se reintenta tras GITHUB_SYNC_BACKOFF · 2^n
+segundos (máximo GITHUB_SYNC_BACKOFF_MAX). Un guardado nuevo no adelanta el
+reintento: solo actualiza lo que se subirá.
+
+CircuitoGitHub envuelve cada petición. Tras GITHUB_BREAKER_FALLOS fallos
+seguidos (timeout, red, 5xx, 403/429) se ABRE durante un enfriamiento y las
+peticiones se rechazan al instante: el juego sigue en local. Un 403/429 con
+Retry-After o X-RateLimit-Reset abre exactamente hasta esa hora. Pasado el
+enfriamiento queda SEMIABIERTO y deja pasar una sola petición de prueba: si
+sale bien se cierra, si falla se vuelve a abrir con el doble de enfriamiento.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Mapping, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ================= CONFIGURACIÓN =================
+GITHUB_SYNC_WINDOW = float(os.getenv("GITHUB_SYNC_WINDOW", "5"))
+GITHUB_SYNC_BACKOFF = float(os.getenv("GITHUB_SYNC_BACKOFF", "5"))
+GITHUB_SYNC_BACKOFF_MAX = float(os.getenv("GITHUB_SYNC_BACKOFF_MAX", "600"))
+# Segundos que se espera al apagar para vaciar la cola
+GITHUB_SYNC_DRAIN = float(os.getenv("GITHUB_SYNC_DRAIN", "30"))
+GITHUB_BREAKER_FALLOS = max(1, int(os.getenv("GITHUB_BREAKER_FALLOS", "3")))
+GITHUB_BREAKER_ENFRIAMIENTO = float(os.getenv("GITHUB_BREAKER_ENFRIAMIENTO", "30"))
+GITHUB_BREAKER_ENFRIAMIENTO_MAX = float(os.getenv("GITHUB_BREAKER_ENFRIAMIENTO_MAX", "900"))
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMIABIERTO = "semiabierto"
+
+# subir({filepath: contenido}) -> bool   (todo el lote en un commit, o nada)
+Subidor = Callable[[Dict[str, bytes]], bool]
+
+# ================= CORTACIRCUITOS =================
+
+def _espera_limite(status: Optional[int], cabeceras: Mapping[str, str]) -> Optional[float]:
+    """Segundos que GitHub pide esperar (Retry-After / X-RateLimit-Reset), o None"""
+    retry_after = cabeceras.get("Retry-After")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+    if cabeceras.get("X-RateLimit-Remaining") == "0" and cabeceras.get("X-RateLimit-Reset"):
+        try:
+            return max(0.0, float(cabeceras["X-RateLimit-Reset"]) - time.time())
+        except ValueError:
+            pass
+    return None
+
+class CircuitoGitHub:
+    """🔌 Cerrado → abierto tras N fallos → semiabierto (una prueba) → cerrado"""
+
+    def __init__(self, fallos: int = GITHUB_BREAKER_FALLOS,
+                 enfriamiento: float = GITHUB_BREAKER_ENFRIAMIENTO,
+                 enfriamiento_max: float = GITHUB_BREAKER_ENFRIAMIENTO_MAX):
+        self.umbral = fallos
+        self.enfriamiento_base = enfriamiento
+        self.enfriamiento_max = enfriamiento_max
+        self._lock = threading.Lock()
+        self.estado = CERRADO
+        self.fallos = 0
+        self._enfriamiento = enfriamiento
+        self._reabre = 0.0
+        self._prueba_en_curso = False
+        self.motivo: Optional[str] = None
+        self._stats = {"aperturas": 0, "rechazadas": 0}
+
+    def permitir(self) -> bool:
+        """¿Puede salir una petición ahora? En semiabierto solo sale la de prueba"""
+        with self._lock:
+            if self.estado == CERRADO:
+                return True
+            if self.estado == ABIERTO and time.monotonic() >= self._reabre:
+                self.estado = SEMIABIERTO
+                self._prueba_en_curso = False
+            if self.estado == SEMIABIERTO and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                return True
+            self._stats["rechazadas"] += 1
+            return False
+
+    def espera(self) -> float:
+        """Segundos hasta que permitir() pueda volver a dar paso (0 = ya)"""
+        with self._lock:
+            if self.estado == CERRADO:
+                return 0.0
+            if self.estado == ABIERTO:
+                return max(0.0, self._reabre - time.monotonic())
+            return 1.0 if self._prueba_en_curso else 0.0
+
+    def registrar(self, status: Optional[int], cabeceras: Optional[Mapping[str, str]] = None) -> None:
+        """
+        📝 Resultado de una petición. status None = timeout o error de red.
+        404/409/422 son respuestas normales de la API, no fallos de GitHub.
+        """
+        cabeceras = cabeceras or {}
+        limite = _espera_limite(status, cabeceras)
+        with self._lock:
+            self._prueba_en_curso = False
+            fallo = status is None or status >= 500 or status in (403, 429)
+            if limite is not None and (fallo or status < 400):
+                # GitHub dice hasta cuándo: ni un segundo antes
+                if fallo:
+                    self.fallos += 1
+                self._abrir(limite, f"límite de peticiones ({status})")
+                return
+            if fallo:
+                self.fallos += 1
+                motivo = "sin respuesta" if status is None else f"HTTP {status}"
+                if self.estado == SEMIABIERTO:
+                    self._abrir(min(self._enfriamiento * 2, self.enfriamiento_max), motivo)
+                elif self.fallos >= self.umbral:
+                    self._abrir(self._enfriamiento, motivo)
+                return
+            if self.estado != CERRADO:
+                logger.info("🔌 GitHub responde de nuevo: circuito cerrado")
+            self.estado = CERRADO
+            self.fallos = 0
+            self._enfriamiento = self.enfriamiento_base
+            self.motivo = None
+
+    def _abrir(self, segundos: float, motivo: str) -> None:
+        """Con el lock tomado"""
+        self.estado = ABIERTO
+        self._enfriamiento = max(self.enfriamiento_base, min(segundos, self.enfriamiento_max))
+        self._reabre = time.monotonic() + segundos
+        self.motivo = motivo
+        self._stats["aperturas"] += 1
+        logger.warning(f"🔌 Circuito de GitHub ABIERTO {segundos:.0f}s ({motivo}): solo datos locales")
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "estado": self.estado,
+                "fallos_seguidos": self.fallos,
+                "reabre_en_s": round(max(0.0, self._reabre - time.monotonic()), 1) if self.estado == ABIERTO else 0.0,
+                "motivo": self.motivo,
+                "aperturas": self._stats["aperturas"],
+                "rechazadas": self._stats["rechazadas"],
+            }
+
+# ================= COLA DE SINCRONIZACIÓN =================
+
+class ColaSincronizacion:
+    """☁️ Rutas pendientes de subir a GitHub, agrupadas por archivo"""
+
+    def __init__(self, subir: Subidor, ventana: float = GITHUB_SYNC_WINDOW,
+                 circuito: Optional[CircuitoGitHub] = None):
+        self._subir = subir
+        self.ventana = ventana
+        # Con el circuito abierto no se gastan intentos: se espera a que reabra
+        self._circuito = circuito
+        self._pendientes: Dict[str, Dict[str, Any]] = {}
+        self._cond = threading.Condition()
+        self._hilo: Optional[threading.Thread] = None
+        # Archivos del lote que está subiendo el hilo ahora mismo
+        self._en_curso: Set[str] = set()
+        self._stats = {
+            "encolados": 0, "coalescidos": 0, "lotes": 0, "subidas": 0,
+            "fallos": 0, "descartados": 0, "retraso_max": 0.0,
+        }
+        self.ultimo_error: Optional[str] = None
+
+    # ================= ENTRADA =================
+
+    def encolar(self, filepath: str) -> None:
+        """📥 Marca el archivo para subirlo; si ya estaba pendiente no se duplica"""
+        clave = os.path.normpath(filepath)
+        ahora = time.monotonic()
+        with self._cond:
+            self._stats["encolados"] += 1
+            entrada = self._pendientes.get(clave)
+            if entrada is None:
+                self._pendientes[clave] = {
+                    "filepath": filepath,
+                    "desde": ahora,
+                    "proximo": ahora + self.ventana,
+                    "intentos": 0,
+                    "version": 1,
+                }
+            else:
+                entrada["version"] += 1
+                self._stats["coalescidos"] += 1
+            self._iniciar()
+            self._cond.notify()
+
+    def _iniciar(self) -> None:
+        if self._hilo is None or not self._hilo.is_alive():
+            self._hilo = threading.Thread(target=self._bucle, name="astroio-github-sync", daemon=True)
+            self._hilo.start()
+
+    # ================= HILO =================
+
+    def _bucle(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pendientes:
+                    self._cond.wait()
+                espera = min(e["proximo"] for e in self._pendientes.values()) - time.monotonic()
+                if self._circuito is not None:
+                    espera = max(espera, self._circuito.espera())
+                if espera > 0:
+                    self._cond.wait(espera)
+                    continue
+                lote = self._elegir_lote(time.monotonic())
+                self._en_curso = set(lote)
+            try:
+                self._procesar(lote)
+            except Exception as e:
+                logger.error(f"❌ Error en la sincronización con GitHub: {e}")
+            finally:
+                with self._cond:
+                    self._en_curso = set()
+                    self._cond.notify_all()
+
+    def _elegir_lote(self, ahora: float) -> Dict[str, Tuple[str, int]]:
+        """
+        Vencido el primer archivo, viajan con él todos los que no están
+        esperando un reintento: un solo commit para todo lo acumulado.
+        Retorna {clave: (filepath, versión encolada)}.
+        """
+        return {
+            clave: (e["filepath"], e["version"])
+            for clave, e in self._pendientes.items()
+            if e["proximo"] <= ahora or not e["intentos"]
+        }
+
+    def _procesar(self, lote: Dict[str, Tuple[str, int]]) -> None:
+        """Sube el contenido actual de los archivos del lote en un solo commit"""
+        archivos: Dict[str, bytes] = {}
+        for clave, (filepath, _) in lote.items():
+            try:
+                with open(filepath, "rb") as f:
+                    archivos[filepath] = f.read()
+            except FileNotFoundError:
+                with self._cond:
+                    self._pendientes.pop(clave, None)
+                    self._stats["descartados"] += 1
+        if not archivos:
+            return
+
+        exito, error = False, None
+        try:
+            exito = self._subir(archivos)
+        except Exception as e:
+            error = str(e)
+
+        ahora = time.monotonic()
+        with self._cond:
+            if exito:
+                self._stats["lotes"] += 1
+                self._stats["subidas"] += len(archivos)
+            else:
+                self._stats["fallos"] += 1
+                self.ultimo_error = f"lote de {len(archivos)}: {error or 'subida rechazada'}"
+            for clave, (_, version) in lote.items():
+                entrada = self._pendientes.get(clave)
+                if entrada is None:
+                    continue
+                if exito:
+                    self._stats["retraso_max"] = max(self._stats["retraso_max"], ahora - entrada["desde"])
+                    if entrada["version"] == version:
+                        del self._pendientes[clave]
+                    else:
+                        # Llegó otro guardado mientras subíamos: nueva ventana
+                        entrada["intentos"] = 0
+                        entrada["desde"] = ahora
+                        entrada["proximo"] = ahora + self.ventana
+                else:
+                    entrada["intentos"] += 1
+                    espera = min(GITHUB_SYNC_BACKOFF * 2 ** (entrada["intentos"] - 1), GITHUB_SYNC_BACKOFF_MAX)
+                    entrada["fallo"] = ahora
+                    entrada["proximo"] = ahora + espera
+            if not exito:
+                intentos = max((self._pendientes[c]["intentos"] for c in lote if c in self._pendientes), default=0)
+                logger.warning(
+                    f"⚠️ GitHub: lote de {len(archivos)} archivos no se pudo subir (intento {intentos})"
+                )
+
+    # ================= CONTROL =================
+
+    def vaciar(self, timeout: float = GITHUB_SYNC_DRAIN) -> bool:
+        """
+        ⏩ Adelanta todo lo pendiente y espera a que se suba.
+        Retorna False si quedan archivos al vencer el timeout.
+        """
+        limite = time.monotonic() + timeout
+        with self._cond:
+            if not self._pendientes:
+                return True
+            ahora = time.monotonic()
+            for entrada in self._pendientes.values():
+                entrada["proximo"] = min(entrada["proximo"], ahora)
+            self._iniciar()
+            self._cond.notify_all()
+            while self._pendientes:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    return False
+                # Los que ya fallaron en este vaciado vuelven a esperar: no insistir
+                if not self._en_curso and all(
+                    e.get("fallo", 0) >= ahora for e in self._pendientes.values()
+                ):
+                    return False
+                self._cond.wait(min(restante, 0.5))
+            return True
+
+    def pendiente(self, filepath: str) -> bool:
+        """¿Tiene el archivo cambios locales que GitHub todavía no conoce?"""
+        clave = os.path.normpath(filepath)
+        with self._cond:
+            return clave in self._pendientes or clave in self._en_curso
+
+    def profundidad(self) -> int:
+        with self._cond:
+            return len(self._pendientes)
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        """📊 Profundidad de cola, subidas, reintentos y antigüedad del más viejo"""
+        with self._cond:
+            ahora = time.monotonic()
+            mas_antiguo = min((e["desde"] for e in self._pendientes.values()), default=None)
+            return {
+                "ventana": self.ventana,
+                "pendientes": len(self._pendientes),
+                "en_reintento": sum(1 for e in self._pendientes.values() if e["intentos"]),
+                "subiendo": len(self._en_curso),
+                "antiguedad_s": round(ahora - mas_antiguo, 1) if mas_antiguo is not None else 0.0,
+                "encolados": self._stats["encolados"],
+                "coalescidos": self._stats["coalescidos"],
+                "lotes": self._stats["lotes"],
+                "subidas": self._stats["subidas"],
+                "fallos": self._stats["fallos"],
+                "descartados": self._stats["descartados"],
+                "retraso_max_s": round(self._stats["retraso_max"], 1),
+                "ultimo_error": self.ultimo_error,
+            }
+
+__all__ = [
+    'GITHUB_SYNC_WINDOW',
+    'GITHUB_SYNC_BACKOFF',
+    'GITHUB_SYNC_BACKOFF_MAX',
+    'GITHUB_SYNC_DRAIN',
+    'GITHUB_BREAKER_FALLOS',
+    'GITHUB_BREAKER_ENFRIAMIENTO',
+    'CERRADO',
+    'ABIERTO',
+    'SEMIABIERTO',
+    'CircuitoGitHub',
+    'ColaSincronizacion',
+]
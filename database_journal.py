@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#██████╗ ███████╗████████╗██████╗  █████╗ ██╗     ███████╗
+#██╔══██╗██╔════╝╚══██╔══╝██╔══██╗██╔══██╗██║     ██╔════╝
+#██████╔╝███████╗   ██║   ██████╔╝███████║██║     ███████╗
+#██╔══██╗╚════██║   ██║   ██╔══██╗██╔══██║██║     ╚════██║
+#██║  ██║███████║   ██║   ██║  ██║██║  ██║███████╗███████║
+#╚═╝  ╚═╝╚══════╝   ╚═╝   ╚═╝  ╚═╝╚═╝  ╚═╝╚══════╝╚══════╝
+
+#🚀 ASTRO.IO v2.4.5 🚀
+#📜 database_journal.py - DIARIO DE ESCRITURA (WRITE-AHEAD LOG)
+#=======================================
+#✅ Cada cambio se añade al final de data/journal.log (una línea por entrada)
+#✅ Instantáneas en segundo plano a los JSON normales (y GitHub)
+#✅ Al arrancar: instantánea + reproducción del diario = sin pérdidas tras un reinicio
+#=======================================
+
+"""
+Se activa con STORAGE_BACKEND=journal.
+
+Formato del diario (una línea JSON por registro):
+    {"f": archivo, "k": clave, "v": valor}   -> fija una entrada
+    {"f": archivo, "k": clave, "x": 1}       -> elimina una entrada
+    {"f": archivo, "v": valor, "doc": 1}     -> documento completo
+    {"t": [registros...]}                    -> transacción (todo o nada)
+
+Los registros guardan siempre el valor final (nunca un delta), así que
+reproducir dos veces el mismo tramo del diario deja el mismo estado.
+"""
+
+import os
+import json
+import logging
+import threading
+from typing import Any, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ================= CONFIGURACIÓN =================
+JOURNAL_PATH = os.getenv("JOURNAL_PATH", os.path.join("data", "journal.log"))
+JOURNAL_SNAPSHOT_INTERVAL = float(os.getenv("JOURNAL_SNAPSHOT_INTERVAL", "300"))
+JOURNAL_MAX_BYTES = int(float(os.getenv("JOURNAL_MAX_MB", "8")) * 1024 * 1024)
+JOURNAL_FSYNC = os.getenv("JOURNAL_FSYNC", "false").lower() == "true"
+
+# Tipos de documento en memoria
+TIPO_DICT = "dict"
+TIPO_RAW = "raw"
+
+def _serializar(valor: Any) -> str:
+    return json.dumps(valor, ensure_ascii=False, separators=(",", ":"))
+
+class BackendDiario:
+    """📜 Estado en memoria + diario de cambios + instantáneas sobre otro backend"""
+
+    nombre = "journal"
+
+    def __init__(self, base, ruta_diario: str = JOURNAL_PATH):
+        # Backend donde se escriben las instantáneas (JSON local + GitHub)
+        self._base = base
+        self.ruta_diario = ruta_diario
+        self.ruta_anterior = ruta_diario + ".old"
+        self._lock = threading.RLock()
+        self._snapshot_lock = threading.Lock()
+        # archivo -> (TIPO_DICT, {clave: json}) | (TIPO_RAW, json)
+        self._estado: Dict[str, Tuple[str, Any]] = {}
+        self._versiones: Dict[str, int] = {}
+        # Archivos con cambios posteriores a la última instantánea
+        self._sucios: Set[str] = set()
+        self._stats = {"registros": 0, "bytes": 0, "instantaneas": 0, "errores": 0}
+        self._evento = threading.Event()
+        self._cerrado = False
+
+        if os.path.dirname(ruta_diario):
+            os.makedirs(os.path.dirname(ruta_diario), exist_ok=True)
+
+        reproducidos = self._reproducir()
+        self._log = open(ruta_diario, "a", encoding="utf-8")
+        if reproducidos:
+            logger.info(f"📜 Diario reproducido: {reproducidos} registros")
+            self.instantanea()
+
+        self._hilo = threading.Thread(target=self._bucle_instantaneas, name="journal-snapshot", daemon=True)
+        self._hilo.start()
+
+    # ================= ESTADO EN MEMORIA =================
+
+    def _cargar(self, archivo: str) -> Optional[Tuple[str, Any]]:
+        """Estado del documento, leyéndolo de la última instantánea la primera vez"""
+        estado = self._estado.get(archivo)
+        if estado is None:
+            encontrado, data = self._base.leer(archivo)
+            if not encontrado:
+                return None
+            if isinstance(data, dict):
+                estado = (TIPO_DICT, {str(c): _serializar(v) for c, v in data.items()})
+            else:
+                estado = (TIPO_RAW, _serializar(data))
+            self._estado[archivo] = estado
+        return estado
+
+    @staticmethod
+    def _materializar(estado: Tuple[str, Any]) -> Any:
+        tipo, contenido = estado
+        if tipo == TIPO_RAW:
+            return json.loads(contenido)
+        return {clave: json.loads(valor) for clave, valor in contenido.items()}
+
+    def _aplicar(self, registro: Dict[str, Any]) -> None:
+        """Aplica un registro del diario al estado en memoria"""
+        archivo = registro["f"]
+        if registro.get("doc"):
+            valor = registro["v"]
+            if isinstance(valor, dict):
+                self._estado[archivo] = (TIPO_DICT, {str(c): _serializar(v) for c, v in valor.items()})
+            else:
+                self._estado[archivo] = (TIPO_RAW, _serializar(valor))
+        else:
+            estado = self._cargar(archivo)
+            if estado is None or estado[0] != TIPO_DICT:
+                estado = (TIPO_DICT, {})
+                self._estado[archivo] = estado
+            if registro.get("x"):
+                estado[1].pop(registro["k"], None)
+            else:
+                estado[1][registro["k"]] = _serializar(registro["v"])
+        self._sucios.add(archivo)
+        self._versiones[archivo] = self._versiones.get(archivo, 0) + 1
+
+    # ================= DIARIO =================
+
+    def _anotar(self, registros: list, agrupados: bool = False) -> bool:
+        """
+        ✍️ Añade registros al final del diario y los aplica en memoria.
+        Agrupados van en una sola línea {"t": [...]}: al reproducir se aplican
+        todos o ninguno (una línea cortada se descarta entera).
+        """
+        try:
+            if agrupados:
+                lineas = _serializar({"t": registros}) + "\n"
+            else:
+                lineas = "".join(_serializar(r) + "\n" for r in registros)
+        except (RuntimeError, TypeError, ValueError) as e:
+            logger.warning(f"⚠️ No se pudo serializar el registro del diario: {e}")
+            return False
+
+        with self._lock:
+            try:
+                self._log.write(lineas)
+                self._log.flush()
+                if JOURNAL_FSYNC:
+                    os.fsync(self._log.fileno())
+            except (OSError, ValueError) as e:
+                self._stats["errores"] += 1
+                logger.error(f"❌ Error escribiendo en el diario: {e}")
+                return False
+            for registro in registros:
+                self._aplicar(registro)
+            self._stats["registros"] += len(registros)
+            self._stats["bytes"] += len(lineas)
+            if self._log.tell() >= JOURNAL_MAX_BYTES:
+                self._evento.set()
+        return True
+
+    def _reproducir(self) -> int:
+        """🔁 Reaplica el diario pendiente (anterior + actual) sobre la instantánea"""
+        total = 0
+        for ruta in (self.ruta_anterior, self.ruta_diario):
+            if not os.path.exists(ruta):
+                continue
+            with open(ruta, "r", encoding="utf-8") as f:
+                for numero, linea in enumerate(f, 1):
+                    try:
+                        registro = json.loads(linea)
+                    except ValueError:
+                        # Última línea a medio escribir cuando el proceso murió
+                        logger.warning(f"⚠️ Registro ilegible en {ruta}:{numero}, se ignora")
+                        continue
+                    for r in registro.get("t", [registro]):
+                        self._aplicar(r)
+                        total += 1
+        return total
+
+    # ================= INSTANTÁNEAS =================
+
+    def _bucle_instantaneas(self) -> None:
+        while not self._cerrado:
+            self._evento.wait(JOURNAL_SNAPSHOT_INTERVAL)
+            self._evento.clear()
+            if self._cerrado:
+                break
+            try:
+                self.instantanea()
+            except Exception as e:
+                logger.error(f"❌ Error en la instantánea del diario: {e}")
+
+    def instantanea(self) -> bool:
+        """
+        📸 Escribe los documentos modificados en el backend base y compacta el diario.
+        El tramo del diario ya cubierto se aparta como .old y se borra al terminar;
+        si el proceso muere a mitad, se reproduce entero al arrancar.
+        """
+        with self._snapshot_lock:
+            with self._lock:
+                if not self._sucios:
+                    return True
+                capturados = {archivo: self._estado[archivo] for archivo in self._sucios}
+                capturados = {
+                    archivo: (tipo, dict(contenido) if tipo == TIPO_DICT else contenido)
+                    for archivo, (tipo, contenido) in capturados.items()
+                }
+                self._sucios.clear()
+                self._rotar()
+
+            fallidos = []
+            for archivo, estado in capturados.items():
+                if not self._base.escribir(archivo, self._materializar(estado)):
+                    fallidos.append(archivo)
+
+            with self._lock:
+                if fallidos:
+                    # Se conservan en el .old y se reintentan en la próxima instantánea
+                    self._sucios.update(fallidos)
+                    self._stats["errores"] += 1
+                    logger.warning(f"⚠️ Instantánea incompleta, pendientes: {', '.join(fallidos)}")
+                    return False
+                try:
+                    os.remove(self.ruta_anterior)
+                except FileNotFoundError:
+                    pass
+                self._stats["instantaneas"] += 1
+            logger.debug(f"📸 Instantánea del diario: {len(capturados)} documentos")
+            return True
+
+    def _rotar(self) -> None:
+        """Aparta el diario actual (se llama con el lock tomado)"""
+        self._log.close()
+        if os.path.exists(self.ruta_anterior):
+            # Una instantánea anterior falló: se acumula en el mismo .old
+            with open(self.ruta_diario, "r", encoding="utf-8") as origen, \
+                    open(self.ruta_anterior, "a", encoding="utf-8") as destino:
+                destino.write(origen.read())
+            os.remove(self.ruta_diario)
+        elif os.path.exists(self.ruta_diario):
+            os.replace(self.ruta_diario, self.ruta_anterior)
+        self._log = open(self.ruta_diario, "a", encoding="utf-8")
+
+    def cerrar(self) -> None:
+        """🛑 Instantánea final (sube el estado al backend base) y cierre del diario"""
+        self._cerrado = True
+        self._evento.set()
+        self.instantanea()
+        with self._lock:
+            self._log.close()
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pendientes"] = len(self._sucios)
+            try:
+                stats["tamano_diario"] = os.path.getsize(self.ruta_diario)
+            except OSError:
+                stats["tamano_diario"] = 0
+            return stats
+
+    # ================= INTERFAZ DE BACKEND =================
+
+    def por_clave(self, filepath: str) -> bool:
+        return True
+
+    def firma(self, filepath: str) -> Any:
+        archivo = os.path.normpath(filepath)
+        with self._lock:
+            if archivo in self._estado:
+                return "journal", self._versiones.get(archivo, 0)
+        return self._base.firma(filepath)
+
+    def existe(self, filepath: str) -> bool:
+        archivo = os.path.normpath(filepath)
+        with self._lock:
+            if archivo in self._estado:
+                return True
+        return self._base.existe(filepath)
+
+    def leer(self, filepath: str) -> Tuple[bool, Any]:
+        with self._lock:
+            estado = self._cargar(os.path.normpath(filepath))
+            if estado is None:
+                return False, None
+            return True, self._materializar(estado)
+
+    def _registros_documento(self, archivo: str, data: Any) -> list:
+        """Registros que llevan el estado actual al documento dado (solo lo que cambió)"""
+        if not isinstance(data, dict):
+            return [{"f": archivo, "v": data, "doc": 1}]
+        nuevos = {str(clave): _serializar(valor) for clave, valor in data.items()}
+        estado = self._cargar(archivo)
+        if estado is None or estado[0] != TIPO_DICT:
+            return [{"f": archivo, "v": data, "doc": 1}]
+        actuales = estado[1]
+        registros = [
+            {"f": archivo, "k": str(clave), "v": valor}
+            for clave, valor in data.items() if actuales.get(str(clave)) != nuevos[str(clave)]
+        ]
+        registros += [{"f": archivo, "k": clave, "x": 1} for clave in actuales.keys() - nuevos.keys()]
+        return registros
+
+    def escribir(self, filepath: str, data: Any) -> bool:
+        """Añade al diario SOLO las entradas que cambiaron respecto al estado actual"""
+        with self._lock:
+            try:
+                registros = self._registros_documento(os.path.normpath(filepath), data)
+            except (RuntimeError, TypeError, ValueError) as e:
+                logger.warning(f"⚠️ No se pudo serializar {filepath}: {e}")
+                return False
+            if not registros:
+                return True
+            return self._anotar(registros)
+
+    def escribir_lote(self, operaciones: list) -> bool:
+        """📦 Todas las escrituras de una transacción en UNA sola línea del diario"""
+        with self._lock:
+            registros = []
+            try:
+                for op in operaciones:
+                    archivo = os.path.normpath(op["f"])
+                    if op["op"] == "doc":
+                        registros += self._registros_documento(archivo, op["v"])
+                        continue
+                    estado = self._cargar(archivo)
+                    if estado is not None and estado[0] != TIPO_DICT:
+                        raise ValueError(f"{archivo} no es un documento por claves")
+                    registros.append({"f": archivo, "k": str(op["k"]), "v": op["v"]})
+            except (RuntimeError, TypeError, ValueError) as e:
+                logger.error(f"❌ Error preparando la escritura por lotes: {e}")
+                return False
+            if not registros:
+                return True
+            return self._anotar(registros, agrupados=True)
+
+    def leer_entrada(self, filepath: str, clave: str) -> Tuple[bool, Any]:
+        with self._lock:
+            estado = self._cargar(os.path.normpath(filepath))
+            if estado is None or estado[0] != TIPO_DICT or clave not in estado[1]:
+                return False, None
+            return True, json.loads(estado[1][clave])
+
+    def escribir_entrada(self, filepath: str, clave: str, valor: Any) -> bool:
+        archivo = os.path.normpath(filepath)
+        with self._lock:
+            estado = self._cargar(archivo)
+            if estado is not None and estado[0] != TIPO_DICT:
+                logger.warning(f"⚠️ {archivo} no es un documento por claves")
+                return False
+            return self._anotar([{"f": archivo, "k": str(clave), "v": valor}])
+
+    def parchear_entrada(self, filepath: str, clave: str, operaciones: list) -> Tuple[bool, Any]:
+        """🩹 Aplica el patch sobre la entrada en memoria y añade UN registro con el resultado"""
+        from database import aplicar_operaciones
+        archivo = os.path.normpath(filepath)
+        with self._lock:
+            estado = self._cargar(archivo)
+            if estado is not None and estado[0] != TIPO_DICT:
+                logger.warning(f"⚠️ {archivo} no es un documento por claves")
+                return False, None
+            actual = json.loads(estado[1][clave]) if estado is not None and clave in estado[1] else None
+            try:
+                valor = aplicar_operaciones(actual, operaciones)
+            except (TypeError, ValueError) as e:
+                logger.error(f"❌ Error aplicando patch en {archivo}[{clave}]: {e}")
+                return False, None
+            return self._anotar([{"f": archivo, "k": str(clave), "v": valor}]), valor
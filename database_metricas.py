@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#██████╗ ███████╗████████╗██████╗  █████╗ ██╗     ███████╗
+#██╔══██╗██╔════╝╚══██╔══╝██╔══██╗██╔══██╗██║     ██╔════╝
+#██████╔╝███████╗   ██║   ██████╔╝███████║██║     ███████╗
+#██╔══██╗╚════██║   ██║   ██╔══██╗██╔══██║██║     ╚════██║
+#██║  ██║███████║   ██║   ██║  ██║██║  ██║███████╗███████║
+#╚═╝  ╚═╝╚══════╝   ╚═╝   ╚═╝  ╚═╝╚═╝  ╚═╝╚══════╝╚══════╝
+
+#🚀 ASTRO.IO v2.4.5 🚀
+#📈 database_metricas.py - MÉTRICAS DE E/S POR ARCHIVO
+#=======================================
+#✅ Cargas, guardados, escrituras reales y bytes de cada archivo
+#✅ Tiempo de parseo/serialización y latencia de GitHub
+#✅ Contadores sin locks en el camino caliente (uno por hilo)
+#=======================================
+
+"""
+Cada hilo suma en su propia tabla {archivo: [contadores]}, así que registrar
+una métrica nunca espera a otro hilo. Solo se toma un lock la primera vez que
+un hilo registra algo, para dar de alta su tabla. La instantánea suma las
+tablas de todos los hilos; puede ir un incremento por detrás, nunca más.
+
+Los fragmentos por jugador (data/users/<id>/<seccion>.json) se agrupan bajo
+un solo nombre, "<seccion>.json (fragmentos)".
+"""
+
+import os
+import time
+import threading
+from typing import Any, Dict, List, Optional
+
+# ================= CAMPOS =================
+CAMPOS = (
+    "cargas",             # load_json / obtener_usuario pedidos por el juego
+    "guardados",          # save_json / guardar_usuario / patch pedidos por el juego
+    "coalescidas",        # guardados absorbidos por otro pendiente en la ventana
+    "escrituras",         # escrituras reales en el backend
+    "lecturas",           # lecturas reales del backend (fallos de caché)
+    "bytes_leidos",
+    "bytes_escritos",
+    "parseo_s",
+    "serializacion_s",
+    "github_peticiones",
+    "github_s",
+    "github_errores",
+    "github_limitadas",   # respuestas 403/429 (límite de peticiones)
+)
+_INDICE = {campo: i for i, campo in enumerate(CAMPOS)}
+
+USERS_DIRNAME = "users"
+
+def nombre_logico(filepath: str, data_dir: str = "data") -> str:
+    """🏷️ Nombre con el que se agrupa un archivo: ruta relativa a data/"""
+    ruta = os.path.normpath(filepath).replace(os.sep, "/")
+    prefijo = os.path.normpath(data_dir).replace(os.sep, "/") + "/"
+    if ruta.startswith(prefijo):
+        ruta = ruta[len(prefijo):]
+    partes = ruta.split("/")
+    if len(partes) == 3 and partes[0] == USERS_DIRNAME:
+        return f"{partes[2]} (fragmentos)"
+    return ruta
+
+# ================= REGISTRO =================
+
+class RegistroMetricas:
+    """📈 Contadores por archivo repartidos en una tabla por hilo"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._tablas: List[Dict[str, List[float]]] = []
+        self._alta_lock = threading.Lock()
+        # Totales en el último reinicio: se restan en la instantánea
+        self._base: Dict[str, List[float]] = {}
+        self.desde = time.time()
+
+    def _tabla(self) -> Dict[str, List[float]]:
+        tabla = getattr(self._local, "tabla", None)
+        if tabla is None:
+            tabla = self._local.tabla = {}
+            with self._alta_lock:
+                self._tablas.append(tabla)
+        return tabla
+
+    def sumar(self, archivo: str, campo: str, valor: float = 1) -> None:
+        """➕ Suma en la tabla del hilo actual (sin locks)"""
+        tabla = self._tabla()
+        fila = tabla.get(archivo)
+        if fila is None:
+            fila = tabla[archivo] = [0] * len(CAMPOS)
+        fila[_INDICE[campo]] += valor
+
+    def _totales(self) -> Dict[str, List[float]]:
+        totales: Dict[str, List[float]] = {}
+        for tabla in list(self._tablas):
+            for archivo, fila in list(tabla.items()):
+                acumulado = totales.setdefault(archivo, [0] * len(CAMPOS))
+                for i, valor in enumerate(list(fila)):
+                    acumulado[i] += valor
+        return totales
+
+    def instantanea(self, orden: str = "guardados", top: Optional[int] = None) -> Dict[str, Any]:
+        """
+        📸 Métricas por archivo desde el último reinicio.
+        Incluye cargas/guardados/escrituras por minuto y tiempos en ms.
+        """
+        segundos = max(time.time() - self.desde, 1e-9)
+        minutos = segundos / 60
+        archivos = {}
+        for archivo, fila in self._totales().items():
+            base = self._base.get(archivo)
+            if base is not None:
+                fila = [valor - anterior for valor, anterior in zip(fila, base)]
+            if not any(fila):
+                continue
+            m = dict(zip(CAMPOS, fila))
+            peticiones = m["github_peticiones"]
+            archivos[archivo] = {
+                "cargas": int(m["cargas"]),
+                "guardados": int(m["guardados"]),
+                "coalescidas": int(m["coalescidas"]),
+                "escrituras": int(m["escrituras"]),
+                "lecturas": int(m["lecturas"]),
+                "cargas_min": round(m["cargas"] / minutos, 2),
+                "guardados_min": round(m["guardados"] / minutos, 2),
+                "escrituras_min": round(m["escrituras"] / minutos, 2),
+                "bytes_leidos": int(m["bytes_leidos"]),
+                "bytes_escritos": int(m["bytes_escritos"]),
+                "parseo_ms": round(m["parseo_s"] * 1000, 2),
+                "serializacion_ms": round(m["serializacion_s"] * 1000, 2),
+                "github_peticiones": int(peticiones),
+                "github_rtt_ms": round(m["github_s"] / peticiones * 1000, 1) if peticiones else 0.0,
+                "github_errores": int(m["github_errores"]),
+                "github_limitadas": int(m["github_limitadas"]),
+            }
+
+        claves = sorted(archivos, key=lambda a: archivos[a].get(orden, 0), reverse=True)
+        if top is not None:
+            claves = claves[:top]
+        return {
+            "desde": self.desde,
+            "segundos": round(segundos, 1),
+            "archivos": {archivo: archivos[archivo] for archivo in claves},
+        }
+
+    def reiniciar(self) -> None:
+        """🔄 Empieza una nueva ventana de medición (no toca las tablas de los hilos)"""
+        self._base = self._totales()
+        self.desde = time.time()
+
+metricas = RegistroMetricas()
+
+__all__ = [
+    'CAMPOS',
+    'nombre_logico',
+    'RegistroMetricas',
+    'metricas',
+]
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#██████╗ ███████╗████████╗██████╗  █████╗ ██╗     ███████╗
+#██╔══██╗██╔════╝╚══██╔══╝██╔══██╗██╔══██╗██║     ██╔════╝
+#██████╔╝███████╗   ██║   ██████╔╝███████║██║     ███████╗
+#██╔══██╗╚════██║   ██║   ██╔══██╗██╔══██║██║     ╚════██║
+#██║  ██║███████║   ██║   ██║  ██║██║  ██║███████╗███████║
+#╚═╝  ╚═╝╚══════╝   ╚═╝   ╚═╝  ╚═╝╚═╝  ╚═╝╚══════╝╚══════╝
+
+#🚀 ASTRO.IO v2.4.5 🚀
+#🧩 database_shards.py - FRAGMENTOS JSON POR USUARIO
+#=======================================
+#✅ data/users/<id>/<seccion>.json para los documentos por jugador
+#✅ Solo se leen los fragmentos que toca cada petición
+#✅ Guardar a un jugador ya no reescribe a todos los demás
+#=======================================
+
+"""
+Se activa con STORAGE_BACKEND=sharded. Los archivos de ARCHIVOS_POR_USUARIO
+se reparten en un fragmento por jugador; el resto sigue siendo un JSON normal.
+La primera vez, cada data/<seccion>.json existente se reparte en fragmentos
+(el archivo original se conserva como respaldo).
+"""
+
+import os
+import json
+import logging
+import threading
+from urllib.parse import quote, unquote
+from typing import Any, Dict, Iterator, Set, Tuple
+
+from serializadores import decodificar
+
+logger = logging.getLogger(__name__)
+
+# ================= CONSTANTES =================
+ARCHIVOS_POR_USUARIO = (
+    "recursos.json",
+    "minas.json",
+    "edificios_usuario.json",
+    "flota_usuario.json",
+    "defensa_usuario.json",
+    "campos.json",
+    "colas_edificios.json",
+    "colas_flota.json",
+    "colas_defensa.json",
+)
+
+USERS_DIRNAME = "users"
+MANIFIESTO = "_secciones.json"
+
+def _huella(valor: Any) -> int:
+    """Huella del contenido para saber si un fragmento cambió"""
+    return hash(json.dumps(valor, ensure_ascii=False, sort_keys=True, separators=(",", ":")))
+
+class BackendFragmentado:
+    """🧩 Documentos por jugador repartidos en un archivo por usuario"""
+
+    nombre = "sharded"
+
+    def __init__(self, data_dir: str, backend_json):
+        self.data_dir = os.path.normpath(data_dir)
+        self.users_dir = os.path.join(self.data_dir, USERS_DIRNAME)
+        # Lectura/escritura de cada archivo individual (incluye GitHub si está activo)
+        self._json = backend_json
+        self._lock = threading.RLock()
+        self._secciones_validas = {nombre[:-len(".json")] for nombre in ARCHIVOS_POR_USUARIO}
+        # Secciones ya repartidas en fragmentos
+        self._secciones: Set[str] = set()
+        # Versión en proceso de cada sección: sirve de firma para la caché
+        self._versiones: Dict[str, int] = {}
+        # seccion -> {clave: huella} de lo último leído o escrito
+        self._huellas: Dict[str, Dict[str, int]] = {}
+
+        os.makedirs(self.users_dir, exist_ok=True)
+        self._cargar_manifiesto()
+        self._migrar_archivos_completos()
+
+    # ================= AUXILIARES =================
+
+    def _seccion(self, filepath: str):
+        """Nombre de la sección si el archivo se guarda fragmentado, o None"""
+        ruta = os.path.normpath(filepath)
+        if os.path.dirname(ruta) != self.data_dir:
+            return None
+        nombre = os.path.basename(ruta)
+        if not nombre.endswith(".json"):
+            return None
+        seccion = nombre[:-len(".json")]
+        return seccion if seccion in self._secciones_validas else None
+
+    def _ruta_fragmento(self, seccion: str, clave: str) -> str:
+        return os.path.join(self.users_dir, quote(str(clave), safe=""), f"{seccion}.json")
+
+    def _cargar_manifiesto(self) -> None:
+        ruta = os.path.join(self.users_dir, MANIFIESTO)
+        try:
+            with open(ruta, "r", encoding="utf-8") as f:
+                self._secciones = set(json.load(f))
+        except FileNotFoundError:
+            self._secciones = set()
+        except Exception as e:
+            logger.warning(f"⚠️ Manifiesto de fragmentos ilegible, se reconstruye: {e}")
+            self._secciones = set()
+
+    def _registrar_seccion(self, seccion: str) -> None:
+        with self._lock:
+            if seccion in self._secciones:
+                return
+            self._secciones.add(seccion)
+            from database import escribir_atomico
+            ruta = os.path.join(self.users_dir, MANIFIESTO)
+            escribir_atomico(ruta, json.dumps(sorted(self._secciones), indent=2))
+
+    def _migrar_archivos_completos(self) -> None:
+        """📥 Reparte en fragmentos los data/<seccion>.json que aún no lo están"""
+        for seccion in sorted(self._secciones_validas - self._secciones):
+            ruta = os.path.join(self.data_dir, f"{seccion}.json")
+            if not os.path.exists(ruta):
+                continue
+            try:
+                with open(ruta, "rb") as f:
+                    data = decodificar(f.read())
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo fragmentar {ruta}: {e}")
+                continue
+            if not isinstance(data, dict):
+                logger.warning(f"⚠️ {ruta} no es un documento por usuario, no se fragmenta")
+                continue
+            if self.escribir(ruta, data):
+                logger.info(f"🧩 {seccion}.json repartido en {len(data)} fragmentos")
+
+    def _tocar(self, seccion: str) -> None:
+        self._versiones[seccion] = self._versiones.get(seccion, 0) + 1
+
+    def _escribir_fragmento(self, seccion: str, clave: str, valor: Any) -> bool:
+        return self._json.escribir(self._ruta_fragmento(seccion, clave), valor)
+
+    # ================= INTERFAZ DE BACKEND =================
+
+    def por_clave(self, filepath: str) -> bool:
+        return self._seccion(filepath) is not None
+
+    def firma(self, filepath: str) -> Any:
+        seccion = self._seccion(filepath)
+        if seccion is None:
+            return self._json.firma(filepath)
+        if seccion not in self._secciones:
+            return None
+        return "sharded", self._versiones.get(seccion, 0)
+
+    def existe(self, filepath: str) -> bool:
+        seccion = self._seccion(filepath)
+        if seccion is None:
+            return self._json.existe(filepath)
+        return seccion in self._secciones
+
+    def iterar(self, filepath: str) -> Iterator[Tuple[str, Any]]:
+        """
+        🔁 Recorre los fragmentos de una sección uno a uno, leyendo de disco local.
+        Nunca tiene en memoria más de un fragmento a la vez.
+        """
+        seccion = self._seccion(filepath)
+        if seccion is None:
+            encontrado, data = self._json.leer(filepath)
+            if encontrado and isinstance(data, dict):
+                yield from data.items()
+            elif encontrado:
+                yield None, data
+            return
+
+        try:
+            entradas = sorted(os.scandir(self.users_dir), key=lambda e: e.name)
+        except FileNotFoundError:
+            return
+        for entrada in entradas:
+            if not entrada.is_dir():
+                continue
+            ruta = os.path.join(entrada.path, f"{seccion}.json")
+            try:
+                with open(ruta, "rb") as f:
+                    valor = decodificar(f.read())
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                logger.warning(f"⚠️ Fragmento ilegible {ruta}: {e}")
+                continue
+            yield unquote(entrada.name), valor
+
+    def leer(self, filepath: str) -> Tuple[bool, Any]:
+        seccion = self._seccion(filepath)
+        if seccion is None:
+            return self._json.leer(filepath)
+        if seccion not in self._secciones:
+            return False, None
+
+        data = dict(self.iterar(filepath))
+        with self._lock:
+            self._huellas[seccion] = {clave: _huella(valor) for clave, valor in data.items()}
+        return True, data
+
+    def escribir(self, filepath: str, data: Any) -> bool:
+        """
+        Guarda una sección completa escribiendo SOLO los fragmentos que cambiaron
+        y borrando los de usuarios que ya no están.
+        """
+        seccion = self._seccion(filepath)
+        if seccion is None:
+            return self._json.escribir(filepath, data)
+        if not isinstance(data, dict):
+            logger.error(f"❌ {filepath} debe ser un diccionario por usuario")
+            return False
+
+        try:
+            nuevas = {str(clave): _huella(valor) for clave, valor in data.items()}
+        except (RuntimeError, TypeError, ValueError) as e:
+            logger.warning(f"⚠️ No se pudo serializar {filepath}: {e}")
+            return False
+
+        with self._lock:
+            anteriores = self._huellas.get(seccion)
+            if anteriores is None:
+                # Sin lectura previa: comparar contra los fragmentos en disco
+                anteriores = {clave: None for clave, _ in self.iterar(filepath)}
+
+            todo_ok = True
+            for clave, valor in data.items():
+                clave = str(clave)
+                if anteriores.get(clave) == nuevas[clave]:
+                    continue
+                if not self._escribir_fragmento(seccion, clave, valor):
+                    todo_ok = False
+                    nuevas.pop(clave, None)
+
+            for clave in anteriores.keys() - nuevas.keys():
+                if clave in data:
+                    continue
+                ruta = self._ruta_fragmento(seccion, clave)
+                try:
+                    os.remove(ruta)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"⚠️ No se pudo borrar el fragmento {seccion}/{clave}: {e}")
+                    todo_ok = False
+                    continue
+                try:
+                    # Quitar la carpeta del usuario si ya no le queda ninguna sección
+                    os.rmdir(os.path.dirname(ruta))
+                except OSError:
+                    pass
+
+            self._huellas[seccion] = nuevas
+            self._registrar_seccion(seccion)
+            self._tocar(seccion)
+        return todo_ok
+
+    def leer_entrada(self, filepath: str, clave: str) -> Tuple[bool, Any]:
+        seccion = self._seccion(filepath)
+        if seccion is None:
+            return self._json.leer_entrada(filepath, clave)
+        return self._json.leer(self._ruta_fragmento(seccion, clave))
+
+    def escribir_entrada(self, filepath: str, clave: str, valor: Any) -> bool:
+        seccion = self._seccion(filepath)
+        if seccion is None:
+            return self._json.escribir_entrada(filepath, clave, valor)
+        if not self._escribir_fragmento(seccion, clave, valor):
+            return False
+        with self._lock:
+            if seccion in self._huellas:
+                self._huellas[seccion][str(clave)] = _huella(valor)
+            self._registrar_seccion(seccion)
+            self._tocar(seccion)
+        return True
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#██████╗ ███████╗████████╗██████╗  █████╗ ██╗     ███████╗
+#██╔══██╗██╔════╝╚══██╔══╝██╔══██╗██╔══██╗██║     ██╔════╝
+#██████╔╝███████╗   ██║   ██████╔╝███████║██║     ███████╗
+#██╔══██╗╚════██║   ██║   ██╔══██╗██╔══██║██║     ╚════██║
+#██║  ██║███████║   ██║   ██║  ██║██║  ██║███████╗███████║
+#╚═╝  ╚═╝╚══════╝   ╚═╝   ╚═╝  ╚═╝╚═╝  ╚═╝╚══════╝╚══════╝
+
+#🚀 ASTRO.IO v2.4.5 🚀
+#🗄️ database_sqlite.py - BACKEND SQLITE PARA load_json/save_json
+#=======================================
+#✅ Una tabla por archivo lógico, una fila por user_id / entidad
+#✅ Modo WAL - lecturas y escrituras por fila en O(1)
+#✅ Migración única desde data/*.json
+#=======================================
+
+"""
+Se activa con STORAGE_BACKEND=sqlite. La base se guarda en SQLITE_PATH
+(por defecto data/astroio.db).
+
+Migración manual:
+    python database_sqlite.py migrar [--forzar]
+"""
+
+import os
+import re
+import sys
+import json
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Tuple
+
+from serializadores import decodificar
+
+logger = logging.getLogger(__name__)
+
+# ================= CONSTANTES =================
+SQLITE_PATH = os.getenv("SQLITE_PATH", os.path.join("data", "astroio.db"))
+
+# Tipos de documento: 'dict' = una fila por clave, 'raw' = documento entero en una fila
+TIPO_DICT = "dict"
+TIPO_RAW = "raw"
+CLAVE_RAW = ""
+
+def _serializar(valor: Any) -> str:
+    return json.dumps(valor, ensure_ascii=False, separators=(",", ":"))
+
+class BackendSQLite:
+    """🗄️ Todos los documentos en una sola base SQLite, una tabla por archivo"""
+
+    nombre = "sqlite"
+
+    def __init__(self, ruta_db: str, data_dir: str, migrar_si_vacia: bool = True):
+        self.ruta_db = ruta_db
+        self.data_dir = data_dir
+        self._lock = threading.RLock()
+        # Versión en proceso de cada documento: sirve de firma para la caché
+        self._versiones: Dict[str, int] = {}
+
+        if os.path.dirname(ruta_db):
+            os.makedirs(os.path.dirname(ruta_db), exist_ok=True)
+        self._conn = sqlite3.connect(ruta_db, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS _documentos ("
+            "archivo TEXT PRIMARY KEY, tabla TEXT NOT NULL, tipo TEXT NOT NULL)"
+        )
+        self._documentos: Dict[str, Tuple[str, str]] = {
+            archivo: (tabla, tipo)
+            for archivo, tabla, tipo in self._conn.execute("SELECT archivo, tabla, tipo FROM _documentos")
+        }
+
+        if migrar_si_vacia and not self._documentos:
+            migrados = self.migrar_desde_json()
+            if migrados:
+                logger.info(f"🗄️ Migración inicial a SQLite: {migrados} archivos importados")
+
+    # ================= AUXILIARES =================
+
+    def _archivo(self, filepath: str) -> str:
+        """Nombre lógico del documento: ruta relativa a data/ si está dentro"""
+        ruta = os.path.normpath(filepath)
+        base = os.path.normpath(self.data_dir)
+        if ruta.startswith(base + os.sep):
+            ruta = ruta[len(base) + 1:]
+        return ruta.replace(os.sep, "/")
+
+    @staticmethod
+    def _nombre_tabla(archivo: str) -> str:
+        return "doc_" + re.sub(r"\W", "_", archivo.rsplit(".", 1)[0])
+
+    @contextmanager
+    def _transaccion(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            else:
+                self._conn.execute("COMMIT")
+
+    def _registrar(self, conn, archivo: str, tipo: str) -> str:
+        """Crea la tabla del documento si no existe y fija su tipo"""
+        actual = self._documentos.get(archivo)
+        tabla = actual[0] if actual else self._nombre_tabla(archivo)
+        if actual is None:
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS "{tabla}" ('
+                "clave TEXT PRIMARY KEY, valor TEXT NOT NULL)"
+            )
+        if actual is None or actual[1] != tipo:
+            if actual is not None:
+                conn.execute(f'DELETE FROM "{tabla}"')
+            conn.execute(
+                "INSERT INTO _documentos (archivo, tabla, tipo) VALUES (?, ?, ?) "
+                "ON CONFLICT(archivo) DO UPDATE SET tipo = excluded.tipo",
+                (archivo, tabla, tipo)
+            )
+            self._documentos[archivo] = (tabla, tipo)
+        return tabla
+
+    def _tocar(self, archivo: str) -> None:
+        self._versiones[archivo] = self._versiones.get(archivo, 0) + 1
+
+    # ================= INTERFAZ DE BACKEND =================
+
+    def por_clave(self, filepath: str) -> bool:
+        return True
+
+    def firma(self, filepath: str) -> Any:
+        archivo = self._archivo(filepath)
+        if archivo not in self._documentos:
+            return None
+        return "sqlite", self._versiones.get(archivo, 0)
+
+    def existe(self, filepath: str) -> bool:
+        return self._archivo(filepath) in self._documentos
+
+    def leer(self, filepath: str) -> Tuple[bool, Any]:
+        archivo = self._archivo(filepath)
+        with self._lock:
+            doc = self._documentos.get(archivo)
+            if doc is None:
+                return False, None
+            tabla, tipo = doc
+            filas = self._conn.execute(f'SELECT clave, valor FROM "{tabla}" ORDER BY rowid').fetchall()
+
+        if tipo == TIPO_RAW:
+            return (True, json.loads(filas[0][1])) if filas else (False, None)
+        return True, {clave: json.loads(valor) for clave, valor in filas}
+
+    def _escribir_en(self, conn, archivo: str, data: Any) -> None:
+        """Escribe el documento completo dentro de una transacción abierta"""
+        if isinstance(data, dict):
+            nuevos = {str(clave): _serializar(valor) for clave, valor in data.items()}
+            tabla = self._registrar(conn, archivo, TIPO_DICT)
+            actuales = dict(conn.execute(f'SELECT clave, valor FROM "{tabla}"'))
+            cambios = [(c, v) for c, v in nuevos.items() if actuales.get(c) != v]
+            borrados = [(c,) for c in actuales.keys() - nuevos.keys()]
+            if cambios:
+                conn.executemany(
+                    f'INSERT INTO "{tabla}" (clave, valor) VALUES (?, ?) '
+                    "ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor",
+                    cambios
+                )
+            if borrados:
+                conn.executemany(f'DELETE FROM "{tabla}" WHERE clave = ?', borrados)
+        else:
+            contenido = _serializar(data)
+            tabla = self._registrar(conn, archivo, TIPO_RAW)
+            conn.execute(
+                f'INSERT INTO "{tabla}" (clave, valor) VALUES (?, ?) '
+                "ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor",
+                (CLAVE_RAW, contenido)
+            )
+
+    def _escribir_entrada_en(self, conn, archivo: str, clave: str, valor: Any) -> None:
+        tabla = self._registrar(conn, archivo, TIPO_DICT)
+        conn.execute(
+            f'INSERT INTO "{tabla}" (clave, valor) VALUES (?, ?) '
+            "ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor",
+            (clave, _serializar(valor))
+        )
+
+    def escribir(self, filepath: str, data: Any) -> bool:
+        """
+        Guarda el documento completo escribiendo SOLO las filas que cambiaron.
+        """
+        archivo = self._archivo(filepath)
+        try:
+            with self._transaccion() as conn:
+                self._escribir_en(conn, archivo, data)
+            self._tocar(archivo)
+            return True
+        except (RuntimeError, TypeError, ValueError) as e:
+            logger.warning(f"⚠️ No se pudo serializar {filepath}: {e}")
+            return False
+        except sqlite3.Error as e:
+            logger.error(f"❌ Error guardando {archivo} en SQLite: {e}")
+            return False
+
+    def escribir_lote(self, operaciones: list) -> bool:
+        """📦 Varias escrituras (documentos o entradas) en UNA transacción SQLite"""
+        archivos = []
+        try:
+            with self._transaccion() as conn:
+                for op in operaciones:
+                    archivo = self._archivo(op["f"])
+                    doc = self._documentos.get(archivo)
+                    if op["op"] == "doc":
+                        self._escribir_en(conn, archivo, op["v"])
+                    elif doc is not None and doc[1] != TIPO_DICT:
+                        raise ValueError(f"{archivo} no es un documento por claves")
+                    else:
+                        self._escribir_entrada_en(conn, archivo, op["k"], op["v"])
+                    archivos.append(archivo)
+        except (sqlite3.Error, RuntimeError, TypeError, ValueError) as e:
+            logger.error(f"❌ Error en la escritura por lotes en SQLite: {e}")
+            # El ROLLBACK deshizo también las tablas registradas en esta transacción
+            self._documentos = {
+                archivo: (tabla, tipo)
+                for archivo, tabla, tipo in self._conn.execute("SELECT archivo, tabla, tipo FROM _documentos")
+            }
+            return False
+        for archivo in archivos:
+            self._tocar(archivo)
+        return True
+
+    def leer_entrada(self, filepath: str, clave: str) -> Tuple[bool, Any]:
+        archivo = self._archivo(filepath)
+        with self._lock:
+            doc = self._documentos.get(archivo)
+            if doc is None or doc[1] != TIPO_DICT:
+                return False, None
+            fila = self._conn.execute(
+                f'SELECT valor FROM "{doc[0]}" WHERE clave = ?', (clave,)
+            ).fetchone()
+        if fila is None:
+            return False, None
+        return True, json.loads(fila[0])
+
+    def escribir_entrada(self, filepath: str, clave: str, valor: Any) -> bool:
+        archivo = self._archivo(filepath)
+        doc = self._documentos.get(archivo)
+        if doc is not None and doc[1] != TIPO_DICT:
+            logger.warning(f"⚠️ {archivo} no es un documento por claves")
+            return False
+        try:
+            with self._transaccion() as conn:
+                self._escribir_entrada_en(conn, archivo, clave, valor)
+            self._tocar(archivo)
+            return True
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.error(f"❌ Error guardando {archivo}[{clave}] en SQLite: {e}")
+            return False
+
+    def parchear_entrada(self, filepath: str, clave: str, operaciones: list) -> Tuple[bool, Any]:
+        """🩹 Lee, modifica y reescribe UNA fila dentro de la misma transacción"""
+        from database import aplicar_operaciones
+        archivo = self._archivo(filepath)
+        doc = self._documentos.get(archivo)
+        if doc is not None and doc[1] != TIPO_DICT:
+            logger.warning(f"⚠️ {archivo} no es un documento por claves")
+            return False, None
+        try:
+            with self._transaccion() as conn:
+                tabla = self._registrar(conn, archivo, TIPO_DICT)
+                fila = conn.execute(f'SELECT valor FROM "{tabla}" WHERE clave = ?', (clave,)).fetchone()
+                valor = aplicar_operaciones(json.loads(fila[0]) if fila else None, operaciones)
+                conn.execute(
+                    f'INSERT INTO "{tabla}" (clave, valor) VALUES (?, ?) '
+                    "ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor",
+                    (clave, _serializar(valor))
+                )
+            self._tocar(archivo)
+            return True, valor
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.error(f"❌ Error aplicando patch en {archivo}[{clave}]: {e}")
+            return False, None
+
+    # ================= MIGRACIÓN =================
+
+    def migrar_desde_json(self, forzar: bool = False) -> int:
+        """
+        📥 Importa todos los data/*.json a la base.
+        Sin forzar, los documentos que ya existen en SQLite no se tocan.
+        Retorna el número de archivos importados.
+        """
+        if not os.path.isdir(self.data_dir):
+            return 0
+
+        importados = 0
+        for nombre in sorted(os.listdir(self.data_dir)):
+            if not nombre.endswith(".json"):
+                continue
+            ruta = os.path.join(self.data_dir, nombre)
+            if not forzar and self.existe(ruta):
+                continue
+            try:
+                with open(ruta, "rb") as f:
+                    data = decodificar(f.read())
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo migrar {nombre}: {e}")
+                continue
+            if self.escribir(ruta, data):
+                importados += 1
+                logger.info(f"📥 Migrado a SQLite: {nombre}")
+        return importados
+
+    def cerrar(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+# ================= EJECUCIÓN DIRECTA =================
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != "migrar":
+        print("Uso: python database_sqlite.py migrar [--forzar]")
+        sys.exit(1)
+    backend = BackendSQLite(SQLITE_PATH, "data", migrar_si_vacia=False)
+    total = backend.migrar_desde_json(forzar="--forzar" in sys.argv)
+    print(f"✅ {total} archivos migrados a {SQLITE_PATH}")
+    backend.cerrar()
@@ -24,7 +24,9 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 from login import AuthSystem, requiere_login
-from database import load_json, save_json
+from database import load_json, save_json, obtener_usuario, guardar_usuario, patch, transaction, TransaccionFallida
+from almacen import store
+from bloqueos import bloquea_usuario, bloquear, clave_usuario
 from utils import abreviar_numero
 from edificios import obtener_nivel
 
@@ -194,26 +196,16 @@ CONFIG_DEFENSAS = {
 # ================= FUNCIONES DE LECTURA =================
 
 def obtener_defensas(user_id: int) -> dict:
-    user_id_str = str(user_id)
-    data = load_json(DEFENSA_USUARIO_FILE) or {}
-    return data.get(user_id_str, {})
+    return obtener_usuario(user_id, DEFENSA_USUARIO_FILE)
 
 def guardar_defensas(user_id: int, defensas: dict) -> bool:
-    user_id_str = str(user_id)
-    data = load_json(DEFENSA_USUARIO_FILE) or {}
-    data[user_id_str] = defensas
-    return save_json(DEFENSA_USUARIO_FILE, data)
+    return guardar_usuario(user_id, DEFENSA_USUARIO_FILE, defensas)
 
 def obtener_recursos(user_id: int) -> dict:
-    user_id_str = str(user_id)
-    data = load_json(RECURSOS_FILE) or {}
-    return data.get(user_id_str, {})
+    return obtener_usuario(user_id, RECURSOS_FILE)
 
 def guardar_recursos(user_id: int, recursos: dict) -> bool:
-    user_id_str = str(user_id)
-    data = load_json(RECURSOS_FILE) or {}
-    data[user_id_str] = recursos
-    return save_json(RECURSOS_FILE, data)
+    return guardar_usuario(user_id, RECURSOS_FILE, recursos)
 
 def obtener_cantidad_defensa(user_id: int, tipo_defensa: str) -> int:
     defensas = obtener_defensas(user_id)
@@ -276,15 +268,10 @@ def calcular_tiempo_construccion(user_id: int, tipo_defensa: str, cantidad: int
 # ================= 📋 FUNCIONES DE COLA =================
 
 def obtener_cola(user_id: int) -> list:
-    user_id_str = str(user_id)
-    data = load_json(COLAS_DEFENSA_FILE) or {}
-    return data.get(user_id_str, [])
+    return obtener_usuario(user_id, COLAS_DEFENSA_FILE, [])
 
 def guardar_cola(user_id: int, cola: list) -> bool:
-    user_id_str = str(user_id)
-    data = load_json(COLAS_DEFENSA_FILE) or {}
-    data[user_id_str] = cola
-    return save_json(COLAS_DEFENSA_FILE, data)
+    return guardar_usuario(user_id, COLAS_DEFENSA_FILE, cola)
 
 def agregar_a_cola(user_id: int, tipo_defensa: str, cantidad: int, costo: dict, tiempo: int) -> tuple:
     cola = obtener_cola(user_id)
@@ -388,16 +375,6 @@ def construir_defensas(user_id: int, tipo_defensa: str, cantidad: int = 1) -> tu
     if not cumple_req:
         return False, msg_req
     
-    # Verificar recursos
-    cumple_rec, msg_rec = verificar_recursos_suficientes(user_id, tipo_defensa, cantidad)
-    if not cumple_rec:
-        return False, msg_rec
-    
-    # Verificar cola
-    cola = obtener_cola(user_id)
-    if len(cola) >= MAX_COLA_SIZE:
-        return False, f"❌ Límite de {MAX_COLA_SIZE} construcciones alcanzado"
-    
     # Calcular costo y tiempo
     costo_total = {}
     for recurso, valor in config["costo"].items():
@@ -406,20 +383,21 @@ def construir_defensas(user_id: int, tipo_defensa: str, cantidad: int = 1) -> tu
     
     tiempo = calcular_tiempo_construccion(user_id, tipo_defensa, cantidad)
     
-    # Descontar recursos
-    recursos = obtener_recursos(user_id)
-    for recurso, cantidad_req in costo_total.items():
-        recursos[recurso] = recursos.get(recurso, 0) - cantidad_req
-    guardar_recursos(user_id, recursos)
-    
-    # Agregar a cola
-    exito, msg_cola = agregar_a_cola(user_id, tipo_defensa, cantidad, costo_total, tiempo)
+    # Verificar recursos, encolar y descontar en una sola transacción: dos pedidos a la vez
+    # no gastan los mismos recursos y si algo falla no queda nada a medias.
+    # agregar_a_cola valida la cola antes de escribir, así que sin hueco no se cobra nada.
+    try:
+        with transaction():
+            exito, msg = verificar_recursos_suficientes(user_id, tipo_defensa, cantidad)
+            if exito:
+                exito, msg = agregar_a_cola(user_id, tipo_defensa, cantidad, costo_total, tiempo)
+            if exito:
+                patch(RECURSOS_FILE, user_id, [("incr", recurso, -cantidad_req) for recurso, cantidad_req in costo_total.items()])
+    except TransaccionFallida as e:
+        logger.error(f"❌ No se pudo iniciar {tipo_defensa} para {user_id}: {e}")
+        return False, "❌ No se pudo guardar la construcción, inténtalo de nuevo"
     if not exito:
-        # Reembolsar si falla
-        for recurso, cantidad_req in costo_total.items():
-            recursos[recurso] = recursos.get(recurso, 0) + cantidad_req
-        guardar_recursos(user_id, recursos)
-        return False, msg_cola
+        return False, msg
     
     username = AuthSystem.obtener_username(user_id)
     logger.info(f"🛡️ {username} inició construcción de {cantidad}x {config['nombre']} - {formatear_tiempo_corto(tiempo)}")
@@ -454,12 +432,13 @@ async def menu_defensa_principal(update: Update, context: ContextTypes.DEFAULT_T
     await query.answer()
     user_id = query.from_user.id
     
-    procesar_cola(user_id)
+    async with bloquear(clave_usuario(user_id)):
+        await store.ejecutar(procesar_cola, user_id)
     
-    recursos = obtener_recursos(user_id)
-    defensas = obtener_defensas(user_id)
-    cola = obtener_cola(user_id)
-    username_tag = AuthSystem.obtener_username(user_id)
+    recursos = await store.ejecutar(obtener_recursos, user_id)
+    defensas = await store.ejecutar(obtener_defensas, user_id)
+    cola = await store.ejecutar(obtener_cola, user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
     total_defensas = sum(defensas.values())
     
@@ -564,18 +543,18 @@ async def submenu_defensa(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     config = CONFIG_DEFENSAS[tipo_defensa]
     
-    recursos = obtener_recursos(user_id)
-    defensas = obtener_defensas(user_id)
-    cola = obtener_cola(user_id)
+    recursos = await store.ejecutar(obtener_recursos, user_id)
+    defensas = await store.ejecutar(obtener_defensas, user_id)
+    cola = await store.ejecutar(obtener_cola, user_id)
     cantidad_actual = defensas.get(tipo_defensa, 0)
-    nivel_hangar = obtener_nivel(user_id, "hangar")
-    username_tag = AuthSystem.obtener_username(user_id)
+    nivel_hangar = await store.ejecutar(obtener_nivel, user_id, "hangar")
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
-    tiempo_unitario = calcular_tiempo_construccion(user_id, tipo_defensa, 1)
+    tiempo_unitario = await store.ejecutar(calcular_tiempo_construccion, user_id, tipo_defensa, 1)
     tiempo_10 = tiempo_unitario * 10
     
-    cumple_requisitos, msg_req = verificar_requisitos(user_id, tipo_defensa)
-    puede_1, _ = verificar_recursos_suficientes(user_id, tipo_defensa, 1) if cumple_requisitos else (False, "")
+    cumple_requisitos, msg_req = await store.ejecutar(verificar_requisitos, user_id, tipo_defensa)
+    puede_1, _ = await store.ejecutar(verificar_recursos_suficientes, user_id, tipo_defensa, 1) if cumple_requisitos else (False, "")
     tiene_slot = len(cola) < MAX_COLA_SIZE
     
     tiempo_str = formatear_tiempo_corto(tiempo_unitario)
@@ -616,7 +595,7 @@ async def submenu_defensa(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     for req_def, cantidad_req in config["requisitos"].items():
         if req_def != "hangar":
-            cant_actual = obtener_cantidad_defensa(user_id, req_def)
+            cant_actual = await store.ejecutar(obtener_cantidad_defensa, user_id, req_def)
             estado = "✅" if cant_actual >= cantidad_req else "❌"
             nombre_def = CONFIG_DEFENSAS.get(req_def, {}).get("nombre", req_def)
             mensaje += f"   {estado} {nombre_def}: {cantidad_req} (tienes: {cant_actual})\n"
@@ -668,6 +647,7 @@ async def submenu_defensa(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 @requiere_login
+@bloquea_usuario
 async def confirmar_construccion_defensa_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -682,9 +662,9 @@ async def confirmar_construccion_defensa_handler(update: Update, context: Contex
         return
     
     config = CONFIG_DEFENSAS[tipo_defensa]
-    cola = obtener_cola(user_id)
+    cola = await store.ejecutar(obtener_cola, user_id)
     
-    cumple_req, msg_req = verificar_requisitos(user_id, tipo_defensa)
+    cumple_req, msg_req = await store.ejecutar(verificar_requisitos, user_id, tipo_defensa)
     if not cumple_req:
         keyboard = [[InlineKeyboardButton("◀️ VOLVER", callback_data=f"defensa_{tipo_defensa}")]]
         await query.edit_message_text(
@@ -701,8 +681,8 @@ async def confirmar_construccion_defensa_handler(update: Update, context: Contex
         )
         return
     
-    cumple_rec, msg_rec = verificar_recursos_suficientes(user_id, tipo_defensa, cantidad)
-    tiempo = calcular_tiempo_construccion(user_id, tipo_defensa, cantidad)
+    cumple_rec, msg_rec = await store.ejecutar(verificar_recursos_suficientes, user_id, tipo_defensa, cantidad)
+    tiempo = await store.ejecutar(calcular_tiempo_construccion, user_id, tipo_defensa, cantidad)
     
     costo_total = {}
     for recurso, valor in config["costo"].items():
@@ -713,7 +693,7 @@ async def confirmar_construccion_defensa_handler(update: Update, context: Contex
     
     mensaje = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
-        f"🔨 <b>CONFIRMAR CONSTRUCCIÓN</b> - {AuthSystem.obtener_username(user_id)}\n"
+        f"🔨 <b>CONFIRMAR CONSTRUCCIÓN</b> - {await store.ejecutar(AuthSystem.obtener_username, user_id)}\n"
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n\n"
         f"{config['icono']} {config['nombre']}\n"
         f"Cantidad: <b>{cantidad}</b>\n\n"
@@ -752,6 +732,7 @@ async def confirmar_construccion_defensa_handler(update: Update, context: Contex
     )
 
 @requiere_login
+@bloquea_usuario
 async def comprar_defensa_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -761,7 +742,7 @@ async def comprar_defensa_handler(update: Update, context: ContextTypes.DEFAULT_
     tipo_defensa = "_".join(partes[2:-1])
     cantidad = int(partes[-1])
     
-    exito, mensaje = construir_defensas(user_id, tipo_defensa, cantidad)
+    exito, mensaje = await store.ejecutar(construir_defensas, user_id, tipo_defensa, cantidad)
     
     if exito:
         keyboard = [
@@ -791,10 +772,11 @@ async def ver_cola_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
-    procesar_cola(user_id)
-    cola = obtener_cola(user_id)
+    async with bloquear(clave_usuario(user_id)):
+        await store.ejecutar(procesar_cola, user_id)
+    cola = await store.ejecutar(obtener_cola, user_id)
     
     if not cola:
         mensaje = (
@@ -851,6 +833,7 @@ async def ver_cola_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 @requiere_login
+@bloquea_usuario
 async def cancelar_construccion_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -858,7 +841,7 @@ async def cancelar_construccion_handler(update: Update, context: ContextTypes.DE
     user_id = query.from_user.id
     posicion = int(query.data.split("_")[2])
     
-    exito, mensaje, reembolso = cancelar_construccion(user_id, posicion)
+    exito, mensaje, reembolso = await store.ejecutar(cancelar_construccion, user_id, posicion)
     
     if exito:
         texto = (
@@ -908,7 +891,7 @@ async def personalizar_cantidad_defensa_handler(update: Update, context: Context
     
     mensaje = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
-        f"✏️ <b>CANTIDAD PERSONALIZADA</b> - {AuthSystem.obtener_username(user_id)}\n"
+        f"✏️ <b>CANTIDAD PERSONALIZADA</b> - {await store.ejecutar(AuthSystem.obtener_username, user_id)}\n"
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n\n"
         f"{config['icono']} {config['nombre']}\n\n"
         f"💰 Costo por unidad:\n"
@@ -931,6 +914,7 @@ async def personalizar_cantidad_defensa_handler(update: Update, context: Context
     )
 
 @requiere_login
+@bloquea_usuario
 async def recibir_cantidad_personalizada_defensa(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
@@ -952,22 +936,22 @@ async def recibir_cantidad_personalizada_defensa(update: Update, context: Contex
         await update.message.reply_text("❌ La cantidad debe ser entre 1 y 10.000.")
         return
     
-    cumple_req, msg_req = verificar_requisitos(user_id, tipo_defensa)
+    cumple_req, msg_req = await store.ejecutar(verificar_requisitos, user_id, tipo_defensa)
     if not cumple_req:
         await update.message.reply_text(f"❌ {msg_req}")
         return
     
-    cola = obtener_cola(user_id)
+    cola = await store.ejecutar(obtener_cola, user_id)
     if len(cola) >= MAX_COLA_SIZE:
         await update.message.reply_text(f"❌ Cola llena ({len(cola)}/{MAX_COLA_SIZE})")
         return
     
-    cumple_rec, msg_rec = verificar_recursos_suficientes(user_id, tipo_defensa, cantidad)
+    cumple_rec, msg_rec = await store.ejecutar(verificar_recursos_suficientes, user_id, tipo_defensa, cantidad)
     if not cumple_rec:
         await update.message.reply_text(f"❌ {msg_rec}")
         return
     
-    exito, mensaje = construir_defensas(user_id, tipo_defensa, cantidad)
+    exito, mensaje = await store.ejecutar(construir_defensas, user_id, tipo_defensa, cantidad)
     
     if exito:
         await update.message.reply_text(mensaje, parse_mode="HTML")
@@ -978,11 +962,13 @@ async def recibir_cantidad_personalizada_defensa(update: Update, context: Contex
 
 async def procesar_colas_background(context: ContextTypes.DEFAULT_TYPE):
     logger.info("🔄 Procesando colas de defensa...")
-    colas_data = load_json(COLAS_DEFENSA_FILE) or {}
+    colas_data = await store.get(COLAS_DEFENSA_FILE) or {}
     for user_id_str in colas_data.keys():
         try:
             user_id = int(user_id_str)
-            procesar_cola(user_id)
+            # procesar_cola reescribe la cola entera: mismo bloqueo que los handlers que encolan
+            async with bloquear(clave_usuario(user_id)):
+                await store.ejecutar(procesar_cola, user_id)
         except Exception as e:
             logger.error(f"❌ Error procesando cola de {user_id_str}: {e}")
     logger.info("✅ Colas de defensa procesadas")
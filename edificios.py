@@ -24,7 +24,10 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 from login import AuthSystem, requiere_login
-from database import load_json, save_json
+from database import obtener_usuario, guardar_usuario, ver_usuario, patch, transaction, en_transaccion, TransaccionFallida
+from almacen import store
+from bloqueos import bloquea_usuario, bloquear, clave_usuario
+from migraciones import normalizar_nivel
 from utils import abreviar_numero
 
 logger = logging.getLogger(__name__)
@@ -189,47 +192,38 @@ CONSTRUCCIONES = {
 # ================= FUNCIONES DE LECTURA =================
 
 def obtener_nivel(user_id: int, tipo: str) -> int:
-    user_id_str = str(user_id)
     if tipo in ["metal", "cristal", "deuterio"]:
-        data = load_json(MINAS_FILE) or {}
-        usuario = data.get(user_id_str, {})
-        nivel_data = usuario.get(tipo, 0)
+        usuario = ver_usuario(user_id, MINAS_FILE, {})
     else:
-        data = load_json(EDIFICIOS_USUARIO_FILE) or {}
-        usuario = data.get(user_id_str, {})
-        nivel_data = usuario.get(tipo, 0)
-    
-    if isinstance(nivel_data, dict):
-        return nivel_data.get("nivel", 0)
-    return int(nivel_data) if isinstance(nivel_data, (int, float)) else 0
+        usuario = ver_usuario(user_id, EDIFICIOS_USUARIO_FILE, {})
+    return normalizar_nivel(usuario.get(tipo, 0))
+
+def obtener_niveles(user_id: int) -> dict:
+    """📊 Nivel de cada construcción leyendo una sola vez minas y edificios del jugador"""
+    minas = ver_usuario(user_id, MINAS_FILE, {})
+    edificios = ver_usuario(user_id, EDIFICIOS_USUARIO_FILE, {})
+    return {
+        tipo: normalizar_nivel((minas if tipo in ["metal", "cristal", "deuterio"] else edificios).get(tipo, 0))
+        for tipo in CONSTRUCCIONES
+    }
 
 def obtener_campos(user_id: int) -> dict:
-    user_id_str = str(user_id)
-    campos_data = load_json(CAMPOS_FILE) or {}
-    return campos_data.get(user_id_str, {
+    return obtener_usuario(user_id, CAMPOS_FILE) or {
         "total": CAMPO_BASE_PLANETA,
         "usados": 0,
         "adicionales": 0
-    })
+    }
 
 def calcular_campos_usados(user_id: int) -> int:
-    user_id_str = str(user_id)
-    minas_data = load_json(MINAS_FILE) or {}
-    minas = minas_data.get(user_id_str, {})
-    edificios_data = load_json(EDIFICIOS_USUARIO_FILE) or {}
-    edificios = edificios_data.get(user_id_str, {})
+    minas = ver_usuario(user_id, MINAS_FILE, {})
+    edificios = ver_usuario(user_id, EDIFICIOS_USUARIO_FILE, {})
     
     total = 0
     for mina in ["metal", "cristal", "deuterio"]:
-        nivel = minas.get(mina, 0)
-        if isinstance(nivel, dict):
-            nivel = nivel.get("nivel", 0)
-        total += int(nivel) * 1
+        total += normalizar_nivel(minas.get(mina, 0)) * 1
     
     for edificio, nivel in edificios.items():
-        if isinstance(nivel, dict):
-            nivel = nivel.get("nivel", 0)
-        nivel = int(nivel)
+        nivel = normalizar_nivel(nivel)
         if edificio == "energia":
             total += nivel * 1
         elif edificio == "laboratorio":
@@ -242,15 +236,12 @@ def calcular_campos_usados(user_id: int) -> int:
     return total
 
 def actualizar_campos(user_id: int) -> dict:
-    user_id_str = str(user_id)
     campos = obtener_campos(user_id)
     campos_usados = calcular_campos_usados(user_id)
     
     if campos.get("usados", 0) != campos_usados:
         campos["usados"] = campos_usados
-        campos_data = load_json(CAMPOS_FILE) or {}
-        campos_data[user_id_str] = campos
-        save_json(CAMPOS_FILE, campos_data)
+        guardar_usuario(user_id, CAMPOS_FILE, campos)
     
     return campos
 
@@ -298,9 +289,7 @@ def verificar_requisitos(user_id: int, tipo: str) -> tuple:
     return True, "✅ Requisitos cumplidos"
 
 def verificar_recursos(user_id: int, tipo: str, nivel_actual: int) -> tuple:
-    user_id_str = str(user_id)
-    recursos_data = load_json(RECURSOS_FILE) or {}
-    recursos = recursos_data.get(user_id_str, {})
+    recursos = ver_usuario(user_id, RECURSOS_FILE, {})
     costo = calcular_costo(tipo, nivel_actual)
     
     faltantes = []
@@ -325,15 +314,10 @@ def verificar_campos(user_id: int, tipo: str) -> tuple:
 # ================= 📋 FUNCIONES DE COLA =================
 
 def obtener_cola(user_id: int) -> list:
-    user_id_str = str(user_id)
-    data = load_json(COLAS_EDIFICIOS_FILE) or {}
-    return data.get(user_id_str, [])
+    return obtener_usuario(user_id, COLAS_EDIFICIOS_FILE, [])
 
 def guardar_cola(user_id: int, cola: list) -> bool:
-    user_id_str = str(user_id)
-    data = load_json(COLAS_EDIFICIOS_FILE) or {}
-    data[user_id_str] = cola
-    return save_json(COLAS_EDIFICIOS_FILE, data)
+    return guardar_usuario(user_id, COLAS_EDIFICIOS_FILE, cola)
 
 def agregar_a_cola(user_id: int, tipo: str, nivel_objetivo: int, costo: dict) -> tuple:
     cola = obtener_cola(user_id)
@@ -362,6 +346,14 @@ def agregar_a_cola(user_id: int, tipo: str, nivel_objetivo: int, costo: dict) ->
     return True, f"✅ Construcción añadida a la cola", tiempo
 
 def procesar_cola(user_id: int) -> list:
+    """✅ Aplica las construcciones terminadas; niveles, campos y cola se guardan juntos"""
+    try:
+        return en_transaccion(_procesar_cola, user_id)
+    except TransaccionFallida as e:
+        logger.error(f"❌ No se pudo procesar la cola de {user_id}: {e}")
+        return []
+
+def _procesar_cola(user_id: int) -> list:
     cola = obtener_cola(user_id)
     if not cola:
         return []
@@ -378,31 +370,17 @@ def procesar_cola(user_id: int) -> list:
                 nivel = item["nivel_objetivo"]
                 
                 if tipo in ["metal", "cristal", "deuterio"]:
-                    minas_data = load_json(MINAS_FILE) or {}
-                    minas_usuario = minas_data.get(str(user_id), {})
-                    minas_usuario[tipo] = nivel
-                    minas_data[str(user_id)] = minas_usuario
-                    save_json(MINAS_FILE, minas_data)
+                    patch(MINAS_FILE, user_id, [("set", tipo, nivel)])
                 else:
-                    edificios_data = load_json(EDIFICIOS_USUARIO_FILE) or {}
-                    edificios_usuario = edificios_data.get(str(user_id), {})
-                    edificios_usuario[tipo] = nivel
-                    edificios_data[str(user_id)] = edificios_usuario
-                    save_json(EDIFICIOS_USUARIO_FILE, edificios_data)
+                    patch(EDIFICIOS_USUARIO_FILE, user_id, [("set", tipo, nivel)])
                 
                 if tipo == "terraformer":
-                    campos_data = load_json(CAMPOS_FILE) or {}
-                    campos = campos_data.get(str(user_id), {
-                        "total": CAMPO_BASE_PLANETA,
-                        "usados": 0,
-                        "adicionales": 0
-                    })
+                    campos = obtener_campos(user_id)
                     campos_adicionales = nivel * 5
                     campos["adicionales"] = campos_adicionales
                     campos["total"] = CAMPO_BASE_PLANETA + campos_adicionales
                     campos["usados"] = calcular_campos_usados(user_id)
-                    campos_data[str(user_id)] = campos
-                    save_json(CAMPOS_FILE, campos_data)
+                    guardar_usuario(user_id, CAMPOS_FILE, campos)
                 else:
                     actualizar_campos(user_id)
                 
@@ -421,6 +399,14 @@ def procesar_cola(user_id: int) -> list:
     return completadas
 
 def cancelar_construccion(user_id: int, posicion: int) -> tuple:
+    """❌ Quita la construcción de la cola y reembolsa el 50% en la misma transacción"""
+    try:
+        return en_transaccion(_cancelar_construccion, user_id, posicion)
+    except TransaccionFallida as e:
+        logger.error(f"❌ No se pudo cancelar la construcción de {user_id}: {e}")
+        return False, "❌ No se pudo cancelar, inténtalo de nuevo", {}
+
+def _cancelar_construccion(user_id: int, posicion: int) -> tuple:
     cola = obtener_cola(user_id)
     if posicion < 0 or posicion >= len(cola):
         return False, "❌ Posición inválida", {}
@@ -431,12 +417,7 @@ def cancelar_construccion(user_id: int, posicion: int) -> tuple:
         reembolso[recurso] = int(cantidad * 0.5)
     
     if reembolso:
-        recursos_data = load_json(RECURSOS_FILE) or {}
-        recursos = recursos_data.get(str(user_id), {})
-        for recurso, cantidad in reembolso.items():
-            recursos[recurso] = recursos.get(recurso, 0) + cantidad
-        recursos_data[str(user_id)] = recursos
-        save_json(RECURSOS_FILE, recursos_data)
+        patch(RECURSOS_FILE, user_id, [("incr", recurso, cantidad) for recurso, cantidad in reembolso.items()])
     
     guardar_cola(user_id, cola)
     return True, f"✅ Construcción cancelada. 50% reembolsado.", reembolso
@@ -457,32 +438,27 @@ def iniciar_construccion(user_id: int, tipo: str) -> tuple:
     if not cumple_req:
         return False, msg_req
     
-    cumple_rec, msg_rec = verificar_recursos(user_id, tipo, nivel_actual)
-    if not cumple_rec:
-        return False, msg_rec
-    
     cumple_cam, msg_cam = verificar_campos(user_id, tipo)
     if not cumple_cam:
         return False, msg_cam
     
     costo = calcular_costo(tipo, nivel_actual)
     
-    # Descontar recursos
-    recursos_data = load_json(RECURSOS_FILE) or {}
-    recursos = recursos_data.get(str(user_id), {})
-    for recurso, cantidad in costo.items():
-        recursos[recurso] = recursos.get(recurso, 0) - cantidad
-    recursos_data[str(user_id)] = recursos
-    save_json(RECURSOS_FILE, recursos_data)
-    
-    # Agregar a cola
-    exito, msg_cola, tiempo = agregar_a_cola(user_id, tipo, nivel_actual + 1, costo)
+    # Verificar recursos, encolar y descontar en una sola transacción: dos pedidos a la vez
+    # no gastan los mismos recursos y si algo falla no queda nada a medias.
+    # agregar_a_cola valida la cola antes de escribir, así que sin hueco no se cobra nada.
+    try:
+        with transaction():
+            exito, msg = verificar_recursos(user_id, tipo, nivel_actual)
+            if exito:
+                exito, msg, tiempo = agregar_a_cola(user_id, tipo, nivel_actual + 1, costo)
+            if exito:
+                patch(RECURSOS_FILE, user_id, [("incr", recurso, -cantidad) for recurso, cantidad in costo.items()])
+    except TransaccionFallida as e:
+        logger.error(f"❌ No se pudo iniciar {tipo} para {user_id}: {e}")
+        return False, "❌ No se pudo guardar la construcción, inténtalo de nuevo"
     if not exito:
-        for recurso, cantidad in costo.items():
-            recursos[recurso] = recursos.get(recurso, 0) + cantidad
-        recursos_data[str(user_id)] = recursos
-        save_json(RECURSOS_FILE, recursos_data)
-        return False, msg_cola
+        return False, msg
     
     cola = obtener_cola(user_id)
     username = AuthSystem.obtener_username(user_id)
@@ -516,15 +492,15 @@ async def menu_edificios_principal(update: Update, context: ContextTypes.DEFAULT
     await query.answer()
     user_id = query.from_user.id
     
-    procesar_cola(user_id)
+    async with bloquear(clave_usuario(user_id)):
+        await store.ejecutar(procesar_cola, user_id)
     
-    recursos_data = load_json(RECURSOS_FILE) or {}
-    recursos = recursos_data.get(str(user_id), {})
-    campos = actualizar_campos(user_id)
-    cola = obtener_cola(user_id)
-    username_tag = AuthSystem.obtener_username(user_id)
+    recursos = await store.ver_usuario(user_id, RECURSOS_FILE, {})
+    campos = await store.ejecutar(actualizar_campos, user_id)
+    cola = await store.ejecutar(obtener_cola, user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
-    niveles = {tipo: obtener_nivel(user_id, tipo) for tipo in CONSTRUCCIONES}
+    niveles = await store.ejecutar(obtener_niveles, user_id)
     
     mensaje = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -619,20 +595,19 @@ async def submenu_edificio(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     config = CONSTRUCCIONES[tipo]
-    nivel_actual = obtener_nivel(user_id, tipo)
-    recursos_data = load_json(RECURSOS_FILE) or {}
-    recursos = recursos_data.get(str(user_id), {})
-    username_tag = AuthSystem.obtener_username(user_id)
-    cola = obtener_cola(user_id)
+    nivel_actual = await store.ejecutar(obtener_nivel, user_id, tipo)
+    recursos = await store.ver_usuario(user_id, RECURSOS_FILE)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
+    cola = await store.ejecutar(obtener_cola, user_id)
     
     costo_proximo = calcular_costo(tipo, nivel_actual) if nivel_actual < config["max_nivel"] else {}
     tiempo_proximo = calcular_tiempo(tipo, nivel_actual) if nivel_actual < config["max_nivel"] else 0
     produccion_actual = calcular_produccion(tipo, nivel_actual)
     produccion_proximo = calcular_produccion(tipo, nivel_actual + 1) if nivel_actual < config["max_nivel"] else 0
     
-    cumple_requisitos, msg_req = verificar_requisitos(user_id, tipo)
-    cumple_recursos, msg_rec = verificar_recursos(user_id, tipo, nivel_actual) if nivel_actual < config["max_nivel"] else (False, "")
-    cumple_campos, msg_cam = verificar_campos(user_id, tipo) if nivel_actual < config["max_nivel"] else (False, "")
+    cumple_requisitos, msg_req = await store.ejecutar(verificar_requisitos, user_id, tipo)
+    cumple_recursos, msg_rec = await store.ejecutar(verificar_recursos, user_id, tipo, nivel_actual) if nivel_actual < config["max_nivel"] else (False, "")
+    cumple_campos, msg_cam = await store.ejecutar(verificar_campos, user_id, tipo) if nivel_actual < config["max_nivel"] else (False, "")
     tiene_slot = len(cola) < MAX_COLA_SIZE if nivel_actual < config["max_nivel"] else False
     
     puede_construir = (
@@ -720,6 +695,7 @@ async def submenu_edificio(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 @requiere_login
+@bloquea_usuario
 async def construir_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -727,7 +703,7 @@ async def construir_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = query.from_user.id
     tipo = query.data.replace("construir_", "")
     
-    exito, mensaje = iniciar_construccion(user_id, tipo)
+    exito, mensaje = await store.ejecutar(iniciar_construccion, user_id, tipo)
     
     if exito:
         keyboard = [
@@ -757,10 +733,11 @@ async def ver_cola_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
-    procesar_cola(user_id)
-    cola = obtener_cola(user_id)
+    async with bloquear(clave_usuario(user_id)):
+        await store.ejecutar(procesar_cola, user_id)
+    cola = await store.ejecutar(obtener_cola, user_id)
     
     if not cola:
         mensaje = (
@@ -817,6 +794,7 @@ async def ver_cola_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 @requiere_login
+@bloquea_usuario
 async def cancelar_construccion_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -824,7 +802,7 @@ async def cancelar_construccion_handler(update: Update, context: ContextTypes.DE
     user_id = query.from_user.id
     posicion = int(query.data.split("_")[2])
     
-    exito, mensaje, reembolso = cancelar_construccion(user_id, posicion)
+    exito, mensaje, reembolso = await store.ejecutar(cancelar_construccion, user_id, posicion)
     
     if exito:
         texto = (
@@ -864,11 +842,13 @@ async def cancelar_construccion_handler(update: Update, context: ContextTypes.DE
 
 async def procesar_colas_background(context: ContextTypes.DEFAULT_TYPE):
     logger.info("🔄 Procesando colas de construcción...")
-    colas_data = load_json(COLAS_EDIFICIOS_FILE) or {}
+    colas_data = await store.get(COLAS_EDIFICIOS_FILE) or {}
     for user_id_str in colas_data.keys():
         try:
             user_id = int(user_id_str)
-            procesar_cola(user_id)
+            # procesar_cola reescribe la cola entera: mismo bloqueo que los handlers que encolan
+            async with bloquear(clave_usuario(user_id)):
+                await store.ejecutar(procesar_cola, user_id)
         except Exception as e:
             logger.error(f"❌ Error procesando cola de {user_id_str}: {e}")
     logger.info("✅ Colas de construcción procesadas")
@@ -884,6 +864,7 @@ __all__ = [
     'procesar_colas_background',
     'CONSTRUCCIONES',
     'obtener_nivel',
+    'obtener_niveles',
     'calcular_produccion',
     'actualizar_campos'
 ]
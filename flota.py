@@ -24,7 +24,9 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 from login import AuthSystem, requiere_login
-from database import load_json, save_json
+from database import load_json, save_json, obtener_usuario, guardar_usuario, patch, transaction, TransaccionFallida
+from almacen import store
+from bloqueos import bloquea_usuario, bloquear, clave_usuario
 from utils import abreviar_numero
 from edificios import obtener_nivel
 
@@ -241,26 +243,16 @@ CONFIG_NAVES = {
 # ================= FUNCIONES DE LECTURA =================
 
 def obtener_flota(user_id: int) -> dict:
-    user_id_str = str(user_id)
-    data = load_json(FLOTA_USUARIO_FILE) or {}
-    return data.get(user_id_str, {})
+    return obtener_usuario(user_id, FLOTA_USUARIO_FILE)
 
 def guardar_flota(user_id: int, flota: dict) -> bool:
-    user_id_str = str(user_id)
-    data = load_json(FLOTA_USUARIO_FILE) or {}
-    data[user_id_str] = flota
-    return save_json(FLOTA_USUARIO_FILE, data)
+    return guardar_usuario(user_id, FLOTA_USUARIO_FILE, flota)
 
 def obtener_recursos(user_id: int) -> dict:
-    user_id_str = str(user_id)
-    data = load_json(RECURSOS_FILE) or {}
-    return data.get(user_id_str, {})
+    return obtener_usuario(user_id, RECURSOS_FILE)
 
 def guardar_recursos(user_id: int, recursos: dict) -> bool:
-    user_id_str = str(user_id)
-    data = load_json(RECURSOS_FILE) or {}
-    data[user_id_str] = recursos
-    return save_json(RECURSOS_FILE, data)
+    return guardar_usuario(user_id, RECURSOS_FILE, recursos)
 
 def verificar_requisitos(user_id: int, tipo_nave: str) -> tuple:
     if tipo_nave not in CONFIG_NAVES:
@@ -307,15 +299,10 @@ def calcular_tiempo_construccion(user_id: int, tipo_nave: str, cantidad: int = 1
 # ================= 📋 FUNCIONES DE COLA =================
 
 def obtener_cola(user_id: int) -> list:
-    user_id_str = str(user_id)
-    data = load_json(COLAS_FLOTA_FILE) or {}
-    return data.get(user_id_str, [])
+    return obtener_usuario(user_id, COLAS_FLOTA_FILE, [])
 
 def guardar_cola(user_id: int, cola: list) -> bool:
-    user_id_str = str(user_id)
-    data = load_json(COLAS_FLOTA_FILE) or {}
-    data[user_id_str] = cola
-    return save_json(COLAS_FLOTA_FILE, data)
+    return guardar_usuario(user_id, COLAS_FLOTA_FILE, cola)
 
 def agregar_a_cola(user_id: int, tipo_nave: str, cantidad: int, costo: dict, tiempo: int) -> tuple:
     cola = obtener_cola(user_id)
@@ -419,16 +406,6 @@ def construir_naves(user_id: int, tipo_nave: str, cantidad: int = 1) -> tuple:
     if not cumple_req:
         return False, msg_req
     
-    # Verificar recursos
-    cumple_rec, msg_rec = verificar_recursos_suficientes(user_id, tipo_nave, cantidad)
-    if not cumple_rec:
-        return False, msg_rec
-    
-    # Verificar cola
-    cola = obtener_cola(user_id)
-    if len(cola) >= MAX_COLA_SIZE:
-        return False, f"❌ Límite de {MAX_COLA_SIZE} construcciones alcanzado"
-    
     # Calcular costo y tiempo
     costo_total = {}
     for recurso, valor in config["costo"].items():
@@ -437,20 +414,21 @@ def construir_naves(user_id: int, tipo_nave: str, cantidad: int = 1) -> tuple:
     
     tiempo = calcular_tiempo_construccion(user_id, tipo_nave, cantidad)
     
-    # Descontar recursos
-    recursos = obtener_recursos(user_id)
-    for recurso, cantidad_req in costo_total.items():
-        recursos[recurso] = recursos.get(recurso, 0) - cantidad_req
-    guardar_recursos(user_id, recursos)
-    
-    # Agregar a cola
-    exito, msg_cola = agregar_a_cola(user_id, tipo_nave, cantidad, costo_total, tiempo)
+    # Verificar recursos, encolar y descontar en una sola transacción: dos pedidos a la vez
+    # no gastan los mismos recursos y si algo falla no queda nada a medias.
+    # agregar_a_cola valida la cola antes de escribir, así que sin hueco no se cobra nada.
+    try:
+        with transaction():
+            exito, msg = verificar_recursos_suficientes(user_id, tipo_nave, cantidad)
+            if exito:
+                exito, msg = agregar_a_cola(user_id, tipo_nave, cantidad, costo_total, tiempo)
+            if exito:
+                patch(RECURSOS_FILE, user_id, [("incr", recurso, -cantidad_req) for recurso, cantidad_req in costo_total.items()])
+    except TransaccionFallida as e:
+        logger.error(f"❌ No se pudo iniciar {tipo_nave} para {user_id}: {e}")
+        return False, "❌ No se pudo guardar la construcción, inténtalo de nuevo"
     if not exito:
-        # Reembolsar si falla
-        for recurso, cantidad_req in costo_total.items():
-            recursos[recurso] = recursos.get(recurso, 0) + cantidad_req
-        guardar_recursos(user_id, recursos)
-        return False, msg_cola
+        return False, msg
     
     username = AuthSystem.obtener_username(user_id)
     logger.info(f"🚀 {username} inició construcción de {cantidad}x {config['nombre']} - {formatear_tiempo_corto(tiempo)}")
@@ -485,12 +463,13 @@ async def menu_flota_principal(update: Update, context: ContextTypes.DEFAULT_TYP
     await query.answer()
     user_id = query.from_user.id
     
-    procesar_cola(user_id)
+    async with bloquear(clave_usuario(user_id)):
+        await store.ejecutar(procesar_cola, user_id)
     
-    recursos = obtener_recursos(user_id)
-    flota = obtener_flota(user_id)
-    cola = obtener_cola(user_id)
-    username_tag = AuthSystem.obtener_username(user_id)
+    recursos = await store.ejecutar(obtener_recursos, user_id)
+    flota = await store.ejecutar(obtener_flota, user_id)
+    cola = await store.ejecutar(obtener_cola, user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
     total_naves = sum(flota.values())
     
@@ -593,18 +572,18 @@ async def submenu_nave(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     config = CONFIG_NAVES[tipo_nave]
     
-    recursos = obtener_recursos(user_id)
-    flota = obtener_flota(user_id)
-    cola = obtener_cola(user_id)
+    recursos = await store.ejecutar(obtener_recursos, user_id)
+    flota = await store.ejecutar(obtener_flota, user_id)
+    cola = await store.ejecutar(obtener_cola, user_id)
     cantidad_actual = flota.get(tipo_nave, 0)
-    nivel_hangar = obtener_nivel(user_id, "hangar")
-    username_tag = AuthSystem.obtener_username(user_id)
+    nivel_hangar = await store.ejecutar(obtener_nivel, user_id, "hangar")
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
-    tiempo_unitario = calcular_tiempo_construccion(user_id, tipo_nave, 1)
+    tiempo_unitario = await store.ejecutar(calcular_tiempo_construccion, user_id, tipo_nave, 1)
     tiempo_10 = tiempo_unitario * 10
     
-    cumple_requisitos, msg_req = verificar_requisitos(user_id, tipo_nave)
-    puede_1, _ = verificar_recursos_suficientes(user_id, tipo_nave, 1) if cumple_requisitos else (False, "")
+    cumple_requisitos, msg_req = await store.ejecutar(verificar_requisitos, user_id, tipo_nave)
+    puede_1, _ = await store.ejecutar(verificar_recursos_suficientes, user_id, tipo_nave, 1) if cumple_requisitos else (False, "")
     tiene_slot = len(cola) < MAX_COLA_SIZE
     
     tiempo_str = formatear_tiempo_corto(tiempo_unitario)
@@ -685,6 +664,7 @@ async def submenu_nave(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 @requiere_login
+@bloquea_usuario
 async def confirmar_construccion_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -699,9 +679,9 @@ async def confirmar_construccion_handler(update: Update, context: ContextTypes.D
         return
     
     config = CONFIG_NAVES[tipo_nave]
-    cola = obtener_cola(user_id)
+    cola = await store.ejecutar(obtener_cola, user_id)
     
-    cumple_req, msg_req = verificar_requisitos(user_id, tipo_nave)
+    cumple_req, msg_req = await store.ejecutar(verificar_requisitos, user_id, tipo_nave)
     if not cumple_req:
         keyboard = [[InlineKeyboardButton("◀️ VOLVER", callback_data=f"nave_{tipo_nave}")]]
         await query.edit_message_text(
@@ -718,8 +698,8 @@ async def confirmar_construccion_handler(update: Update, context: ContextTypes.D
         )
         return
     
-    cumple_rec, msg_rec = verificar_recursos_suficientes(user_id, tipo_nave, cantidad)
-    tiempo = calcular_tiempo_construccion(user_id, tipo_nave, cantidad)
+    cumple_rec, msg_rec = await store.ejecutar(verificar_recursos_suficientes, user_id, tipo_nave, cantidad)
+    tiempo = await store.ejecutar(calcular_tiempo_construccion, user_id, tipo_nave, cantidad)
     
     costo_total = {}
     for recurso, valor in config["costo"].items():
@@ -730,7 +710,7 @@ async def confirmar_construccion_handler(update: Update, context: ContextTypes.D
     
     mensaje = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
-        f"🔨 <b>CONFIRMAR CONSTRUCCIÓN</b> - {AuthSystem.obtener_username(user_id)}\n"
+        f"🔨 <b>CONFIRMAR CONSTRUCCIÓN</b> - {await store.ejecutar(AuthSystem.obtener_username, user_id)}\n"
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n\n"
         f"{config['icono']} {config['nombre']}\n"
         f"Cantidad: <b>{cantidad}</b>\n\n"
@@ -769,6 +749,7 @@ async def confirmar_construccion_handler(update: Update, context: ContextTypes.D
     )
 
 @requiere_login
+@bloquea_usuario
 async def comprar_nave_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -778,7 +759,7 @@ async def comprar_nave_handler(update: Update, context: ContextTypes.DEFAULT_TYP
     tipo_nave = "_".join(partes[1:-1])
     cantidad = int(partes[-1])
     
-    exito, mensaje = construir_naves(user_id, tipo_nave, cantidad)
+    exito, mensaje = await store.ejecutar(construir_naves, user_id, tipo_nave, cantidad)
     
     if exito:
         keyboard = [
@@ -808,10 +789,11 @@ async def ver_cola_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
-    procesar_cola(user_id)
-    cola = obtener_cola(user_id)
+    async with bloquear(clave_usuario(user_id)):
+        await store.ejecutar(procesar_cola, user_id)
+    cola = await store.ejecutar(obtener_cola, user_id)
     
     if not cola:
         mensaje = (
@@ -868,6 +850,7 @@ async def ver_cola_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 @requiere_login
+@bloquea_usuario
 async def cancelar_construccion_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -875,7 +858,7 @@ async def cancelar_construccion_handler(update: Update, context: ContextTypes.DE
     user_id = query.from_user.id
     posicion = int(query.data.split("_")[2])
     
-    exito, mensaje, reembolso = cancelar_construccion(user_id, posicion)
+    exito, mensaje, reembolso = await store.ejecutar(cancelar_construccion, user_id, posicion)
     
     if exito:
         texto = (
@@ -925,7 +908,7 @@ async def personalizar_cantidad_handler(update: Update, context: ContextTypes.DE
     
     mensaje = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
-        f"✏️ <b>CANTIDAD PERSONALIZADA</b> - {AuthSystem.obtener_username(user_id)}\n"
+        f"✏️ <b>CANTIDAD PERSONALIZADA</b> - {await store.ejecutar(AuthSystem.obtener_username, user_id)}\n"
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n\n"
         f"{config['icono']} {config['nombre']}\n\n"
         f"💰 Costo por unidad:\n"
@@ -948,6 +931,7 @@ async def personalizar_cantidad_handler(update: Update, context: ContextTypes.DE
     )
 
 @requiere_login
+@bloquea_usuario
 async def recibir_cantidad_personalizada(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
@@ -969,22 +953,22 @@ async def recibir_cantidad_personalizada(update: Update, context: ContextTypes.D
         await update.message.reply_text("❌ La cantidad debe ser entre 1 y 10.000.")
         return
     
-    cumple_req, msg_req = verificar_requisitos(user_id, tipo_nave)
+    cumple_req, msg_req = await store.ejecutar(verificar_requisitos, user_id, tipo_nave)
     if not cumple_req:
         await update.message.reply_text(f"❌ {msg_req}")
         return
     
-    cola = obtener_cola(user_id)
+    cola = await store.ejecutar(obtener_cola, user_id)
     if len(cola) >= MAX_COLA_SIZE:
         await update.message.reply_text(f"❌ Cola llena ({len(cola)}/{MAX_COLA_SIZE})")
         return
     
-    cumple_rec, msg_rec = verificar_recursos_suficientes(user_id, tipo_nave, cantidad)
+    cumple_rec, msg_rec = await store.ejecutar(verificar_recursos_suficientes, user_id, tipo_nave, cantidad)
     if not cumple_rec:
         await update.message.reply_text(f"❌ {msg_rec}")
         return
     
-    exito, mensaje = construir_naves(user_id, tipo_nave, cantidad)
+    exito, mensaje = await store.ejecutar(construir_naves, user_id, tipo_nave, cantidad)
     
     if exito:
         await update.message.reply_text(mensaje, parse_mode="HTML")
@@ -995,11 +979,13 @@ async def recibir_cantidad_personalizada(update: Update, context: ContextTypes.D
 
 async def procesar_colas_background(context: ContextTypes.DEFAULT_TYPE):
     logger.info("🔄 Procesando colas de flota...")
-    colas_data = load_json(COLAS_FLOTA_FILE) or {}
+    colas_data = await store.get(COLAS_FLOTA_FILE) or {}
     for user_id_str in colas_data.keys():
         try:
             user_id = int(user_id_str)
-            procesar_cola(user_id)
+            # procesar_cola reescribe la cola entera: mismo bloqueo que los handlers que encolan
+            async with bloquear(clave_usuario(user_id)):
+                await store.ejecutar(procesar_cola, user_id)
         except Exception as e:
             logger.error(f"❌ Error procesando cola de {user_id_str}: {e}")
     logger.info("✅ Colas de flota procesadas")
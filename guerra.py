@@ -22,7 +22,9 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CallbackQueryHandler, ConversationHandler, CommandHandler, MessageHandler, filters
 
 from login import AuthSystem, requiere_login, requiere_admin
-from database import load_json, save_json
+from database import load_json, save_json, existe_json, ver_usuario
+from almacen import store
+from indice_alianzas import alianza_verificada
 from utils import abreviar_numero, formatear_tiempo
 
 logger = logging.getLogger(__name__)
@@ -70,18 +72,10 @@ PESOS_NAVES = {
 
 def obtener_alianza_usuario(user_id: int) -> tuple:
     """Obtiene la alianza de un usuario"""
-    user_id_str = str(user_id)
-    miembros_data = load_json(ALIANZA_MIEMBROS_FILE) or {}
-    
-    for alianza_id, miembros in miembros_data.items():
-        if isinstance(miembros, dict) and user_id_str in miembros:
-            datos = load_json(ALIANZA_DATOS_FILE) or {}
-            return alianza_id, datos.get(alianza_id, {})
-        elif isinstance(miembros, list) and user_id_str in miembros:
-            datos = load_json(ALIANZA_DATOS_FILE) or {}
-            return alianza_id, datos.get(alianza_id, {})
-    
-    return None, None
+    alianza_id = alianza_verificada(user_id)
+    if alianza_id is None:
+        return None, None
+    return alianza_id, ver_usuario(alianza_id, ALIANZA_DATOS_FILE)
 
 def obtener_miembros_alianza(alianza_id: str) -> dict:
     """Obtiene los miembros de una alianza"""
@@ -153,7 +147,7 @@ def guardar_configuracion_guerra(config: dict) -> bool:
 
 def inicializar_puntos_guerra():
     """📊 Inicializa el archivo de puntos de guerra"""
-    if not os.path.exists(PUNTOS_GUERRA_FILE):
+    if not existe_json(PUNTOS_GUERRA_FILE):
         estructura_inicial = {
             "temporada_actual": None,
             "fecha_inicio": None,
@@ -628,7 +622,7 @@ async def menu_guerra(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await query.answer()
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
     # Obtener alianza del usuario
     alianza_id, alianza_datos = obtener_alianza_usuario(user_id)
@@ -754,7 +748,7 @@ async def mis_puntos_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await query.answer()
     
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
     puntos_data = obtener_puntos_usuario(user_id)
     temporada = obtener_estado_temporada()
@@ -857,7 +851,7 @@ async def enviar_flotas_menu(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await query.answer()
     
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
     # Verificar temporada activa
     temporada = obtener_estado_temporada()
@@ -1729,6 +1723,3 @@ __all__ = [
     'menu_guerra',
     'config_guerra_global_menu'
 ]
-
-# Inicializar puntos de guerra al cargar el módulo
-inicializar_puntos_guerra()
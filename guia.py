@@ -23,6 +23,7 @@ from telegram.ext import ContextTypes
 
 from login import AuthSystem, requiere_login
 from database import load_json
+from almacen import store
 
 logger = logging.getLogger(__name__)
 
@@ -260,7 +261,7 @@ async def guia_desbloqueo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
     texto = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -301,7 +302,7 @@ async def guia_naves(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
     CONFIG_NAVES = cargar_config_naves()
     
@@ -357,7 +358,7 @@ async def guia_naves_todas(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
     # Obtener página
     data = query.data
@@ -436,7 +437,7 @@ async def guia_defensas(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
     CONFIG_DEFENSAS = cargar_config_defensas()
     
@@ -488,7 +489,7 @@ async def guia_defensas_todas(update: Update, context: ContextTypes.DEFAULT_TYPE
     await query.answer()
     
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
     # Obtener página
     data = query.data
@@ -555,7 +556,7 @@ async def guia_edificios(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
     CONSTRUCCIONES = cargar_config_edificios()
     
@@ -602,7 +603,7 @@ async def guia_investigacion(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await query.answer()
     
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
     INVESTIGACIONES = cargar_config_investigaciones()
     
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#██████╗ ███████╗████████╗██████╗  █████╗ ██╗     ███████╗
+#██╔══██╗██╔════╝╚══██╔══╝██╔══██╗██╔══██╗██║     ██╔════╝
+#██████╔╝███████╗   ██║   ██████╔╝███████║██║     ███████╗
+#██╔══██╗╚════██║   ██║   ██╔══██╗██╔══██║██║     ╚════██║
+#██║  ██║███████║   ██║   ██║  ██║██║  ██║███████╗███████║
+#╚═╝  ╚═╝╚══════╝   ╚═╝   ╚═╝  ╚═╝╚═╝  ╚═╝╚══════╝╚══════╝
+
+#🚀 ASTRO.IO v2.4.5 🚀
+#🗂️ indice_alianzas.py - ÍNDICE JUGADOR → ALIANZA
+#=======================================
+#✅ ¿En qué alianza está este jugador? en O(1), sin recorrer alianza_miembros.json
+#✅ Se mantiene al entrar, salir, ser expulsado o disolver la alianza
+#✅ Se reconstruye al arrancar y tras restaurar un backup
+#=======================================
+
+"""
+data/alianza_indice.json guarda {uid: alianza_id}. Es un dato derivado:
+la fuente de verdad sigue siendo alianza_miembros.json, y reconstruir_indice()
+lo vuelve a sacar de ahí si alguna vez se desincroniza.
+
+Cada cambio escribe solo la entrada del jugador. Al salir de la alianza la
+entrada queda a None en vez de borrarse; reconstruir_indice() las limpia.
+"""
+
+import os
+import logging
+from typing import Dict, Optional
+
+from database import load_json, save_json, ver_json, ver_usuario, guardar_usuario, VistaDict, VistaLista
+
+logger = logging.getLogger(__name__)
+
+# ================= CONSTANTES =================
+DATA_DIR = "data"
+ALIANZA_MIEMBROS_FILE = os.path.join(DATA_DIR, "alianza_miembros.json")
+ALIANZA_INDICE_FILE = os.path.join(DATA_DIR, "alianza_indice.json")
+
+# ================= CONSULTA =================
+
+def alianza_de_usuario(user_id: int) -> Optional[str]:
+    """🔎 ID de la alianza del jugador o None"""
+    return ver_usuario(user_id, ALIANZA_INDICE_FILE) or None
+
+def alianza_verificada(user_id: int) -> Optional[str]:
+    """🔎 alianza_de_usuario comprobada contra alianza_miembros.json (corrige la entrada si no cuadra)"""
+    alianza_id = alianza_de_usuario(user_id)
+    if alianza_id is None or str(user_id) in {str(uid) for uid in ver_usuario(alianza_id, ALIANZA_MIEMBROS_FILE)}:
+        return alianza_id
+    # Índice desincronizado: buscar al jugador entre los miembros
+    encontrada = construir_indice(ver_json(ALIANZA_MIEMBROS_FILE) or {}).get(str(user_id))
+    logger.warning(f"🗂️ Índice de alianzas corregido para {user_id}: {alianza_id} → {encontrada}")
+    if encontrada is None:
+        quitar_alianza(user_id, alianza_id)
+    else:
+        asignar_alianza(user_id, encontrada)
+    return encontrada
+
+# ================= MANTENIMIENTO =================
+
+def asignar_alianza(user_id: int, alianza_id: str) -> bool:
+    """➕ El jugador entra (o funda) alianza_id"""
+    if alianza_de_usuario(user_id) == alianza_id:
+        return True
+    return guardar_usuario(user_id, ALIANZA_INDICE_FILE, alianza_id)
+
+def quitar_alianza(user_id: int, alianza_id: Optional[str] = None) -> bool:
+    """➖ El jugador sale o es expulsado (solo si sigue apuntando a alianza_id)"""
+    actual = alianza_de_usuario(user_id)
+    if actual is None or (alianza_id is not None and actual != alianza_id):
+        return True
+    return guardar_usuario(user_id, ALIANZA_INDICE_FILE, None)
+
+def disolver_en_indice(alianza_id: str) -> bool:
+    """💥 Borra del índice a los miembros de una alianza (antes de borrar sus miembros)"""
+    exito = True
+    for uid in list(ver_usuario(alianza_id, ALIANZA_MIEMBROS_FILE)):
+        exito = quitar_alianza(uid, alianza_id) and exito
+    return exito
+
+def construir_indice(miembros_data: Dict) -> Dict[str, str]:
+    """🏗️ {uid: alianza_id} a partir de alianza_miembros.json (dict o lista de ids)"""
+    indice = {}
+    for alianza_id, miembros in (miembros_data or {}).items():
+        if isinstance(miembros, (dict, list, VistaDict, VistaLista)):
+            for uid in miembros:
+                indice[str(uid)] = alianza_id
+    return indice
+
+def reconstruir_indice() -> Dict[str, int]:
+    """
+    🔄 Rehace el índice desde alianza_miembros.json.
+    Solo escribe si cambió; retorna cuántos jugadores indexa y cuántos corrigió.
+    """
+    nuevo = construir_indice(load_json(ALIANZA_MIEMBROS_FILE) or {})
+    actual = load_json(ALIANZA_INDICE_FILE)
+    corregidos = 0
+    if actual != nuevo:
+        actual = {uid: aid for uid, aid in (actual or {}).items() if aid is not None}
+        corregidos = sum(1 for uid in set(actual) | set(nuevo) if actual.get(uid) != nuevo.get(uid))
+        save_json(ALIANZA_INDICE_FILE, nuevo)
+        logger.info(f"🗂️ Índice de alianzas reconstruido: {len(nuevo)} jugadores, {corregidos} corregidos")
+    return {"jugadores": len(nuevo), "corregidos": corregidos}
+
+__all__ = [
+    'ALIANZA_INDICE_FILE',
+    'alianza_de_usuario',
+    'alianza_verificada',
+    'asignar_alianza',
+    'quitar_alianza',
+    'disolver_en_indice',
+    'construir_indice',
+    'reconstruir_indice',
+]
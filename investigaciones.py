@@ -24,7 +24,8 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 from login import AuthSystem, requiere_login
-from database import load_json, save_json
+from database import load_json, save_json, existe_json, obtener_usuario, guardar_usuario
+from almacen import store
 from utils import abreviar_numero
 from edificios import obtener_nivel
 
@@ -172,7 +173,7 @@ INVESTIGACIONES = {
 
 def inicializar_db_investigaciones():
     """📁 Inicializa el archivo de investigaciones si no existe"""
-    if not os.path.exists(INVESTIGACIONES_FILE):
+    if not existe_json(INVESTIGACIONES_FILE):
         estructura = {
             "usuarios": {},
             "colas": {},
@@ -218,16 +219,11 @@ def guardar_investigacion(user_id: int, investigaciones: dict = None, cola: list
 
 def obtener_recursos(user_id: int) -> dict:
     """💰 Obtiene recursos del usuario"""
-    user_id_str = str(user_id)
-    recursos_data = load_json(RECURSOS_FILE) or {}
-    return recursos_data.get(user_id_str, {})
+    return obtener_usuario(user_id, RECURSOS_FILE)
 
 def guardar_recursos(user_id: int, recursos: dict) -> bool:
     """💾 Guarda recursos del usuario"""
-    user_id_str = str(user_id)
-    recursos_data = load_json(RECURSOS_FILE) or {}
-    recursos_data[user_id_str] = recursos
-    return save_json(RECURSOS_FILE, recursos_data)
+    return guardar_usuario(user_id, RECURSOS_FILE, recursos)
 
 # ================= FUNCIONES DE CÁLCULO =================
 
@@ -496,7 +492,7 @@ async def menu_investigaciones_principal(update: Update, context: ContextTypes.D
     datos_inv = obtener_datos_investigacion(user_id)
     nivel_lab = obtener_nivel(user_id, "laboratorio")
     slots_max = calcular_slots(nivel_lab)
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
     # Obtener investigaciones desbloqueadas
     desbloqueadas = obtener_investigaciones_desbloqueadas(user_id)
@@ -641,7 +637,7 @@ async def submenu_investigacion(update: Update, context: ContextTypes.DEFAULT_TY
     nivel_actual = datos_inv["investigaciones"].get(tipo, 0)
     nivel_lab = obtener_nivel(user_id, "laboratorio")
     slots_max = calcular_slots(nivel_lab)
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
     # Verificar desbloqueo
     desbloqueadas = obtener_investigaciones_desbloqueadas(user_id)
@@ -765,7 +761,7 @@ async def iniciar_investigacion_handler(update: Update, context: ContextTypes.DE
     
     exito, mensaje = iniciar_investigacion_db(user_id, tipo)
     
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
     if exito:
         logger.info(f"✅ {username_tag} inició investigación {tipo}")
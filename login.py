@@ -26,7 +26,8 @@ from typing import Dict, List, Optional, Tuple, Any
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
-from database import load_json, save_json
+from database import load_json, save_json, existe_json, obtener_usuario, guardar_usuario, ver_json, ver_usuario
+from almacen import store
 
 # Configurar logging más detallado
 logging.basicConfig(
@@ -170,7 +171,7 @@ def verificar_todos_archivos() -> Dict[str, str]:
     resultados = {}
     
     # admin.json - Asegurar que el admin principal existe
-    if not os.path.exists(ADMINS_FILE):
+    if not existe_json(ADMINS_FILE):
         logger.warning("⚠️ admin.json no existe - creando...")
         admins = {str(ADMIN_USER_ID): {
             "username": f"@{ADMIN_USER_ID}",
@@ -198,7 +199,7 @@ def verificar_todos_archivos() -> Dict[str, str]:
         resultados[ADMINS_FILE] = "existe"
     
     # authorized_users.json
-    if not os.path.exists(AUTHORIZED_USERS_FILE):
+    if not existe_json(AUTHORIZED_USERS_FILE):
         logger.warning("⚠️ authorized_users.json no existe - creando...")
         autorizados = [ADMIN_USER_ID]
         save_json(AUTHORIZED_USERS_FILE, autorizados)
@@ -213,7 +214,7 @@ def verificar_todos_archivos() -> Dict[str, str]:
         resultados[AUTHORIZED_USERS_FILE] = "existe"
     
     # config.json
-    if not os.path.exists(CONFIG_FILE):
+    if not existe_json(CONFIG_FILE):
         config = {
             "version": VERSION,
             "nombre_bot": "AstroIO",
@@ -231,35 +232,35 @@ def verificar_todos_archivos() -> Dict[str, str]:
         resultados[CONFIG_FILE] = "actualizado"
     
     # data.json
-    if not os.path.exists(DATA_FILE):
+    if not existe_json(DATA_FILE):
         save_json(DATA_FILE, {})
         resultados[DATA_FILE] = "creado"
     else:
         resultados[DATA_FILE] = "existe"
     
     # colas.json
-    if not os.path.exists(COLAS_FILE):
+    if not existe_json(COLAS_FILE):
         save_json(COLAS_FILE, {})
         resultados[COLAS_FILE] = "creado"
     else:
         resultados[COLAS_FILE] = "existe"
     
     # recursos.json
-    if not os.path.exists(RECURSOS_FILE):
+    if not existe_json(RECURSOS_FILE):
         save_json(RECURSOS_FILE, {})
         resultados[RECURSOS_FILE] = "creado"
     else:
         resultados[RECURSOS_FILE] = "existe"
     
     # recursos_usuario.json
-    if not os.path.exists(RECURSOS_USUARIO_FILE):
+    if not existe_json(RECURSOS_USUARIO_FILE):
         save_json(RECURSOS_USUARIO_FILE, {})
         resultados[RECURSOS_USUARIO_FILE] = "creado"
     else:
         resultados[RECURSOS_USUARIO_FILE] = "existe"
     
     # edificios.json
-    if not os.path.exists(EDIFICIOS_FILE):
+    if not existe_json(EDIFICIOS_FILE):
         edificios_config = {
             "energia": {"nombre": "Planta de Energía", "nivel_maximo": 100},
             "laboratorio": {"nombre": "Laboratorio", "nivel_maximo": 30},
@@ -272,91 +273,91 @@ def verificar_todos_archivos() -> Dict[str, str]:
         resultados[EDIFICIOS_FILE] = "existe"
     
     # edificios_usuario.json
-    if not os.path.exists(EDIFICIOS_USUARIO_FILE):
+    if not existe_json(EDIFICIOS_USUARIO_FILE):
         save_json(EDIFICIOS_USUARIO_FILE, {})
         resultados[EDIFICIOS_USUARIO_FILE] = "creado"
     else:
         resultados[EDIFICIOS_USUARIO_FILE] = "existe"
     
     # minas.json
-    if not os.path.exists(MINAS_FILE):
+    if not existe_json(MINAS_FILE):
         save_json(MINAS_FILE, {})
         resultados[MINAS_FILE] = "creado"
     else:
         resultados[MINAS_FILE] = "existe"
     
     # campos.json
-    if not os.path.exists(CAMPOS_FILE):
+    if not existe_json(CAMPOS_FILE):
         save_json(CAMPOS_FILE, {})
         resultados[CAMPOS_FILE] = "creado"
     else:
         resultados[CAMPOS_FILE] = "existe"
     
     # defensa.json
-    if not os.path.exists(DEFENSA_FILE):
+    if not existe_json(DEFENSA_FILE):
         save_json(DEFENSA_FILE, {})
         resultados[DEFENSA_FILE] = "creado"
     else:
         resultados[DEFENSA_FILE] = "existe"
     
     # defensa_usuario.json
-    if not os.path.exists(DEFENSA_USUARIO_FILE):
+    if not existe_json(DEFENSA_USUARIO_FILE):
         save_json(DEFENSA_USUARIO_FILE, {})
         resultados[DEFENSA_USUARIO_FILE] = "creado"
     else:
         resultados[DEFENSA_USUARIO_FILE] = "existe"
     
     # flota.json
-    if not os.path.exists(FLOTA_FILE):
+    if not existe_json(FLOTA_FILE):
         save_json(FLOTA_FILE, {})
         resultados[FLOTA_FILE] = "creado"
     else:
         resultados[FLOTA_FILE] = "existe"
     
     # flota_usuario.json
-    if not os.path.exists(FLOTA_USUARIO_FILE):
+    if not existe_json(FLOTA_USUARIO_FILE):
         save_json(FLOTA_USUARIO_FILE, {})
         resultados[FLOTA_USUARIO_FILE] = "creado"
     else:
         resultados[FLOTA_USUARIO_FILE] = "existe"
     
     # investigaciones.json
-    if not os.path.exists(INVESTIGACIONES_FILE):
+    if not existe_json(INVESTIGACIONES_FILE):
         save_json(INVESTIGACIONES_FILE, {})
         resultados[INVESTIGACIONES_FILE] = "creado"
     else:
         resultados[INVESTIGACIONES_FILE] = "existe"
     
     # investigaciones_usuario.json
-    if not os.path.exists(INVESTIGACIONES_USUARIO_FILE):
+    if not existe_json(INVESTIGACIONES_USUARIO_FILE):
         save_json(INVESTIGACIONES_USUARIO_FILE, {})
         resultados[INVESTIGACIONES_USUARIO_FILE] = "creado"
     else:
         resultados[INVESTIGACIONES_USUARIO_FILE] = "existe"
     
     # misiones_flota.json
-    if not os.path.exists(MISIONES_FLOTA_FILE):
+    if not existe_json(MISIONES_FLOTA_FILE):
         save_json(MISIONES_FLOTA_FILE, {})
         resultados[MISIONES_FLOTA_FILE] = "creado"
     else:
         resultados[MISIONES_FLOTA_FILE] = "existe"
     
     # bajas_flota.json
-    if not os.path.exists(BAJAS_FLOTA_FILE):
+    if not existe_json(BAJAS_FLOTA_FILE):
         save_json(BAJAS_FLOTA_FILE, {})
         resultados[BAJAS_FLOTA_FILE] = "creado"
     else:
         resultados[BAJAS_FLOTA_FILE] = "existe"
     
     # galaxia.json
-    if not os.path.exists(GALAXIA_FILE):
+    if not existe_json(GALAXIA_FILE):
         save_json(GALAXIA_FILE, {})
         resultados[GALAXIA_FILE] = "creado"
     else:
         resultados[GALAXIA_FILE] = "existe"
     
     # guia_cache.json
-    if not os.path.exists(GUIA_CACHE_FILE):
+    if not existe_json(GUIA_CACHE_FILE):
         guia_cache_inicial = {
             "ultima_actualizacion": datetime.now().isoformat(),
             "naves": {},
@@ -370,28 +371,28 @@ def verificar_todos_archivos() -> Dict[str, str]:
         resultados[GUIA_CACHE_FILE] = "existe"
     
     # alianza_datos.json
-    if not os.path.exists(ALIANZA_DATOS_FILE):
+    if not existe_json(ALIANZA_DATOS_FILE):
         save_json(ALIANZA_DATOS_FILE, {})
         resultados[ALIANZA_DATOS_FILE] = "creado"
     else:
         resultados[ALIANZA_DATOS_FILE] = "existe"
     
     # alianza_miembros.json
-    if not os.path.exists(ALIANZA_MIEMBROS_FILE):
+    if not existe_json(ALIANZA_MIEMBROS_FILE):
         save_json(ALIANZA_MIEMBROS_FILE, {})
         resultados[ALIANZA_MIEMBROS_FILE] = "creado"
     else:
         resultados[ALIANZA_MIEMBROS_FILE] = "existe"
     
     # alianza_banco.json
-    if not os.path.exists(ALIANZA_BANCO_FILE):
+    if not existe_json(ALIANZA_BANCO_FILE):
         save_json(ALIANZA_BANCO_FILE, {})
         resultados[ALIANZA_BANCO_FILE] = "creado"
     else:
         resultados[ALIANZA_BANCO_FILE] = "existe"
     
     # alianza_permisos.json
-    if not os.path.exists(ALIANZA_PERMISOS_FILE):
+    if not existe_json(ALIANZA_PERMISOS_FILE):
         save_json(ALIANZA_PERMISOS_FILE, {})
         resultados[ALIANZA_PERMISOS_FILE] = "creado"
     else:
@@ -425,17 +426,18 @@ class AuthSystem:
     
     @staticmethod
     def esta_registrado(user_id: int) -> bool:
-        data = load_json(DATA_FILE) or {}
-        return str(user_id) in data
+        # Basta con que exista la entrada, aunque esté vacía
+        ausente = object()
+        return ver_usuario(user_id, DATA_FILE, ausente) is not ausente
     
     @staticmethod
     def esta_autorizado(user_id: int) -> bool:
-        autorizados = load_json(AUTHORIZED_USERS_FILE) or []
+        autorizados = ver_json(AUTHORIZED_USERS_FILE) or []
         return user_id in autorizados
     
     @staticmethod
     def es_admin(user_id: int) -> bool:
-        admins = load_json(ADMINS_FILE) or {}
+        admins = ver_json(ADMINS_FILE) or {}
         return str(user_id) in admins
     
     @staticmethod
@@ -467,13 +469,11 @@ class AuthSystem:
     
     @staticmethod
     def obtener_usuario(user_id: int) -> dict:
-        data = load_json(DATA_FILE) or {}
-        return data.get(str(user_id), {})
+        return obtener_usuario(user_id, DATA_FILE)
     
     @staticmethod
     def obtener_username(user_id: int) -> str:
-        data = load_json(DATA_FILE) or {}
-        usuario = data.get(str(user_id), {})
+        usuario = ver_usuario(user_id, DATA_FILE, {})
         username = usuario.get("username", f"@{user_id}")
         if not username.startswith('@'):
             return f"@{username}"
@@ -481,51 +481,41 @@ class AuthSystem:
     
     @staticmethod
     def obtener_recursos(user_id: int) -> dict:
-        recursos_data = load_json(RECURSOS_FILE) or {}
-        return recursos_data.get(str(user_id), {})
+        return obtener_usuario(user_id, RECURSOS_FILE)
     
     @staticmethod
     def actualizar_recursos(user_id: int, recursos: dict) -> bool:
-        user_id_str = str(user_id)
-        recursos_data = load_json(RECURSOS_FILE) or {}
-        recursos_data[user_id_str] = recursos
-        return save_json(RECURSOS_FILE, recursos_data)
+        return guardar_usuario(user_id, RECURSOS_FILE, recursos)
     
     @staticmethod
     def obtener_minas(user_id: int) -> dict:
-        minas_data = load_json(MINAS_FILE) or {}
-        return minas_data.get(str(user_id), {
+        return obtener_usuario(user_id, MINAS_FILE, {
             "metal": 0, "cristal": 0, "deuterio": 0
         })
     
     @staticmethod
     def obtener_edificios(user_id: int) -> dict:
-        edificios_data = load_json(EDIFICIOS_USUARIO_FILE) or {}
-        return edificios_data.get(str(user_id), {
+        return obtener_usuario(user_id, EDIFICIOS_USUARIO_FILE, {
             "energia": 0, "laboratorio": 0, "hangar": 0, "terraformer": 0
         })
     
     @staticmethod
     def obtener_campos(user_id: int) -> dict:
-        campos_data = load_json(CAMPOS_FILE) or {}
-        return campos_data.get(str(user_id), {
+        return obtener_usuario(user_id, CAMPOS_FILE, {
             "total": 163, "usados": 0, "adicionales": 0
         })
     
     @staticmethod
     def obtener_flota(user_id: int) -> dict:
-        flota_data = load_json(FLOTA_USUARIO_FILE) or {}
-        return flota_data.get(str(user_id), {})
+        return obtener_usuario(user_id, FLOTA_USUARIO_FILE)
     
     @staticmethod
     def obtener_defensa(user_id: int) -> dict:
-        defensa_data = load_json(DEFENSA_USUARIO_FILE) or {}
-        return defensa_data.get(str(user_id), {})
+        return obtener_usuario(user_id, DEFENSA_USUARIO_FILE)
     
     @staticmethod
     def obtener_investigaciones(user_id: int) -> dict:
-        inv_data = load_json(INVESTIGACIONES_USUARIO_FILE) or {}
-        return inv_data.get(str(user_id), {})
+        return obtener_usuario(user_id, INVESTIGACIONES_USUARIO_FILE)
     
     @staticmethod
     def obtener_coordenadas(user_id: int) -> dict:
@@ -847,7 +837,7 @@ def requiere_login(func):
         if not user:
             return
         
-        if not AuthSystem.esta_autorizado(user.id):
+        if not await store.ejecutar(AuthSystem.esta_autorizado, user.id):
             if update.message:
                 await update.message.reply_text(
                     "❌ <b>No autorizado</b>\n\nUsa /start para solicitar acceso.",
@@ -867,7 +857,7 @@ def requiere_admin(func):
         if not user:
             return
         
-        if not AuthSystem.es_admin(user.id):
+        if not await store.ejecutar(AuthSystem.es_admin, user.id):
             if update.message:
                 await update.message.reply_text(
                     "❌ <b>Acceso denegado</b>\n\nSe requieren permisos de administrador.",
@@ -26,7 +26,9 @@ from telegram.ext import ContextTypes
 from telegram.error import BadRequest
 
 from login import AuthSystem, VERSION
-from database import load_json, save_json
+from database import obtener_usuario, guardar_usuario, ver_json, ver_usuario
+from almacen import store
+from migraciones import normalizar_nivel
 from utils import abreviar_numero, formatear_tiempo_corto
 
 logger = logging.getLogger(__name__)
@@ -46,40 +48,32 @@ COLAS_INVESTIGACION_FILE = os.path.join(DATA_DIR, "investigaciones.json")
 
 def obtener_coordenadas_reales(user_id: int) -> dict:
     """🪐 Obtiene coordenadas REALES del usuario desde usuarios.json"""
-    user_id_str = str(user_id)
-    usuarios_data = load_json(USUARIOS_FILE) or {}
+    coordenadas = obtener_usuario(user_id, USUARIOS_FILE)
     
-    if user_id_str not in usuarios_data:
+    if not coordenadas:
         # Generar coordenadas aleatorias para usuario nuevo
         galaxia = 1
         sistema = random.randint(1, 100)
         planeta = random.randint(1, 15)
-        usuarios_data[user_id_str] = {
+        coordenadas = {
             "galaxia": galaxia,
             "sistema": sistema,
             "planeta": planeta,
             "registro": datetime.now().isoformat()
         }
-        save_json(USUARIOS_FILE, usuarios_data)
+        guardar_usuario(user_id, USUARIOS_FILE, coordenadas)
         logger.info(f"🪐 Coordenadas generadas para {AuthSystem.obtener_username(user_id)}: {galaxia}:{sistema}:{planeta}")
     
-    return usuarios_data.get(user_id_str, {
-        "galaxia": 1,
-        "sistema": random.randint(1, 100),
-        "planeta": random.randint(1, 15)
-    })
+    return coordenadas
 
 def obtener_total_usuarios_real() -> int:
     """👥 Obtiene número REAL de usuarios autorizados"""
-    autorizados = load_json(AUTHORIZED_USERS_FILE) or []
+    autorizados = ver_json(AUTHORIZED_USERS_FILE) or []
     return len(autorizados)
 
 def obtener_recursos_reales(user_id: int) -> dict:
-    """💰 Obtiene recursos REALES desde recursos.json"""
-    user_id_str = str(user_id)
-    recursos_data = load_json(RECURSOS_FILE) or {}
-    
-    return recursos_data.get(user_id_str, {
+    """💰 Obtiene recursos REALES desde recursos.json (solo lectura)"""
+    return ver_usuario(user_id, RECURSOS_FILE, {
         "metal": 200,
         "cristal": 100,
         "deuterio": 0,
@@ -90,39 +84,26 @@ def obtener_recursos_reales(user_id: int) -> dict:
 
 def obtener_colas_edificios_reales(user_id: int) -> list:
     """🏗️ Obtiene colas de edificios REALES"""
-    user_id_str = str(user_id)
-    colas_data = load_json(COLAS_EDIFICIOS_FILE) or {}
-    return colas_data.get(user_id_str, [])
+    return ver_usuario(user_id, COLAS_EDIFICIOS_FILE, [])
 
 def obtener_colas_investigacion_reales(user_id: int) -> list:
     """🔬 Obtiene colas de investigación REALES"""
-    user_id_str = str(user_id)
-    colas_data = load_json(COLAS_INVESTIGACION_FILE) or {}
-    return colas_data.get(user_id_str, [])
+    return ver_usuario(user_id, COLAS_INVESTIGACION_FILE, [])
 
 def calcular_campos_usados_real(user_id: int) -> int:
     """📐 Calcula campos usados en tiempo REAL"""
-    user_id_str = str(user_id)
-    
-    minas_data = load_json(MINAS_FILE) or {}
-    minas = minas_data.get(user_id_str, {"metal": 0, "cristal": 0, "deuterio": 0})
-    
-    edificios_data = load_json(EDIFICIOS_USUARIO_FILE) or {}
-    edificios = edificios_data.get(user_id_str, {
+    minas = ver_usuario(user_id, MINAS_FILE, {"metal": 0, "cristal": 0, "deuterio": 0})
+    edificios = ver_usuario(user_id, EDIFICIOS_USUARIO_FILE, {
         "energia": 0, "laboratorio": 0, "hangar": 0, "terraformer": 0
     })
     
     campos_usados = 0
     
     for mina, nivel in minas.items():
-        if isinstance(nivel, dict):
-            nivel = nivel.get("nivel", 0)
-        campos_usados += int(nivel) * 1
+        campos_usados += normalizar_nivel(nivel) * 1
     
     for edificio, nivel in edificios.items():
-        if isinstance(nivel, dict):
-            nivel = nivel.get("nivel", 0)
-        nivel = int(nivel)
+        nivel = normalizar_nivel(nivel)
         
         if edificio == "energia":
             campos_usados += nivel * 1
@@ -137,21 +118,17 @@ def calcular_campos_usados_real(user_id: int) -> int:
 
 def obtener_campos_reales(user_id: int) -> dict:
     """🌍 Obtiene campos del planeta ACTUALIZADOS"""
-    user_id_str = str(user_id)
-    
-    campos_data = load_json(CAMPOS_FILE) or {}
-    campos = campos_data.get(user_id_str, {
+    campos = obtener_usuario(user_id, CAMPOS_FILE) or {
         "total": 163,
         "usados": 0,
         "adicionales": 0
-    })
+    }
     
     campos_usados = calcular_campos_usados_real(user_id)
     
     if campos.get("usados", 0) != campos_usados:
         campos["usados"] = campos_usados
-        campos_data[user_id_str] = campos
-        save_json(CAMPOS_FILE, campos_data)
+        guardar_usuario(user_id, CAMPOS_FILE, campos)
     
     return campos
 
@@ -273,16 +250,16 @@ async def menu_principal(update: Update, context: ContextTypes.DEFAULT_TYPE):
     username_tag = AuthSystem.formatear_username(user_id, query.from_user.first_name)
     
     # Coordenadas reales
-    coords = obtener_coordenadas_reales(user_id)
+    coords = await store.ejecutar(obtener_coordenadas_reales, user_id)
     galaxia = coords.get("galaxia", 1)
     sistema = coords.get("sistema", 1)
     planeta = coords.get("planeta", 1)
     
     # Total usuarios real
-    total_usuarios = obtener_total_usuarios_real()
+    total_usuarios = await store.ejecutar(obtener_total_usuarios_real)
     
     # Recursos reales
-    recursos = obtener_recursos_reales(user_id)
+    recursos = await store.ejecutar(obtener_recursos_reales, user_id)
     metal = abreviar_numero(recursos.get("metal", 200))
     cristal = abreviar_numero(recursos.get("cristal", 100))
     deuterio = abreviar_numero(recursos.get("deuterio", 0))
@@ -291,14 +268,14 @@ async def menu_principal(update: Update, context: ContextTypes.DEFAULT_TYPE):
     nxt = abreviar_numero(recursos.get("nxt20", 0))
     
     # Campos reales
-    campos = obtener_campos_reales(user_id)
+    campos = await store.ejecutar(obtener_campos_reales, user_id)
     campos_usados = campos.get("usados", 0)
     campos_totales = campos.get("total", 163)
     barra_campos = barra_progreso_corta(campos_usados, campos_totales)
     
     # ========== 🔥 COLAS DINÁMICAS - SOLO LO QUE HAY ==========
-    colas_edificios = obtener_colas_edificios_reales(user_id)
-    colas_investigacion = obtener_colas_investigacion_reales(user_id)
+    colas_edificios = await store.ejecutar(obtener_colas_edificios_reales, user_id)
+    colas_investigacion = await store.ejecutar(obtener_colas_investigacion_reales, user_id)
     
     # Procesar todas las colas
     edificios_procesados = []
@@ -360,7 +337,7 @@ async def menu_principal(update: Update, context: ContextTypes.DEFAULT_TYPE):
     mensaje += f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀"
     
     # ========== CONSTRUIR TECLADO CON BOTÓN DE MERCADO ==========
-    es_admin = AuthSystem.es_admin(user_id)
+    es_admin = await store.ejecutar(AuthSystem.es_admin, user_id)
     
     keyboard = [
         [InlineKeyboardButton("💰 RECURSOS", callback_data="menu_recursos")],
@@ -418,13 +395,13 @@ async def menu_bienvenida(context, user_id: int, username: str = None):
     username_tag = AuthSystem.formatear_username(user_id, username)
     
     # Generar coordenadas
-    coords = obtener_coordenadas_reales(user_id)
+    coords = await store.ejecutar(obtener_coordenadas_reales, user_id)
     galaxia = coords.get("galaxia", 1)
     sistema = coords.get("sistema", 1)
     planeta = coords.get("planeta", 1)
     
-    total_usuarios = obtener_total_usuarios_real()
-    es_admin = AuthSystem.es_admin(user_id)
+    total_usuarios = await store.ejecutar(obtener_total_usuarios_real)
+    es_admin = await store.ejecutar(AuthSystem.es_admin, user_id)
     
     mensaje = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -33,6 +33,9 @@ from telegram.ext import (
 from telegram.error import BadRequest
 
 from login import AuthSystem, requiere_login, requiere_admin
+from database import patch
+from almacen import store
+from bloqueos import bloquear, clave_usuario, clave_oferta
 from utils import abreviar_numero, formatear_tiempo_corto
 
 logger = logging.getLogger(__name__)
@@ -40,7 +43,6 @@ logger = logging.getLogger(__name__)
 # ================= CONSTANTES =================
 DB_NAME = "market.db"
 DATA_DIR = "data"
-os.makedirs(DATA_DIR, exist_ok=True)
 DB_PATH = os.path.join(DATA_DIR, DB_NAME)
 
 # Cantidad de ofertas por página
@@ -75,7 +77,8 @@ COMISION_FINAL = 0.08    # 8%
 # ================= BASE DE DATOS =================
 
 def crear_tablas():
-    """Crea las tablas necesarias si no existen."""
+    """Crea las tablas necesarias si no existen (lo llama arranque.bootstrap)."""
+    os.makedirs(DATA_DIR, exist_ok=True)
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
 
@@ -123,9 +126,6 @@ def crear_tablas():
     conn.close()
     logger.info("✅ Tablas de mercado creadas/verificadas.")
 
-# Llamar a la creación al importar el módulo
-crear_tablas()
-
 # ================= FUNCIONES AUXILIARES DE BASE DE DATOS =================
 
 def get_db_connection():
@@ -361,25 +361,16 @@ def restar_item_usuario(user_id: int, tipo: str, nombre: str, cantidad: int) ->
     return False
 
 def sumar_item_usuario(user_id: int, tipo: str, nombre: str, cantidad: int) -> bool:
-    """Suma cantidad al inventario del usuario."""
+    """Suma cantidad al inventario del usuario (patch sobre el campo)."""
     if tipo == 'recurso':
-        from recursos import obtener_recursos_usuario, guardar_recursos_usuario
-        recursos = obtener_recursos_usuario(user_id)
-        recursos[nombre] = recursos.get(nombre, 0) + cantidad
-        guardar_recursos_usuario(user_id, recursos)
-        return True
+        from recursos import RECURSOS_FILE
+        return patch(RECURSOS_FILE, user_id, [("incr", nombre, cantidad)])
     elif tipo == 'nave':
-        from flota import obtener_flota, guardar_flota
-        flota = obtener_flota(user_id)
-        flota[nombre] = flota.get(nombre, 0) + cantidad
-        guardar_flota(user_id, flota)
-        return True
+        from flota import FLOTA_USUARIO_FILE
+        return patch(FLOTA_USUARIO_FILE, user_id, [("incr", nombre, cantidad)])
     elif tipo == 'defensa':
-        from defensa import obtener_defensas, guardar_defensas
-        defensas = obtener_defensas(user_id)
-        defensas[nombre] = defensas.get(nombre, 0) + cantidad
-        guardar_defensas(user_id, defensas)
-        return True
+        from defensa import DEFENSA_USUARIO_FILE
+        return patch(DEFENSA_USUARIO_FILE, user_id, [("incr", nombre, cantidad)])
     return False
 
 # ================= FUNCIONES DE NEGOCIO =================
@@ -453,13 +444,9 @@ def procesar_compra_usuario(oferta_id: int, comprador_id: int, context: ContextT
     ganancia_vendedor = precio_base - comision_inicial - comision_final
 
     # Transferir NXT: comprador paga precio_base, vendedor recibe ganancia, fondo recibe comisión final
-    recursos_comprador['nxt20'] -= precio_base
-    from recursos import guardar_recursos_usuario
-    guardar_recursos_usuario(comprador_id, recursos_comprador)
-
-    recursos_vendedor = obtener_recursos_usuario(vendedor_id)
-    recursos_vendedor['nxt20'] = recursos_vendedor.get('nxt20', 0) + ganancia_vendedor
-    guardar_recursos_usuario(vendedor_id, recursos_vendedor)
+    from recursos import RECURSOS_FILE
+    patch(RECURSOS_FILE, comprador_id, [("incr", "nxt20", -precio_base)])
+    patch(RECURSOS_FILE, vendedor_id, [("incr", "nxt20", ganancia_vendedor)])
 
     sumar_fondo_proyecto(comision_final)
 
@@ -536,9 +523,8 @@ def procesar_compra_sistema(oferta_id: int, comprador_id: int, context: ContextT
         return {'error': 'comprador_sin_nxt'}
 
     # Descontar NXT del comprador (todo va al fondo del proyecto)
-    recursos_comprador['nxt20'] -= precio
-    from recursos import guardar_recursos_usuario
-    guardar_recursos_usuario(comprador_id, recursos_comprador)
+    from recursos import RECURSOS_FILE
+    patch(RECURSOS_FILE, comprador_id, [("incr", "nxt20", -precio)])
 
     # Sumar al fondo del proyecto
     sumar_fondo_proyecto(precio)
@@ -662,10 +648,10 @@ async def mercado_principal(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     await query.answer()
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
 
     # Ejecutar expiración automática
-    expirar_ofertas_usuario()
+    await store.ejecutar(expirar_ofertas_usuario)
 
     texto = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -680,7 +666,7 @@ async def mercado_principal(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     await query.edit_message_text(
         text=texto,
-        reply_markup=mercado_principal_keyboard(user_id),
+        reply_markup=await store.ejecutar(mercado_principal_keyboard, user_id),
         parse_mode="HTML"
     )
 
@@ -714,7 +700,7 @@ async def mercado_venta_seleccionar_tipo(update: Update, context: ContextTypes.D
     tipo = data.split('_')[3]  # mercado_venta_tipo_recurso -> recurso
     
     user_id = query.from_user.id
-    items = obtener_items_usuario(user_id, tipo)
+    items = await store.ejecutar(obtener_items_usuario, user_id, tipo)
     
     if not items:
         await query.edit_message_text(
@@ -866,14 +852,14 @@ async def mercado_venta_confirmar(update: Update, context: ContextTypes.DEFAULT_
     await query.answer()
     
     user_id = query.from_user.id
-    username = AuthSystem.obtener_username(user_id)
+    username = await store.ejecutar(AuthSystem.obtener_username, user_id)
     tipo = context.user_data['venta_item_tipo']
     nombre_id = context.user_data['venta_item_nombre_id']
     cantidad = context.user_data['venta_cantidad']
     precio = context.user_data['venta_precio']
     
     # Verificar que todavía tiene los ítems (por si acaso)
-    items_actuales = obtener_items_usuario(user_id, tipo)
+    items_actuales = await store.ejecutar(obtener_items_usuario, user_id, tipo)
     tiene_item = False
     for item in items_actuales:
         if item[0] == tipo and item[1] == nombre_id and item[3] >= cantidad:
@@ -894,7 +880,7 @@ async def mercado_venta_confirmar(update: Update, context: ContextTypes.DEFAULT_
         return ConversationHandler.END
     
     # Restar ítems del inventario
-    exito_resta = restar_item_usuario(user_id, tipo, nombre_id, cantidad)
+    exito_resta = await store.ejecutar(restar_item_usuario, user_id, tipo, nombre_id, cantidad)
     if not exito_resta:
         await query.edit_message_text(
             "❌ Error al retirar los ítems de tu inventario.",
@@ -905,11 +891,11 @@ async def mercado_venta_confirmar(update: Update, context: ContextTypes.DEFAULT_
         return ConversationHandler.END
     
     # Registrar oferta (esto descuenta la comisión inicial)
-    oferta_id, comision = registrar_oferta_usuario_db(user_id, username, tipo, nombre_id, cantidad, precio)
+    oferta_id, comision = await store.ejecutar(registrar_oferta_usuario_db, user_id, username, tipo, nombre_id, cantidad, precio)
     
     if oferta_id is None:
         # Si falló, devolver los ítems
-        sumar_item_usuario(user_id, tipo, nombre_id, cantidad)
+        await store.ejecutar(sumar_item_usuario, user_id, tipo, nombre_id, cantidad)
         await query.edit_message_text(
             f"❌ {comision}",  # El mensaje de error viene de registrar_oferta_usuario_db
             reply_markup=InlineKeyboardMarkup([[
@@ -951,10 +937,10 @@ async def mercado_ver_ofertas(update: Update, context: ContextTypes.DEFAULT_TYPE
     await query.answer()
     
     # Ejecutar expiración automática
-    expirar_ofertas_usuario()
+    await store.ejecutar(expirar_ofertas_usuario)
     
-    ofertas_user = listar_ofertas_usuario('activo')
-    ofertas_sys = listar_ofertas_sistema('activo')
+    ofertas_user = await store.ejecutar(listar_ofertas_usuario, 'activo')
+    ofertas_sys = await store.ejecutar(listar_ofertas_sistema, 'activo')
     
     texto = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -1162,7 +1148,7 @@ async def mercado_comprar_seleccion(update: Update, context: ContextTypes.DEFAUL
     context.user_data['compra_oferta_id'] = oferta_id
     
     if tipo == 'sistema':
-        oferta = obtener_oferta_sistema(oferta_id)
+        oferta = await store.ejecutar(obtener_oferta_sistema, oferta_id)
         if not oferta:
             await query.edit_message_text("❌ Oferta no encontrada.")
             return
@@ -1198,7 +1184,7 @@ async def mercado_comprar_seleccion(update: Update, context: ContextTypes.DEFAUL
             f"¿Confirmas la compra?"
         )
     else:  # usuario
-        oferta = obtener_oferta_usuario(oferta_id)
+        oferta = await store.ejecutar(obtener_oferta_usuario, oferta_id)
         if not oferta:
             await query.edit_message_text("❌ Oferta no encontrada.")
             return
@@ -1256,10 +1242,19 @@ async def mercado_comprar_confirmar(update: Update, context: ContextTypes.DEFAUL
     
     comprador_id = query.from_user.id
     
-    if tipo == 'sistema':
-        resultado = procesar_compra_sistema(oferta_id, comprador_id, context)
-    else:
-        resultado = procesar_compra_usuario(oferta_id, comprador_id, context)
+    # Comprador, vendedor y oferta bloqueados: la oferta se vende una sola vez
+    # y los NXT de ambos no se pisan con otras operaciones en curso
+    claves = [clave_usuario(comprador_id), clave_oferta(tipo, oferta_id)]
+    if tipo != 'sistema':
+        oferta = await store.ejecutar(obtener_oferta_usuario, oferta_id)
+        if oferta:
+            claves.append(clave_usuario(oferta[1]))
+    
+    async with bloquear(*claves):
+        if tipo == 'sistema':
+            resultado = await store.ejecutar(procesar_compra_sistema, oferta_id, comprador_id, context)
+        else:
+            resultado = await store.ejecutar(procesar_compra_usuario, oferta_id, comprador_id, context)
     
     if 'error' in resultado:
         texto_error = {
@@ -1319,7 +1314,7 @@ async def mercado_admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def mercado_admin_fondo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    fondo = obtener_fondo_proyecto()
+    fondo = await store.ejecutar(obtener_fondo_proyecto)
     await query.edit_message_text(
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
         f"💰 <b>FONDO DEL PROYECTO</b>\n"
@@ -1460,7 +1455,7 @@ async def admin_crear_confirmar(update: Update, context: ContextTypes.DEFAULT_TY
     cantidad_lote = context.user_data['admin_crear_cantidad_lote']
     num_lotes = context.user_data['admin_crear_num_lotes']
     
-    ids = crear_multiples_ofertas_sistema(tipo, nombre, cantidad_lote, precio, num_lotes)
+    ids = await store.ejecutar(crear_multiples_ofertas_sistema, tipo, nombre, cantidad_lote, precio, num_lotes)
     
     # Limpiar datos
     for key in list(context.user_data.keys()):
@@ -1482,7 +1477,7 @@ async def admin_crear_confirmar(update: Update, context: ContextTypes.DEFAULT_TY
 async def admin_listar(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    ofertas = listar_ofertas_sistema('activo')
+    ofertas = await store.ejecutar(listar_ofertas_sistema, 'activo')
     if not ofertas:
         await query.edit_message_text(
             "📭 No hay ofertas activas en el Mercado Negro.",
@@ -1498,7 +1493,7 @@ async def admin_listar(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def mostrar_pagina_ofertas_admin(update, context, pagina, accion):
     query = update.callback_query
-    ofertas = listar_ofertas_sistema('activo')
+    ofertas = await store.ejecutar(listar_ofertas_sistema, 'activo')
     if not ofertas:
         await query.edit_message_text("📭 No hay ofertas.", reply_markup=InlineKeyboardMarkup([[
             InlineKeyboardButton("◀️ VOLVER", callback_data="mercado_admin")
@@ -1529,7 +1524,7 @@ async def admin_listar_select(update: Update, context: ContextTypes.DEFAULT_TYPE
     query = update.callback_query
     await query.answer()
     oferta_id = int(query.data.split(':')[1])
-    oferta = obtener_oferta_sistema(oferta_id)
+    oferta = await store.ejecutar(obtener_oferta_sistema, oferta_id)
     if not oferta:
         await query.edit_message_text("❌ Oferta no encontrada.")
         return
@@ -1554,7 +1549,7 @@ async def admin_listar_select(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def admin_editar_inicio(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    ofertas = listar_ofertas_sistema('activo')
+    ofertas = await store.ejecutar(listar_ofertas_sistema, 'activo')
     if not ofertas:
         await query.edit_message_text("📭 No hay ofertas para editar.", reply_markup=InlineKeyboardMarkup([[
             InlineKeyboardButton("◀️ VOLVER", callback_data="mercado_admin")
@@ -1575,7 +1570,7 @@ async def admin_editar_select(update: Update, context: ContextTypes.DEFAULT_TYPE
     await query.answer()
     oferta_id = int(query.data.split(':')[1])
     context.user_data['admin_editar_id'] = oferta_id
-    oferta = obtener_oferta_sistema(oferta_id)
+    oferta = await store.ejecutar(obtener_oferta_sistema, oferta_id)
     texto = (
         f"✏️ <b>EDITAR OFERTA ID {oferta_id}</b>\n\n"
         f"1. Tipo: {oferta[1]}\n"
@@ -1618,7 +1613,7 @@ async def admin_editar_valor(update: Update, context: ContextTypes.DEFAULT_TYPE)
     # Actualizar en BD
     mapeo = {1:'item_type', 2:'item_name', 3:'cantidad', 4:'precio_nxt'}
     campo_bd = mapeo[campo]
-    actualizar_oferta_sistema(oferta_id, **{campo_bd: valor})
+    await store.ejecutar(actualizar_oferta_sistema, oferta_id, **{campo_bd: valor})
 
     # Limpiar datos
     context.user_data.pop('admin_editar_campo', None)
@@ -1637,7 +1632,7 @@ async def admin_editar_valor(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def admin_eliminar_inicio(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    ofertas = listar_ofertas_sistema('activo')
+    ofertas = await store.ejecutar(listar_ofertas_sistema, 'activo')
     if not ofertas:
         await query.edit_message_text("📭 No hay ofertas para eliminar.", reply_markup=InlineKeyboardMarkup([[
             InlineKeyboardButton("◀️ VOLVER", callback_data="mercado_admin")
@@ -1658,7 +1653,7 @@ async def admin_eliminar_select(update: Update, context: ContextTypes.DEFAULT_TY
     await query.answer()
     oferta_id = int(query.data.split(':')[1])
     context.user_data['admin_eliminar_id'] = oferta_id
-    oferta = obtener_oferta_sistema(oferta_id)
+    oferta = await store.ejecutar(obtener_oferta_sistema, oferta_id)
     texto = (
         f"❓ ¿Estás seguro de eliminar la oferta?\n\n"
         f"ID: {oferta_id}\n"
@@ -1674,7 +1669,7 @@ async def admin_eliminar_confirm(update: Update, context: ContextTypes.DEFAULT_T
     query = update.callback_query
     await query.answer()
     oferta_id = int(query.data.split(':')[1])
-    eliminar_oferta_sistema(oferta_id)
+    await store.ejecutar(eliminar_oferta_sistema, oferta_id)
     context.user_data.pop('admin_eliminar_id', None)
     await query.edit_message_text(
         f"✅ Oferta {oferta_id} eliminada (marcada como inactiva).",
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#██████╗ ███████╗████████╗██████╗  █████╗ ██╗     ███████╗
+#██╔══██╗██╔════╝╚══██╔══╝██╔══██╗██╔══██╗██║     ██╔════╝
+#██████╔╝███████╗   ██║   ██████╔╝███████║██║     ███████╗
+#██╔══██╗╚════██║   ██║   ██╔══██╗██╔══██║██║     ╚════██║
+#██║  ██║███████║   ██║   ██║  ██║██║  ██║███████╗███████║
+#╚═╝  ╚═╝╚══════╝   ╚═╝   ╚═╝  ╚═╝╚═╝  ╚═╝╚══════╝╚══════╝
+
+#🚀 ASTRO.IO v2.4.5 🚀
+#🧭 migraciones.py - VERSIONES DEL ESQUEMA DE DATOS
+#=======================================
+#✅ Migraciones numeradas que dejan cada documento en su forma canónica
+#✅ Se aplican UNA vez al arrancar (y tras restaurar un backup)
+#✅ La versión aplicada queda registrada en data/esquema.json
+#=======================================
+
+"""
+Forma canónica tras la última migración:
+
+    minas.json / edificios_usuario.json / investigaciones_usuario.json
+        {uid: {tipo: nivel_entero}}          (nunca {"nivel": n})
+    colas_edificios.json
+        {uid: [{"tipo", "nivel_actual", "nivel_objetivo", "tiempo_total", ...}]}
+
+Los lectores siguen pasando cada nivel por normalizar_nivel(): lo que se escribe
+después del arranque (reconciliación con GitHub, ediciones de admin) no pasa por aquí.
+Para añadir una migración: nueva función y nueva entrada al final de MIGRACIONES
+con la versión siguiente. Cada una se confirma en una transacción junto con la
+versión, así que un arranque interrumpido la repite entera.
+"""
+
+import os
+import logging
+from datetime import datetime
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, List
+
+from database import load_json, save_json, existe_json, transaction
+
+logger = logging.getLogger(__name__)
+
+# ================= CONSTANTES =================
+DATA_DIR = "data"
+ESQUEMA_FILE = os.path.join(DATA_DIR, "esquema.json")
+MINAS_FILE = os.path.join(DATA_DIR, "minas.json")
+EDIFICIOS_USUARIO_FILE = os.path.join(DATA_DIR, "edificios_usuario.json")
+INVESTIGACIONES_USUARIO_FILE = os.path.join(DATA_DIR, "investigaciones_usuario.json")
+INVESTIGACIONES_FILE = os.path.join(DATA_DIR, "investigaciones.json")
+COLAS_EDIFICIOS_FILE = os.path.join(DATA_DIR, "colas_edificios.json")
+
+# ================= NORMALIZADORES =================
+
+def normalizar_nivel(valor: Any) -> int:
+    """🔢 {"nivel": n}, float o texto numérico -> int; cualquier otra cosa -> 0"""
+    if isinstance(valor, Mapping):
+        valor = valor.get("nivel", 0)
+    if isinstance(valor, bool):
+        return int(valor)
+    if isinstance(valor, (int, float)):
+        return int(valor)
+    try:
+        return int(float(valor))
+    except (TypeError, ValueError):
+        return 0
+
+def _niveles_enteros(niveles: Any) -> int:
+    """Normaliza in situ {tipo: nivel} de un jugador. Retorna cuántos cambió"""
+    if not isinstance(niveles, dict):
+        return 0
+    cambios = 0
+    for tipo, valor in niveles.items():
+        nivel = normalizar_nivel(valor)
+        if type(valor) is not int or valor != nivel:
+            niveles[tipo] = nivel
+            cambios += 1
+    return cambios
+
+# ================= MIGRACIONES =================
+
+def _v1_niveles_enteros(data: Any, archivo: str) -> int:
+    """Niveles guardados como {"nivel": n} o float pasan a int"""
+    if not isinstance(data, dict):
+        return 0
+    if archivo == INVESTIGACIONES_FILE:
+        # investigaciones.json guarda los niveles bajo "usuarios"
+        data = data.get("usuarios") or {}
+    return sum(_niveles_enteros(niveles) for niveles in data.values())
+
+def _v2_colas_edificios(data: Any, archivo: str) -> int:
+    """Elementos antiguos con "nivel" en vez de nivel_objetivo/nivel_actual"""
+    if not isinstance(data, dict):
+        return 0
+    cambios = 0
+    for cola in data.values():
+        if not isinstance(cola, list):
+            continue
+        for item in cola:
+            if not isinstance(item, dict):
+                continue
+            antes = dict(item)
+            if "nivel_objetivo" not in item and "nivel" in item:
+                item["nivel_objetivo"] = item.pop("nivel")
+            item["nivel_objetivo"] = normalizar_nivel(item.get("nivel_objetivo", 0))
+            item["nivel_actual"] = normalizar_nivel(item.get("nivel_actual", item["nivel_objetivo"] - 1))
+            for campo in ("tiempo_total", "tiempo_restante", "progreso"):
+                if campo in item:
+                    item[campo] = normalizar_nivel(item[campo])
+            if item != antes:
+                cambios += 1
+    return cambios
+
+MIGRACIONES: List[Dict[str, Any]] = [
+    {
+        "version": 1,
+        "descripcion": "Niveles como entero",
+        "archivos": (MINAS_FILE, EDIFICIOS_USUARIO_FILE, INVESTIGACIONES_USUARIO_FILE, INVESTIGACIONES_FILE),
+        "aplicar": _v1_niveles_enteros,
+    },
+    {
+        "version": 2,
+        "descripcion": "Colas de edificios con nivel_actual/nivel_objetivo enteros",
+        "archivos": (COLAS_EDIFICIOS_FILE,),
+        "aplicar": _v2_colas_edificios,
+    },
+]
+
+VERSION_ESQUEMA = MIGRACIONES[-1]["version"]
+
+# ================= EJECUCIÓN =================
+
+def obtener_version_esquema() -> int:
+    return (load_json(ESQUEMA_FILE) or {}).get("version", 0)
+
+def _aplicar(migracion: Dict[str, Any], esquema: Dict[str, Any]) -> int:
+    """Aplica una migración a sus archivos y registra la versión, todo junto"""
+    aplicar: Callable[[Any, str], int] = migracion["aplicar"]
+    cambios = 0
+    with transaction():
+        for archivo in migracion["archivos"]:
+            if not existe_json(archivo):
+                continue
+            data = load_json(archivo)
+            cambiados = aplicar(data, archivo)
+            if cambiados:
+                save_json(archivo, data)
+                cambios += cambiados
+        esquema["version"] = max(esquema.get("version", 0), migracion["version"])
+        esquema.setdefault("historial", []).append({
+            "version": migracion["version"],
+            "descripcion": migracion["descripcion"],
+            "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "cambios": cambios,
+        })
+        save_json(ESQUEMA_FILE, esquema)
+    return cambios
+
+def migrar_esquema(forzar: bool = False) -> Dict[str, Any]:
+    """
+    🧭 Lleva los datos a VERSION_ESQUEMA aplicando las migraciones pendientes.
+    Idempotente. Con forzar=True las repasa todas (p. ej. tras restaurar un
+    backup que puede traer documentos con la forma antigua).
+    """
+    esquema = load_json(ESQUEMA_FILE) or {}
+    actual = 0 if forzar else esquema.get("version", 0)
+    aplicadas = {}
+    for migracion in MIGRACIONES:
+        if migracion["version"] <= actual:
+            continue
+        cambios = _aplicar(migracion, esquema)
+        aplicadas[migracion["version"]] = cambios
+        logger.info(f"🧭 Esquema v{migracion['version']} ({migracion['descripcion']}): {cambios} cambios")
+    return {"version": esquema.get("version", 0), "aplicadas": aplicadas}
+
+__all__ = [
+    'VERSION_ESQUEMA',
+    'MIGRACIONES',
+    'ESQUEMA_FILE',
+    'normalizar_nivel',
+    'obtener_version_esquema',
+    'migrar_esquema',
+]
@@ -22,7 +22,10 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 from login import AuthSystem, requiere_login
-from database import load_json, save_json
+from database import ver_json, ver_usuario
+from almacen import store
+from indice_alianzas import alianza_de_usuario
+from migraciones import normalizar_nivel
 from utils import abreviar_numero
 
 logger = logging.getLogger(__name__)
@@ -101,48 +104,25 @@ PESOS = {
 
 def obtener_nivel_edificio(user_id: int, edificio: str) -> int:
     """📊 Obtiene nivel de edificio de edificios_usuario.json"""
-    user_id_str = str(user_id)
-    data = load_json(EDIFICIOS_USUARIO_FILE) or {}
-    usuario = data.get(user_id_str, {})
-    
-    nivel_data = usuario.get(edificio, 0)
-    if isinstance(nivel_data, dict):
-        return nivel_data.get("nivel", 0)
-    return int(nivel_data) if isinstance(nivel_data, (int, float)) else 0
+    usuario = ver_usuario(user_id, EDIFICIOS_USUARIO_FILE)
+    
+    return normalizar_nivel(usuario.get(edificio, 0))
 
 def obtener_cantidad_flota(user_id: int, nave: str) -> int:
     """🚀 Obtiene cantidad de naves de flota_usuario.json"""
-    user_id_str = str(user_id)
-    data = load_json(FLOTA_USUARIO_FILE) or {}
-    usuario = data.get(user_id_str, {})
-    return usuario.get(nave, 0)
+    return ver_usuario(user_id, FLOTA_USUARIO_FILE).get(nave, 0)
 
 def obtener_cantidad_defensa(user_id: int, defensa: str) -> int:
     """🛡️ Obtiene cantidad de defensas de defensa_usuario.json"""
-    user_id_str = str(user_id)
-    data = load_json(DEFENSA_USUARIO_FILE) or {}
-    usuario = data.get(user_id_str, {})
-    return usuario.get(defensa, 0)
+    return ver_usuario(user_id, DEFENSA_USUARIO_FILE).get(defensa, 0)
 
 def obtener_nivel_investigacion(user_id: int) -> int:
     """🔬 Obtiene nivel total de investigaciones"""
-    user_id_str = str(user_id)
-    data = load_json(INVESTIGACIONES_USUARIO_FILE) or {}
-    usuario = data.get(user_id_str, {})
-    
-    total = 0
-    for nivel in usuario.values():
-        if isinstance(nivel, dict):
-            total += nivel.get("nivel", 0)
-        elif isinstance(nivel, (int, float)):
-            total += int(nivel)
-    return total
+    return sum(normalizar_nivel(nivel) for nivel in ver_usuario(user_id, INVESTIGACIONES_USUARIO_FILE).values())
 
 def obtener_recursos(user_id: int) -> dict:
     """💰 Obtiene recursos del usuario"""
-    user_id_str = str(user_id)
-    data = load_json(RECURSOS_FILE) or {}
-    return data.get(user_id_str, {
+    return ver_usuario(user_id, RECURSOS_FILE, {
         "metal": 0,
         "cristal": 0,
         "deuterio": 0,
@@ -151,18 +131,12 @@ def obtener_recursos(user_id: int) -> dict:
 
 def obtener_alianza_usuario(user_id: int) -> str:
     """🌍 Obtiene el nombre de la alianza del usuario"""
-    user_id_str = str(user_id)
-    
-    # Buscar en miembros
-    miembros = load_json(ALIANZA_MIEMBROS_FILE) or {}
-    for alianza_id, miembros_alianza in miembros.items():
-        if user_id_str in miembros_alianza:
-            # Obtener nombre de la alianza
-            datos = load_json(ALIANZA_DATOS_FILE) or {}
-            alianza = datos.get(alianza_id, {})
-            return alianza.get("nombre", "Sin alianza")
-    
-    return "Sin alianza"
+    alianza_id = alianza_de_usuario(user_id)
+    if alianza_id is None:
+        return "Sin alianza"
+    
+    datos = ver_json(ALIANZA_DATOS_FILE) or {}
+    return datos.get(alianza_id, {}).get("nombre", "Sin alianza")
 
 # ================= CALCULAR PUNTUACIÓN TOTAL =================
 
@@ -236,7 +210,7 @@ def obtener_ranking() -> list:
     
     # Obtener todos los usuarios autorizados
     from login import AuthSystem
-    autorizados = load_json(os.path.join(DATA_DIR, "authorized_users.json")) or []
+    autorizados = ver_json(os.path.join(DATA_DIR, "authorized_users.json")) or []
     
     for user_id in autorizados:
         try:
@@ -279,7 +253,7 @@ async def menu_puntuacion(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await query.answer()
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
     mensaje = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -314,7 +288,7 @@ async def mis_estadisticas(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
     # CALCULAR EN TIEMPO REAL
     puntos = calcular_puntuacion_total(user_id)
@@ -25,7 +25,9 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 from login import AuthSystem, requiere_login, RECURSOS_INICIALES
-from database import load_json, save_json
+from database import obtener_usuario, ver_usuario, guardar_usuario, patch
+from almacen import store
+from migraciones import normalizar_nivel
 from utils import abreviar_numero
 
 logger = logging.getLogger(__name__)
@@ -43,64 +45,38 @@ MAX_MINUTOS_ACUMULABLES = 30 * 24 * 60  # 43200 minutos
 # ================= FUNCIONES DE RECURSOS =================
 
 def obtener_recursos_usuario(user_id: int) -> dict:
-    """💰 Obtiene recursos del usuario desde recursos.json"""
-    user_id_str = str(user_id)
-    recursos_data = load_json(RECURSOS_FILE) or {}
+    """💰 Obtiene recursos del usuario desde recursos.json (solo su entrada)"""
+    recursos = AuthSystem.obtener_recursos(user_id)
     
     # Si no existe, crear con valores por defecto (SINCRONIZADO con login.py)
-    if user_id_str not in recursos_data:
-        recursos_data[user_id_str] = RECURSOS_INICIALES.copy()
-        save_json(RECURSOS_FILE, recursos_data)
+    if not recursos:
+        recursos = RECURSOS_INICIALES.copy()
+        guardar_recursos_usuario(user_id, recursos)
         logger.info(f"💰 Recursos iniciales ({RECURSOS_INICIALES['metal']}M, {RECURSOS_INICIALES['cristal']}C, {RECURSOS_INICIALES['deuterio']}D) asignados a {AuthSystem.obtener_username(user_id)}")
     
-    return recursos_data.get(user_id_str, {
-        "metal": 0,
-        "cristal": 0,
-        "deuterio": 0,
-        "materia_oscura": 0,
-        "nxt20": 0,
-        "energia": 0
-    })
+    return recursos
 
 def guardar_recursos_usuario(user_id: int, recursos: dict) -> bool:
     """💾 Guarda recursos del usuario en recursos.json"""
-    user_id_str = str(user_id)
-    recursos_data = load_json(RECURSOS_FILE) or {}
-    recursos_data[user_id_str] = recursos
-    return save_json(RECURSOS_FILE, recursos_data)
+    return AuthSystem.actualizar_recursos(user_id, recursos)
 
 def obtener_nivel_mina(user_id: int, tipo: str) -> int:
     """⛏️ Obtiene nivel de una mina específica"""
-    user_id_str = str(user_id)
-    minas_data = load_json(MINAS_FILE) or {}
-    minas_usuario = minas_data.get(user_id_str, {})
+    minas_usuario = ver_usuario(user_id, MINAS_FILE)
     
-    nivel_data = minas_usuario.get(tipo, 0)
-    if isinstance(nivel_data, dict):
-        return nivel_data.get("nivel", 0)
-    return int(nivel_data) if isinstance(nivel_data, (int, float)) else 0
+    return normalizar_nivel(minas_usuario.get(tipo, 0))
 
 def obtener_nivel_energia(user_id: int) -> int:
     """⚡ Obtiene nivel de la planta de energía"""
-    user_id_str = str(user_id)
-    edificios_data = load_json(EDIFICIOS_USUARIO_FILE) or {}
-    edificios_usuario = edificios_data.get(user_id_str, {})
+    edificios_usuario = ver_usuario(user_id, EDIFICIOS_USUARIO_FILE)
     
-    nivel_data = edificios_usuario.get("energia", 0)
-    if isinstance(nivel_data, dict):
-        return nivel_data.get("nivel", 0)
-    return int(nivel_data) if isinstance(nivel_data, (int, float)) else 0
+    return normalizar_nivel(edificios_usuario.get("energia", 0))
 
 def obtener_nivel_edificio(user_id: int, edificio: str) -> int:
     """🏢 Obtiene nivel de un edificio específico"""
-    user_id_str = str(user_id)
-    edificios_data = load_json(EDIFICIOS_USUARIO_FILE) or {}
-    edificios_usuario = edificios_data.get(user_id_str, {})
+    edificios_usuario = ver_usuario(user_id, EDIFICIOS_USUARIO_FILE)
     
-    nivel_data = edificios_usuario.get(edificio, 0)
-    if isinstance(nivel_data, dict):
-        return nivel_data.get("nivel", 0)
-    return int(nivel_data) if isinstance(nivel_data, (int, float)) else 0
+    return normalizar_nivel(edificios_usuario.get(edificio, 0))
 
 def calcular_produccion_mina(nivel: int, base: int = 30, factor: float = 1.1) -> int:
     """📈 Calcula producción por hora de una mina"""
@@ -116,9 +92,7 @@ def calcular_produccion_energia(nivel: int, base: int = 50, factor: float = 1.1)
 
 def obtener_ultima_actualizacion(user_id: int) -> datetime:
     """⏰ Obtiene la última vez que se actualizaron los recursos"""
-    user_id_str = str(user_id)
-    data = load_json(DATA_FILE) or {}
-    usuario = data.get(user_id_str, {})
+    usuario = ver_usuario(user_id, DATA_FILE)
     
     # Intentar obtener timestamp específico de recursos
     ultima_str = usuario.get("ultima_actualizacion_recursos")
@@ -143,16 +117,11 @@ def obtener_ultima_actualizacion(user_id: int) -> datetime:
 
 def guardar_ultima_actualizacion(user_id: int) -> bool:
     """⏰ Guarda la hora de última actualización"""
-    user_id_str = str(user_id)
-    data = load_json(DATA_FILE) or {}
-    
-    if user_id_str not in data:
-        data[user_id_str] = {}
-    
-    ahora = datetime.now()
-    data[user_id_str]["ultima_actualizacion"] = ahora.strftime("%Y-%m-%d %H:%M:%S")
-    data[user_id_str]["ultima_actualizacion_recursos"] = ahora.strftime("%Y-%m-%d %H:%M:%S")
-    return save_json(DATA_FILE, data)
+    ahora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return patch(DATA_FILE, user_id, [
+        ("set", "ultima_actualizacion", ahora),
+        ("set", "ultima_actualizacion_recursos", ahora)
+    ])
 
 def obtener_produccion(user_id: int) -> dict:
     """📊 Obtiene producción por minuto y hora (SIEMPRE EN TIEMPO REAL)"""
@@ -335,10 +304,10 @@ async def mostrar_recursos(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """💰 Muestra los recursos del usuario (SIEMPRE ACTUALIZADO)"""
     user = update.effective_user
     user_id = user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
     # ✅ ACTUALIZAR RECURSOS AUTOMÁTICAMENTE
-    resultado = actualizar_recursos_tiempo(user_id)
+    resultado = await store.ejecutar(actualizar_recursos_tiempo, user_id)
     recursos = resultado["recursos"]
     produccion = resultado["produccion"]
     minutos = resultado["minutos"]
@@ -399,10 +368,10 @@ async def menu_recursos_handler(update: Update, context: ContextTypes.DEFAULT_TY
     await query.answer()
     
     user_id = query.from_user.id
-    username_tag = AuthSystem.obtener_username(user_id)
+    username_tag = await store.ejecutar(AuthSystem.obtener_username, user_id)
     
     # ✅ ACTUALIZAR RECURSOS AUTOMÁTICAMENTE
-    resultado = actualizar_recursos_tiempo(user_id)
+    resultado = await store.ejecutar(actualizar_recursos_tiempo, user_id)
     recursos = resultado["recursos"]
     produccion = resultado["produccion"]
     
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#██████╗ ███████╗████████╗██████╗  █████╗ ██╗     ███████╗
+#██╔══██╗██╔════╝╚══██╔══╝██╔══██╗██╔══██╗██║     ██╔════╝
+#██████╔╝███████╗   ██║   ██████╔╝███████║██║     ███████╗
+#██╔══██╗╚════██║   ██║   ██╔══██╗██╔══██║██║     ╚════██║
+#██║  ██║███████║   ██║   ██║  ██║██║  ██║███████╗███████║
+#╚═╝  ╚═╝╚══════╝   ╚═╝   ╚═╝  ╚═╝╚═╝  ╚═╝╚══════╝╚══════╝
+
+#🚀 ASTRO.IO v2.4.5 🚀
+#🗜️ retencion.py - RETENCIÓN Y COMPACTACIÓN DE HISTORIALES
+#=======================================
+#✅ Políticas por almacén: antigüedad máxima, máximo por jugador/alianza
+#✅ Lo que se descarta se acumula en resúmenes (los totales no cambian)
+#✅ bajas_flota, guerras, historial_temporadas y ofertas cerradas de market.db
+#✅ Tarea programada que reescribe los JSON y hace VACUUM del mercado
+#=======================================
+
+"""
+Almacenes y resúmenes:
+
+    bajas_flota.json          -> bajas_flota_resumen.json  {uid: totales por nave}
+    guerras.json              -> historial_guerras.json    {alianza: totales}
+    historial_temporadas      -> las temporadas antiguas conservan solo el top
+    market.db (user/system)   -> tabla ofertas_archivadas  (por día, ítem y estado)
+
+Las políticas se ajustan por entorno (RETENCION_*). Un valor 0 desactiva ese límite.
+"""
+
+import os
+import time
+import sqlite3
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from database import load_json, save_json, existe_json, en_transaccion
+
+logger = logging.getLogger(__name__)
+
+# ================= CONSTANTES =================
+DATA_DIR = "data"
+BAJAS_FLOTA_FILE = os.path.join(DATA_DIR, "bajas_flota.json")
+BAJAS_FLOTA_RESUMEN_FILE = os.path.join(DATA_DIR, "bajas_flota_resumen.json")
+GUERRAS_FILE = os.path.join(DATA_DIR, "guerras.json")
+HISTORIAL_GUERRAS_FILE = os.path.join(DATA_DIR, "historial_guerras.json")
+PUNTOS_GUERRA_FILE = os.path.join(DATA_DIR, "puntos_guerra.json")
+MARKET_DB_PATH = os.path.join(DATA_DIR, "market.db")
+
+# ================= POLÍTICAS =================
+RETENCION_INTERVALO_HORAS = float(os.getenv("RETENCION_INTERVALO_HORAS", "6"))
+
+POLITICAS = {
+    "bajas_flota": {
+        "max_dias": int(os.getenv("RETENCION_BAJAS_DIAS", "30")),
+        "max_por_usuario": int(os.getenv("RETENCION_BAJAS_POR_USUARIO", "50")),
+    },
+    "guerras": {
+        "max_dias": int(os.getenv("RETENCION_GUERRAS_DIAS", "30")),
+        "max_por_alianza": int(os.getenv("RETENCION_GUERRAS_POR_ALIANZA", "20")),
+    },
+    "temporadas": {
+        # Temporadas más recientes que conservan la tabla completa de usuarios
+        "completas": int(os.getenv("RETENCION_TEMPORADAS_COMPLETAS", "5")),
+        "top_usuarios": int(os.getenv("RETENCION_TEMPORADAS_TOP", "10")),
+    },
+    "mercado": {
+        "max_dias": int(os.getenv("RETENCION_MERCADO_DIAS", "7")),
+    },
+}
+
+_ultima_compactacion: Dict[str, Any] = {}
+
+def _fecha(texto: Optional[str]) -> Optional[datetime]:
+    """Acepta 'YYYY-MM-DD HH:MM:SS' y el formato ISO de guerra.py"""
+    if not texto:
+        return None
+    try:
+        return datetime.fromisoformat(texto)
+    except (TypeError, ValueError):
+        return None
+
+def _limite(max_dias: int, ahora: datetime) -> Optional[datetime]:
+    return ahora - timedelta(days=max_dias) if max_dias > 0 else None
+
+# ================= 💀 BAJAS DE FLOTA =================
+
+def recortar_bajas(bajas: List[dict], ahora: Optional[datetime] = None) -> Tuple[List[dict], List[dict]]:
+    """✂️ Separa las bajas de un jugador en (conservadas, descartadas) según la política"""
+    politica = POLITICAS["bajas_flota"]
+    limite = _limite(politica["max_dias"], ahora or datetime.now())
+
+    conservadas, descartadas = [], []
+    for baja in bajas:
+        fecha = _fecha(baja.get("fecha"))
+        if limite is not None and fecha is not None and fecha < limite:
+            descartadas.append(baja)
+        else:
+            conservadas.append(baja)
+
+    maximo = politica["max_por_usuario"]
+    if maximo > 0 and len(conservadas) > maximo:
+        descartadas.extend(conservadas[:-maximo])
+        conservadas = conservadas[-maximo:]
+    return conservadas, descartadas
+
+def acumular_bajas(resumen: Dict[str, Any], user_id_str: str, descartadas: List[dict]) -> None:
+    """📊 Suma las bajas descartadas al resumen del jugador"""
+    acumulado = resumen.setdefault(user_id_str, {"registros": 0, "total": 0, "naves": {}, "hasta": None})
+    for baja in descartadas:
+        acumulado["registros"] += 1
+        acumulado["total"] += baja.get("total", 0)
+        for nave, cantidad in (baja.get("naves") or {}).items():
+            acumulado["naves"][nave] = acumulado["naves"].get(nave, 0) + cantidad
+        fecha = baja.get("fecha")
+        if fecha and (acumulado["hasta"] is None or fecha > acumulado["hasta"]):
+            acumulado["hasta"] = fecha
+
+def compactar_bajas_flota(ahora: Optional[datetime] = None) -> Dict[str, int]:
+    """💀 Aplica la política a bajas_flota.json y acumula lo descartado"""
+    # Se repite si una baja nueva llega entre la lectura y la escritura
+    return en_transaccion(_compactar_bajas_flota, ahora or datetime.now())
+
+def _compactar_bajas_flota(ahora: datetime) -> Dict[str, int]:
+    eliminadas = usuarios = 0
+    data = load_json(BAJAS_FLOTA_FILE) or {}
+    resumen = None
+    for user_id_str in list(data.keys()):
+        conservadas, descartadas = recortar_bajas(data[user_id_str], ahora)
+        if not descartadas:
+            continue
+        if resumen is None:
+            resumen = load_json(BAJAS_FLOTA_RESUMEN_FILE) or {}
+        acumular_bajas(resumen, user_id_str, descartadas)
+        if conservadas:
+            data[user_id_str] = conservadas
+        else:
+            del data[user_id_str]
+        eliminadas += len(descartadas)
+        usuarios += 1
+    if resumen is not None:
+        save_json(BAJAS_FLOTA_FILE, data)
+        save_json(BAJAS_FLOTA_RESUMEN_FILE, resumen)
+    return {"eliminadas": eliminadas, "usuarios": usuarios}
+
+# ================= ⚔️ GUERRAS =================
+
+def _acumular_batalla(historial: Dict[str, Any], batalla: dict) -> None:
+    """Suma una batalla archivada a los totales de las dos alianzas"""
+    for lado, rival in (("atacante", "defensor"), ("defensor", "atacante")):
+        alianza_id = batalla.get(f"{lado}_id")
+        if not alianza_id:
+            continue
+        totales = historial.setdefault(alianza_id, {
+            "batallas": 0, "como_atacante": 0, "como_defensor": 0,
+            "puntos": 0, "puntos_rival": 0, "hasta": None,
+        })
+        totales["batallas"] += 1
+        totales[f"como_{lado}"] += 1
+        totales["puntos"] += batalla.get(f"puntos_{lado}", 0) or 0
+        totales["puntos_rival"] += batalla.get(f"puntos_{rival}", 0) or 0
+        fin = batalla.get("fin")
+        if fin and (totales["hasta"] is None or fin > totales["hasta"]):
+            totales["hasta"] = fin
+
+def compactar_guerras(ahora: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    ⚔️ Archiva las batallas terminadas de guerras.json: fuera las más antiguas
+    que max_dias y, por alianza, las que pasan de max_por_alianza.
+    Las batallas en curso nunca se tocan.
+    """
+    return en_transaccion(_compactar_guerras, ahora or datetime.now())
+
+def _compactar_guerras(ahora: datetime) -> Dict[str, int]:
+    politica = POLITICAS["guerras"]
+    limite = _limite(politica["max_dias"], ahora)
+    maximo = politica["max_por_alianza"]
+
+    guerras = load_json(GUERRAS_FILE) or {}
+    terminadas = []
+    for guerra_id, batalla in guerras.items():
+        fin = _fecha(batalla.get("fin"))
+        if fin is not None and fin <= ahora:
+            terminadas.append((fin, guerra_id, batalla))
+    terminadas.sort(key=lambda t: t[0], reverse=True)
+
+    archivar = set()
+    conservadas_por_alianza: Dict[str, int] = {}
+    for fin, guerra_id, batalla in terminadas:
+        if limite is not None and fin < limite:
+            archivar.add(guerra_id)
+            continue
+        # Se conserva si alguna de las dos alianzas aún tiene hueco
+        alianzas = [batalla.get("atacante_id"), batalla.get("defensor_id")]
+        if maximo > 0 and all(conservadas_por_alianza.get(a, 0) >= maximo for a in alianzas):
+            archivar.add(guerra_id)
+            continue
+        for alianza_id in alianzas:
+            conservadas_por_alianza[alianza_id] = conservadas_por_alianza.get(alianza_id, 0) + 1
+
+    if archivar:
+        historial = load_json(HISTORIAL_GUERRAS_FILE) or {}
+        for guerra_id in archivar:
+            _acumular_batalla(historial, guerras.pop(guerra_id))
+        save_json(GUERRAS_FILE, guerras)
+        save_json(HISTORIAL_GUERRAS_FILE, historial)
+    return {"archivadas": len(archivar), "restantes": len(guerras)}
+
+# ================= 🏆 TEMPORADAS DE GUERRA =================
+
+def resumir_temporada(temporada: dict, top: int) -> dict:
+    """🏆 Sustituye la tabla completa de usuarios por totales y el top"""
+    usuarios = temporada.get("usuarios") or {}
+    ordenados = sorted(usuarios.items(), key=lambda kv: (kv[1] or {}).get("puntos", 0), reverse=True)
+    resumida = {clave: valor for clave, valor in temporada.items() if clave != "usuarios"}
+    resumida.update({
+        "participantes": len(usuarios),
+        "puntos_totales": sum((u or {}).get("puntos", 0) for u in usuarios.values()),
+        "top": [
+            {"user_id": uid, "nombre": u.get("nombre"), "alianza": u.get("alianza"), "puntos": u.get("puntos", 0)}
+            for uid, u in ordenados[:top] if isinstance(u, dict)
+        ],
+        "compactada": True,
+    })
+    return resumida
+
+def compactar_temporadas() -> Dict[str, int]:
+    """🏆 Deja la tabla completa solo en las últimas temporadas del historial"""
+    politica = POLITICAS["temporadas"]
+    if politica["completas"] <= 0 or not existe_json(PUNTOS_GUERRA_FILE):
+        return {"compactadas": 0}
+
+    return en_transaccion(_compactar_temporadas, politica)
+
+def _compactar_temporadas(politica: Dict[str, int]) -> Dict[str, int]:
+    compactadas = 0
+    data = load_json(PUNTOS_GUERRA_FILE) or {}
+    historial = data.get("historial_temporadas") or []
+    antiguas = len(historial) - politica["completas"]
+    for i in range(max(0, antiguas)):
+        if "usuarios" in historial[i]:
+            historial[i] = resumir_temporada(historial[i], politica["top_usuarios"])
+            compactadas += 1
+    if compactadas:
+        data["historial_temporadas"] = historial
+        save_json(PUNTOS_GUERRA_FILE, data)
+    return {"compactadas": compactadas}
+
+# ================= 🛒 MERCADO (market.db) =================
+
+_ARCHIVADO_SQL = """
+    INSERT INTO ofertas_archivadas (dia, tabla, item_type, item_name, estado, ofertas, cantidad, importe)
+    SELECT date(fecha_creacion), '{tabla}', item_type, item_name, estado,
+           COUNT(*), SUM(cantidad), SUM({precio})
+    FROM {tabla}
+    WHERE estado != 'activo' AND fecha_creacion < ?
+    GROUP BY date(fecha_creacion), item_type, item_name, estado
+    ON CONFLICT (dia, tabla, item_type, item_name, estado) DO UPDATE SET
+        ofertas = ofertas + excluded.ofertas,
+        cantidad = cantidad + excluded.cantidad,
+        importe = importe + excluded.importe
+"""
+
+def compactar_mercado(ahora: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    🛒 Pasa las ofertas vendidas/expiradas/inactivas antiguas a ofertas_archivadas
+    (agregadas por día e ítem), las borra y hace VACUUM si se borró algo.
+    """
+    if not os.path.exists(MARKET_DB_PATH):
+        return {"borradas": 0}
+    max_dias = POLITICAS["mercado"]["max_dias"]
+    if max_dias <= 0:
+        return {"borradas": 0}
+
+    # fecha_creacion usa CURRENT_TIMESTAMP de SQLite (UTC)
+    ahora = ahora or datetime.now(timezone.utc).replace(tzinfo=None)
+    limite = (ahora - timedelta(days=max_dias)).strftime("%Y-%m-%d %H:%M:%S")
+
+    conn = sqlite3.connect(MARKET_DB_PATH, timeout=30)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ofertas_archivadas (
+                dia TEXT NOT NULL,
+                tabla TEXT NOT NULL,
+                item_type TEXT NOT NULL,
+                item_name TEXT NOT NULL,
+                estado TEXT NOT NULL,
+                ofertas INTEGER NOT NULL,
+                cantidad INTEGER NOT NULL,
+                importe INTEGER NOT NULL,
+                PRIMARY KEY (dia, tabla, item_type, item_name, estado)
+            )
+        """)
+        borradas = 0
+        for tabla, precio in (("user_offers", "precio_base"), ("system_offers", "precio_nxt")):
+            cursor.execute(_ARCHIVADO_SQL.format(tabla=tabla, precio=precio), (limite,))
+            cursor.execute(f"DELETE FROM {tabla} WHERE estado != 'activo' AND fecha_creacion < ?", (limite,))
+            borradas += cursor.rowcount
+        conn.commit()
+        if borradas:
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+    return {"borradas": borradas}
+
+# ================= ⏱️ COMPACTACIÓN COMPLETA =================
+
+def compactar_todo() -> Dict[str, Any]:
+    """🗜️ Pasa todas las políticas; un almacén que falla no frena a los demás"""
+    resultados: Dict[str, Any] = {}
+    inicio_total = time.perf_counter()
+    for nombre, tarea in (
+        ("bajas_flota", compactar_bajas_flota),
+        ("guerras", compactar_guerras),
+        ("temporadas", compactar_temporadas),
+        ("mercado", compactar_mercado),
+    ):
+        inicio = time.perf_counter()
+        try:
+            resultados[nombre] = tarea()
+        except Exception as e:
+            logger.error(f"❌ Error compactando {nombre}: {e}")
+            resultados[nombre] = {"error": str(e)}
+        resultados[nombre]["ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+
+    _ultima_compactacion.clear()
+    _ultima_compactacion.update({
+        "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "ms": round((time.perf_counter() - inicio_total) * 1000, 1),
+        "almacenes": resultados,
+    })
+    logger.info(f"🗜️ Compactación terminada en {_ultima_compactacion['ms']} ms: {resultados}")
+    return resultados
+
+async def compactacion_programada(context) -> None:
+    """⏱️ Tarea del job_queue: compacta en el pool de E/S sin bloquear el bot"""
+    from almacen import store
+    await store.ejecutar(compactar_todo)
+
+def obtener_estadisticas_retencion() -> Dict[str, Any]:
+    """📊 Políticas activas y resultado de la última compactación"""
+    return {"politicas": POLITICAS, "ultima": dict(_ultima_compactacion)}
+
+__all__ = [
+    'POLITICAS',
+    'RETENCION_INTERVALO_HORAS',
+    'BAJAS_FLOTA_RESUMEN_FILE',
+    'HISTORIAL_GUERRAS_FILE',
+    'recortar_bajas',
+    'acumular_bajas',
+    'compactar_bajas_flota',
+    'compactar_guerras',
+    'resumir_temporada',
+    'compactar_temporadas',
+    'compactar_mercado',
+    'compactar_todo',
+    'compactacion_programada',
+    'obtener_estadisticas_retencion',
+]
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#██████╗ ███████╗████████╗██████╗  █████╗ ██╗     ███████╗
+#██╔══██╗██╔════╝╚══██╔══╝██╔══██╗██╔══██╗██║     ██╔════╝
+#██████╔╝███████╗   ██║   ██████╔╝███████║██║     ███████╗
+#██╔══██╗╚════██║   ██║   ██╔══██╗██╔══██║██║     ╚════██║
+#██║  ██║███████║   ██║   ██║  ██║██║  ██║███████╗███████║
+#╚═╝  ╚═╝╚══════╝   ╚═╝   ╚═╝  ╚═╝╚═╝  ╚═╝╚══════╝╚══════╝
+
+#🚀 ASTRO.IO v2.4.5 🚀
+#🧬 serializadores.py - FORMATOS DE ARCHIVO INTERCAMBIABLES
+#=======================================
+#✅ json-indent (legible), json compacto, orjson (si está instalado)
+#✅ msgpack para archivos internos (si está instalado)
+#✅ Lectura con detección automática del formato de cada archivo
+#=======================================
+
+"""
+SERIALIZER           -> formato de los documentos (json | json-indent | orjson)
+SERIALIZER_INTERNO   -> formato de ARCHIVOS_INTERNOS (por defecto msgpack)
+ARCHIVOS_INTERNOS    -> lista separada por comas de archivos que nadie edita a mano
+
+Los archivos msgpack empiezan por la cabecera MSGPACK_CABECERA; cualquier otro
+contenido se lee como JSON. Cambiar de formato no requiere migración: cada
+archivo se lee en el formato en que está y se reescribe en el nuevo al guardarlo.
+"""
+
+import os
+import json
+import logging
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# ================= CONFIGURACIÓN =================
+SERIALIZER = os.getenv("SERIALIZER", "json").lower()
+SERIALIZER_INTERNO = os.getenv("SERIALIZER_INTERNO", "msgpack").lower()
+ARCHIVOS_INTERNOS = {
+    nombre.strip() for nombre in os.getenv(
+        "ARCHIVOS_INTERNOS",
+        "colas_edificios.json,colas_flota.json,colas_defensa.json,misiones_flota.json,bajas_flota.json"
+    ).split(",") if nombre.strip()
+}
+
+# Marca el formato dentro del propio archivo (un JSON nunca empieza así)
+MSGPACK_CABECERA = b"MSGPACK1\n"
+
+# ================= SERIALIZADORES =================
+
+class SerializadorJSON:
+    """📝 JSON estándar; con indent=2 es el formato histórico legible"""
+
+    def __init__(self, nombre: str, indent: Any = None):
+        self.nombre = nombre
+        self._indent = indent
+        self._separadores = None if indent else (",", ":")
+
+    def codificar(self, data: Any) -> bytes:
+        return json.dumps(data, indent=self._indent, separators=self._separadores,
+                          ensure_ascii=False).encode("utf-8")
+
+    def decodificar(self, contenido: bytes) -> Any:
+        return json.loads(contenido)
+
+class SerializadorORJSON:
+    """⚡ JSON compacto con orjson: mismo formato, bastante menos CPU"""
+
+    nombre = "orjson"
+
+    def codificar(self, data: Any) -> bytes:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+    def decodificar(self, contenido: bytes) -> Any:
+        return orjson.loads(contenido)
+
+class SerializadorMsgpack:
+    """📦 msgpack binario con cabecera, para archivos que nadie lee a mano"""
+
+    nombre = "msgpack"
+
+    def codificar(self, data: Any) -> bytes:
+        return MSGPACK_CABECERA + msgpack.packb(data, use_bin_type=True)
+
+    def decodificar(self, contenido: bytes) -> Any:
+        return msgpack.unpackb(contenido[len(MSGPACK_CABECERA):], raw=False, strict_map_key=False)
+
+def _crear_serializadores() -> Dict[str, Any]:
+    serializadores = {
+        "json": SerializadorJSON("json"),
+        "json-indent": SerializadorJSON("json-indent", indent=2),
+    }
+    if orjson is not None:
+        serializadores["orjson"] = SerializadorORJSON()
+    if msgpack is not None:
+        serializadores["msgpack"] = SerializadorMsgpack()
+    return serializadores
+
+SERIALIZADORES = _crear_serializadores()
+
+def obtener_serializador(nombre: str, respaldo: str = "json"):
+    """Serializador por nombre; si su librería no está instalada, el de respaldo"""
+    serializador = SERIALIZADORES.get(nombre)
+    if serializador is None:
+        if nombre not in ("orjson", "msgpack"):
+            logger.warning(f"⚠️ Serializador desconocido '{nombre}', usando {respaldo}")
+        else:
+            logger.info(f"ℹ️ {nombre} no está instalado, usando {respaldo}")
+        serializador = SERIALIZADORES[respaldo]
+    return serializador
+
+_serializador_general = obtener_serializador(SERIALIZER)
+_serializador_interno = obtener_serializador(SERIALIZER_INTERNO, respaldo=_serializador_general.nombre)
+
+# ================= API =================
+
+def serializador_para(filepath: str):
+    """🧬 Serializador con el que se escribe este archivo"""
+    if os.path.basename(filepath) in ARCHIVOS_INTERNOS:
+        return _serializador_interno
+    return _serializador_general
+
+def codificar(filepath: str, data: Any) -> bytes:
+    """Serializa el documento en el formato configurado para su archivo"""
+    return serializador_para(filepath).codificar(data)
+
+def detectar_formato(contenido: bytes) -> str:
+    return "msgpack" if contenido.startswith(MSGPACK_CABECERA) else "json"
+
+def decodificar(contenido: bytes) -> Any:
+    """🔍 Lee cualquier formato soportado mirando la cabecera del contenido"""
+    if contenido.startswith(MSGPACK_CABECERA):
+        if msgpack is None:
+            raise ValueError("Archivo en formato msgpack pero la librería msgpack no está instalada")
+        return SERIALIZADORES["msgpack"].decodificar(contenido)
+    if orjson is not None:
+        return orjson.loads(contenido)
+    return json.loads(contenido)
+
+__all__ = [
+    'SERIALIZER',
+    'SERIALIZER_INTERNO',
+    'ARCHIVOS_INTERNOS',
+    'SERIALIZADORES',
+    'obtener_serializador',
+    'serializador_para',
+    'codificar',
+    'decodificar',
+    'detectar_formato',
+]
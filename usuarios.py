@@ -21,6 +21,7 @@
 import os
 import sys
 import json
+import html
 import logging
 import io
 from datetime import datetime
@@ -30,8 +31,14 @@ from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, Mess
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from login import AuthSystem, ADMIN_USER_ID, requiere_admin, notificar_admins
-from database import load_json, save_json
+from database import (
+    load_json, save_json, flush_all, existe_json, iterar_documento,
+    obtener_metricas_archivos, reiniciar_metricas_archivos, obtener_estadisticas_escritura,
+    obtener_estadisticas_github, reconciliar_github
+)
 from utils import abreviar_numero
+from bloqueos import obtener_estadisticas_bloqueos
+from almacen import store, obtener_estadisticas_almacen
 
 logger = logging.getLogger(__name__)
 
@@ -121,12 +128,34 @@ def obtener_todos_archivos_json() -> list:
         ("galaxia.json", GALAXIA_FILE),
         ("misiones_flota.json", MISIONES_FLOTA_FILE),
         ("bajas_flota.json", BAJAS_FLOTA_FILE),
+        ("bajas_flota_resumen.json", os.path.join(DATA_DIR, "bajas_flota_resumen.json")),
         ("alianza_datos.json", ALIANZA_DATOS_FILE),
         ("alianza_miembros.json", ALIANZA_MIEMBROS_FILE),
         ("alianza_banco.json", ALIANZA_BANCO_FILE),
         ("alianza_permisos.json", ALIANZA_PERMISOS_FILE),
     ]
 
+def _serializar_documento_backup(ruta: str) -> tuple:
+    """
+    📝 Serializa un documento recorriéndolo entrada a entrada (iterar_documento),
+    sin armar el diccionario completo en memoria. Mismo formato que indent=2.
+    Retorna (json_str, num_registros, es_diccionario)
+    """
+    partes = []
+    num_registros = 0
+    for clave, valor in iterar_documento(ruta):
+        if clave is None:
+            # Documento que no es un diccionario (listas, valores sueltos)
+            num_items = len(valor) if isinstance(valor, list) else 0
+            return json.dumps(valor, indent=2, ensure_ascii=False), num_items, False
+        valor_str = json.dumps(valor, indent=2, ensure_ascii=False).replace("\n", "\n  ")
+        partes.append(f"  {json.dumps(str(clave), ensure_ascii=False)}: {valor_str}")
+        num_registros += 1
+    
+    if not partes:
+        return "{}", 0, True
+    return "{\n" + ",\n".join(partes) + "\n}", num_registros, True
+
 def crear_backup_completo() -> tuple:
     """💾 Crea un backup completo de TODOS los archivos JSON"""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -147,23 +176,22 @@ def crear_backup_completo() -> tuple:
     contenido.append("=" * 80)
     contenido.append("")
     
+    # Volcar escrituras diferidas para que el backup refleje el estado actual
+    flush_all()
+    
     for nombre, ruta in obtener_todos_archivos_json():
         try:
-            if os.path.exists(ruta):
-                with open(ruta, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                json_str = json.dumps(data, indent=2, ensure_ascii=False)
+            # Leer a través del backend activo (JSON, SQLite o fragmentos)
+            if existe_json(ruta):
+                json_str, num_registros, es_diccionario = _serializar_documento_backup(ruta)
                 tamano = len(json_str)
                 total_tamano += tamano
                 total_archivos += 1
                 
-                if isinstance(data, dict):
-                    num_keys = len(data)
-                    resumen.append(f"   ✅ {nombre}: {num_keys} registros, {tamano} bytes")
-                elif isinstance(data, list):
-                    num_items = len(data)
-                    resumen.append(f"   ✅ {nombre}: {num_items} items, {tamano} bytes")
+                if es_diccionario:
+                    resumen.append(f"   ✅ {nombre}: {num_registros} registros, {tamano} bytes")
+                elif json_str.startswith("["):
+                    resumen.append(f"   ✅ {nombre}: {num_registros} items, {tamano} bytes")
                 else:
                     resumen.append(f"   ✅ {nombre}: {tamano} bytes")
                 
@@ -240,8 +268,8 @@ def restaurar_backup_desde_texto(texto: str) -> tuple:
                             break
                     
                     if ruta:
-                        with open(ruta, 'w', encoding='utf-8') as f:
-                            json.dump(data, f, indent=2, ensure_ascii=False)
+                        # Pasar por save_json para reemplazar también la versión en memoria
+                        save_json(ruta, data)
                         estadisticas["archivos_restaurados"] += 1
                         estadisticas["detalle"].append(f"✅ {nombre_archivo}: Restaurado")
                         logger.info(f"✅ Archivo restaurado: {nombre_archivo}")
@@ -259,6 +287,13 @@ def restaurar_backup_desde_texto(texto: str) -> tuple:
                 estadisticas["errores"] += 1
                 estadisticas["detalle"].append(f"❌ {nombre_archivo}: Error - {str(e)[:50]}")
         
+        # El backup puede venir de una versión con niveles {"nivel": n}
+        from migraciones import migrar_esquema
+        migrar_esquema(forzar=True)
+        from indice_alianzas import reconstruir_indice
+        reconstruir_indice()
+        
+        flush_all()
         return True, "✅ Backup restaurado correctamente", estadisticas
         
     except Exception as e:
@@ -274,7 +309,7 @@ async def backup_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
     await query.answer()
     
     admin_id = query.from_user.id
-    admin_username = AuthSystem.obtener_username(admin_id)
+    admin_username = await store.ejecutar(AuthSystem.obtener_username, admin_id)
     es_principal = (admin_id == ADMIN_USER_ID)
     
     mensaje = (
@@ -681,7 +716,7 @@ async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # 🔧 Verificar si el modo mantenimiento está activado
     if AuthSystem.obtener_estado_mantenimiento():
         # Si es ADMIN, puede pasar
-        if AuthSystem.es_admin(user_id):
+        if await store.ejecutar(AuthSystem.es_admin, user_id):
             # Admin puede seguir
             pass
         else:
@@ -710,7 +745,7 @@ async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
     
     # Verificar si ya está autorizado
-    if AuthSystem.esta_autorizado(user_id):
+    if await store.ejecutar(AuthSystem.esta_autorizado, user_id):
         # Usuario ya autorizado - ir al menú principal
         from menus_principal import menu_principal
         
@@ -749,7 +784,7 @@ async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Verificar si ya está registrado (pendiente)
-    if AuthSystem.esta_registrado(user_id):
+    if await store.ejecutar(AuthSystem.esta_registrado, user_id):
         await update.message.reply_text(
             f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
             f"⏳ <b>SOLICITUD PENDIENTE</b>\n"
@@ -1161,26 +1196,27 @@ async def admin_estadisticas_handler(update: Update, context: ContextTypes.DEFAU
     pendientes = AuthSystem.obtener_usuarios_pendientes()
     admins = load_json(ADMINS_FILE) or {}
     
-    recursos_data = load_json(RECURSOS_FILE) or {}
-    total_metal = sum(u.get("metal", 0) for u in recursos_data.values())
-    total_cristal = sum(u.get("cristal", 0) for u in recursos_data.values())
-    total_deuterio = sum(u.get("deuterio", 0) for u in recursos_data.values())
-    
-    flota_data = load_json(FLOTA_USUARIO_FILE) or {}
-    total_naves = sum(sum(f.values()) for f in flota_data.values())
+    # Recorrer los documentos por usuario entrada a entrada (sin cargarlos enteros)
+    total_metal = total_cristal = total_deuterio = 0
+    for _, u in iterar_documento(RECURSOS_FILE):
+        if isinstance(u, dict):
+            total_metal += u.get("metal", 0)
+            total_cristal += u.get("cristal", 0)
+            total_deuterio += u.get("deuterio", 0)
     
-    defensa_data = load_json(DEFENSA_USUARIO_FILE) or {}
-    total_defensas = sum(sum(d.values()) for d in defensa_data.values())
+    total_naves = sum(sum(f.values()) for _, f in iterar_documento(FLOTA_USUARIO_FILE) if isinstance(f, dict))
+    total_defensas = sum(sum(d.values()) for _, d in iterar_documento(DEFENSA_USUARIO_FILE) if isinstance(d, dict))
     
-    colas_edificios = load_json(COLAS_EDIFICIOS_FILE) or {}
-    colas_flota = load_json(COLAS_FLOTA_FILE) or {}
-    colas_defensa = load_json(COLAS_DEFENSA_FILE) or {}
-    total_colas = (
-        sum(len(c) for c in colas_edificios.values()) +
-        sum(len(c) for c in colas_flota.values()) +
-        sum(len(c) for c in colas_defensa.values())
+    total_colas = sum(
+        len(c)
+        for archivo in (COLAS_EDIFICIOS_FILE, COLAS_FLOTA_FILE, COLAS_DEFENSA_FILE)
+        for _, c in iterar_documento(archivo)
+        if isinstance(c, list)
     )
     
+    bloqueos = obtener_estadisticas_bloqueos(top=3)
+    disputadas = ", ".join(f"{clave} ({veces})" for clave, veces in bloqueos["mas_disputadas"]) or "ninguna"
+    
     mensaje = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
         f"📊 <b>ESTADÍSTICAS DEL SISTEMA</b>\n"
@@ -1197,10 +1233,110 @@ async def admin_estadisticas_handler(update: Update, context: ContextTypes.DEFAU
         f"🚀 <b>FLOTA TOTAL:</b> {abreviar_numero(total_naves)} naves\n"
         f"🛡️ <b>DEFENSAS TOTALES:</b> {abreviar_numero(total_defensas)} unidades\n"
         f"📋 <b>COLAS ACTIVAS:</b> {total_colas} construcciones\n\n"
+        f"🔒 <b>BLOQUEOS:</b>\n"
+        f"   ├ Adquiridos: {bloqueos['adquisiciones']} ({bloqueos['contendidas']} con espera)\n"
+        f"   ├ Espera media/máx: {bloqueos['espera_media_ms']} / {bloqueos['espera_max_ms']} ms\n"
+        f"   └ Más disputados: {disputadas}\n\n"
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀"
     )
     
-    keyboard = [[InlineKeyboardButton("◀️ VOLVER", callback_data="menu_admin")]]
+    keyboard = [
+        [InlineKeyboardButton("📈 E/S POR ARCHIVO", callback_data="admin_metricas_almacen")],
+        [InlineKeyboardButton("◀️ VOLVER", callback_data="menu_admin")]
+    ]
+    
+    await query.edit_message_text(
+        text=mensaje,
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode="HTML"
+    )
+
+@requiere_admin
+async def admin_metricas_almacen_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """📈 Archivos más escritos: guardados/min, bytes, parseo y GitHub"""
+    query = update.callback_query
+    
+    reconciliacion = None
+    if query.data == "admin_metricas_almacen_reiniciar":
+        reiniciar_metricas_archivos()
+        await query.answer("🔄 Métricas reiniciadas")
+    elif query.data == "admin_metricas_almacen_github":
+        await query.answer("☁️ Reconciliando con GitHub...")
+        reconciliacion = await store.ejecutar(reconciliar_github)
+    else:
+        await query.answer()
+    
+    metricas = obtener_metricas_archivos(orden="guardados", top=8)
+    escritura = obtener_estadisticas_escritura()
+    almacen = obtener_estadisticas_almacen()
+    github = obtener_estadisticas_github()
+    minutos = max(1, round(metricas["segundos"] / 60))
+    
+    mensaje = (
+        f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
+        f"📈 <b>E/S POR ARCHIVO</b>\n"
+        f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n\n"
+        f"⏱️ Últimos {minutos} min · backend <b>{almacen['backend']}</b>\n"
+        f"💾 Guardados {escritura['solicitudes']} → escrituras {escritura['escrituras']} "
+        f"({escritura['pendientes']} pendientes)\n"
+        f"🧵 Pool: {almacen['en_curso']}/{almacen['hilos']} ocupados, "
+        f"espera máx {almacen['espera_max_ms']} ms\n"
+    )
+    if github["activado"]:
+        mensaje += (
+            f"☁️ GitHub: <b>{github['pendientes']}</b> en cola "
+            f"({github['en_reintento']} reintentando) · {github['subidas']} subidas en {github['lotes']} commits, "
+            f"{github['coalescidos']} agrupadas · retraso máx {github['retraso_max_s']}s\n"
+        )
+        circuito = github["circuito"]
+        if circuito["estado"] == "abierto":
+            mensaje += (
+                f"   ├ 🔴 Circuito ABIERTO: {html.escape(circuito['motivo'] or '')} · "
+                f"reabre en {circuito['reabre_en_s']}s ({circuito['rechazadas']} peticiones evitadas)\n"
+            )
+        elif circuito["estado"] == "semiabierto":
+            mensaje += "   ├ 🟡 Circuito SEMIABIERTO: probando GitHub\n"
+        else:
+            mensaje += (
+                f"   ├ 🟢 Circuito cerrado · {circuito['fallos_seguidos']} fallos seguidos · "
+                f"{circuito['aperturas']} aperturas\n"
+            )
+        if github["ultimo_error"]:
+            mensaje += f"   └ Último error: {html.escape(github['ultimo_error'][:80])}\n"
+        if reconciliacion is not None:
+            if reconciliacion["disponible"]:
+                mensaje += (
+                    f"   └ Reconciliado: {reconciliacion['descargados']} descargados, "
+                    f"{reconciliacion['encolados']} por subir, {reconciliacion['errores']} errores\n"
+                )
+            else:
+                mensaje += "   └ ❌ GitHub no respondió, se siguen usando los datos locales\n"
+    mensaje += "\n"
+    
+    if not metricas["archivos"]:
+        mensaje += "ℹ️ Sin actividad desde el último reinicio\n\n"
+    for archivo, m in metricas["archivos"].items():
+        mensaje += (
+            f"📄 <b>{archivo}</b>\n"
+            f"   ├ Guardados/min: {m['guardados_min']} ({m['coalescidas']} agrupados)\n"
+            f"   ├ Escrituras: {m['escrituras']} · {abreviar_numero(m['bytes_escritos'])}B · "
+            f"serializar {m['serializacion_ms']} ms\n"
+            f"   ├ Cargas: {m['cargas']} ({m['lecturas']} de disco) · "
+            f"{abreviar_numero(m['bytes_leidos'])}B · parseo {m['parseo_ms']} ms\n"
+            f"   └ GitHub: {m['github_peticiones']} pet. · RTT {m['github_rtt_ms']} ms · "
+            f"{m['github_errores']} errores · {m['github_limitadas']} limitadas\n\n"
+        )
+    mensaje += "🌀 ━━━━━━━━━━━━━━━━━━━ 🌀"
+    
+    keyboard = [
+        [
+            InlineKeyboardButton("🔄 ACTUALIZAR", callback_data="admin_metricas_almacen"),
+            InlineKeyboardButton("🧹 REINICIAR", callback_data="admin_metricas_almacen_reiniciar")
+        ],
+        [InlineKeyboardButton("◀️ VOLVER", callback_data="admin_estadisticas")]
+    ]
+    if github["activado"]:
+        keyboard.insert(1, [InlineKeyboardButton("☁️ RECONCILIAR GITHUB", callback_data="admin_metricas_almacen_github")])
     
     await query.edit_message_text(
         text=mensaje,
@@ -1255,8 +1391,8 @@ async def ejecutar_limpiar_colas(update: Update, context: ContextTypes.DEFAULT_T
     await query.answer()
     
     user_id = int(query.data.split("_")[3])
-    username = AuthSystem.obtener_username(user_id)
-    admin_username = AuthSystem.obtener_username(query.from_user.id)
+    username = await store.ejecutar(AuthSystem.obtener_username, user_id)
+    admin_username = await store.ejecutar(AuthSystem.obtener_username, query.from_user.id)
     
     colas_edificios = load_json(COLAS_EDIFICIOS_FILE) or {}
     colas_flota = load_json(COLAS_FLOTA_FILE) or {}
@@ -1459,7 +1595,7 @@ async def confirmar_agregar_admin(update: Update, context: ContextTypes.DEFAULT_
         "nombre": usuario.get("nombre", "Administrador"),
         "fecha_registro": ahora,
         "agregado_por": admin_principal_id,
-        "agregado_por_username": AuthSystem.obtener_username(admin_principal_id),
+        "agregado_por_username": await store.ejecutar(AuthSystem.obtener_username, admin_principal_id),
         "permisos": ["basicos"]
     }
     
@@ -1470,7 +1606,7 @@ async def confirmar_agregar_admin(update: Update, context: ContextTypes.DEFAULT_
             f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n\n"
             f"👤 Nuevo administrador: {username_formateado}\n"
             f"🆔 ID: <code>{user_id}</code>\n"
-            f"👑 Agregado por: {AuthSystem.obtener_username(admin_principal_id)}\n"
+            f"👑 Agregado por: {await store.ejecutar(AuthSystem.obtener_username, admin_principal_id)}\n"
             f"📅 Fecha: {ahora}\n\n"
             f"🔑 Permisos: básicos\n\n"
             f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀"
@@ -1486,7 +1622,7 @@ async def confirmar_agregar_admin(update: Update, context: ContextTypes.DEFAULT_
                     f"Has sido promovido a <b>ADMINISTRADOR</b>.\n\n"
                     f"Ahora tienes acceso al panel de administración.\n"
                     f"Usa /admin para acceder.\n\n"
-                    f"Promovido por: {AuthSystem.obtener_username(admin_principal_id)}\n\n"
+                    f"Promovido por: {await store.ejecutar(AuthSystem.obtener_username, admin_principal_id)}\n\n"
                     f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀"
                 ),
                 parse_mode="HTML"
@@ -1495,7 +1631,7 @@ async def confirmar_agregar_admin(update: Update, context: ContextTypes.DEFAULT_
         except Exception as e:
             logger.error(f"❌ Error notificando a nuevo admin {user_id}: {e}")
         
-        logger.info(f"✅ {username_formateado} fue promovido a administrador por {AuthSystem.obtener_username(admin_principal_id)}")
+        logger.info(f"✅ {username_formateado} fue promovido a administrador por {await store.ejecutar(AuthSystem.obtener_username, admin_principal_id)}")
     else:
         mensaje = "❌ <b>Error al guardar</b>\n\nNo se pudo agregar el administrador."
     
@@ -1663,7 +1799,7 @@ async def confirmar_remover_admin(update: Update, context: ContextTypes.DEFAULT_
             f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n\n"
             f"👤 Usuario: {username}\n"
             f"🆔 ID: <code>{user_id}</code>\n"
-            f"👑 Removido por: {AuthSystem.obtener_username(admin_principal_id)}\n"
+            f"👑 Removido por: {await store.ejecutar(AuthSystem.obtener_username, admin_principal_id)}\n"
             f"📅 Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
             f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀"
         )
@@ -1677,7 +1813,7 @@ async def confirmar_remover_admin(update: Update, context: ContextTypes.DEFAULT_
                     f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n\n"
                     f"Has sido removido como administrador.\n\n"
                     f"Ya no tienes acceso al panel de administración.\n\n"
-                    f"Removido por: {AuthSystem.obtener_username(admin_principal_id)}\n\n"
+                    f"Removido por: {await store.ejecutar(AuthSystem.obtener_username, admin_principal_id)}\n\n"
                     f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀"
                 ),
                 parse_mode="HTML"
@@ -1685,7 +1821,7 @@ async def confirmar_remover_admin(update: Update, context: ContextTypes.DEFAULT_
         except Exception as e:
             logger.error(f"❌ Error notificando a {user_id}: {e}")
         
-        logger.info(f"✅ {username} fue removido de administrador por {AuthSystem.obtener_username(admin_principal_id)}")
+        logger.info(f"✅ {username} fue removido de administrador por {await store.ejecutar(AuthSystem.obtener_username, admin_principal_id)}")
     else:
         mensaje = "❌ <b>Error al guardar</b>\n\nNo se pudo remover el administrador."
     
@@ -1718,6 +1854,8 @@ async def admin_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
         await confirmar_reinicio_fabrica(update, context)
     elif data == "admin_estadisticas":
         await admin_estadisticas_handler(update, context)
+    elif data.startswith("admin_metricas_almacen"):
+        await admin_metricas_almacen_handler(update, context)
     elif data == "admin_remover":
         await remover_admin_menu(update, context)
     elif data.startswith("admin_remover_user_"):
@@ -1734,7 +1872,7 @@ async def toggle_mantenimiento_handler(update: Update, context: ContextTypes.DEF
     await query.answer()
     
     admin_id = query.from_user.id
-    admin_username = AuthSystem.obtener_username(admin_id)
+    admin_username = await store.ejecutar(AuthSystem.obtener_username, admin_id)
     
     estado_actual = AuthSystem.obtener_estado_mantenimiento()
     nuevo_estado = not estado_actual
@@ -1856,6 +1994,8 @@ async def confirmar_reinicio_fabrica(update: Update, context: ContextTypes.DEFAU
             from base_flotas import MISIONES_FLOTA_FILE, BAJAS_FLOTA_FILE
             save_json(MISIONES_FLOTA_FILE, {})
             save_json(BAJAS_FLOTA_FILE, {})
+            from retencion import BAJAS_FLOTA_RESUMEN_FILE
+            save_json(BAJAS_FLOTA_RESUMEN_FILE, {})
         except:
             pass
         
@@ -2111,8 +2251,8 @@ async def ingresar_nivel_edificio(update: Update, context: ContextTypes.DEFAULT_
     else:
         actualizar_campos(user_id)
     
-    username = AuthSystem.obtener_username(user_id)
-    admin_username = AuthSystem.obtener_username(update.effective_user.id)
+    username = await store.ejecutar(AuthSystem.obtener_username, user_id)
+    admin_username = await store.ejecutar(AuthSystem.obtener_username, update.effective_user.id)
     
     mensaje = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -2341,8 +2481,8 @@ async def ingresar_nivel_investigacion(update: Update, context: ContextTypes.DEF
     investigaciones[tech_id] = nivel
     guardar_investigacion(user_id, investigaciones=investigaciones)
     
-    username = AuthSystem.obtener_username(user_id)
-    admin_username = AuthSystem.obtener_username(update.effective_user.id)
+    username = await store.ejecutar(AuthSystem.obtener_username, user_id)
+    admin_username = await store.ejecutar(AuthSystem.obtener_username, update.effective_user.id)
     
     mensaje = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -2422,7 +2562,7 @@ async def recibir_anuncio_handler(update: Update, context: ContextTypes.DEFAULT_
         await update.message.reply_text("❌ El anuncio no puede estar vacío.")
         return INGRESAR_ANUNCIO
     
-    admin_username = AuthSystem.obtener_username(update.effective_user.id)
+    admin_username = await store.ejecutar(AuthSystem.obtener_username, update.effective_user.id)
     
     autorizados = load_json(AUTHORIZED_USERS_FILE) or []
     
@@ -2644,8 +2784,8 @@ async def ingresar_deuterio_handler(update: Update, context: ContextTypes.DEFAUL
     recursos_data[str(user_id)] = recursos
     save_json(RECURSOS_FILE, recursos_data)
     
-    username = AuthSystem.obtener_username(user_id)
-    admin_username = AuthSystem.obtener_username(update.effective_user.id)
+    username = await store.ejecutar(AuthSystem.obtener_username, user_id)
+    admin_username = await store.ejecutar(AuthSystem.obtener_username, update.effective_user.id)
     
     mensaje = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -2867,8 +3007,8 @@ async def ingresar_cantidad_flota(update: Update, context: ContextTypes.DEFAULT_
     flota_data[str(user_id)] = flota
     save_json(FLOTA_USUARIO_FILE, flota_data)
     
-    username = AuthSystem.obtener_username(user_id)
-    admin_username = AuthSystem.obtener_username(update.effective_user.id)
+    username = await store.ejecutar(AuthSystem.obtener_username, user_id)
+    admin_username = await store.ejecutar(AuthSystem.obtener_username, update.effective_user.id)
     
     mensaje = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -3088,8 +3228,8 @@ async def ingresar_cantidad_defensa(update: Update, context: ContextTypes.DEFAUL
     defensa_data[str(user_id)] = defensas
     save_json(DEFENSA_USUARIO_FILE, defensa_data)
     
-    username = AuthSystem.obtener_username(user_id)
-    admin_username = AuthSystem.obtener_username(update.effective_user.id)
+    username = await store.ejecutar(AuthSystem.obtener_username, user_id)
+    admin_username = await store.ejecutar(AuthSystem.obtener_username, update.effective_user.id)
     
     mensaje = (
         f"🌀 ━━━━━━━━━━━━━━━━━━━ 🌀\n"
@@ -3253,6 +3393,7 @@ __all__ = [
     'remover_admin_menu',
     'confirmar_remover_admin',
     'admin_estadisticas_handler',
+    'admin_metricas_almacen_handler',
     'regalar_recursos_menu',
     'regalar_flota_menu',
     'regalar_defensa_menu',